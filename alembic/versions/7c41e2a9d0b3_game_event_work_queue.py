@@ -0,0 +1,43 @@
+"""game_event work queue index and daily rollups
+
+Revision ID: 7c41e2a9d0b3
+Revises: 1dcb8f36137e
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c41e2a9d0b3'
+down_revision: Union[str, Sequence[str], None] = '1dcb8f36137e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_game_event_unprocessed', 'game_event', ['id'],
+        postgresql_where=sa.text('processed = false'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'game_event_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=True),
+        sa.Column('value_sum', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('day', 'user_id', 'event_type'),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('game_event_daily')
+    op.drop_index('ix_game_event_unprocessed', table_name='game_event')
@@ -20,6 +20,17 @@ try:
 except Exception:
     pass
 
+def get_upsert_insert(session):
+    """
+    Return the dialect-specific insert() construct for the session's engine.
+    Both PostgreSQL and SQLite variants support on_conflict_do_update/do_nothing.
+    """
+    if session.get_bind().dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
 class Database:
     _instance = None
     
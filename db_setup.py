@@ -2,8 +2,6 @@ from database import Database, Base
 import os
 import importlib
 from sqlalchemy import text, inspect
-from models.user import Utente
-from services.user_service import UserService
 
 def migrate_refinery(db):
     engine = db.engine
@@ -596,22 +594,47 @@ def migrate_mob_tactical(db):
     finally:
         session.close()
 
+# Indexes backing hot queries (idempotent: IF NOT EXISTS works on PostgreSQL and SQLite).
+# Partial indexes keep work queues small no matter how much history piles up.
+PERFORMANCE_INDEXES = [
+    # Achievement pipeline queue: claim unprocessed events in id order
+    ("ix_game_event_unprocessed", "CREATE INDEX IF NOT EXISTS ix_game_event_unprocessed ON game_event (id) WHERE processed = {false}"),
+    # Transformation reverter: only users with a pending expiry
+    ("ix_utente_transformation_expires_at", "CREATE INDEX IF NOT EXISTS ix_utente_transformation_expires_at ON utente (transformation_expires_at) WHERE transformation_expires_at IS NOT NULL"),
+    # Market browser: active-set filter and keyset pagination
+    ("ix_market_listings_status_expires", "CREATE INDEX IF NOT EXISTS ix_market_listings_status_expires ON market_listings (status, expires_at)"),
+    ("ix_market_listings_status_created", "CREATE INDEX IF NOT EXISTS ix_market_listings_status_created ON market_listings (status, created_at, id)"),
+    # Leaderboard rebuilds (boot and hourly resync)
+    ("ix_utente_exp", 'CREATE INDEX IF NOT EXISTS ix_utente_exp ON utente (exp, "id_Telegram")'),
+    ("ix_season_progress_ranking", "CREATE INDEX IF NOT EXISTS ix_season_progress_ranking ON season_progress (season_id, current_level, current_exp, user_id)"),
+    ("ix_guild_dungeon_stats_guild", "CREATE INDEX IF NOT EXISTS ix_guild_dungeon_stats_guild ON guild_dungeon_stats (guild_id, total_damage)"),
+]
+
+def migrate_performance_indexes(db):
+    """Create indexes used by hot paths and background jobs"""
+    session = db.get_session()
+    try:
+        print("Checking performance indexes...")
+        false_literal = '0' if db.engine.name == 'sqlite' else 'false'
+        for name, sql in PERFORMANCE_INDEXES:
+            try:
+                session.execute(text(sql.format(false=false_literal)))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"⚠️ Failed to create index {name}: {e}")
+        print("✅ Performance indexes verified!")
+    finally:
+        session.close()
+
 def migrate_recalculate_stats(db):
     """Recalculate stats for all users"""
-    session = db.get_session()
-    user_service = UserService()
+    from services.user_recalculation_service import UserRecalculationService
     try:
-        users = session.query(Utente).all()
-        print(f"Recalculating stats for {len(users)} users...")
-        for user in users:
-            user_service.recalculate_stats(user.id_telegram, session=session)
-        session.commit()
-        print("✅ Stats recalculated for all users!")
+        result = UserRecalculationService().recalculate_all(recalculate_levels=False)
+        print(f"✅ Stats recalculated for {result['users']} users ({result['updated']} updated)!")
     except Exception as e:
-        session.rollback()
         print(f"Error recalculating stats: {e}")
-    finally:
-        session.close()
 
 def seed_refined_materials(db):
     print("Seeding refined_materials...")
@@ -837,6 +860,7 @@ def init_database():
     migrate_other_tables(db)
     migrate_mount_system(db)
     migrate_mob_tactical(db)
+    migrate_performance_indexes(db)
     migrate_recalculate_stats(db)
     
     # 3. Seeding (Idempotent ON CONFLICT)
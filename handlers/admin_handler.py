@@ -8,18 +8,20 @@ from services.item_service import ItemService
 from services.character_loader import get_character_loader
 from services.skin_service import SkinService
 from services.backup_service import BackupService
+from services.service_registry import get_service
+from services.delayed_event_scheduler import get_delayed_event_scheduler
 from utils.markup_utils import get_combat_markup, get_mention_markdown, safe_answer_callback
 from utils.format_utils import format_mob_stats
 from database import Database
 from models.pve import Mob
 
 # Initialize Services
-user_service = UserService()
-pve_service = PvEService()
-dungeon_service = DungeonService()
-item_service = ItemService()
-skin_service = SkinService()
-backup_service = BackupService()
+user_service = get_service(UserService)
+pve_service = get_service(PvEService)
+dungeon_service = get_service(DungeonService)
+item_service = get_service(ItemService)
+skin_service = get_service(SkinService)
+backup_service = get_service(BackupService)
 
 # Global state for uploads (from main.py)
 pending_attack_upload = {}
@@ -371,32 +373,34 @@ def handle_stop_dungeon(bot, message):
     success, msg = dungeon_service.force_close_dungeon(chat_id)
     bot.reply_to(message, f"{'✅' if success else '❌'} {msg}")
 
+def _play_dungeon_event(bot, event, chat_id):
+    """Send a single dungeon event (called by the delayed event scheduler)"""
+    if event['type'] == 'message':
+        bot.send_message(chat_id, event['content'], parse_mode='markdown')
+    elif event['type'] == 'delay':
+        try:
+            bot.send_chat_action(chat_id, 'typing')
+        except: pass
+    elif event['type'] == 'spawn':
+        # Display spawned mobs
+        mob_ids = event.get('mob_ids', [])
+        for mob_id in mob_ids:
+            mob_data = pve_service.get_mob_details(mob_id)
+            if mob_data:
+                msg = f"⚠️ **{mob_data['name']}** è apparso!"
+                if mob_data['is_boss']:
+                    msg = f"☠️ **BOSS: {mob_data['name']}** è sceso in campo!"
+                
+                markup = get_combat_markup("mob", mob_id, chat_id)
+                
+                if mob_data.get('image_path') and os.path.exists(mob_data['image_path']):
+                    with open(mob_data['image_path'], 'rb') as photo:
+                        bot.send_photo(chat_id, photo, caption=msg, reply_markup=markup, parse_mode='markdown')
+                else:
+                    bot.send_message(chat_id, msg, reply_markup=markup, parse_mode='markdown')
+
 def process_dungeon_events(bot, events, chat_id):
-    """Process dungeon events (messages, delays, spawns)"""
-    import time
-    for event in events:
-        if event['type'] == 'message':
-            bot.send_message(chat_id, event['content'], parse_mode='markdown')
-        elif event['type'] == 'delay':
-            seconds = event.get('seconds', 3)
-            try:
-                bot.send_chat_action(chat_id, 'typing')
-            except: pass
-            time.sleep(seconds)
-        elif event['type'] == 'spawn':
-            # Display spawned mobs
-            mob_ids = event.get('mob_ids', [])
-            for mob_id in mob_ids:
-                mob_data = pve_service.get_mob_details(mob_id)
-                if mob_data:
-                    msg = f"⚠️ **{mob_data['name']}** è apparso!"
-                    if mob_data['is_boss']:
-                        msg = f"☠️ **BOSS: {mob_data['name']}** è sceso in campo!"
-                    
-                    markup = get_combat_markup("mob", mob_id, chat_id)
-                    
-                    if mob_data.get('image_path') and os.path.exists(mob_data['image_path']):
-                        with open(mob_data['image_path'], 'rb') as photo:
-                            bot.send_photo(chat_id, photo, caption=msg, reply_markup=markup, parse_mode='markdown')
-                    else:
-                        bot.send_message(chat_id, msg, reply_markup=markup, parse_mode='markdown')
+    """Process dungeon events (messages, delays, spawns) asynchronously, in order per chat"""
+    get_delayed_event_scheduler().play_script(
+        chat_id, events, lambda event: _play_dungeon_event(bot, event, chat_id)
+    )
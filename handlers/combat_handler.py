@@ -9,6 +9,7 @@ from services.user_service import UserService
 from services.pve_service import PvEService
 from services.item_service import ItemService
 from services.drop_service import DropService
+from services.service_registry import get_service
 from utils.markup_utils import get_combat_markup, get_mention_markdown
 
 # Global lock for mob display to prevent race conditions
@@ -25,10 +26,10 @@ def get_mob_display_lock(mob_id):
 class CombatHandler:
     def __init__(self, bot):
         self.bot = bot
-        self.user_service = UserService()
-        self.pve_service = PvEService()
-        self.item_service = ItemService()
-        self.drop_service = DropService()
+        self.user_service = get_service(UserService)
+        self.pve_service = get_service(PvEService)
+        self.item_service = get_service(ItemService)
+        self.drop_service = get_service(DropService)
 
     def send_combat_message(self, chat_id, text, image_path, markup, mob_id, old_message_id=None, is_death=False):
         """Send or update a combat message with locking to prevent visual glitches"""
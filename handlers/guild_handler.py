@@ -7,13 +7,16 @@ from services.user_service import UserService
 from services.guild_service import GuildService
 from services.guild_activity_service import GuildActivityService
 from services.mount_service import MountService
+from services.service_registry import get_service
+from services.callback_router import get_callback_router
 from utils.markup_utils import get_mention_markdown, escape_markdown
 
 # Initialize services
-user_service = UserService()
-guild_service = GuildService()
-guild_activity_service = GuildActivityService()
-mount_service = MountService()
+user_service = get_service(UserService)
+guild_service = get_service(GuildService)
+guild_activity_service = get_service(GuildActivityService)
+mount_service = get_service(MountService)
+callback_router = get_callback_router()
 
 PIL_AVAILABLE = False
 try:
@@ -114,6 +117,12 @@ def handle_found_cmd(bot, message):
     # Simpler: define it here.
     bot.register_next_step_handler(msg, process_guild_name)
 
+@callback_router.route("guild_found_start", pass_bot=True)
+def handle_found_start_callback(bot, call):
+    """'Fonda Gilda' button"""
+    safe_answer_callback(bot, call.id)
+    handle_found_cmd(bot, call.message)
+
 def process_guild_name(message):
     from main import bot
     name = message.text
@@ -2,6 +2,7 @@ from telebot import types
 from settings import *
 from services.market_service import MarketService
 from services.item_service import ItemService
+from services.service_registry import get_service
 from utils.markup_utils import safe_answer_callback, safe_edit_message, get_mention_markdown
 
 def handle_market_cmd(bot, message):
@@ -17,17 +18,20 @@ def handle_market_callbacks(bot, call):
     action = call.data
     user_id = call.from_user.id
     
-    market_service = MarketService()
+    market_service = get_service(MarketService)
     
     if action.startswith("market_list|"):
+        # market_list|<page>[|n or p|<cursor>]: keyset navigation from the previous page
+        parts = action.split("|")
         try:
-            page_str = action.split("|")[1]
-            page = int(page_str)
+            page = int(parts[1])
         except (IndexError, ValueError):
             page = 1
+        backwards = len(parts) > 3 and parts[2] == "p"
+        cursor = parts[3] if len(parts) > 3 else None
             
         limit = 5
-        listings, total = market_service.get_active_listings(page, limit)
+        listings, total, next_cursor, prev_cursor = market_service.get_listings_page(cursor, backwards, limit)
         
         msg = f"🏪 **MERCATO GLOBALE (Pagina {page})**\n\n"
         
@@ -40,9 +44,6 @@ def handle_market_callbacks(bot, call):
         # Based on diff: listings, total = market_service.get_active_listings(page, limit)
         # Assuming get_active_listings returns objects with attributes.
         
-        import math
-        total_pages = math.ceil(total / limit)
-        
         markup = types.InlineKeyboardMarkup()
         
         # Add listings buttons directly? 
@@ -78,9 +79,10 @@ def handle_market_callbacks(bot, call):
                 
         nav_row = []
         if page > 1:
-            nav_row.append(types.InlineKeyboardButton("⬅️ Prec", callback_data=f"market_list|{page-1}"))
-        if page < total_pages:
-            nav_row.append(types.InlineKeyboardButton("Succ ➡️", callback_data=f"market_list|{page+1}"))
+            prev_cb = f"market_list|{page-1}|p|{prev_cursor}" if prev_cursor else "market_list|1"
+            nav_row.append(types.InlineKeyboardButton("⬅️ Prec", callback_data=prev_cb))
+        if next_cursor:
+            nav_row.append(types.InlineKeyboardButton("Succ ➡️", callback_data=f"market_list|{page+1}|n|{next_cursor}"))
         
         if nav_row:
             markup.row(*nav_row)
@@ -133,7 +135,7 @@ def handle_market_callbacks(bot, call):
         return True
 
     elif action == "market_sell_menu":
-         item_svc = ItemService()
+         item_svc = get_service(ItemService)
          inventory = item_svc.get_inventory(user_id)
          
          msg = "📦 **VENDITA OGGETTO**\nScegli cosa vendere dal tuo inventario:"
@@ -199,7 +201,7 @@ def process_market_sell_price(message, bot, item_name, qty):
             bot.reply_to(message, "❌ Prezzo non valido.")
             return
 
-        ms = MarketService()
+        ms = get_service(MarketService)
         user_id = message.from_user.id
         
         success, res_msg = ms.create_listing(user_id, item_name, qty, price_total)
@@ -7,6 +7,7 @@ from telebot import types
 from services.character_loader import get_character_loader
 from services.user_service import UserService
 from services.transformation_service import TransformationService
+from services.character_service import invalidate_character_ownership
 from models.system import UserCharacter, CharacterTransformation, UserTransformation
 from models.user import Utente
 
@@ -167,6 +168,7 @@ def handle_transformation_callbacks(bot, call, utente, user_service, transformat
         session.add(new_ownership)
         session.commit()
         session.close()
+        invalidate_character_ownership(user_id)
         
         safe_answer(f"✅ {character['nome']} acquistato!")
         bot.send_message(user_id, f"🎉 Hai acquistato **{character['nome']}** per {price} 🍑!", parse_mode='markdown')
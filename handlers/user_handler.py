@@ -22,24 +22,26 @@ from services.skill_service import SkillService
 from services.transformation_service import TransformationService
 from services.crafting_service import CraftingService
 from utils.markup_utils import safe_answer_callback, safe_edit_message, get_mention_markdown, escape_markdown
-from services.leveling_service import LevelingService
+from services.leveling_service import LevelingService, get_level_curve
+from services.leaderboard_service import get_leaderboards
+from services.service_registry import get_service
 
 # Initialize services
-user_service = UserService()
-item_service = ItemService()
-equipment_service = EquipmentService()
-stats_service = StatsService()
-achievement_tracker = AchievementTracker()
-season_manager = SeasonManager()
-shop_service = ShopService()
-potion_service = PotionService()
-skin_service = SkinService()
-wish_service = WishService()
-character_service = CharacterService()
-guild_service = GuildService()
-skill_service = SkillService()
-transformation_service = TransformationService()
-crafting_service = CraftingService()
+user_service = get_service(UserService)
+item_service = get_service(ItemService)
+equipment_service = get_service(EquipmentService)
+stats_service = get_service(StatsService)
+achievement_tracker = get_service(AchievementTracker)
+season_manager = get_service(SeasonManager)
+shop_service = get_service(ShopService)
+potion_service = get_service(PotionService)
+skin_service = get_service(SkinService)
+wish_service = get_service(WishService)
+character_service = get_service(CharacterService)
+guild_service = get_service(GuildService)
+skill_service = get_service(SkillService)
+transformation_service = get_service(TransformationService)
+crafting_service = get_service(CraftingService)
 
 # Global state for admin features (volatile)
 admin_last_viewed_character = {}
@@ -130,8 +132,8 @@ def handle_profile_view(bot, message, target_user=None, is_callback=False, call_
         # Progression
         next_lv_num = target.livello + 1
         
-        # Consistent XP Formula usage
-        exp_req = LevelingService().get_xp_requirement(next_lv_num)
+        # Consistent XP Formula usage (shared level curve table)
+        exp_req = get_level_curve().requirement(next_lv_num)
             
         exp_percent = int((target.exp / exp_req) * 10) if exp_req > 0 else 0
         exp_bar = "▰" * exp_percent + "▱" * (10 - exp_percent)
@@ -366,11 +368,14 @@ def handle_character_choice_menu(bot, message, level_idx=None, char_idx=0, only_
 
     current_level = levels[level_idx]
 
+    # Purchased ids loaded once: every unlock/ownership check below is in memory
+    ownership = character_service.get_ownership_snapshot(utente)
+
     # Handle "Only Owned/Unlocked" flat list mode
     if only_owned == 1:
         # FLAT LIST MODE: unlocked chars
-        all_chars = character_service.get_available_characters(utente)
-        level_chars = [c for c in all_chars if character_service.is_character_unlocked(utente, c['id'])]
+        all_chars = character_service.get_available_characters(utente, snapshot=ownership)
+        level_chars = [c for c in all_chars if ownership.is_unlocked(c)]
         level_chars.sort(key=lambda x: (x['livello'], x['nome']))
         current_level = "TUTTI"
         # Mock levels for display
@@ -431,9 +436,9 @@ def handle_character_choice_menu(bot, message, level_idx=None, char_idx=0, only_
     char_lv_premium = char.get('lv_premium', 0)
     char_price = char.get('price', 0)
 
-    is_owned = character_service.is_character_owned(utente, char_id)
+    is_owned = ownership.is_owned(char)
     is_equipped = (utente.livello_selezionato == char_id)
-    is_unlocked = character_service.is_character_unlocked(utente, char_id)
+    is_unlocked = ownership.is_unlocked(char)
 
     # Format Card
     lock_icon = "" if is_unlocked else "🔒 "
@@ -567,9 +572,10 @@ def handle_saga_view(bot, message, saga_name, char_idx=0, is_callback=False):
 
     char = saga_chars[char_idx]
     char_id = char['id']
-    is_owned = character_service.is_character_owned(utente, char_id)
+    ownership = character_service.get_ownership_snapshot(utente)
+    is_owned = ownership.is_owned(char)
     is_equipped = (utente.livello_selezionato == char_id)
-    is_unlocked = character_service.is_character_unlocked(utente, char_id)
+    is_unlocked = ownership.is_unlocked(char)
 
     # Format Card
     lock_icon = "" if is_unlocked else "🔒 "
@@ -1073,13 +1079,12 @@ def handle_ranking_view(bot, message, ranking_type="global", is_callback=False):
     markup = types.InlineKeyboardMarkup()
     
     if ranking_type == "global":
-        users = user_service.get_users()
-        users.sort(key=lambda x: x.exp if x.exp else 0, reverse=True)
+        users = get_leaderboards().get_global_ranking(limit=15)
         
         msg = "🌍 **CLASSIFICA GLOBALE** 🌍\n\n"
         char_loader = get_character_loader()
         
-        for i, u in enumerate(users[:15]):
+        for i, u in enumerate(users):
             char_name = "N/A"
             if u.livello_selezionato:
                 c = char_loader.get_character_by_id(u.livello_selezionato)
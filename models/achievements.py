@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Date, Boolean, ForeignKey, Float, Index
 from database import Base
 import datetime
 
@@ -59,3 +59,22 @@ class GameEvent(Base):
     
     timestamp = Column(DateTime, default=datetime.datetime.now)
     processed = Column(Boolean, default=False)  # For async stat aggregation
+
+    __table_args__ = (
+        # Work-queue index: covers only the (few) unprocessed rows, in claim order
+        Index('ix_game_event_unprocessed', 'id',
+              postgresql_where=(processed == False),
+              sqlite_where=(processed == False)),
+    )
+
+
+class GameEventDailyRollup(Base):
+    """Per-day compaction of processed GameEvents (history without the raw rows)"""
+    __tablename__ = "game_event_daily"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)  # id_telegram
+    event_type = Column(String(50), primary_key=True)
+
+    event_count = Column(Integer, default=0)
+    value_sum = Column(Float, default=0.0)
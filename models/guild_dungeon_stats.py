@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -17,3 +17,8 @@ class GuildDungeonStats(Base):
     updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
     guild = relationship("Guild")
+
+    __table_args__ = (
+        # Guild leaderboard rebuild: per-guild damage sums
+        Index('ix_guild_dungeon_stats_guild', 'guild_id', 'total_damage'),
+    )
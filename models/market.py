@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, BigInteger, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -24,5 +24,12 @@ class MarketListing(Base):
     seller = relationship("Utente", foreign_keys=[seller_id], backref="listings_sold")
     buyer = relationship("Utente", foreign_keys=[buyer_id], backref="listings_bought")
 
+    __table_args__ = (
+        # Active-set filter (count, expiry sweeper)
+        Index('ix_market_listings_status_expires', 'status', 'expires_at'),
+        # Keyset pagination: newest first within the active set
+        Index('ix_market_listings_status_created', 'status', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<MarketListing(id={self.id}, item={self.item_name}, seller={self.seller_id}, status={self.status})>"
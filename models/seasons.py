@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float, Index
 from database import Base
 import datetime
 
@@ -36,6 +36,11 @@ class SeasonProgress(Base):
     
     last_update = Column(DateTime, default=datetime.datetime.now)
 
+    __table_args__ = (
+        # Season leaderboard rebuild: one season's ranks without touching the rows
+        Index('ix_season_progress_ranking', 'season_id', 'current_level', 'current_exp', 'user_id'),
+    )
+
 class SeasonReward(Base):
     """Defines rewards for seasonal ranks (Gradi)"""
     __tablename__ = "season_reward"
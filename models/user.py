@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Index
 from database import Base
 import datetime
 from dateutil.relativedelta import relativedelta
@@ -108,6 +108,15 @@ class Utente(Base):
     # Notifications
     notify_on_attack = Column(Boolean, default=True, server_default="true")
 
+    __table_args__ = (
+        # Transformation reverter: covers only users with a pending expiry
+        Index('ix_utente_transformation_expires_at', 'transformation_expires_at',
+              postgresql_where=(transformation_expires_at != None),
+              sqlite_where=(transformation_expires_at != None)),
+        # Global leaderboard rebuild: index-only read of (exp, user)
+        Index('ix_utente_exp', 'exp', 'id_Telegram'),
+    )
+
     @property
     def attack_power(self):
         return self.base_damage
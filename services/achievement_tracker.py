@@ -3,6 +3,7 @@ Achievement Tracker Service - Tracks and awards achievements based on game event
 """
 
 from database import Database
+from sqlalchemy import or_
 from models.achievements import Achievement, UserAchievement
 from models.stats import UserStat
 from services.event_dispatcher import EventDispatcher
@@ -10,6 +11,7 @@ from services.stat_aggregator import StatAggregator
 import json
 import os
 from datetime import datetime
+from types import SimpleNamespace
 from services.leveling_service import LevelingService
 from services.season_content_service import get_season_content_service
 
@@ -21,6 +23,9 @@ class AchievementTracker:
     """
     Manages achievement checks and unlocks based on UserStats.
     """
+
+    # Achievements computed from a whole family of stats instead of a single key
+    DERIVED_STAT_PREFIXES = {'botanist_unique_count': 'discovery_'}
     
     def __init__(self):
         self.db = Database()
@@ -28,6 +33,7 @@ class AchievementTracker:
         self.stat_aggregator = StatAggregator()
         self.content_service = get_season_content_service()
         self._last_content_signature = None
+        self._achievements_by_stat = None  # stat_key -> [definition snapshots]
 
     def _is_achievement_available(self, achievement, inactive_seasonal_categories) -> bool:
         """Hide only achievements from seasonal categories that are currently inactive."""
@@ -41,6 +47,46 @@ class AchievementTracker:
             self._last_content_signature = content_signature
             self.load_from_csv()
 
+    def invalidate_achievement_index(self):
+        """Drop the stat_key index so it is rebuilt from the current definitions."""
+        self._achievements_by_stat = None
+
+    def _get_achievement_index(self, session):
+        """
+        Return {stat_key: [achievement snapshots]}, built once per definitions load.
+        Snapshots are plain objects so they can be shared across sessions.
+        """
+        index = self._achievements_by_stat
+        if index is not None:
+            return index
+
+        index = {}
+        for ach in session.query(Achievement).all():
+            snapshot = SimpleNamespace(
+                achievement_key=ach.achievement_key,
+                name=ach.name,
+                description=ach.description,
+                stat_key=ach.stat_key,
+                condition_type=ach.condition_type or '>=',
+                tiers=ach.tiers,
+                category=ach.category,
+            )
+            index.setdefault(ach.stat_key, []).append(snapshot)
+        self._achievements_by_stat = index
+        return index
+
+    def _achievements_for_stats(self, index, stat_keys):
+        """Achievements that observe at least one of the given stat keys."""
+        selected = {}
+        for stat_key in stat_keys:
+            for ach in index.get(stat_key, ()):
+                selected[ach.achievement_key] = ach
+            for derived_key, prefix in self.DERIVED_STAT_PREFIXES.items():
+                if stat_key.startswith(prefix):
+                    for ach in index.get(derived_key, ()):
+                        selected[ach.achievement_key] = ach
+        return list(selected.values())
+
     def get_available_categories(self, session=None):
         """Return categories that currently have visible achievements."""
         self._ensure_active_achievement_definitions()
@@ -124,6 +170,7 @@ class AchievementTracker:
                         
                         count += 1
             session.commit()
+            self.invalidate_achievement_index()
             print(f"[AchievementTracker] Successfully processed {count} achievements.")
                 
         except Exception as e:
@@ -183,6 +230,7 @@ class AchievementTracker:
                     count += 1
                 
                 session.commit()
+                self.invalidate_achievement_index()
                 print(f"[AchievementTracker] Successfully processed {count} achievements from JSON.")
                 
         except Exception as e:
@@ -194,27 +242,47 @@ class AchievementTracker:
     def process_pending_events(self, limit=100, session=None):
         """
         Main loop:
-        1. Fetch unprocessed events
+        1. Claim unprocessed events (oldest first, skipping rows locked by other workers)
         2. Aggregate them into UserStats
         3. Check for new achievement unlocks
         """
         while True:
-            # 1. Fetch
-            events = self.event_dispatcher.get_unprocessed_events(limit, session=session)
-            if not events:
-                break
+            # 1. Claim + 2. Aggregate, in one transaction so the claimed rows
+            # stay locked (skipped by parallel workers) until marked processed
+            own_session = session is None
+            work_session = self.db.get_session() if own_session else session
+            try:
+                claimed = self.event_dispatcher.claim_unprocessed_events(limit, session=work_session)
+                if not claimed:
+                    break
+                    
+                touched_stats = self.stat_aggregator.process_events(claimed, session=work_session) or {}
                 
-            # 2. Aggregate
-            self.stat_aggregator.process_events(events, session=session)
-            
-            # 3. Check Achievements for affected users
-            affected_user_ids = set(e.user_id for e in events)
+                # Plain snapshot: ORM rows expire on commit
+                events = [
+                    SimpleNamespace(user_id=e.user_id, event_type=e.event_type, value=e.value, context=e.context)
+                    for e in claimed
+                ]
+                if own_session:
+                    work_session.commit()
+            except Exception:
+                if own_session:
+                    work_session.rollback()
+                raise
+            finally:
+                if own_session:
+                    work_session.close()
             
+            # 3. Check Achievements for affected users, limited to the stats the batch touched
             # Batch notification collection
             batch_notifications = []
             
-            for user_id in affected_user_ids:
-                self.check_achievements(user_id, session=session, collected_notifications=batch_notifications)
+            for user_id, stat_keys in touched_stats.items():
+                self.check_achievements(
+                    user_id, session=session,
+                    collected_notifications=batch_notifications,
+                    stat_keys=stat_keys
+                )
             
             # 4. Handle Notifications for specific events (Level Up, Resources)
             import main
@@ -288,11 +356,15 @@ class AchievementTracker:
         finally:
             session.close()
 
-    def check_achievements(self, user_id, session=None, collected_notifications=None):
+    def check_achievements(self, user_id, session=None, collected_notifications=None, stat_keys=None):
         """
-        Check all achievements for a user against their current stats.
+        Check achievements for a user against their current stats.
+        If stat_keys is given, only achievements observing those stats are re-evaluated.
         If collected_notifications list is provided, public messages are appended to it instead of sent immediately.
         """
+        if stat_keys is not None and not stat_keys:
+            return
+
         local_session = False
         if not session:
             session = self.db.get_session()
@@ -308,24 +380,41 @@ class AchievementTracker:
                 return
             
             self._ensure_active_achievement_definitions()
+            index = self._get_achievement_index(session)
+            if stat_keys is None:
+                candidates = [a for achs in index.values() for a in achs]
+            else:
+                candidates = self._achievements_for_stats(index, stat_keys)
+            if not candidates:
+                return
+
             inactive_seasonal_categories = set(
                 self.content_service.get_inactive_seasonal_achievement_categories(session=session)
             )
-            # Get all achievements
-            all_achievements = [
-                a for a in session.query(Achievement).all()
+            achievements = [
+                a for a in candidates
                 if self._is_achievement_available(a, inactive_seasonal_categories)
             ]
             
             # Get user stats (cache in dict for performance)
-            user_stats = session.query(UserStat).filter_by(user_id=user_id).all()
-            stats_map = {s.stat_key: s.value for s in user_stats}
+            stats_query = session.query(UserStat).filter_by(user_id=user_id)
+            user_ach_query = session.query(UserAchievement).filter_by(user_id=user_id)
+            if stat_keys is not None:
+                observed = {a.stat_key for a in achievements}
+                stat_filter = UserStat.stat_key.in_(observed)
+                for derived_key, prefix in self.DERIVED_STAT_PREFIXES.items():
+                    if derived_key in observed:
+                        stat_filter = or_(stat_filter, UserStat.stat_key.like(f"{prefix}%"))
+                stats_query = stats_query.filter(stat_filter)
+                user_ach_query = user_ach_query.filter(
+                    UserAchievement.achievement_key.in_([a.achievement_key for a in achievements])
+                )
+            stats_map = {s.stat_key: s.value for s in stats_query.all()}
             
             # Pre-fetch user achievements to avoid N+1 queries and reduce race conditions
-            user_achievements = session.query(UserAchievement).filter_by(user_id=user_id).all()
-            user_ach_map = {ua.achievement_key: ua for ua in user_achievements}
+            user_ach_map = {ua.achievement_key: ua for ua in user_ach_query.all()}
             
-            for achievement in all_achievements:
+            for achievement in achievements:
                 self._check_single_achievement(session, user_id, achievement, stats_map, rewards_to_award, user_ach_map)
             
             if local_session:
@@ -363,7 +452,7 @@ class AchievementTracker:
         
         # Get user's current progress
         user_ach = None
-        if user_ach_map:
+        if user_ach_map is not None:
             user_ach = user_ach_map.get(achievement.achievement_key)
         else:
             # Fallback for legacy calls
@@ -1,11 +1,12 @@
+import os
 import schedule
 import threading
 from sqlalchemy import text
 from database import Database
-from models.user import Utente
 from db_setup import init_database
 from services.user_service import UserService
 from services.leveling_service import LevelingService
+from services.user_recalculation_service import UserRecalculationService
 
 # All columns that must exist in their respective tables.
 # Format: (table_name, column_name, column_definition)
@@ -22,6 +23,7 @@ class BootService:
         self.db = Database()
         self.user_service = UserService()
         self.leveling_service = LevelingService()
+        self.recalculation_service = UserRecalculationService()
 
     def run_startup_sequence(self, bot=None):
         """Esegue le operazioni intere di boot del sistema"""
@@ -64,55 +66,24 @@ class BootService:
         finally:
             session.close()
 
-    def startup_and_clean(self):
-        """Ricalcola stats e livelli per tutti gli utenti all'avvio"""
-        session = self.db.get_session()
-        try:
-            all_users = session.query(Utente).all()
-            fixed_count = 0
-
-            for u in all_users:
-                # Fallback valori None a 0
-                if u.exp is None:
-                    u.exp = 0
-                if u.livello is None:
-                    u.livello = 1
-
-                # Alloca punti Null-safe
-                for attr in ['allocated_health', 'allocated_mana', 'allocated_damage',
-                            'allocated_resistance', 'allocated_crit', 'allocated_speed']:
-                    if getattr(u, attr) is None:
-                        setattr(u, attr, 0)
-
-                # Ricalcolo livello usando la nuova curva
-                self.leveling_service.recalculate_level(u.id_telegram, session=session)
-
-                # Ricalcolo stats
-                self.user_service.recalculate_stats(u.id_telegram, session=session)
-
-                # Controllo livello massimo personaggio selezionato
-                from services.character_loader import get_character_loader
-                loader = get_character_loader()
+    def startup_and_clean(self, background=None):
+        """
+        Ricalcola stats e livelli per tutti gli utenti all'avvio (a blocchi).
+        With background=True (or BOOT_RECALC_BACKGROUND=1) it runs in a daemon
+        thread so polling can start right away.
+        """
+        if background is None:
+            background = os.getenv('BOOT_RECALC_BACKGROUND') == '1'
+        if background:
+            thread = threading.Thread(target=self._recalculate_all_users, name="boot-recalc", daemon=True)
+            thread.start()
+            print("[BOOT] User recalculation started in background.")
+            return thread
+        self._recalculate_all_users()
 
-                selected_char_id = u.livello_selezionato
-                if selected_char_id is not None:
-                    char_info = loader.get_character_by_id(selected_char_id)
-                    if char_info:
-                        required_level = char_info.get('livello', 1)
-                        if u.livello < required_level:
-                            print(f"[BOOT] User {u.id_telegram} level ({u.livello}) below character requirement ({required_level}). Resetting to Chocobo (1).")
-                            u.livello_selezionato = 1 # Chocobo ID
-                            
-                            # Recalculate stats with the new character
-                            self.user_service.recalculate_stats(u.id_telegram, session=session)
-
-                fixed_count += 1
-
-            session.commit()
-            print(f"[BOOT] Cleaned stats and levels for {fixed_count} users.")
+    def _recalculate_all_users(self):
+        try:
+            result = self.recalculation_service.recalculate_all()
+            print(f"[BOOT] Cleaned stats and levels for {result['users']} users ({result['updated']} updated).")
         except Exception as e:
-            session.rollback()
             print(f"[BOOT] Error in startup_and_clean: {e}")
-        finally:
-            session.close()
-
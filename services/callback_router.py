@@ -0,0 +1,169 @@
+"""
+Callback Router - Table-driven dispatch of inline keyboard callbacks.
+Handlers register the callback_data they serve with @route; dispatch resolves
+a callback with a dict lookup on the full data, then on its prefix before '|'
+(e.g. "char_buy|12" -> "char_buy"), so the cost no longer grows with the number
+of registered callbacks. Legacy prefixes without a '|' separator ("guide_",
+"market_") are matched afterwards, in registration order.
+Every route keeps call-count and latency counters.
+
+handlers/ modules take the bot as first argument: register them with
+pass_bot=True and they are called as handler(router.bot, call).
+"""
+
+import threading
+import time
+
+
+class Route:
+    __slots__ = ('name', 'handler', 'pass_bot', 'calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self, name, handler, pass_bot=False):
+        self.name = name
+        self.handler = handler
+        self.pass_bot = pass_bot
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class CallbackRouter:
+    SLOW_ROUTE = 1.0  # seconds, logged on every occurrence
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self._lock = threading.Lock()
+        self._exact = {}     # callback_data -> Route
+        self._args = {}      # prefix before '|' -> Route
+        self._prefixes = []  # [(prefix, Route)] legacy startswith matches
+        self._routes = {}    # handler -> Route
+
+    # ---- Registration ----
+
+    def route(self, *patterns, prefix=False, pass_bot=False):
+        """
+        Decorator registering a handler(call) for the given patterns:
+          "profile_refresh"  exactly that callback_data
+          "char_buy|"        any callback_data starting with "char_buy|"
+        With prefix=True every pattern is a plain startswith match.
+        With pass_bot=True the handler is called as handler(bot, call).
+        """
+        def decorator(handler):
+            self.add(handler, *patterns, prefix=prefix, pass_bot=pass_bot)
+            return handler
+        return decorator
+
+    def add(self, handler, *patterns, prefix=False, pass_bot=False):
+        if not patterns:
+            raise ValueError(f"No callback pattern for {handler.__name__}")
+        with self._lock:
+            route = self._routes.get(handler)
+            if route is None:
+                route = self._routes[handler] = Route(handler.__name__, handler, pass_bot)
+            for pattern in patterns:
+                if prefix:
+                    if any(existing == pattern for existing, _ in self._prefixes):
+                        raise ValueError(f"Callback prefix '{pattern}' already registered")
+                    self._prefixes.append((pattern, route))
+                    continue
+                if pattern.endswith('|'):
+                    table, key = self._args, pattern[:-1]
+                else:
+                    table, key = self._exact, pattern
+                if '|' in key:
+                    raise ValueError(f"Invalid callback pattern '{pattern}'")
+                if key in table:
+                    raise ValueError(f"Callback '{pattern}' already routed to {table[key].name}")
+                table[key] = route
+
+    # ---- Dispatch ----
+
+    def resolve(self, data):
+        """Route for a callback_data, None if nothing is registered for it"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route
+        key, sep, _ = data.partition('|')
+        if sep:
+            route = self._args.get(key)
+            if route is not None:
+                return route
+        for prefix, route in self._prefixes:
+            if data.startswith(prefix):
+                return route
+        return None
+
+    def dispatch(self, call):
+        """Run the handler for call.data; False if no route matches"""
+        route = self.resolve(call.data or '')
+        if route is None:
+            return False
+        start = time.perf_counter()
+        try:
+            if route.pass_bot:
+                route.handler(self.bot, call)
+            else:
+                route.handler(call)
+        except Exception:
+            with self._lock:
+                route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                route.calls += 1
+                route.total_time += elapsed
+                if elapsed > route.max_time:
+                    route.max_time = elapsed
+            if elapsed > self.SLOW_ROUTE:
+                print(f"[CALLBACK] Slow route {route.name} ({call.data}): {elapsed * 1000:.0f}ms")
+        return True
+
+    # ---- Metrics ----
+
+    def get_metrics(self):
+        """Snapshot of {handler_name: {calls, errors, avg_ms, max_ms, total_ms}} for routes hit so far"""
+        with self._lock:
+            routes = list(self._routes.values())
+        return {
+            route.name: {
+                'calls': route.calls,
+                'errors': route.errors,
+                'avg_ms': route.total_time * 1000 / route.calls,
+                'max_ms': route.max_time * 1000,
+                'total_ms': route.total_time * 1000,
+            }
+            for route in routes if route.calls
+        }
+
+    def format_metrics(self, limit=10):
+        """Busiest routes by total time, one line each"""
+        metrics = sorted(self.get_metrics().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        return "\n".join(
+            f"{name}: {m['calls']} calls, avg {m['avg_ms']:.1f}ms, max {m['max_ms']:.0f}ms"
+            + (f", {m['errors']} errors" if m['errors'] else "")
+            for name, m in metrics[:limit]
+        )
+
+    def reset_metrics(self):
+        with self._lock:
+            for route in self._routes.values():
+                route.calls = route.errors = 0
+                route.total_time = route.max_time = 0.0
+
+    def __len__(self):
+        return len(self._exact) + len(self._args) + len(self._prefixes)
+
+
+_callback_router = None
+_callback_router_lock = threading.Lock()
+
+
+def get_callback_router():
+    global _callback_router
+    if _callback_router is None:
+        with _callback_router_lock:
+            if _callback_router is None:
+                _callback_router = CallbackRouter()
+    return _callback_router
@@ -11,24 +11,72 @@ from services.season_content_service import get_season_content_service
 LOADER_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(LOADER_DIR)
 
+
+def is_night_only_name(name):
+    """Great Ape / Scimmione transformations are bound to the night"""
+    return bool(name) and ('Scimmione' in name or 'Great Ape' in name)
+
+
+class CharacterIndex:
+    """
+    Immutable lookup tables over one load of the character CSVs.
+    Built once per content signature and swapped in as a whole, so polling
+    threads always read a consistent snapshot without locking.
+    """
+    __slots__ = (
+        'signature', 'characters', 'by_id', 'by_name', 'by_level', 'by_base',
+        'by_saga', 'levels', 'sagas', 'spawnable', 'bosses', 'mobs', 'night_only',
+    )
+
+    def __init__(self, signature, characters):
+        self.signature = signature
+        self.characters = characters  # Sorted by level
+        self.by_id = {}
+        self.by_name = {}
+        by_level = {}
+        by_base = {}
+        by_saga = {}
+        for char in characters:
+            self.by_id[char['id']] = char
+            self.by_name[char['nome']] = char
+            by_level.setdefault(char['livello'], []).append(char)
+            if char.get('base_character_id'):
+                by_base.setdefault(char['base_character_id'], []).append(char)
+            if char['character_group']:
+                by_saga.setdefault(char['character_group'], []).append(char)
+        self.by_level = {k: tuple(v) for k, v in by_level.items()}
+        self.by_base = {k: tuple(v) for k, v in by_base.items()}
+        self.by_saga = {k: tuple(v) for k, v in by_saga.items()}
+        self.levels = tuple(sorted(by_level))
+        self.sagas = tuple(sorted(by_saga))
+        self.spawnable = tuple(c for c in characters if c.get('spawn_eligible', False))
+        self.bosses = tuple(c for c in characters if c.get('entity_type') == 'Boss')
+        self.mobs = tuple(c for c in characters if c.get('entity_type') == 'Mob')
+        # Great Ape forms: only allowed between 18:00 and 06:00
+        self.night_only = frozenset(
+            c['id'] for c in characters
+            if c['id'] and (is_night_only_name(c.get('nome', '')) or c['id'] == 500)
+        )
+
+
 class CharacterLoader:
     """Load and cache character data from CSV file"""
     
     def __init__(self):
-        self._cache = None
-        self._cache_by_id = {}
-        self._cache_by_name = {}
-        self._last_content_signature = None
+        self._index = None
     
+    def _get_index(self) -> CharacterIndex:
+        """Current index, rebuilt first if the active content pack changed."""
+        self.load_characters_from_csv()
+        return self._index
+
     def load_characters_from_csv(self) -> List[Dict[str, Any]]:
         """Load all characters from CSV with caching"""
         content_service = get_season_content_service()
         content_signature = content_service.get_runtime_signature()
-        if self._cache is not None and self._last_content_signature == content_signature:
-            return self._cache
-        if self._last_content_signature != content_signature:
-            self.clear_cache()
-        self._last_content_signature = content_signature
+        index = self._index
+        if index is not None and index.signature == content_signature:
+            return index.characters
         
         # Helper to safely convert to int
         def safe_int(value, default=0):
@@ -101,55 +149,45 @@ class CharacterLoader:
                             'subgroup': row.get('subgroup', ''),
                         }
                         characters.append(char)
-
-                        # Build lookup caches
-                        self._cache_by_id[char['id']] = char
-                        self._cache_by_name[char['nome']] = char
                     
         except Exception as e:
             print(f"Error loading characters from CSV: {e}")
             import traceback
             traceback.print_exc()
-            self._cache = []
+            self._index = CharacterIndex(content_signature, [])
             return []
         
         # Sort by level
         characters.sort(key=lambda x: x['livello'])
-        self._cache = characters
+        # Single reference swap: readers see either the old or the new index
+        self._index = CharacterIndex(content_signature, characters)
         return characters
     
     def get_character_by_id(self, char_id: int) -> Optional[Dict[str, Any]]:
         """Get character by ID"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return self._cache_by_id.get(char_id)
+        return self._get_index().by_id.get(char_id)
     
     def get_character_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Get character by name"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return self._cache_by_name.get(name)
+        return self._get_index().by_name.get(name)
     
     def get_characters_by_level(self, level: int) -> List[Dict[str, Any]]:
         """Get all characters for a specific level"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return [c for c in self._cache if c['livello'] == level]
+        return list(self._get_index().by_level.get(level, ()))
     
     def get_all_characters(self) -> List[Dict[str, Any]]:
         """Get all characters sorted by level"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return self._cache.copy()
+        return list(self._get_index().characters)
     
+    def get_night_only_character_ids(self) -> frozenset:
+        """IDs of characters that revert at sunrise (Great Ape forms)"""
+        return self._get_index().night_only
+
     def filter_characters(self, level: Optional[int] = None, 
                          lv_premium: Optional[int] = None,
                          purchasable_only: bool = False) -> List[Dict[str, Any]]:
         """Filter characters by various criteria"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        
-        result = self._cache.copy()
+        result = list(self._get_index().characters)
         
         if level is not None:
             result = [c for c in result if c['livello'] <= level]
@@ -164,25 +202,15 @@ class CharacterLoader:
     
     def get_character_levels(self) -> List[int]:
         """Get unique character levels"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        levels = sorted(set(c['livello'] for c in self._cache))
-        return levels
+        return list(self._get_index().levels)
     
     def get_all_sagas(self) -> List[str]:
         """Get unique character sagas/groups sorted alphabetically"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        sagas = sorted(set(c['character_group'] for c in self._cache if c['character_group']))
-        return sagas
+        return list(self._get_index().sagas)
     
     def get_characters_by_saga(self, saga: str) -> List[Dict[str, Any]]:
         """Get all characters for a specific saga, sorted by level"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        chars = [c for c in self._cache if c['character_group'] == saga]
-        chars.sort(key=lambda x: x['livello'])
-        return chars
+        return list(self._get_index().by_saga.get(saga, ()))
     
     def is_transformation(self, char_id: int) -> bool:
         """Check if a character is a transformation (not base form)"""
@@ -200,18 +228,13 @@ class CharacterLoader:
     
     def get_transformations_for_base(self, base_char_id: int) -> List[Dict[str, Any]]:
         """Get all transformations available for a base character"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return [c for c in self._cache if c.get('base_character_id') == base_char_id]
+        return list(self._get_index().by_base.get(base_char_id, ()))
     
     def get_transformation_chain(self, base_char_id: int) -> List[Dict[str, Any]]:
         """
         Get all transformations for a base character.
         Includes both CSV-defined (linear) and DB-defined (multiple) transformations.
         """
-        if not self._cache:
-            self.load_characters_from_csv()
-
         chain = []
         
         # 1. Existing CSV Linear Logic
@@ -266,10 +289,8 @@ class CharacterLoader:
         Get all character IDs that belong to the same 'family' (base + transformations).
         Used for checking uniqueness across all forms of a character.
         """
-        if not self._cache:
-            self.load_characters_from_csv()
-            
-        char = self.get_character_by_id(char_id)
+        index = self._get_index()
+        char = index.by_id.get(char_id)
         if not char:
             return []
             
@@ -282,80 +303,68 @@ class CharacterLoader:
             if parent_id in visited: # Cycle detection
                 break
             visited.add(parent_id)
-            parent = self.get_character_by_id(parent_id)
+            parent = index.by_id.get(parent_id)
             if parent:
                 root_char = parent
             else:
                 break
         
-        # 2. Find all descendants of the Root (BFS/DFS)
-        family_ids = {root_char['id']}
-        queue = [root_char['id']]
-        
-        # We need DB access for transformations
+        # DB transformations: one query for the whole (small) table
+        db_children = {}
         try:
             from database import Database
             from models.system import CharacterTransformation
-            db = Database()
-            session = db.get_session()
-        except:
-            session = None
+            session = Database().get_session()
+            try:
+                rows = session.query(
+                    CharacterTransformation.base_character_id,
+                    CharacterTransformation.transformed_character_id
+                ).all()
+            finally:
+                session.close()
+            for base_id, target_id in rows:
+                db_children.setdefault(base_id, []).append(target_id)
+        except Exception:
+            pass
 
+        # 2. Find all descendants of the Root (BFS)
+        family_ids = {root_char['id']}
+        queue = [root_char['id']]
         while queue:
             current_id = queue.pop(0)
-            
-            # A. Find direct children in CSV
-            children = [c for c in self._cache if c.get('base_character_id') == current_id]
-            for child in children:
-                if child['id'] not in family_ids:
-                    family_ids.add(child['id'])
-                    queue.append(child['id'])
-            
-            # B. Find direct children in DB
-            if session:
-                db_children = session.query(CharacterTransformation).filter_by(base_character_id=current_id).all()
-                for db_child in db_children:
-                    target_id = db_child.transformed_character_id
-                    if target_id not in family_ids:
-                        family_ids.add(target_id)
-                        queue.append(target_id)
-        
-        if session:
-            session.close()
+            # A. Direct children in CSV
+            child_ids = [c['id'] for c in index.by_base.get(current_id, ())]
+            # B. Direct children in DB
+            child_ids.extend(db_children.get(current_id, ()))
+            for child_id in child_ids:
+                if child_id not in family_ids:
+                    family_ids.add(child_id)
+                    queue.append(child_id)
                     
         return list(family_ids)
     
     # New unified schema helper functions
     def get_playable_characters(self) -> List[Dict[str, Any]]:
         """Get all playable characters (all entities in unified schema)"""
-        if not self._cache:
-            self.load_characters_from_csv()
         # ALL entities are playable now
-        return [c for c in self._cache if c.get('entity_type') != 'Mob' or c.get('entity_type') != 'Boss' or True]
+        return list(self._get_index().characters)
     
     def get_spawnable_entities(self) -> List[Dict[str, Any]]:
         """Get all entities eligible for spawning in chat (Evil only)"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return [c for c in self._cache if c.get('spawn_eligible', False)]
+        return list(self._get_index().spawnable)
     
     def get_boss_entities(self) -> List[Dict[str, Any]]:
         """Get all boss entities"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return [c for c in self._cache if c.get('entity_type') == 'Boss']
+        return list(self._get_index().bosses)
     
     def get_mob_entities(self) -> List[Dict[str, Any]]:
         """Get all mob entities"""
-        if not self._cache:
-            self.load_characters_from_csv()
-        return [c for c in self._cache if c.get('entity_type') == 'Mob']
+        return list(self._get_index().mobs)
 
     def clear_cache(self):
         """Clear the cache (useful for testing or reloading data)"""
-        self._cache = None
-        self._cache_by_id = {}
-        self._cache_by_name = {}
+        self._index = None
+
     def update_character_gif(self, char_id: int, filename: str) -> bool:
         """
         Update the special_attack_gif for a character in the CSV and cache.
@@ -380,14 +389,10 @@ class CharacterLoader:
                     if int(row['id']) == char_id:
                         row['special_attack_gif'] = filename
                         updated = True
-                        # Update cache if loaded
-                        if self._cache:
-                            for char in self._cache:
-                                if char['id'] == char_id:
-                                    char['special_attack_gif'] = filename
-                                    break
-                            if char_id in self._cache_by_id:
-                                self._cache_by_id[char_id]['special_attack_gif'] = filename
+                        # Update cache if loaded (index entries share the same dicts)
+                        index = self._index
+                        if index and char_id in index.by_id:
+                            index.by_id[char_id]['special_attack_gif'] = filename
                             
                     writer.writerow(row)
             
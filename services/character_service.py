@@ -1,4 +1,5 @@
 from database import Database
+from sqlalchemy import event
 from models.system import Livello, UserCharacter
 from models.character_ownership import CharacterOwnership
 from models.user import Utente
@@ -7,6 +8,92 @@ from services.character_loader import get_character_loader
 from services.event_dispatcher import EventDispatcher
 from settings import PointsName
 from datetime import datetime, timedelta
+import threading
+import time
+
+# Purchased characters change only through purchase_character, season rewards,
+# transformation purchases and account deletion, which all invalidate.
+OWNERSHIP_CACHE_TTL = 300  # seconds
+
+
+class OwnershipSnapshot:
+    """
+    A user's level, premium flag and purchased character ids, so unlock and
+    ownership checks over the whole catalog are set lookups instead of queries.
+    """
+
+    __slots__ = ('user_id', 'livello', 'premium', 'purchased')
+
+    def __init__(self, user, purchased):
+        self.user_id = user.id_telegram
+        self.livello = user.livello or 1
+        self.premium = user.premium
+        self.purchased = purchased  # frozenset of character ids
+
+    def is_unlocked(self, character):
+        """Same rules as CharacterService.is_character_unlocked"""
+        if character['livello'] > self.livello:
+            return False
+        if character['lv_premium'] == 1:
+            return self.premium == 1
+        if character.get('lv_premium') == 0:
+            return True
+        return character['id'] in self.purchased
+
+    def is_owned(self, character):
+        """Same rules as CharacterService.is_character_owned"""
+        if character['lv_premium'] == 0:
+            return self.livello >= character['livello']
+        if character['lv_premium'] == 1:
+            return self.premium == 1
+        return character['id'] in self.purchased
+
+
+class OwnershipCache:
+    """Per-process cache of user_id -> purchased character ids"""
+
+    def __init__(self, ttl=OWNERSHIP_CACHE_TTL):
+        self.ttl = ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._purchased = {}  # user_id -> (expires_at, frozenset)
+
+    def get(self, user_id):
+        entry = self._purchased.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def store(self, generation, user_id, purchased):
+        with self._lock:
+            # An invalidation raced with the query: don't cache its result
+            if generation == self.generation:
+                self._purchased[user_id] = (time.monotonic() + self.ttl, purchased)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self.generation += 1
+            if user_id is None:
+                self._purchased.clear()
+            else:
+                self._purchased.pop(user_id, None)
+
+
+_ownership_cache = OwnershipCache()
+
+
+def invalidate_character_ownership(user_id=None):
+    """Call after adding/removing UserCharacter rows outside CharacterService."""
+    _ownership_cache.invalidate(user_id=user_id)
+
+
+def invalidate_character_ownership_on_commit(session, user_id=None):
+    """
+    For UserCharacter rows added on a session the caller commits: invalidating
+    before the commit lets a concurrent snapshot re-cache the old set.
+    """
+    event.listen(session, 'after_commit', lambda committed: invalidate_character_ownership(user_id), once=True)
+
 
 class CharacterService:
     def __init__(self):
@@ -15,8 +102,25 @@ class CharacterService:
         self.char_loader = get_character_loader()
         self.event_dispatcher = EventDispatcher()
     
-    def get_available_characters(self, user):
+    def get_ownership_snapshot(self, user):
+        """OwnershipSnapshot for this user; purchased ids come from one cached query"""
+        purchased = _ownership_cache.get(user.id_telegram)
+        if purchased is None:
+            generation = _ownership_cache.generation
+            session = self.db.get_session()
+            try:
+                purchased = frozenset(
+                    char_id for (char_id,) in
+                    session.query(UserCharacter.character_id).filter_by(user_id=user.id_telegram)
+                )
+            finally:
+                session.close()
+            _ownership_cache.store(generation, user.id_telegram, purchased)
+        return OwnershipSnapshot(user, purchased)
+
+    def get_available_characters(self, user, snapshot=None):
         """Get characters user can select (unlocked by level or purchased)"""
+        snapshot = snapshot or self.get_ownership_snapshot(user)
         session = self.db.get_session()
         
         # 1. Level-based characters from CSV
@@ -28,8 +132,7 @@ class CharacterService:
                           if c['lv_premium'] == 0]
             
         # 2. Purchased characters
-        purchased_ids = session.query(UserCharacter.character_id).filter_by(user_id=user.id_telegram).all()
-        purchased_ids = [pid[0] for pid in purchased_ids]
+        purchased_ids = sorted(snapshot.purchased)
         
         purchased_chars = []
         if purchased_ids:
@@ -163,6 +266,7 @@ class CharacterService:
         )
         session.add(new_ownership)
         session.commit()
+        invalidate_character_ownership(user.id_telegram)
         
         # Extract data before closing session
         char_name = character['nome']
@@ -244,6 +348,7 @@ class CharacterService:
             # last_character_change update removed to allow unlimited changes
         
         session.commit()
+        invalidate_character_ownership(user.id_telegram)
         
         # Recalculate stats to apply new character bonuses immediately
         self.user_service.recalculate_stats(user.id_telegram)
@@ -454,72 +559,25 @@ class CharacterService:
         """Get all characters in the system"""
         return self.char_loader.get_all_characters()
     
-    def is_character_unlocked(self, user, char_id):
+    def is_character_unlocked(self, user, char_id, snapshot=None):
         """Check if user has unlocked/can use this character"""
-        session = self.db.get_session()
         character = self.char_loader.get_character_by_id(char_id)
-        
         if not character:
-            session.close()
-            return False
-        
-        # CRITICAL: Always enforce level requirement
-        if character['livello'] > user.livello:
-            session.close()
             return False
-            
-        # Check level unlock (for free/premium level-based characters)
-        # Check premium requirement
-        if character['lv_premium'] == 1:
-            if user.premium == 1:
-                session.close()
-                return True
-            else:
-                session.close()
-                return False
-        
-        # If it's a standard level-unlocked character (lv_premium == 0)
-        # USER REQUEST: "Others must never be free". 
-        # So even if lv_premium == 0, we require UserCharacter record (purchase/unlock).
-        # We REMOVE the early return True here.
-        if character.get('lv_premium') == 0:
-            session.close()
-            return True
-            
-        # Check if purchased or seasonal (lv_premium == 2)
-        purchased = session.query(UserCharacter).filter_by(
-            user_id=user.id_telegram,
-            character_id=char_id
-        ).first()
-        
-        session.close()
-        return purchased is not None
+
+        # Level is always enforced; lv_premium 1 needs Premium, 0 is free,
+        # anything else (purchasable/seasonal) needs a UserCharacter record
+        snapshot = snapshot or self.get_ownership_snapshot(user)
+        return snapshot.is_unlocked(character)
     
-    def is_character_owned(self, user, char_id):
+    def is_character_owned(self, user, char_id, snapshot=None):
         """Check if user owns this character (ignoring level requirements)"""
-        session = self.db.get_session()
         character = self.char_loader.get_character_by_id(char_id)
-        
         if not character:
-            session.close()
             return False
-            
-        if character['lv_premium'] == 0:
-            session.close()
-            return user.livello >= character['livello']
-            
-        if character['lv_premium'] == 1:
-            session.close()
-            return user.premium == 1
-            
-        # Purchasable characters (lv_premium == 2)
-        purchased = session.query(UserCharacter).filter_by(
-            user_id=user.id_telegram,
-            character_id=char_id
-        ).first()
-        
-        session.close()
-        return purchased is not None
+
+        snapshot = snapshot or self.get_ownership_snapshot(user)
+        return snapshot.is_owned(character)
 
     def get_character_levels(self):
         """Get unique character levels for filtering"""
@@ -0,0 +1,129 @@
+"""
+Chat EXP Buffer - Write-behind accumulator for passive chat EXP.
+Every group message used to run add_exp_by_id, add_chat_exp, log a chat_exp
+event and process achievements: several transactions per chat line. EXP and
+chat_exp are now summed per user in memory and written by flush() in one
+transaction every few seconds; level-ups are announced right away from an
+in-memory projection (DB exp + pending EXP on the shared level curve).
+"""
+
+import threading
+from sqlalchemy import bindparam, func, update
+from database import Database
+from models.user import Utente
+from services.leveling_service import LevelingService, get_level_curve
+from services.event_dispatcher import EventDispatcher
+from services.leaderboard_service import get_leaderboards
+
+
+class ChatExpBuffer:
+    FLUSH_INTERVAL = 5  # seconds (scheduled in main.py)
+
+    def __init__(self):
+        self.db = Database()
+        self.leveling_service = LevelingService()
+        self.event_dispatcher = EventDispatcher()
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> {'exp': n, 'chat_exp': n}
+        self._notified_level = {}  # user_id -> highest level announced since the last flush
+
+    def add(self, utente, exp, chat_exp=0):
+        """
+        Buffer EXP for a user row read from the DB (utente.exp does not include
+        pending EXP). Returns the new level if the projection crosses a level
+        not announced yet, else None.
+        """
+        user_id = utente.id_telegram
+        with self._lock:
+            pending = self._pending.setdefault(user_id, {'exp': 0, 'chat_exp': 0})
+            pending['exp'] += exp
+            pending['chat_exp'] += chat_exp
+
+            current_level = utente.livello or 1
+            projected_level = get_level_curve().level_for((utente.exp or 0) + pending['exp'])
+            announced = self._notified_level.get(user_id, current_level)
+            if projected_level > max(current_level, announced):
+                self._notified_level[user_id] = projected_level
+                return projected_level
+        return None
+
+    def pending_exp(self, user_id):
+        with self._lock:
+            return self._pending.get(user_id, {}).get('exp', 0)
+
+    def flush(self):
+        """
+        Write every pending delta in one transaction: exp/chat_exp increments,
+        level-ups for the users that crossed a threshold and one chat_exp event
+        per user. Returns the number of users flushed.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._notified_level = {}
+        if not pending:
+            return 0
+
+        session = self.db.get_session()
+        try:
+            table = Utente.__table__
+            session.connection().execute(
+                update(table)
+                .where(table.c.id_Telegram == bindparam('b_user_id'))
+                .values(
+                    exp=func.coalesce(table.c.exp, 0) + bindparam('b_exp'),
+                    chat_exp=func.coalesce(table.c.chat_exp, 0) + bindparam('b_chat_exp'),
+                ),
+                [
+                    {'b_user_id': user_id, 'b_exp': delta['exp'], 'b_chat_exp': delta['chat_exp']}
+                    for user_id, delta in pending.items()
+                ]
+            )
+
+            rows = session.query(Utente.id_telegram, Utente.exp, Utente.livello, Utente.chat_exp).filter(
+                Utente.id_telegram.in_(list(pending))
+            ).all()
+            curve = get_level_curve()
+            for user_id, exp, livello, chat_exp in rows:
+                if curve.level_for(exp or 0) > (livello or 1):
+                    # Stat points, full heal and level_up event (already announced in chat)
+                    self.leveling_service.check_level_up(user_id, session=session)
+
+                increment = pending[user_id]['chat_exp']
+                if increment > 0:
+                    self.event_dispatcher.log_event(
+                        event_type="chat_exp",
+                        user_id=user_id,
+                        value=increment,
+                        context={"total_chat_exp": chat_exp or 0},
+                        session=session
+                    )
+
+            session.commit()
+            leaderboards = get_leaderboards()
+            for user_id, exp, _, _ in rows:
+                leaderboards.record_exp(user_id, exp)
+            return len(pending)
+        except Exception as e:
+            session.rollback()
+            print(f"[CHAT EXP] Flush failed, re-queueing {len(pending)} users: {e}")
+            with self._lock:
+                for user_id, delta in pending.items():
+                    merged = self._pending.setdefault(user_id, {'exp': 0, 'chat_exp': 0})
+                    merged['exp'] += delta['exp']
+                    merged['chat_exp'] += delta['chat_exp']
+            return 0
+        finally:
+            session.close()
+
+
+_chat_exp_buffer = None
+_chat_exp_buffer_lock = threading.Lock()
+
+
+def get_chat_exp_buffer():
+    global _chat_exp_buffer
+    if _chat_exp_buffer is None:
+        with _chat_exp_buffer_lock:
+            if _chat_exp_buffer is None:
+                _chat_exp_buffer = ChatExpBuffer()
+    return _chat_exp_buffer
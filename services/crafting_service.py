@@ -776,13 +776,9 @@ class CraftingService:
     
     def get_guild_armory_level(self, guild_id):
         """Get guild's armory level"""
-        session = self.db.get_session()
-        try:
-            from models.guild import Guild
-            guild = session.query(Guild).filter_by(id=guild_id).first()
-            return guild.armory_level if guild else 1
-        finally:
-            session.close()
+        from services.guild_service import GuildService
+        guild = GuildService().get_guild_snapshot(guild_id)
+        return guild['armory_level'] if guild else 1
     
 
     def roll_chat_drop(self, chance=20):
@@ -936,6 +932,7 @@ class CraftingService:
             
             from services.guild_service import GuildService
             guild_service = GuildService()
+            guilds = guild_service.get_user_guilds([job.user_id for job in ready_jobs])
             
             for job in ready_jobs:
                 job_id = job.id
@@ -943,7 +940,7 @@ class CraftingService:
                 eq_id = job.equipment_id
                 
                 # Get context info
-                guild = guild_service.get_user_guild(user_id)
+                guild = guilds.get(user_id)
                 armory_level = guild['armory_level'] if guild else 1
                 
                 prof_info = self.get_profession_info(user_id)
@@ -4,9 +4,31 @@ from database import Database
 from models.cultivation import GardenSlot
 from models.user import Utente
 from models.resources import UserResource
-from sqlalchemy import text
+from sqlalchemy import text, update, or_, and_, not_
 from services.event_dispatcher import EventDispatcher
 
+# Moisture is not stored per minute: it is derived from last_watered_at
+MOISTURE_DECAY_PER_HOUR = 10
+
+
+def compute_moisture(slot, now=None):
+    """Current moisture (0-100) of a slot: -10% per hour since the last watering."""
+    if not slot.last_watered_at:
+        return slot.moisture if slot.moisture is not None else 100
+    now = now or datetime.now()
+    hours_since = (now - slot.last_watered_at).total_seconds() / 3600
+    return max(0, 100 - int(hours_since * MOISTURE_DECAY_PER_HOUR))
+
+
+def moist_clause(now):
+    """SQL criterion equivalent to compute_moisture(slot, now) > 0."""
+    dry_after = timedelta(hours=100 / MOISTURE_DECAY_PER_HOUR)
+    return or_(
+        GardenSlot.last_watered_at > now - dry_after,
+        and_(GardenSlot.last_watered_at.is_(None), GardenSlot.moisture > 0)
+    )
+
+
 class CultivationService:
     def __init__(self):
         self.db = Database()
@@ -51,13 +73,14 @@ class CultivationService:
                 
             # Convert to dict to avoid DetachedInstanceError
             result_slots = []
+            now = datetime.now()
             for s in slots:
                 result_slots.append({
                     'slot_id': s.slot_id,
                     'status': s.status,
                     'seed_type': s.seed_type,
                     'completion_time': s.completion_time,
-                    'moisture': s.moisture,
+                    'moisture': compute_moisture(s, now),
                     'rot_time': s.rot_time
                 })
                 
@@ -122,29 +145,13 @@ class CultivationService:
         """Update status of growing plants for a user"""
         session = self.db.get_session()
         try:
-            slots = session.query(GardenSlot).filter_by(user_id=user_id, status='growing').all()
-            now = datetime.now()
-            count = 0
-            
-            for slot in slots:
-                # Decay moisture: -5% every check (approx) or based on time?
-                # For simplicity, if checked, it decays a bit. 
-                # Better: calculate decay based on time since last check/water.
-                
-                # Check for maturity
-                if slot.completion_time and slot.completion_time <= now:
-                    if slot.moisture > 0:
-                        slot.status = 'ready'
-                        # Set rot_time: 2 hours after ready
-                        slot.rot_time = now + timedelta(hours=2)
-                        count += 1
-                    else:
-                        # Stalled growth if no moisture
-                        slot.completion_time += timedelta(minutes=10)
-            
-            if count > 0:
-                session.commit()
-            return count
+            events = self._advance_growth(session, datetime.now(), GardenSlot.user_id == user_id)
+            session.commit()
+            return sum(1 for e in events if e['event'] == 'ready')
+        except Exception as e:
+            session.rollback()
+            print(f"Error checking garden growth for {user_id}: {e}")
+            return 0
         finally:
             session.close()
 
@@ -152,68 +159,65 @@ class CultivationService:
         """Find all plants that matured and mark as ready. Return user_ids for notification."""
         session = self.db.get_session()
         try:
-            now = datetime.now()
-            matured_info = []
-            
-            # 1. Update Growing Plants
-            growing_slots = session.query(GardenSlot).filter(GardenSlot.status == 'growing').all()
-            for slot in growing_slots:
-                # Decay moisture: -10% per hour (approx)
-                if slot.last_watered_at:
-                    hours_since = (now - slot.last_watered_at).total_seconds() / 3600
-                    decay = int(hours_since * 10)
-                    slot.moisture = max(0, 100 - decay)
-                
-                if slot.completion_time <= now:
-                    if slot.moisture > 0:
-                        slot.status = 'ready'
-                        slot.rot_time = now + timedelta(hours=2) # Rot in 2 hours
-                        matured_info.append({
-                            'user_id': slot.user_id,
-                            'seed_type': slot.seed_type,
-                            'event': 'ready'
-                        })
-                    else:
-                        # Penalty: stalled growth
-                        slot.completion_time += timedelta(minutes=30)
-
-            # 2. Update Ready Plants (Rotting)
-            ready_slots = session.query(GardenSlot).filter(GardenSlot.status == 'ready').all()
-            for slot in ready_slots:
-                # Decay moisture even when ready
-                if slot.last_watered_at:
-                    hours_since = (now - slot.last_watered_at).total_seconds() / 3600
-                    decay = int(hours_since * 10)
-                    slot.moisture = max(0, 100 - decay)
-
-                if slot.rot_time and slot.rot_time <= now:
-                    slot.status = 'rotting'
-                    slot.rot_time = now + timedelta(hours=1) # Full rot in another hour
-                    matured_info.append({
-                        'user_id': slot.user_id,
-                        'seed_type': slot.seed_type,
-                        'event': 'rotting'
-                    })
-
-            # 3. Update Rotting to Rotten
-            rotting_slots = session.query(GardenSlot).filter(GardenSlot.status == 'rotting').all()
-            for slot in rotting_slots:
-                if slot.rot_time and slot.rot_time <= now:
-                    slot.status = 'rotten'
-                    matured_info.append({
-                        'user_id': slot.user_id,
-                        'seed_type': slot.seed_type,
-                        'event': 'rotten'
-                    })
-            
+            matured_info = self._advance_growth(session, datetime.now())
             session.commit()
             return matured_info
         except Exception as e:
+            session.rollback()
             print(f"Error processing global garden growth: {e}")
             return []
         finally:
             session.close()
 
+    def _advance_growth(self, session, now, *criteria):
+        """
+        Run the growth state machine as conditional bulk UPDATEs.
+        Only slots whose state actually changes are written; RETURNING hands
+        them back for notification. Extra criteria restrict the slots (e.g. one user).
+        """
+        changed = []
+
+        def transition(event, where, values):
+            stmt = (
+                update(GardenSlot)
+                .where(*criteria, *where)
+                .values(**values)
+                .returning(GardenSlot.user_id, GardenSlot.seed_type)
+                .execution_options(synchronize_session=False)
+            )
+            for user_id, seed_type in session.execute(stmt).all():
+                changed.append({'user_id': user_id, 'seed_type': seed_type, 'event': event})
+
+        # 1. Growing -> Ready (only if the soil is still wet)
+        transition('ready', (
+            GardenSlot.status == 'growing',
+            GardenSlot.completion_time <= now,
+            moist_clause(now),
+        ), {'status': 'ready', 'rot_time': now + timedelta(hours=2)})  # Rot in 2 hours
+
+        # Penalty: stalled growth for dry plants (not notified)
+        session.execute(
+            update(GardenSlot)
+            .where(*criteria, GardenSlot.status == 'growing',
+                   GardenSlot.completion_time <= now, not_(moist_clause(now)))
+            .values(completion_time=now + timedelta(minutes=30))
+            .execution_options(synchronize_session=False)
+        )
+
+        # 2. Ready -> Rotting
+        transition('rotting', (
+            GardenSlot.status == 'ready',
+            GardenSlot.rot_time <= now,
+        ), {'status': 'rotting', 'rot_time': now + timedelta(hours=1)})  # Full rot in another hour
+
+        # 3. Rotting -> Rotten
+        transition('rotten', (
+            GardenSlot.status == 'rotting',
+            GardenSlot.rot_time <= now,
+        ), {'status': 'rotten'})
+
+        return changed
+
     def harvest_plant(self, user_id, slot_id):
         """Harvest a ready plant"""
         session = self.db.get_session()
@@ -240,7 +244,7 @@ class CultivationService:
             
             seed_type = slot.seed_type
             status = slot.status
-            moisture = slot.moisture
+            moisture = compute_moisture(slot)
             
             # Calculate quality multiplier
             quality_mult = 1.0
@@ -377,7 +381,7 @@ class CultivationService:
             if slot.status == 'empty':
                 return False, "Non c'è nulla da irrigare qui!"
                 
-            if slot.moisture >= 100:
+            if compute_moisture(slot) >= 100:
                 return False, "La terra è già molto umida!"
                 
             slot.moisture = 100
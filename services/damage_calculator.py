@@ -3,6 +3,7 @@ Damage Calculator - Enhanced damage calculation with elemental types, crits, and
 """
 
 import random
+from utils.formula_ops import SCALAR_OPS
 
 class DamageCalculator:
     """Enhanced damage calculation system"""
@@ -84,27 +85,18 @@ class DamageCalculator:
         # Elemental Effectiveness
         defender_type = getattr(defender, 'attack_type', 'Normal')
         effectiveness = DamageCalculator.get_elemental_effectiveness(elemental_type, defender_type)
-        base_dmg *= effectiveness
-        
-        # Defender Resistance
-        resistance = getattr(defender, 'resistance', 0)
-        if resistance > 0:
-            resistance_reduction = resistance / 100
-            base_dmg *= (1 - resistance_reduction)
         
         # Defender Defense (if has defense_total attribute)
-        if hasattr(defender, 'defense_total'):
-            defense = getattr(defender, 'defense_total', 0)
-            # Defense reduces damage by a percentage (max 50%)
-            defense_reduction = min(defense / 200, 0.5)
-            base_dmg *= (1 - defense_reduction)
+        defense = getattr(defender, 'defense_total', 0) if hasattr(defender, 'defense_total') else None
         
         # Random variance (±10%)
         variance = random.uniform(0.9, 1.1)
-        final_damage = int(base_dmg * variance)
+        final_damage = DamageCalculator.damage_formula(
+            base_dmg, effectiveness, getattr(defender, 'resistance', 0), defense, variance
+        )
         
         return {
-            'damage': max(1, final_damage),  # Minimum 1 damage
+            'damage': final_damage,
             'is_crit': is_crit,
             'crit_multiplier': crit_multiplier if is_crit else 1.0,
             'effectiveness': effectiveness,
@@ -112,6 +104,29 @@ class DamageCalculator:
             'defender_type': defender_type
         }
     
+    @staticmethod
+    def damage_formula(base_dmg, effectiveness, resistance, defense, variance, ops=SCALAR_OPS):
+        """
+        Damage after elemental effectiveness, resistance, defense and variance
+        (crit already applied to base_dmg). defense=None skips the defense step.
+        Works on plain numbers or, with ops=NumpyOps, on arrays of fights.
+        """
+        base_dmg = base_dmg * effectiveness
+        
+        # Defender Resistance (negative resistance is ignored)
+        base_dmg = base_dmg * (1 - ops.maximum(resistance, 0) / 100)
+        
+        if defense is not None:
+            # Defense reduces damage by a percentage (max 50%)
+            base_dmg = base_dmg * (1 - ops.minimum(defense / 200, 0.5))
+        
+        return ops.maximum(1, ops.trunc(base_dmg * variance))  # Minimum 1 damage
+    
+    @staticmethod
+    def attack_cooldown(speed):
+        """Seconds between attacks: 1 speed point = 5% cooldown reduction"""
+        return 60 / (1 + speed * 0.05)
+    
     @staticmethod
     def get_elemental_effectiveness(attacker_type, defender_type):
         """
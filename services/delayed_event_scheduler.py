@@ -0,0 +1,98 @@
+"""
+Delayed Event Scheduler - Heap-based timer for scripted chat events.
+Dungeon narration (message -> delay -> spawn) used to time.sleep() on the
+calling thread, freezing the scheduler jobs for the whole intro. Scripts are
+now queued on a single timer thread and played back in order per chat.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class DelayedEventScheduler:
+    DEFAULT_DELAY = 3  # seconds, same default as the old time.sleep()
+
+    def __init__(self):
+        self._heap = []  # (due, seq, key, callback)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._tails = {}  # key -> due time of the last queued step (past values are harmless)
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="delayed-events", daemon=True)
+            self._thread.start()
+
+    def _push(self, due, key, callback):
+        heapq.heappush(self._heap, (due, next(self._seq), key, callback))
+
+    def schedule(self, delay, callback, key=None):
+        """Run callback() after delay seconds (on the timer thread)."""
+        with self._cond:
+            self._push(time.monotonic() + max(0, delay), key, callback)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def play_script(self, key, events, handler):
+        """
+        Queue a whole event script for key (e.g. a chat_id).
+        handler(event) is called for every event at its playback time; 'delay'
+        events shift the following ones by event['seconds']. A new script for
+        the same key starts after the one already queued.
+        """
+        with self._cond:
+            now = time.monotonic()
+            offset = max(now, self._tails.get(key, now))
+            for event in events:
+                self._push(offset, key, lambda e=event: handler(e))
+                if event.get('type') == 'delay':
+                    offset += event.get('seconds', self.DEFAULT_DELAY)
+            self._tails[key] = offset
+            self._ensure_thread()
+            self._cond.notify()
+
+    def cancel(self, key):
+        """Drop every pending step queued for key (dungeon fled or closed)."""
+        with self._cond:
+            self._tails.pop(key, None)
+            self._heap = [entry for entry in self._heap if entry[2] != key]
+            heapq.heapify(self._heap)
+
+    def pending(self, key=None):
+        with self._cond:
+            if key is None:
+                return len(self._heap)
+            return sum(1 for entry in self._heap if entry[2] == key)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, key, callback = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+
+            try:
+                callback()
+            except Exception as e:
+                print(f"[DELAYED EVENTS] Error playing event for {key}: {e}")
+
+
+_delayed_event_scheduler = None
+_delayed_event_scheduler_lock = threading.Lock()
+
+
+def get_delayed_event_scheduler():
+    global _delayed_event_scheduler
+    if _delayed_event_scheduler is None:
+        with _delayed_event_scheduler_lock:
+            if _delayed_event_scheduler is None:
+                _delayed_event_scheduler = DelayedEventScheduler()
+    return _delayed_event_scheduler
@@ -5,7 +5,7 @@ Handles random drops while users write in chat
 from database import Database
 from services.user_service import UserService
 from services.item_service import ItemService
-from models.seasons import Season
+from services.season_gate import get_active_season_snapshot
 from sqlalchemy import text
 import os
 import random
@@ -84,9 +84,9 @@ class DropService:
         try:
             # 1. Get active season metadata BEFORE closing any potentially local session
             # We need theme and name for Dragon Ball checks.
-            active_season = session.query(Season).filter_by(is_active=True).first()
-            theme = active_season.theme if active_season else None
-            season_name = active_season.name if active_season else ""
+            active_season = get_active_season_snapshot(session=session)
+            theme = active_season['theme']
+            season_name = active_season['name'] or ""
             
             # 2. Reserving the slot: Update last drop time immediately
             # We do this here using the active session to avoid detached errors and redundant updates
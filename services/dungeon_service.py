@@ -11,6 +11,7 @@ import csv
 import json
 import os
 from services.season_content_service import get_season_content_service
+from services.delayed_event_scheduler import get_delayed_event_scheduler
 
 # Dynamic path resolution
 SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -161,6 +162,7 @@ class DungeonService:
                 m.is_dead = True
                 
             session.commit()
+            get_delayed_event_scheduler().cancel(chat_id)
             return "🌑 **MEZZANOTTE È GIUNTA!**\n\nIl potere del dungeon svanisce e le creature fuggono nell'oscurità...\nFortunatamente siete salvi, ma il bottino è perduto."
         except Exception as e:
             print(f"Error fleeing dungeon: {e}")
@@ -1156,6 +1158,7 @@ class DungeonService:
                 session.commit()
             else:
                 session.flush()
+            get_delayed_event_scheduler().cancel(dungeon.chat_id)
             msg += "\n\n💀 **Dungeon Fallito!** Tutti i partecipanti sono fuggiti o morti."
             
         if local_session:
@@ -1201,6 +1204,7 @@ class DungeonService:
             
             if local_session:
                 session.commit()
+            get_delayed_event_scheduler().cancel(dungeon.chat_id)
             msg = "\n\n💀 **GAME OVER!**\nTutti gli eroi sono caduti. Il dungeon è fallito!"
         if local_session:
             session.close()
@@ -1230,6 +1234,7 @@ class DungeonService:
                 m.health = 0
                 
             session.commit()
+            get_delayed_event_scheduler().cancel(chat_id)
             return True, f"Dungeon '{dungeon.name}' terminato forzatamente."
         finally:
             session.close()
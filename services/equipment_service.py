@@ -130,69 +130,109 @@ class EquipmentService:
             # Query UserEquipment joined with Equipment
             equipped = session.query(UserEquipment, Equipment).join(Equipment, UserEquipment.equipment_id == Equipment.id)\
                 .filter(UserEquipment.user_id == user_id, UserEquipment.equipped == True).all()
-                
-            total_stats = {}
-            set_counts = {}
-            
-            # 1. Sum Item Stats
-            for u_item, item in equipped:
-                # Base stats from JSON
-                stats = item.stats_json
-                if isinstance(stats, str):
-                    try:
-                        stats = json.loads(stats)
-                    except:
-                        stats = {}
-                elif not isinstance(stats, dict):
-                    stats = {}
-                
-                for stat, value in stats.items():
-                    # Map legacy/external stat names to internal ones
-                    if stat == 'health':
-                        total_stats['max_health'] = total_stats.get('max_health', 0) + value
-                    elif stat == 'mana':
-                        total_stats['max_mana'] = total_stats.get('max_mana', 0) + value
-                    elif stat == 'attack':
-                        total_stats['base_damage'] = total_stats.get('base_damage', 0) + value
-                    elif stat == 'defense':
-                        total_stats['resistance'] = total_stats.get('resistance', 0) + value
-                    elif stat in ['crit', 'crit_chance']:
-                        total_stats['crit_chance'] = total_stats.get('crit_chance', 0) + value
-                    elif stat == 'all_stats':
-                        # Valid for "Anello del Tempo" etc.
-                        total_stats['max_health'] = total_stats.get('max_health', 0) + (value * 10)
-                        total_stats['max_mana'] = total_stats.get('max_mana', 0) + (value * 5)
-                        total_stats['base_damage'] = total_stats.get('base_damage', 0) + (value * 2)
-                        total_stats['resistance'] = total_stats.get('resistance', 0) + value
-                        total_stats['crit_chance'] = total_stats.get('crit_chance', 0) + value
-                        total_stats['speed'] = total_stats.get('speed', 0) + value
-                    else:
-                        # Standard stat (max_health, base_damage, etc.)
-                        total_stats[stat] = total_stats.get(stat, 0) + value
-                    
-                # No level scaling usually for equipment unless it's upgraded (+1)
-                # Assuming 'min_level' is requirement, not item level
-                
-                # Count sets (by Name)
-                if item.set_name:
-                    set_counts[item.set_name] = set_counts.get(item.set_name, 0) + 1
-            
-            # 2. Apply Set Bonuses
-            for set_name, count in set_counts.items():
-                # Look up ItemSet by Name
-                item_set = session.query(ItemSet).filter_by(name=set_name).first()
-                if item_set and item_set.bonuses:
-                    # Check thresholds (e.g. "2", "4", "6")
-                    for threshold, bonus_stats in item_set.bonuses.items():
-                        if count >= int(threshold):
-                            for stat, value in bonus_stats.items():
-                                total_stats[stat] = total_stats.get(stat, 0) + value
-                                
-            return total_stats
+            items = [item for _, item in equipped]
+
+            def get_set(set_name):
+                return session.query(ItemSet).filter_by(name=set_name).first()
+
+            return self._sum_equipment_stats(items, get_set)
         finally:
             if local_session:
                 session.close()
 
+    def calculate_equipment_stats_bulk(self, user_ids, session=None):
+        """
+        calculate_equipment_stats for many users at once: one query for the
+        equipped items, one for the item sets. Returns {user_id: stats}.
+        """
+        local_session = False
+        if not session:
+            session = self.db.get_session()
+            local_session = True
+
+        try:
+            if not user_ids:
+                return {}
+            items_by_user = {user_id: [] for user_id in user_ids}
+            rows = session.query(UserEquipment.user_id, Equipment).join(Equipment, UserEquipment.equipment_id == Equipment.id)\
+                .filter(UserEquipment.user_id.in_(user_ids), UserEquipment.equipped == True).all()
+            for user_id, item in rows:
+                items_by_user[user_id].append(item)
+
+            set_names = {item.set_name for _, item in rows if item.set_name}
+            sets = {}
+            if set_names:
+                sets = {s.name: s for s in session.query(ItemSet).filter(ItemSet.name.in_(set_names)).all()}
+
+            return {
+                user_id: self._sum_equipment_stats(items, sets.get)
+                for user_id, items in items_by_user.items()
+            }
+        finally:
+            if local_session:
+                session.close()
+
+    def _sum_equipment_stats(self, items, get_set):
+        """Sum item stats and set bonuses; get_set(name) returns the ItemSet or None"""
+        total_stats = {}
+        set_counts = {}
+        
+        # 1. Sum Item Stats
+        for item in items:
+            # Base stats from JSON
+            stats = item.stats_json
+            if isinstance(stats, str):
+                try:
+                    stats = json.loads(stats)
+                except:
+                    stats = {}
+            elif not isinstance(stats, dict):
+                stats = {}
+            
+            for stat, value in stats.items():
+                # Map legacy/external stat names to internal ones
+                if stat == 'health':
+                    total_stats['max_health'] = total_stats.get('max_health', 0) + value
+                elif stat == 'mana':
+                    total_stats['max_mana'] = total_stats.get('max_mana', 0) + value
+                elif stat == 'attack':
+                    total_stats['base_damage'] = total_stats.get('base_damage', 0) + value
+                elif stat == 'defense':
+                    total_stats['resistance'] = total_stats.get('resistance', 0) + value
+                elif stat in ['crit', 'crit_chance']:
+                    total_stats['crit_chance'] = total_stats.get('crit_chance', 0) + value
+                elif stat == 'all_stats':
+                    # Valid for "Anello del Tempo" etc.
+                    total_stats['max_health'] = total_stats.get('max_health', 0) + (value * 10)
+                    total_stats['max_mana'] = total_stats.get('max_mana', 0) + (value * 5)
+                    total_stats['base_damage'] = total_stats.get('base_damage', 0) + (value * 2)
+                    total_stats['resistance'] = total_stats.get('resistance', 0) + value
+                    total_stats['crit_chance'] = total_stats.get('crit_chance', 0) + value
+                    total_stats['speed'] = total_stats.get('speed', 0) + value
+                else:
+                    # Standard stat (max_health, base_damage, etc.)
+                    total_stats[stat] = total_stats.get(stat, 0) + value
+                
+            # No level scaling usually for equipment unless it's upgraded (+1)
+            # Assuming 'min_level' is requirement, not item level
+            
+            # Count sets (by Name)
+            if item.set_name:
+                set_counts[item.set_name] = set_counts.get(item.set_name, 0) + 1
+        
+        # 2. Apply Set Bonuses
+        for set_name, count in set_counts.items():
+            # Look up ItemSet by Name
+            item_set = get_set(set_name)
+            if item_set and item_set.bonuses:
+                # Check thresholds (e.g. "2", "4", "6")
+                for threshold, bonus_stats in item_set.bonuses.items():
+                    if count >= int(threshold):
+                        for stat, value in bonus_stats.items():
+                            total_stats[stat] = total_stats.get(stat, 0) + value
+                            
+        return total_stats
+
     def add_item_to_user(self, user_id, equipment_id):
         """Give an item to a user"""
         session = self.db.get_session()
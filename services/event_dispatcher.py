@@ -2,14 +2,20 @@
 Event Dispatcher Service - Centralized event logging and dispatching for achievement tracking.
 """
 
-from database import Database
-from models.achievements import GameEvent
+from database import Database, get_upsert_insert
+from models.achievements import GameEvent, GameEventDailyRollup
+from sqlalchemy import func
 from datetime import datetime, timedelta
 import json
 
 class EventDispatcher:
     """Centralized event logging and dispatching"""
     
+    # Processed events older than this are folded into per-day rollups
+    RETENTION_DAYS = 30
+    COMPACTION_BATCH_SIZE = 5000
+    ROLLUP_CHUNK_SIZE = 190  # 5 columns per row, below SQLite's 999 bound parameters
+
     def __init__(self):
         self.db = Database()
     
@@ -68,11 +74,87 @@ class EventDispatcher:
         try:
             events = session.query(GameEvent).filter(
                 GameEvent.processed == False
-            ).limit(limit).all()
+            ).order_by(GameEvent.id).limit(limit).all()
             return events
         finally:
             if local_session:
                 session.close()
+
+    def claim_unprocessed_events(self, limit, session):
+        """
+        Claim the oldest unprocessed events for this worker.
+        Rows stay locked until the caller's transaction ends; rows already
+        claimed by another worker are skipped (FOR UPDATE SKIP LOCKED), so
+        several workers can drain the queue in parallel.
+        """
+        return session.query(GameEvent).filter(
+            GameEvent.processed == False
+        ).order_by(GameEvent.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    def compact_processed_events(self, retention_days=None, batch_size=None):
+        """
+        Fold processed events older than the retention window into
+        game_event_daily (count + value sum per day/user/type) and delete them.
+        Works in bounded batches, one transaction each.
+
+        Returns:
+            int: Number of raw events compacted
+        """
+        retention_days = self.RETENTION_DAYS if retention_days is None else retention_days
+        batch_size = batch_size or self.COMPACTION_BATCH_SIZE
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=retention_days), datetime.min.time())
+
+        total = 0
+        while True:
+            session = self.db.get_session()
+            try:
+                rows = session.query(
+                    GameEvent.id, GameEvent.user_id, GameEvent.event_type, GameEvent.value, GameEvent.timestamp
+                ).filter(
+                    GameEvent.processed == True,
+                    GameEvent.timestamp < cutoff
+                ).order_by(GameEvent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+                if not rows:
+                    break
+
+                rollups = {}
+                for _, user_id, event_type, value, timestamp in rows:
+                    key = (timestamp.date(), user_id, event_type)
+                    entry = rollups.setdefault(key, [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += value or 0.0
+
+                insert = get_upsert_insert(session)
+                values = [
+                    {'day': day, 'user_id': user_id, 'event_type': event_type,
+                     'event_count': count, 'value_sum': value_sum}
+                    for (day, user_id, event_type), (count, value_sum) in rollups.items()
+                ]
+                for i in range(0, len(values), self.ROLLUP_CHUNK_SIZE):
+                    stmt = insert(GameEventDailyRollup).values(values[i:i + self.ROLLUP_CHUNK_SIZE])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['day', 'user_id', 'event_type'],
+                        set_={
+                            'event_count': GameEventDailyRollup.event_count + stmt.excluded.event_count,
+                            'value_sum': GameEventDailyRollup.value_sum + stmt.excluded.value_sum
+                        }
+                    )
+                    session.execute(stmt)
+                session.query(GameEvent).filter(
+                    GameEvent.id.in_([r[0] for r in rows])
+                ).delete(synchronize_session=False)
+                session.commit()
+                total += len(rows)
+            except Exception as e:
+                session.rollback()
+                print(f"Error compacting game events: {e}")
+                break
+            finally:
+                session.close()
+
+            if len(rows) < batch_size:
+                break
+        return total
     
     def mark_processed(self, event_id):
         """Mark event as processed"""
@@ -113,6 +195,11 @@ class EventDispatcher:
                 GameEvent.user_id == user_id,
                 GameEvent.event_type == event_type
             ).count()
-            return count
+            # Include events already compacted into daily rollups
+            compacted = session.query(func.sum(GameEventDailyRollup.event_count)).filter(
+                GameEventDailyRollup.user_id == user_id,
+                GameEventDailyRollup.event_type == event_type
+            ).scalar()
+            return count + int(compacted or 0)
         finally:
             session.close()
@@ -0,0 +1,231 @@
+"""
+Game Search - In-memory inverted index over the game catalogue.
+Titles, platforms, genres and years are tokenised into an inverted index
+(token -> game ids); the token vocabulary is itself indexed by trigram, so a
+query term resolves to every token containing it (like the old ILIKE
+'%term%') and, when nothing contains it, to the tokens most similar to it
+(typo tolerance). Built at startup; GameService rebuilds it when a new game
+appears in the table, and periodically for edited or removed rows.
+"""
+
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+STOP_WORDS = frozenset({
+    'il', 'la', 'lo', 'i', 'gli', 'le', 'un', 'uno', 'una', 'e', 'di', 'a', 'da',
+    'in', 'con', 'su', 'per', 'tra', 'fra',
+})
+
+# Weight of a match by field; a title hit outranks a platform/genre/year hit
+FIELD_WEIGHTS = {'title': 1.0, 'platform': 0.6, 'genre': 0.4, 'year': 0.6}
+# Weight of a match by how the query term matched the token
+EXACT, PREFIX, SUBSTRING = 3.0, 2.0, 1.0
+FUZZY_MIN_SIMILARITY = 0.3
+FUZZY_MAX_TOKENS = 5
+
+
+def normalize(text):
+    """Lowercase, strip accents, keep letters and digits only"""
+    if text is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(ch if ch.isalnum() else ' ' for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return [token for token in normalize(text).split() if token not in STOP_WORDS]
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def padded_trigrams(token):
+    """Trigrams with word boundaries, so short words still share enough grams when misspelt"""
+    return trigrams(f"  {token} ")
+
+
+class GameSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}        # game_id -> {'sort_title', 'premium', 'fields': {field: set(tokens)}}
+        self._postings = {}    # token -> {game_id: weight of its best field}
+        self._trigrams = {}    # padded trigram -> set(tokens)
+        self._vocabulary = []  # sorted tokens (prefix lookup for terms under 3 chars)
+        self.loaded = False
+        self.signature = None  # caller-defined snapshot of the source table at build time
+
+    # ---- Build / update ----
+
+    def build(self, games, signature=None):
+        """Replace the index with an iterable of GameInfo rows (or objects with the same attributes)"""
+        fresh = GameSearchIndex()
+        for game in games:
+            fresh._add(game)
+        with self._lock:
+            self._docs = fresh._docs
+            self._postings = fresh._postings
+            self._trigrams = fresh._trigrams
+            self._vocabulary = fresh._vocabulary
+            self.signature = signature
+            self.loaded = True
+
+    def add(self, game):
+        """Index a new or updated game"""
+        with self._lock:
+            self._remove(game.id)
+            self._add(game)
+
+    def remove(self, game_id):
+        with self._lock:
+            self._remove(game_id)
+
+    def _add(self, game):
+        fields = {
+            'title': set(tokenize(game.title)),
+            'platform': set(tokenize(game.platform)),
+            'genre': set(tokenize(game.genre)),
+            'year': {str(game.year)} if game.year else set(),
+        }
+        self._docs[game.id] = {'sort_title': (game.title or '').lower(), 'premium': game.premium, 'fields': fields}
+        for field, tokens in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    insort(self._vocabulary, token)
+                    for gram in padded_trigrams(token):
+                        self._trigrams.setdefault(gram, set()).add(token)
+                if weight > postings.get(game.id, 0):
+                    postings[game.id] = weight
+
+    def _remove(self, game_id):
+        doc = self._docs.pop(game_id, None)
+        if doc is None:
+            return
+        for tokens in doc['fields'].values():
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(game_id, None)
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+                    for gram in padded_trigrams(token):
+                        grams = self._trigrams.get(gram)
+                        if grams is not None:
+                            grams.discard(token)
+                            if not grams:
+                                del self._trigrams[gram]
+
+    # ---- Query ----
+
+    def _expand(self, term):
+        """Vocabulary tokens matching a query term, with their match weight"""
+        if len(term) < 3:
+            start = bisect_left(self._vocabulary, term)
+            matches = {}
+            for token in self._vocabulary[start:]:
+                if not token.startswith(term):
+                    break
+                matches[token] = EXACT if token == term else PREFIX
+            return matches
+
+        grams = trigrams(term)
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self._trigrams.get(g, ()))):
+            tokens = self._trigrams.get(gram)
+            if not tokens:
+                candidates = set()
+                break
+            candidates = set(tokens) if candidates is None else candidates & tokens
+            if not candidates:
+                break
+        matches = {}
+        for token in candidates or ():
+            if token == term:
+                matches[token] = EXACT
+            elif token.startswith(term):
+                matches[token] = PREFIX
+            elif term in token:
+                matches[token] = SUBSTRING
+        if matches:
+            return matches
+
+        # Nothing contains the term: closest tokens by trigram similarity (Jaccard)
+        grams = padded_trigrams(term)
+        shared = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        scored = []
+        for token, common in shared.items():
+            similarity = common / (len(grams) + len(padded_trigrams(token)) - common)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, token))
+        scored.sort(reverse=True)
+        return {token: similarity for similarity, token in scored[:FUZZY_MAX_TOKENS]}
+
+    def search(self, query, limit=50):
+        """
+        Game ids matching every term of the query (in any field), best first.
+        The single word 'premium' lists the premium games.
+        """
+        with self._lock:
+            if normalize(query).strip() == 'premium':
+                ids = [game_id for game_id, doc in self._docs.items() if doc['premium'] == 1]
+                return heapq.nsmallest(limit, ids, key=lambda game_id: self._docs[game_id]['sort_title'])
+
+            terms = list(dict.fromkeys(tokenize(query)))
+            if not terms:
+                return []
+
+            # [(posting lists with their match weight)] per term, rarest term first
+            expanded = []
+            for term in terms:
+                matches = [(self._postings[token], weight) for token, weight in self._expand(term).items()]
+                if not matches:
+                    return []
+                expanded.append(matches)
+            expanded.sort(key=lambda matches: sum(len(postings) for postings, _ in matches))
+
+            # The rarest term yields the candidates, the others only filter and add to them
+            scores = {}
+            for postings, match_weight in expanded[0]:
+                for game_id, field_weight in postings.items():
+                    score = match_weight * field_weight
+                    if score > scores.get(game_id, 0):
+                        scores[game_id] = score
+            for matches in expanded[1:]:
+                narrowed = {}
+                for game_id, score in scores.items():
+                    best = max(match_weight * postings.get(game_id, 0) for postings, match_weight in matches)
+                    if best:
+                        narrowed[game_id] = score + best
+                scores = narrowed
+                if not scores:
+                    return []
+
+            docs = self._docs
+            top = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], docs[item[0]]['sort_title']))
+            return [game_id for game_id, _ in top]
+
+    def __len__(self):
+        return len(self._docs)
+
+
+_game_search_index = None
+_game_search_index_lock = threading.Lock()
+
+
+def get_game_search_index():
+    global _game_search_index
+    if _game_search_index is None:
+        with _game_search_index_lock:
+            if _game_search_index is None:
+                _game_search_index = GameSearchIndex()
+    return _game_search_index
@@ -1,42 +1,55 @@
 from database import Database
+from sqlalchemy import func
 from models.game import GameInfo, Steam, GiocoUtente
-from sqlalchemy import or_, distinct
+from services.game_search import get_game_search_index
 
 class GameService:
     def __init__(self):
         self.db = Database()
 
-    def search_games(self, query):
-        session = self.db.get_session()
-        try:
-            if query.lower() == "premium":
-                return session.query(GameInfo).filter(GameInfo.premium == 1).all()
-            
-            platforms = session.query(distinct(GameInfo.platform)).all()
-            platforms = [p[0].lower() for p in platforms if p[0]]
-
-            query_words = query.lower().split()
-            platform_filters = [word for word in query_words if word.lower() in platforms]
-            stop_words = {'il', 'la', 'lo', 'i', 'gli', 'le', 'un', 'uno', 'una', 'e', 'di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra'}
-            search_terms = [word for word in query_words if word not in platform_filters and word not in stop_words]
+    RESYNC_INTERVAL = 3600  # seconds (scheduled in main.py), picks up edits to existing rows
 
-            sql_query = session.query(GameInfo)
+    def _catalogue_signature(self, session):
+        """Highest game id: one index lookup, changes whenever a game is added.
+        Removed games need no rebuild, their ids are dropped when the rows are loaded."""
+        return session.query(func.max(GameInfo.id)).scalar()
 
-            if platform_filters:
-                platform_filter = or_(*[GameInfo.platform.ilike(f'%{pf}%') for pf in platform_filters])
-                sql_query = sql_query.filter(platform_filter)
+    def _build_search_index(self, session):
+        signature = self._catalogue_signature(session)
+        games = session.query(
+            GameInfo.id, GameInfo.title, GameInfo.platform, GameInfo.genre, GameInfo.year, GameInfo.premium
+        ).all()
+        get_game_search_index().build(games, signature=signature)
+        return len(games)
 
-            for term in search_terms:
-                search_filter = or_(GameInfo.title.ilike(f'%{term}%'))
-                sql_query = sql_query.filter(search_filter)
+    def load_search_index(self):
+        """Build the in-memory search index from the games table (startup and periodic resync)"""
+        session = self.db.get_session()
+        try:
+            return self._build_search_index(session)
+        finally:
+            session.close()
 
-            results = sql_query.all()
-            return results
+    def search_games(self, query, limit=50):
+        """Ranked, typo-tolerant search on the in-memory index; rows loaded by primary key"""
+        try:
+            index = get_game_search_index()
+            session = self.db.get_session()
+            try:
+                # Games are inserted outside the bot: rebuild as soon as a new one appears
+                if not index.loaded or index.signature != self._catalogue_signature(session):
+                    self._build_search_index(session)
+                game_ids = index.search(query, limit=limit)
+                if not game_ids:
+                    return []
+                games = session.query(GameInfo).filter(GameInfo.id.in_(game_ids)).all()
+            finally:
+                session.close()
+            by_id = {game.id: game for game in games}
+            return [by_id[game_id] for game_id in game_ids if game_id in by_id]
         except Exception as e:
             print(f"Errore durante la ricerca: {e}")
             return []
-        finally:
-            session.close()
 
     def get_game_by_message_link(self, message_link):
         session = self.db.get_session()
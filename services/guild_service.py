@@ -3,8 +3,88 @@ import random
 from database import Database
 from models.guild import Guild, GuildMember, GuildUpgrade, GuildItem
 from models.user import Utente
-from sqlalchemy import func
+from sqlalchemy import func, update
 from settings import PointsName
+from services.leaderboard_service import get_leaderboards
+from services.status_effects import ActiveEffect, load_effects, save_effects
+import threading
+import time
+
+# Guild rows change only through the GuildService mutation methods below,
+# which invalidate explicitly; the TTL bounds staleness for anything else
+# (admin scripts, account deletion in UserService).
+GUILD_CACHE_TTL = 300  # seconds
+
+GUILD_SNAPSHOT_FIELDS = (
+    'id', 'name', 'leader_id', 'wumpa_bank', 'member_limit', 'inn_level',
+    'armory_level', 'village_level', 'map_y', 'bordello_level', 'brewery_level',
+    'emblem', 'skin_id', 'description', 'laboratory_level', 'garden_level',
+    'dragon_stables_level', 'ancient_temple_level', 'magic_library_level',
+    'inn_image', 'bordello_image', 'laboratory_image', 'garden_image',
+    'temple_image', 'library_image', 'stables_image', 'brewery_image',
+    'armory_image', 'main_image',
+)
+
+
+def _guild_snapshot(guild):
+    return {field: getattr(guild, field) for field in GUILD_SNAPSHOT_FIELDS}
+
+
+class GuildSnapshotCache:
+    """Per-process cache of user -> (guild_id, role) and guild_id -> guild snapshot"""
+
+    def __init__(self, ttl=GUILD_CACHE_TTL):
+        self.ttl = ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._members = {}  # user_id -> (expires_at, guild_id or None, role)
+        self._guilds = {}   # guild_id -> (expires_at, snapshot)
+
+    def get_membership(self, user_id):
+        entry = self._members.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def get_guild(self, guild_id):
+        entry = self._guilds.get(guild_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def store_membership(self, generation, user_id, guild_id, role):
+        with self._lock:
+            # An invalidation raced with the query: don't cache its result
+            if generation == self.generation:
+                self._members[user_id] = (time.monotonic() + self.ttl, guild_id, role)
+
+    def store_guild(self, generation, guild_id, snapshot):
+        with self._lock:
+            if generation == self.generation:
+                self._guilds[guild_id] = (time.monotonic() + self.ttl, snapshot)
+
+    def invalidate(self, user_id=None, guild_id=None):
+        """Drop a user's membership and/or a guild snapshot; no arguments clears everything."""
+        with self._lock:
+            self.generation += 1
+            if user_id is None and guild_id is None:
+                self._members.clear()
+                self._guilds.clear()
+                return
+            if user_id is not None:
+                self._members.pop(user_id, None)
+            if guild_id is not None:
+                # Members pointing to a dropped snapshot re-read their membership too
+                self._guilds.pop(guild_id, None)
+
+
+_guild_cache = GuildSnapshotCache()
+
+
+def invalidate_guild_cache(user_id=None, guild_id=None):
+    """Call after changing Guild/GuildMember rows outside GuildService."""
+    _guild_cache.invalidate(user_id=user_id, guild_id=guild_id)
+
 
 class GuildService:
     def __init__(self):
@@ -61,56 +141,104 @@ class GuildService:
         session.add(leader_member)
         
         session.commit()
+        invalidate_guild_cache(user_id=leader_id)
         guild_id = new_guild.id
         session.close()
         return True, f"Gilda '{name}' fondata con successo!", guild_id
 
     def get_user_guild(self, user_id):
-        """Get the guild a user belongs to"""
+        """Get the guild a user belongs to (served from the guild snapshot cache)"""
+        cached = _guild_cache.get_membership(user_id)
+        if cached is not None:
+            guild_id, role = cached
+            if guild_id is None:
+                return None
+            snapshot = _guild_cache.get_guild(guild_id)
+            if snapshot is not None:
+                return dict(snapshot, role=role)
+
+        generation = _guild_cache.generation
         session = self.db.get_session()
-        member = session.query(GuildMember).filter_by(user_id=user_id).first()
-        if not member:
+        try:
+            member = session.query(GuildMember).filter_by(user_id=user_id).first()
+            if not member:
+                _guild_cache.store_membership(generation, user_id, None, None)
+                return None
+            guild = session.query(Guild).filter_by(id=member.guild_id).first()
+            if not guild:
+                return None
+            snapshot = _guild_snapshot(guild)
+            _guild_cache.store_membership(generation, user_id, guild.id, member.role)
+            _guild_cache.store_guild(generation, guild.id, snapshot)
+            return dict(snapshot, role=member.role)
+        finally:
             session.close()
-            return None
-        guild = session.query(Guild).filter_by(id=member.guild_id).first()
-        # We need to detach or keep session open. Detaching is better for simple apps.
-        # But for now, let's just return a dict with data to avoid DetachedInstanceError.
-        guild_data = {
-            'id': guild.id,
-            'name': guild.name,
-            'leader_id': guild.leader_id,
-            'wumpa_bank': guild.wumpa_bank,
-            'member_limit': guild.member_limit,
-            'inn_level': guild.inn_level,
-            'armory_level': guild.armory_level,
-            'village_level': guild.village_level,
-            'map_y': guild.map_y,
-            'role': member.role,
-            'bordello_level': guild.bordello_level,
-            'brewery_level': guild.brewery_level,
-            'emblem': guild.emblem,
-            'skin_id': guild.skin_id,
-            'description': guild.description,
-            'laboratory_level': guild.laboratory_level,
-            'garden_level': guild.garden_level,
-            'dragon_stables_level': guild.dragon_stables_level,
-            'ancient_temple_level': guild.ancient_temple_level,
-            'magic_library_level': guild.magic_library_level,
-            'inn_image': guild.inn_image,
-            'bordello_image': guild.bordello_image,
-            'laboratory_image': guild.laboratory_image,
-            'garden_image': guild.garden_image,
-            'temple_image': guild.temple_image,
-            'library_image': guild.library_image,
-            'stables_image': guild.stables_image,
-            'brewery_image': guild.brewery_image,
-            'armory_image': guild.armory_image,
-            'main_image': guild.main_image
-        }
-        session.close()
-        return guild_data
 
+    def get_user_guilds(self, user_ids):
+        """
+        Bulk get_user_guild for queue jobs: {user_id: guild dict or None}.
+        Cache misses are resolved with one query for memberships and one for guilds.
+        """
+        result = {}
+        missing = []
+        for user_id in set(user_ids):
+            cached = _guild_cache.get_membership(user_id)
+            if cached is not None:
+                guild_id, role = cached
+                if guild_id is None:
+                    result[user_id] = None
+                    continue
+                snapshot = _guild_cache.get_guild(guild_id)
+                if snapshot is not None:
+                    result[user_id] = dict(snapshot, role=role)
+                    continue
+            missing.append(user_id)
+
+        if not missing:
+            return result
+
+        generation = _guild_cache.generation
+        session = self.db.get_session()
+        try:
+            members = session.query(GuildMember).filter(GuildMember.user_id.in_(missing)).all()
+            member_by_user = {m.user_id: m for m in members}
+            guild_ids = {m.guild_id for m in members}
+            snapshots = {}
+            if guild_ids:
+                for guild in session.query(Guild).filter(Guild.id.in_(guild_ids)).all():
+                    snapshots[guild.id] = _guild_snapshot(guild)
+                    _guild_cache.store_guild(generation, guild.id, snapshots[guild.id])
+
+            for user_id in missing:
+                member = member_by_user.get(user_id)
+                if not member:
+                    _guild_cache.store_membership(generation, user_id, None, None)
+                    result[user_id] = None
+                    continue
+                _guild_cache.store_membership(generation, user_id, member.guild_id, member.role)
+                snapshot = snapshots.get(member.guild_id)
+                result[user_id] = dict(snapshot, role=member.role) if snapshot else None
+            return result
+        finally:
+            session.close()
+
+    def get_guild_snapshot(self, guild_id):
+        """Cached guild data by id (same fields as get_user_guild, without 'role')"""
+        snapshot = _guild_cache.get_guild(guild_id)
+        if snapshot is not None:
+            return dict(snapshot)
 
+        generation = _guild_cache.generation
+        session = self.db.get_session()
+        try:
+            guild = session.query(Guild).filter_by(id=guild_id).first()
+            if not guild:
+                return None
+            snapshot = _guild_snapshot(guild)
+            _guild_cache.store_guild(generation, guild_id, snapshot)
+            return dict(snapshot)
+        finally:
+            session.close()
 
 
     # --- Customization Methods ---
@@ -125,6 +253,7 @@ class GuildService:
         guild = session.query(Guild).filter_by(id=member.guild_id).first()
         guild.emblem = emblem
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Stemma della gilda aggiornato: {emblem}"
 
@@ -139,6 +268,7 @@ class GuildService:
         guild = session.query(Guild).filter_by(id=member.guild_id).first()
         guild.skin_id = skin_id
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Skin della gilda aggiornata: {skin_id}"
 
@@ -157,19 +287,22 @@ class GuildService:
         guild = session.query(Guild).filter_by(id=member.guild_id).first()
         guild.description = description
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, "Descrizione della gilda aggiornata!"
 
     def get_dungeon_ranking(self, dungeon_id=None, limit=10):
-        """Get guild damage ranking"""
+        """Get guild damage ranking (all dungeons: served by the guild leaderboard)"""
+        if not dungeon_id:
+            return [{'name': name, 'total_damage': damage}
+                    for _, name, damage in get_leaderboards().get_guild_top(limit)]
+
         session = self.db.get_session()
         from models.guild_dungeon_stats import GuildDungeonStats
         
         query = session.query(Guild.name, func.sum(GuildDungeonStats.total_damage).label('total_damage'))\
-            .join(GuildDungeonStats, Guild.id == GuildDungeonStats.guild_id)
-            
-        if dungeon_id:
-            query = query.filter(GuildDungeonStats.dungeon_id == dungeon_id)
+            .join(GuildDungeonStats, Guild.id == GuildDungeonStats.guild_id)\
+            .filter(GuildDungeonStats.dungeon_id == dungeon_id)
             
         ranking = query.group_by(Guild.id, Guild.name).order_by(func.sum(GuildDungeonStats.total_damage).desc()).limit(limit).all()
         
@@ -211,6 +344,7 @@ class GuildService:
                 rewards_log.append(f"🥉 **{g3_name}**: 1500 Wumpa")
 
         session.commit()
+        invalidate_guild_cache()
         session.close()
         
         if not rewards_log:
@@ -220,54 +354,83 @@ class GuildService:
 
 
     def deposit_wumpa(self, user_id, amount):
-        """Deposit wumpa into guild bank"""
+        """Deposit wumpa into guild bank (SQL deltas, user row locked before the guild row)"""
         if amount <= 0:
             return False, "Importo non valido."
             
         session = self.db.get_session()
-        user = session.query(Utente).filter_by(id_telegram=user_id).first()
-        member = session.query(GuildMember).filter_by(user_id=user_id).first()
-        
-        if not member:
-            session.close()
-            return False, "Non fai parte di nessuna gilda!"
+        try:
+            member = session.query(GuildMember).filter_by(user_id=user_id).first()
             
-        if user.points < amount:
-            session.close()
-            return False, "Non hai abbastanza Wumpa!"
+            if not member:
+                return False, "Non fai parte di nessuna gilda!"
+            guild_id = member.guild_id
+                
+            debited = session.execute(
+                update(Utente)
+                .where(Utente.id_telegram == user_id, Utente.points >= amount)
+                .values(points=Utente.points - amount)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not debited:
+                session.rollback()
+                return False, "Non hai abbastanza Wumpa!"
+                
+            session.execute(
+                update(Guild)
+                .where(Guild.id == guild_id)
+                .values(wumpa_bank=Guild.wumpa_bank + amount)
+                .execution_options(synchronize_session=False)
+            )
             
-        guild = session.query(Guild).filter_by(id=member.guild_id).first()
-        user.points -= amount
-        guild.wumpa_bank += amount
-        
-        session.commit()
-        session.close()
-        return True, f"Hai depositato {amount} Wumpa nella banca della gilda!"
+            session.commit()
+            invalidate_guild_cache(guild_id=guild_id)
+            return True, f"Hai depositato {amount} Wumpa nella banca della gilda!"
+        except Exception as e:
+            session.rollback()
+            print(f"Error depositing wumpa: {e}")
+            return False, "Errore durante il deposito."
+        finally:
+            session.close()
 
     def withdraw_wumpa(self, leader_id, amount):
-        """Leader only: withdraw wumpa from guild bank"""
+        """Leader only: withdraw wumpa from guild bank (same lock order as deposit_wumpa)"""
         if amount <= 0:
             return False, "Importo non valido."
             
         session = self.db.get_session()
-        member = session.query(GuildMember).filter_by(user_id=leader_id, role="Leader").first()
-        
-        if not member:
-            session.close()
-            return False, "Solo il capogilda può prelevare fondi!"
+        try:
+            member = session.query(GuildMember).filter_by(user_id=leader_id, role="Leader").first()
             
-        guild = session.query(Guild).filter_by(id=member.guild_id).first()
-        if guild.wumpa_bank < amount:
-            session.close()
-            return False, "La banca della gilda non ha abbastanza fondi!"
+            if not member:
+                return False, "Solo il capogilda può prelevare fondi!"
+            guild_id = member.guild_id
+                
+            session.execute(
+                update(Utente)
+                .where(Utente.id_telegram == leader_id)
+                .values(points=Utente.points + amount)
+                .execution_options(synchronize_session=False)
+            )
+            debited = session.execute(
+                update(Guild)
+                .where(Guild.id == guild_id, Guild.wumpa_bank >= amount)
+                .values(wumpa_bank=Guild.wumpa_bank - amount)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not debited:
+                session.rollback()
+                return False, "La banca della gilda non ha abbastanza fondi!"
             
-        user = session.query(Utente).filter_by(id_telegram=leader_id).first()
-        guild.wumpa_bank -= amount
-        user.points += amount
-        
-        session.commit()
-        session.close()
-        return True, f"Hai prelevato {amount} Wumpa dalla banca della gilda!"
+            session.commit()
+            invalidate_guild_cache(guild_id=guild_id)
+            return True, f"Hai prelevato {amount} Wumpa dalla banca della gilda!"
+        except Exception as e:
+            session.rollback()
+            print(f"Error withdrawing wumpa: {e}")
+            return False, "Errore durante il prelievo."
+        finally:
+            session.close()
 
     def upgrade_inn(self, leader_id):
         """Upgrade the guild inn"""
@@ -292,6 +455,7 @@ class GuildService:
         new_level = guild.inn_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Locanda potenziata al livello {new_level}! Recupero: +{int((new_level-1)*50)}% -> +{int(new_level*50)}%"
 
@@ -323,6 +487,7 @@ class GuildService:
         new_limit = guild.member_limit
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Villaggio ampliato! Nuovo limite membri: {new_limit}."
 
@@ -353,6 +518,7 @@ class GuildService:
         new_level = guild.armory_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Armeria potenziata al livello {new_level}!"
 
@@ -386,6 +552,7 @@ class GuildService:
         new_level = guild.brewery_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Birrificio potenziato al livello {new_level}!"
 
@@ -401,19 +568,10 @@ class GuildService:
             session.close()
             return 1.0
             
-        import json
-        from datetime import datetime
-        try:
-             effects = json.loads(user.active_status_effects or '[]')
-        except:
-             effects = []
-             
-        now = datetime.now().timestamp()
-        
         max_bonus = 0
-        for e in effects:
-            if e.get('effect') == 'beer_potion_bonus' and e.get('expires_at', 0) > now:
-                max_bonus = max(max_bonus, e.get('value', 0))
+        for e in load_effects(user):
+            if e.effect == 'beer_potion_bonus':
+                max_bonus = max(max_bonus, e.value or 0)
         
         session.close()
         return 1.0 + (max_bonus / 100.0)
@@ -488,24 +646,18 @@ class GuildService:
         final_bonus_pct = int(base_bonus * drink_mult)
         
         # Store in Status Effects
-        import json
-        try:
-            effects = json.loads(user.active_status_effects or '[]')
-        except:
-            effects = []
-            
         # Remove old beer bonuses
-        effects = [e for e in effects if e.get('effect') != 'beer_potion_bonus']
+        effects = [e for e in load_effects(user) if e.effect != 'beer_potion_bonus']
         
         # Duration: 30 minutes
         expires_at = (now + timedelta(minutes=30)).timestamp()
-        effects.append({
-            'effect': 'beer_potion_bonus',
-            'value': final_bonus_pct,
-            'expires_at': expires_at,
-            'name': drink['name']
-        })
-        user.active_status_effects = json.dumps(effects)
+        effects.append(ActiveEffect(
+            effect='beer_potion_bonus',
+            value=final_bonus_pct,
+            expires_at=expires_at,
+            extra={'name': drink['name']}
+        ))
+        save_effects(user, effects)
         
         session.commit()
         session.close()
@@ -581,6 +733,7 @@ class GuildService:
         new_level = guild.bordello_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Bordello delle Elfe potenziato al livello {new_level}!"
 
@@ -633,22 +786,19 @@ class GuildService:
             user.vigore_until = datetime.now() + timedelta(minutes=config['dur'])
             
             # Apply Persistent Status Effects (Dmg, Crit, etc.)
-            import json
-            effects = json.loads(user.active_status_effects or '[]')
-            
             # Remove old bordello effects
-            effects = [e for e in effects if not e.get('effect', '').startswith('bordello_')]
+            effects = [e for e in load_effects(user) if not (e.effect or '').startswith('bordello_')]
             
             expires_at = (datetime.now() + timedelta(minutes=config['dur'])).timestamp()
             
             if config.get('dmg'):
-                effects.append({'effect': 'bordello_dmg', 'value': config['dmg'], 'expires_at': expires_at})
+                effects.append(ActiveEffect(effect='bordello_dmg', value=config['dmg'], expires_at=expires_at))
             if config.get('crit'):
-                effects.append({'effect': 'bordello_crit', 'value': config['crit'], 'expires_at': expires_at})
+                effects.append(ActiveEffect(effect='bordello_crit', value=config['crit'], expires_at=expires_at))
             if config.get('mana'):
-                effects.append({'effect': 'bordello_mana', 'value': config['mana'], 'expires_at': expires_at})
+                effects.append(ActiveEffect(effect='bordello_mana', value=config['mana'], expires_at=expires_at))
                 
-            user.active_status_effects = json.dumps(effects)
+            save_effects(user, effects)
             
             session.commit()
             free_msg = "🎁 **PRIMA VISITA GRATUITA!**\n" if is_free else ""
@@ -695,6 +845,7 @@ class GuildService:
         old_name = guild.name
         guild.name = new_name
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Gilda rinominata da '{old_name}' a '{new_name}'!"
 
@@ -744,6 +895,7 @@ class GuildService:
         new_level = guild.laboratory_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Laboratorio Alchemico potenziato al livello {new_level}!"
 
@@ -788,6 +940,7 @@ class GuildService:
         new_level = guild.garden_level
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"Giardino Botanico potenziato al livello {new_level}!"
 
@@ -815,6 +968,7 @@ class GuildService:
         guild.dragon_stables_level += 1
         new_level = guild.dragon_stables_level
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"🐉 Scuderie dei Draghi potenziate al livello {new_level}! Il tempo di ricarica dei tuoi membri è ridotto."
 
@@ -842,6 +996,7 @@ class GuildService:
         guild.ancient_temple_level += 1
         new_level = guild.ancient_temple_level
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"⛩️ Antico Tempio potenziato al livello {new_level}! Il colpo critico dei tuoi membri è aumentato."
 
@@ -869,6 +1024,7 @@ class GuildService:
         guild.magic_library_level += 1
         new_level = guild.magic_library_level
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"📚 Biblioteca Magica potenziata al livello {new_level}! Il Mana massimo dei tuoi membri è aumentato."
 
@@ -908,6 +1064,7 @@ class GuildService:
         guild.wumpa_bank -= cost
         
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"✨ Menu '{menu_type}' personalizzato con successo! (Costo: {cost} Wumpa)"
 
@@ -937,6 +1094,7 @@ class GuildService:
             
         guild = session.query(Guild).filter_by(id=member.guild_id).first()
         guild_name = guild.name
+        guild_id = guild.id
         
         # Delete all members
         session.query(GuildMember).filter_by(guild_id=guild.id).delete()
@@ -945,6 +1103,8 @@ class GuildService:
         session.delete(guild)
         
         session.commit()
+        invalidate_guild_cache(guild_id=guild_id)
+        get_leaderboards().remove_guild(guild_id)
         session.close()
         return True, f"Gilda '{guild_name}' eliminata definitivamente."
         return True, f"Gilda '{guild_name}' eliminata definitivamente."
@@ -1082,6 +1242,7 @@ class GuildService:
         )
         session.add(new_member)
         session.commit()
+        invalidate_guild_cache(user_id=user_id)
         
         guild_name = guild.name
         session.close()
@@ -1105,6 +1266,7 @@ class GuildService:
         
         session.delete(member)
         session.commit()
+        invalidate_guild_cache(user_id=user_id)
         session.close()
         return True, f"Hai lasciato la gilda {guild_name}."
 
@@ -1176,6 +1338,7 @@ class GuildService:
         )
         session.add(new_egg)
         session.commit()
+        invalidate_guild_cache(guild_id=member.guild_id)
         session.close()
         return True, f"🥚 Hai acquistato un **Uovo {egg_type.capitalize()}**! Ora tutti i membri devono accudirlo per farlo schiudere!"
 
@@ -1245,32 +1408,29 @@ class GuildService:
             # User doesn't have last_prayer.
             # Use JSON to track cooldown? "last_temple_usage": timestamp
             
-            import json
-            effects = json.loads(user.active_status_effects or '[]')
+            effects = load_effects(user)
             
-            # Check for existing buff
-            existing = next((e for e in effects if e.get('effect') == 'temple_buff_crit'), None)
+            # Check for existing buff (expired ones are already pruned)
+            existing = next((e for e in effects if e.effect == 'temple_buff_crit'), None)
             if existing:
-                # Check if expired
-                if existing.get('expires_at', 0) > now.timestamp():
-                    remaining = int((existing['expires_at'] - now.timestamp()) / 60)
-                    return False, f"Sei già benedetto dal Tempio! La benedizione dura ancora {remaining} minuti."
+                remaining = int((existing.get('expires_at', 0) - now.timestamp()) / 60)
+                return False, f"Sei già benedetto dal Tempio! La benedizione dura ancora {remaining} minuti."
             
             # Apply Buff
             duration = 30 # minutes
             expires_at = (now + timedelta(minutes=duration)).timestamp()
             
             # Remove old
-            effects = [e for e in effects if e.get('effect') != 'temple_buff_crit']
+            effects = [e for e in effects if e.effect != 'temple_buff_crit']
             
-            effects.append({
-                'effect': 'temple_buff_crit',
-                'expires_at': expires_at,
-                'value': 15, # 15% Crit
-                'source': 'temple'
-            })
+            effects.append(ActiveEffect(
+                effect='temple_buff_crit',
+                expires_at=expires_at,
+                value=15, # 15% Crit
+                extra={'source': 'temple'}
+            ))
             
-            user.active_status_effects = json.dumps(effects)
+            save_effects(user, effects)
             session.commit()
             
             return True, f"🙏 Hai pregato al Tempio.\n\n✨ **Benedizione Ricevuta**: +15% Critico per {duration} minuti!"
@@ -1295,13 +1455,12 @@ class GuildService:
             user = session.query(Utente).filter_by(id_telegram=user_id).first()
             now = datetime.now()
             
-            import json
-            effects = json.loads(user.active_status_effects or '[]')
+            effects = load_effects(user)
             
-            # Check for existing buff
-            existing = next((e for e in effects if e.get('effect') == 'library_buff_mana'), None)
-            if existing and existing.get('expires_at', 0) > now.timestamp():
-                remaining = int((existing['expires_at'] - now.timestamp()) / 60)
+            # Check for existing buff (expired ones are already pruned)
+            existing = next((e for e in effects if e.effect == 'library_buff_mana'), None)
+            if existing:
+                remaining = int((existing.get('expires_at', 0) - now.timestamp()) / 60)
                 return False, f"Hai già studiato di recente! Il buff dura ancora {remaining} minuti."
             
             # Restore Mana
@@ -1315,18 +1474,18 @@ class GuildService:
             expires_at = (now + timedelta(minutes=duration)).timestamp()
             
             # Remove old
-            effects = [e for e in effects if e.get('effect') != 'library_buff_mana']
+            effects = [e for e in effects if e.effect != 'library_buff_mana']
             
             buff_amount = guild.magic_library_level * 20 # +20 Max Mana per level
             
-            effects.append({
-                'effect': 'library_buff_mana',
-                'expires_at': expires_at,
-                'value': buff_amount,
-                'source': 'library'
-            })
+            effects.append(ActiveEffect(
+                effect='library_buff_mana',
+                expires_at=expires_at,
+                value=buff_amount,
+                extra={'source': 'library'}
+            ))
             
-            user.active_status_effects = json.dumps(effects)
+            save_effects(user, effects)
             session.commit()
             
             return True, f"📖 Hai studiato antichi tomi.\n\n💧 **Mana Recuperato**: {restore}\n✨ **Buff Conoscenza**: +{buff_amount} Mana Max per {duration} minuti!"
@@ -1365,16 +1524,12 @@ class GuildService:
             user = session.query(Utente).filter_by(id_telegram=user_id).first()
             
             # Check Daily Limit (Reset at midnight)
-            import json
-            effects = json.loads(user.active_status_effects or '[]')
+            effects = list(load_effects(user))
             
+            # The tracker expires at midnight and is pruned with the other timed effects
             limit_id = f"relax_limit_{gadget_type}"
-            for effect in effects:
-                if effect.get('id') == limit_id:
-                    # Check expiry
-                    expires = datetime.fromisoformat(effect.get('expires'))
-                    if datetime.now() < expires:
-                        return False, f"Hai già usato {gadget['name']} oggi! Torna domani."
+            if any(effect.id == limit_id for effect in effects):
+                return False, f"Hai già usato {gadget['name']} oggi! Torna domani."
             
             # Check Usage Cost (Erba Verde - now as Resource)
             from services.crafting_service import CraftingService
@@ -1398,30 +1553,32 @@ class GuildService:
             
             now = datetime.now()
             expires_at = (now + timedelta(minutes=duration_minutes)).timestamp()
-            limit_expires = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+            limit_expires = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
             
             # Remove old buffs of same type to prevent stacking of SAME gadget? 
             # Or allow multiple DIFFERENT gadgets? "1 use per gadget type".
             # Assume different gadgets stack.
             
             # Add Limit Tracker
-            effects.append({
-                'id': limit_id,
-                'expires': limit_expires,
-                'type': 'limit'
-            })
+            effects.append(ActiveEffect(
+                id=limit_id,
+                expires_at=limit_expires,
+                extra={'type': 'limit'}
+            ))
             
             # Add Stat Buff
-            effects.append({
-                'effect': f"relax_{gadget_type}",
-                'expires_at': expires_at,
-                'value_res': gadget['res'],
-                'value_speed': gadget['speed'],
-                'source': 'relax_corner',
-                'name': gadget['name']
-            })
-            
-            user.active_status_effects = json.dumps(effects)
+            effects.append(ActiveEffect(
+                effect=f"relax_{gadget_type}",
+                expires_at=expires_at,
+                extra={
+                    'value_res': gadget['res'],
+                    'value_speed': gadget['speed'],
+                    'source': 'relax_corner',
+                    'name': gadget['name']
+                }
+            ))
+            
+            save_effects(user, effects)
             session.commit()
             
             return True, f"🌿 Hai usato: **{gadget['name']}**.\n\n💨 Ti senti molto rilassato...\n🛡️ Resistenza +{gadget['res']}%\n🐌 Velocità {gadget['speed']}"
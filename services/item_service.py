@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import random
 from settings import PointsName
 from services.event_dispatcher import EventDispatcher
+from services.status_effects import ActiveEffect, load_effects, serialize_effects
 
 import csv
 import os
@@ -280,23 +281,16 @@ class ItemService:
         if item_name == "Turbo":
             # Logic: +20% EXP for 30 minutes
             # Update active_status_effects
-            effects = []
-            if user.active_status_effects:
-                try:
-                    effects = json.loads(user.active_status_effects)
-                except:
-                    effects = []
-            
             # Remove existing turbo if any
-            effects = [e for e in effects if e.get('id') != 'turbo']
+            effects = [e for e in load_effects(user) if e.id != 'turbo']
             
             # Add new turbo
-            effects.append({
-                'id': 'turbo',
-                'expires': (datetime.now() + timedelta(minutes=30)).isoformat()
-            })
+            effects.append(ActiveEffect(
+                id='turbo',
+                expires_at=(datetime.now() + timedelta(minutes=30)).timestamp()
+            ))
             
-            self.user_service.update_user(user.id_telegram, {'active_status_effects': json.dumps(effects)})
+            self.user_service.update_user(user.id_telegram, {'active_status_effects': serialize_effects(effects)})
             return "Turbo attivato! Guadagnerai +20% EXP per 30 minuti.", None
         
         elif item_name == "Aku Aku" or item_name == "Uka Uka":
@@ -0,0 +1,161 @@
+"""
+Job Runner - Runs `schedule` jobs on a bounded worker pool.
+A slow job (e.g. a Telegram send in mob_attack_job) no longer delays every
+other periodic job: each due job is handed to a worker, a job never overlaps
+with its own previous run, and overruns/lag are tracked per job.
+Jobs that share non-thread-safe state are put in the same group and run
+one at a time, as they did on the single-threaded schedule loop.
+"""
+
+import threading
+import time
+import traceback
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import schedule
+
+
+class JobRunner:
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_TIMEOUT = 120  # seconds
+    LAG_WARNING = 5  # seconds
+
+    def __init__(self, scheduler=None, max_workers=None, default_timeout=None, timeouts=None, groups=None):
+        """
+        timeouts: {job_name: seconds} overrides; job_name is the scheduled function's name.
+        Python threads cannot be killed, so a timed-out job is reported and keeps
+        blocking only its own next runs (overlap prevention), never the other jobs.
+        groups: {job_name: group_key}; a due job whose group is busy is not skipped,
+        it stays due and starts on a later tick once the other job has finished.
+        """
+        self.scheduler = scheduler or schedule.default_scheduler
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.DEFAULT_MAX_WORKERS,
+            thread_name_prefix="job"
+        )
+        self.default_timeout = default_timeout or self.DEFAULT_TIMEOUT
+        self.timeouts = dict(timeouts or {})
+        self.groups = dict(groups or {})
+        self._lock = threading.Lock()
+        self._running = {}  # job -> started_at (monotonic) or None while queued
+        self._busy_groups = {}  # group_key -> name of the job holding it
+        self._deferred = set()  # jobs waiting for their group (counted once per wait)
+        self._timed_out = set()
+        self._metrics = {}
+
+    @staticmethod
+    def job_name(job):
+        return getattr(job.job_func, '__name__', None) or repr(job)
+
+    def _job_metrics(self, name):
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            metrics = {
+                'runs': 0, 'failures': 0, 'missed_runs': 0, 'deferred_runs': 0, 'timeouts': 0,
+                'last_lag': 0.0, 'max_lag': 0.0, 'last_duration': 0.0, 'max_duration': 0.0,
+            }
+            self._metrics[name] = metrics
+        return metrics
+
+    def record(self, name, **values):
+        """Store job-specific figures (e.g. rows touched) next to the runner's own metrics"""
+        with self._lock:
+            self._job_metrics(name).update(values)
+
+    def get_metrics(self):
+        """Snapshot of {job_name: {runs, failures, missed_runs, deferred_runs, timeouts, lag, duration, recorded values}}"""
+        with self._lock:
+            return {name: dict(m) for name, m in self._metrics.items()}
+
+    def run_pending(self):
+        """Dispatch every due job to the pool (non-blocking)."""
+        self._check_timeouts()
+
+        due_jobs = sorted(job for job in self.scheduler.jobs if job.should_run)
+        for job in due_jobs:
+            name = self.job_name(job)
+            group = self.groups.get(name)
+            scheduled_at = job.next_run
+            with self._lock:
+                already_running = job in self._running
+                if already_running:
+                    self._job_metrics(name)['missed_runs'] += 1
+                elif group is not None and group in self._busy_groups:
+                    # Left due: dispatched by a later tick once the group is free
+                    if job not in self._deferred:
+                        self._deferred.add(job)
+                        self._job_metrics(name)['deferred_runs'] += 1
+                    continue
+                else:
+                    self._running[job] = None
+                    self._deferred.discard(job)
+                    if group is not None:
+                        self._busy_groups[group] = name
+            # Reschedule right away so the job is not seen as due again while in flight
+            job._schedule_next_run()
+            if already_running:
+                print(f"[JOB RUNNER] {name} still running, skipped run scheduled at {scheduled_at:%H:%M:%S}")
+                continue
+            self.executor.submit(self._run_job, job, name, scheduled_at, group)
+
+    def _run_job(self, job, name, scheduled_at, group=None):
+        started = time.monotonic()
+        lag = max(0.0, (datetime.datetime.now() - scheduled_at).total_seconds())
+        with self._lock:
+            self._running[job] = started
+            metrics = self._job_metrics(name)
+            metrics['last_lag'] = lag
+            metrics['max_lag'] = max(metrics['max_lag'], lag)
+        if lag > self.LAG_WARNING:
+            print(f"[JOB RUNNER] {name} started {lag:.1f}s late")
+
+        failed = False
+        try:
+            ret = job.job_func()
+            job.last_run = datetime.datetime.now()
+            if ret is schedule.CancelJob or isinstance(ret, schedule.CancelJob):
+                self.scheduler.cancel_job(job)
+        except Exception as e:
+            failed = True
+            print(f"[JOB RUNNER] {name} failed: {e}")
+            traceback.print_exc()
+        finally:
+            duration = time.monotonic() - started
+            with self._lock:
+                self._running.pop(job, None)
+                self._timed_out.discard(job)
+                if group is not None:
+                    self._busy_groups.pop(group, None)
+                metrics = self._job_metrics(name)
+                metrics['runs'] += 1
+                if failed:
+                    metrics['failures'] += 1
+                metrics['last_duration'] = duration
+                metrics['max_duration'] = max(metrics['max_duration'], duration)
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        overdue = []
+        with self._lock:
+            for job, started in self._running.items():
+                if started is None or job in self._timed_out:
+                    continue
+                name = self.job_name(job)
+                timeout = self.timeouts.get(name, self.default_timeout)
+                if now - started > timeout:
+                    self._timed_out.add(job)
+                    self._job_metrics(name)['timeouts'] += 1
+                    overdue.append((name, now - started))
+        for name, elapsed in overdue:
+            print(f"[JOB RUNNER] {name} exceeded its timeout ({elapsed:.0f}s running)")
+
+    def run_forever(self, interval=1):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"[JOB RUNNER] Scheduler loop error: {e}")
+            time.sleep(interval)
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,245 @@
+"""
+Leaderboard Service - Materialized rankings kept in memory.
+Global EXP, season rank (Grado) and guild dungeon damage are held in sorted
+lists updated from the write paths (add_exp_by_id, the chat EXP flush,
+add_seasonal_exp, dungeon damage tracking). Boards are rebuilt from indexed
+queries at boot and resynced periodically, so ranking screens only load the
+handful of rows they display (by primary key) instead of scanning `utente`.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import func
+from database import Database
+from models.user import Utente
+from models.seasons import SeasonProgress
+from models.guild import Guild
+from models.guild_dungeon_stats import GuildDungeonStats
+
+
+class Leaderboard:
+    """
+    Members sorted by score, best first. Keys are (-score..., member_id) so ties
+    break by member id; lookups and rank_of are O(log n) bisections, inserts
+    and removals shift the list with a single memmove.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []     # sorted keys
+        self._members = {}  # member_id -> key
+
+    @staticmethod
+    def _key(member_id, score):
+        if not isinstance(score, tuple):
+            score = (score,)
+        return tuple(-value for value in score) + (member_id,)
+
+    @staticmethod
+    def _score(key):
+        score = tuple(-value for value in key[:-1])
+        return score[0] if len(score) == 1 else score
+
+    def _discard(self, member_id):
+        key = self._members.pop(member_id, None)
+        if key is not None:
+            del self._keys[bisect_left(self._keys, key)]
+        return key
+
+    def load(self, entries):
+        """Replace the whole board with (member_id, score) pairs"""
+        members = {member_id: self._key(member_id, score) for member_id, score in entries}
+        keys = sorted(members.values())
+        with self._lock:
+            self._members = members
+            self._keys = keys
+
+    def update(self, member_id, score):
+        """Set the absolute score of a member"""
+        key = self._key(member_id, score)
+        with self._lock:
+            if self._members.get(member_id) == key:
+                return
+            self._discard(member_id)
+            self._members[member_id] = key
+            insort(self._keys, key)
+
+    def increment(self, member_id, delta):
+        """Add delta to a single-value score (missing members start at 0)"""
+        with self._lock:
+            old = self._discard(member_id)
+            score = (self._score(old) if old is not None else 0) + delta
+            key = self._key(member_id, score)
+            self._members[member_id] = key
+            insort(self._keys, key)
+            return score
+
+    def remove(self, member_id):
+        with self._lock:
+            self._discard(member_id)
+
+    def top(self, limit):
+        """[(member_id, score)] for the best `limit` members"""
+        with self._lock:
+            keys = self._keys[:limit]
+        return [(key[-1], self._score(key)) for key in keys]
+
+    def rank_of(self, member_id):
+        """1-based position of a member, None if not ranked"""
+        with self._lock:
+            key = self._members.get(member_id)
+            if key is None:
+                return None
+            return bisect_left(self._keys, key) + 1
+
+    def score_of(self, member_id):
+        with self._lock:
+            key = self._members.get(member_id)
+        return self._score(key) if key is not None else None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class LeaderboardService:
+    """Owns the three boards; rows for display are fetched by primary key"""
+
+    RESYNC_INTERVAL = 3600  # seconds (scheduled in main.py)
+
+    def __init__(self):
+        self.db = Database()
+        self.global_exp = Leaderboard()     # user_id -> exp
+        self.season = Leaderboard()         # user_id -> (grado, exp inside the grado)
+        self.guild_damage = Leaderboard()   # guild_id -> total dungeon damage
+        self.season_id = None
+        self.loaded = False
+        self._rebuild_lock = threading.Lock()
+
+    # ---- Rebuild ----
+
+    def rebuild(self, season_id=None):
+        """Reload the boards from the DB (boot and periodic resync)"""
+        with self._rebuild_lock:
+            session = self.db.get_session()
+            try:
+                # Covered by ix_utente_exp: users with no EXP are not ranked
+                self.global_exp.load(
+                    session.query(Utente.id_telegram, Utente.exp).filter(Utente.exp > 0).all()
+                )
+                # Covered by ix_guild_dungeon_stats_guild
+                self.guild_damage.load(
+                    session.query(GuildDungeonStats.guild_id, func.sum(GuildDungeonStats.total_damage))
+                    .group_by(GuildDungeonStats.guild_id).all()
+                )
+                season_id = season_id if season_id is not None else self.season_id
+                if season_id is not None:
+                    self._load_season(session, season_id)
+                self.loaded = True
+            finally:
+                session.close()
+
+    def _load_season(self, session, season_id):
+        # Covered by ix_season_progress_ranking
+        rows = session.query(
+            SeasonProgress.user_id, SeasonProgress.current_level, SeasonProgress.current_exp
+        ).filter(SeasonProgress.season_id == season_id).all()
+        self.season.load((user_id, (level or 1, exp or 0)) for user_id, level, exp in rows)
+        self.season_id = season_id
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.rebuild()
+
+    def _ensure_season(self, season_id):
+        """Switch the season board when the active season changes"""
+        if self.season_id == season_id:
+            return
+        with self._rebuild_lock:
+            if self.season_id == season_id:
+                return
+            session = self.db.get_session()
+            try:
+                self._load_season(session, season_id)
+            finally:
+                session.close()
+
+    # ---- Write-path hooks ----
+
+    def record_exp(self, user_id, exp):
+        if not self.loaded:
+            return  # The boot rebuild reads the committed value
+        if exp and exp > 0:
+            self.global_exp.update(user_id, exp)
+        else:
+            self.global_exp.remove(user_id)
+
+    def record_season(self, season_id, user_id, level, exp):
+        if self.season_id != season_id:
+            return  # Loaded from the DB on first read of that season
+        self.season.update(user_id, (level or 1, exp or 0))
+
+    def record_guild_damage(self, guild_id, damage):
+        if not self.loaded or not damage:
+            return
+        self.guild_damage.increment(guild_id, damage)
+
+    def remove_user(self, user_id):
+        self.global_exp.remove(user_id)
+        self.season.remove(user_id)
+
+    def remove_guild(self, guild_id):
+        self.guild_damage.remove(guild_id)
+
+    # ---- Reads ----
+
+    def rank_of_user(self, user_id):
+        self._ensure_loaded()
+        return self.global_exp.rank_of(user_id)
+
+    def get_global_ranking(self, limit=15):
+        """Top users by EXP as detached Utente rows, best first"""
+        self._ensure_loaded()
+        user_ids = [user_id for user_id, _ in self.global_exp.top(limit)]
+        if not user_ids:
+            return []
+        session = self.db.get_session()
+        try:
+            users = session.query(Utente).filter(Utente.id_telegram.in_(user_ids)).all()
+            by_id = {user.id_telegram: user for user in users}
+            return [by_id[user_id] for user_id in user_ids if user_id in by_id]
+        finally:
+            session.close()
+
+    def get_season_top(self, season_id, limit=10):
+        """[(user_id, grado, exp)] for the given season, best first"""
+        self._ensure_season(season_id)
+        return [(user_id, level, exp) for user_id, (level, exp) in self.season.top(limit)]
+
+    def get_guild_top(self, limit=10):
+        """[(guild_id, guild_name, total_damage)], best first"""
+        self._ensure_loaded()
+        top = self.guild_damage.top(limit)
+        if not top:
+            return []
+        session = self.db.get_session()
+        try:
+            names = dict(session.query(Guild.id, Guild.name).filter(Guild.id.in_([gid for gid, _ in top])).all())
+        finally:
+            session.close()
+        for guild_id, _ in top:
+            if guild_id not in names:
+                self.guild_damage.remove(guild_id)  # Guild deleted since the last resync
+        return [(guild_id, names[guild_id], damage) for guild_id, damage in top if guild_id in names]
+
+
+_leaderboard_service = None
+_leaderboard_service_lock = threading.Lock()
+
+
+def get_leaderboards():
+    global _leaderboard_service
+    if _leaderboard_service is None:
+        with _leaderboard_service_lock:
+            if _leaderboard_service is None:
+                _leaderboard_service = LeaderboardService()
+    return _leaderboard_service
@@ -1,6 +1,74 @@
+from bisect import bisect_right
 from database import Database
 from models.user import Utente
 from services.event_dispatcher import EventDispatcher
+from services.leaderboard_service import get_leaderboards
+from utils.formula_ops import SCALAR_OPS
+
+# EXP curve: total EXP to reach a level = XP_CURVE_A * level ** XP_CURVE_P
+XP_CURVE_A = 10
+XP_CURVE_P = 2.5
+
+
+def xp_requirement(level, ops=SCALAR_OPS):
+    """Total cumulative EXP required to reach 'level' (numbers or arrays, see utils.formula_ops)"""
+    return ops.where(level <= 1, 0, ops.trunc(XP_CURVE_A * (ops.maximum(level, 1) ** XP_CURVE_P)))
+
+
+# Levels precomputed in the lookup table; higher levels fall back to the formula
+LEVEL_CURVE_CAP = 500
+
+
+class LevelCurve:
+    """
+    Cumulative EXP thresholds precomputed up to max_level (thresholds[level]).
+    Requirements are list lookups and level resolution is a bisect.
+    """
+
+    def __init__(self, requirement, max_level):
+        self.requirement_fn = requirement
+        self.max_level = max_level
+        self.thresholds = [requirement(level) for level in range(max_level + 1)]
+
+    @classmethod
+    def from_step_costs(cls, step_cost, max_level):
+        """Curve from the EXP needed to go from each level to the next one"""
+        totals = [0, 0]
+        for level in range(1, max_level):
+            totals.append(totals[-1] + step_cost(level))
+
+        def requirement(level):
+            if level <= max_level:
+                return totals[max(level, 0)]
+            return totals[max_level] + sum(step_cost(l) for l in range(max_level, level))
+
+        return cls(requirement, max_level)
+
+    def requirement(self, level):
+        """Total EXP needed to reach level"""
+        if 0 <= level <= self.max_level:
+            return self.thresholds[level]
+        return self.requirement_fn(level)
+
+    def level_for(self, exp_total):
+        """Highest level whose requirement is <= exp_total (at least 1)"""
+        level = max(1, bisect_right(self.thresholds, exp_total, 1) - 1)
+        if level == self.max_level:
+            # Past the table: keep walking on the formula
+            while exp_total >= self.requirement_fn(level + 1):
+                level += 1
+        return level
+
+
+_level_curve = None
+
+
+def get_level_curve():
+    global _level_curve
+    if _level_curve is None:
+        _level_curve = LevelCurve(xp_requirement, LEVEL_CURVE_CAP)
+    return _level_curve
+
 
 class LevelingService:
     def __init__(self):
@@ -14,13 +82,11 @@ class LevelingService:
         New Curve:
         Approximates a balanced grind up to level 100.
         """
-        if level <= 1:
-            return 0
+        return get_level_curve().requirement(level)
 
-        A = 10
-        p = 2.5
-
-        return int(A * (level ** p))
+    def get_level_for_exp(self, exp_total: int) -> int:
+        """Livello corrispondente a un'exp totale, secondo la curva attuale"""
+        return get_level_curve().level_for(exp_total)
 
     def add_chat_exp(self, user_id, amount):
         """Add chat EXP to user and return new total"""
@@ -53,15 +119,11 @@ class LevelingService:
             if utente.livello is None:
                 utente.livello = 1
             
-            # Check for level-up
-            next_exp_req = self.get_xp_requirement(utente.livello + 1)
-            
-            # Loop to handle multiple level-ups
-            loop_guard = 0
-            while next_exp_req is not None and utente.exp >= int(next_exp_req) and loop_guard < 500:
-                loop_guard += 1
-                # Level up!
-                utente.livello += 1
+            # Check for level-up (all levels gained at once)
+            target_level = self.get_level_for_exp(utente.exp)
+            if target_level > utente.livello:
+                levels_gained = target_level - utente.livello
+                utente.livello = target_level
                 
                 # Stat Points Logic: Always Level * 2
                 spent_points = (
@@ -86,7 +148,6 @@ class LevelingService:
                 # Recalculate stats via UserService
                 from services.user_service import UserService
                 user_service = UserService()
-                self.recalculate_level(user_id, session=session)
                 user_service.recalculate_stats(user_id, session=session)
                 
                 # Refresh user object to pick up updated max_health/max_mana
@@ -112,15 +173,13 @@ class LevelingService:
                     event_type='level_up',
                     user_id=user_id,
                     value=new_level,
-                    context={'exp': utente.exp},
+                    context={'exp': utente.exp, 'levels_gained': levels_gained},
                     session=session
                 )
-                
-                # Check for NEXT level
-                next_exp_req = self.get_xp_requirement(utente.livello + 1)
             
             # Get next level exp requirement for display
-            next_level_exp = next_exp_req
+            next_level_exp = self.get_xp_requirement(utente.livello + 1)
+            get_leaderboards().record_exp(user_id, utente.exp)
             
             if local_session:
                 session.commit()
@@ -140,7 +199,7 @@ class LevelingService:
 
     def check_level_up(self, user_id, session=None):
         """Force check for level up (helper method)"""
-        # We reuse add_exp_by_id with 0 exp to trigger the check loop
+        # We reuse add_exp_by_id with 0 exp to trigger the check
         return self.add_exp_by_id(user_id, 0, session=session)
 
     def recalculate_level(self, user_id, session=None):
@@ -156,17 +215,8 @@ class LevelingService:
             if not u or u.exp is None:
                 return
 
-            exp_total = int(u.exp)
-            livello = 1
-
             # Trova il livello corretto dalla nuova curva
-            while True:
-                next_req = self.get_xp_requirement(livello + 1)
-                if next_req is None or exp_total < next_req:
-                    break
-                livello += 1
-
-            u.livello = livello
+            u.livello = self.get_level_for_exp(int(u.exp))
 
             # Ricalcolo punti stat disponibili
             spent_points = (
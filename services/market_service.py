@@ -6,6 +6,49 @@ from services.event_dispatcher import EventDispatcher
 from services.user_service import UserService
 from services.item_service import ItemService
 from datetime import datetime, timedelta
+from sqlalchemy import text, update, or_, and_
+import threading
+import time
+
+# Active-listing total shown in the market pager: recounted at most every
+# COUNT_CACHE_TTL seconds and dropped whenever a listing changes state.
+COUNT_CACHE_TTL = 30  # seconds
+# Resource names -> ids (seeded at boot); a miss reloads at most this often
+RESOURCE_MAP_RELOAD = 60  # seconds
+
+_count_cache = None  # (expires_at, total)
+_resource_ids = {}
+_resource_ids_loaded_at = None
+_market_cache_lock = threading.Lock()
+
+
+def invalidate_listing_count():
+    global _count_cache
+    with _market_cache_lock:
+        _count_cache = None
+
+
+def invalidate_resource_map():
+    """Forget the resource name map (call after adding resources at runtime)."""
+    global _resource_ids, _resource_ids_loaded_at
+    with _market_cache_lock:
+        _resource_ids = {}
+        _resource_ids_loaded_at = None
+
+
+_CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(listing):
+    """Opaque keyset cursor for a listing: '<created_at µs>.<id>' (fits in callback data)"""
+    micros = (listing.created_at - _CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{listing.id}"
+
+
+def decode_cursor(cursor):
+    micros, listing_id = cursor.split(".")
+    return _CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(listing_id)
+
 
 class MarketService:
     def __init__(self):
@@ -30,8 +73,6 @@ class MarketService:
                 return False, f"Utente non trovato (ID: {user_id})"
 
             # Calculate quantity available (Check items first, then resources)
-            from sqlalchemy import text
-            
             # Check for regular items
             item_qty = session.query(Collezionabili).filter_by(
                 id_telegram=str(user_id), 
@@ -41,7 +82,7 @@ class MarketService:
             
             # Check for resources
             resource_qty = 0
-            resource_id = session.execute(text("SELECT id FROM resources WHERE name = :name"), {"name": item_name}).scalar()
+            resource_id = self.get_resource_id(item_name, session=session)
             if resource_id:
                 resource_qty = session.execute(text("""
                     SELECT quantity FROM user_resources 
@@ -82,6 +123,7 @@ class MarketService:
             )
             session.add(listing)
             session.commit()
+            invalidate_listing_count()
             
             # Log event
             self.event_dispatcher.log_event(
@@ -101,115 +143,284 @@ class MarketService:
     def buy_item(self, buyer_id, listing_id):
         """
         Buy an item from the market.
+        The listing is claimed with a single conditional UPDATE, so only one
+        concurrent buyer can win it; balances move with SQL deltas.
         """
-        session = self.db.get_session()
         try:
-            buyer = session.query(Utente).filter_by(id_telegram=buyer_id).first()
-            listing = session.query(MarketListing).filter_by(id=listing_id).first()
-            
-            if not listing or listing.status != 'active':
-                return False, "Annuncio non più disponibile."
-            
-            if listing.seller_id == buyer_id:
-                return False, "Non puoi acquistare i tuoi oggetti."
-            
-            # Check expiration
-            if listing.expires_at < datetime.now():
-                listing.status = 'expired'
-                session.commit()
-                return False, "Annuncio scaduto."
-            
-            total_price = listing.price_per_unit * listing.quantity
-            
-            if buyer.points < total_price:
-                return False, f"Non hai abbastanza 🍑 ({buyer.points}/{total_price})."
-            
-            # Transact
-            # 1. Deduct points from buyer
-            buyer.points -= total_price
-            
-            # 2. Add points to seller
-            seller = session.query(Utente).filter_by(id_telegram=listing.seller_id).first()
-            if seller:
-                seller.points += total_price
-                
-            # 3. Add to buyer (Check if it's a resource first)
-            from sqlalchemy import text
-            resource_id = session.execute(text("SELECT id FROM resources WHERE name = :name"), {"name": listing.item_name}).scalar()
-            
-            if resource_id:
-                from services.crafting_service import CraftingService
-                crafting_serv = CraftingService()
-                crafting_serv.add_resource_drop(buyer_id, resource_id, listing.quantity, source="market")
-            else:
-                self.item_service.add_item(buyer_id, listing.item_name, listing.quantity, session=session)
-            
-            # 4. Update listing
-            listing.status = 'sold'
-            listing.buyer_id = buyer_id
-            listing.sold_at = datetime.now()
-            
-            session.commit()
-            
+            success, message, sale = self._purchase(buyer_id, listing_id)
+        except Exception as e:
+            return False, f"Errore: {e}"
+
+        if sale:
             # Log Events
             # Buyer bought
             self.event_dispatcher.log_event(
                 event_type='ITEM_BOUGHT',
                 user_id=buyer_id,
-                value=total_price,
-                context={'item': listing.item_name, 'seller': listing.seller_id}
+                value=sale['total_price'],
+                context={'item': sale['item_name'], 'seller': sale['seller_id']}
             )
             
             # Seller sold
             self.event_dispatcher.log_event(
                 event_type='ITEM_SOLD',
-                user_id=listing.seller_id,
-                value=total_price,
-                context={'item': listing.item_name, 'buyer': buyer_id}
+                user_id=sale['seller_id'],
+                value=sale['total_price'],
+                context={'item': sale['item_name'], 'buyer': buyer_id}
             )
             
             # Quick Sale?
-            time_diff = (listing.sold_at - listing.created_at).total_seconds()
+            time_diff = (sale['sold_at'] - sale['created_at']).total_seconds()
             if time_diff <= 60:
                 self.event_dispatcher.log_event(
                     event_type='QUICK_SALE',
-                    user_id=listing.seller_id,
+                    user_id=sale['seller_id'],
                     value=time_diff,
-                    context={'listing_id': listing.id}
+                    context={'listing_id': listing_id}
                 )
+        return success, message
+
+    @Database.transaction_retry(max_retries=5, initial_delay=0.05)
+    def _purchase(self, buyer_id, listing_id):
+        """One purchase transaction: returns (success, message, sale info or None)."""
+        session = self.db.get_session()
+        try:
+            now = datetime.now()
             
-            return True, f"✅ Acquistato {listing.quantity}x {listing.item_name} per {total_price} 🍑!"
-        except Exception as e:
+            # 1. Claim the listing (row lock taken here, first)
+            claimed = session.execute(
+                update(MarketListing)
+                .where(
+                    MarketListing.id == listing_id,
+                    MarketListing.status == 'active',
+                    MarketListing.expires_at >= now,
+                    MarketListing.seller_id != buyer_id
+                )
+                .values(status='sold', buyer_id=buyer_id, sold_at=now)
+                .returning(MarketListing.seller_id, MarketListing.item_name, MarketListing.quantity,
+                           MarketListing.price_per_unit, MarketListing.created_at)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if not claimed:
+                session.rollback()
+                success, message = self._purchase_refused(session, buyer_id, listing_id, now)
+                return success, message, None
+
+            seller_id, item_name, quantity, price_per_unit, created_at = claimed
+            total_price = price_per_unit * quantity
+            
+            # 2. Move points with SQL deltas, locking users in ascending id order
+            for user_id in sorted({buyer_id, seller_id}):
+                if user_id == buyer_id:
+                    debited = session.execute(
+                        update(Utente)
+                        .where(Utente.id_telegram == buyer_id, Utente.points >= total_price)
+                        .values(points=Utente.points - total_price)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                    if not debited:
+                        session.rollback()
+                        points = session.query(Utente.points).filter_by(id_telegram=buyer_id).scalar()
+                        return False, f"Non hai abbastanza 🍑 ({points or 0}/{total_price}).", None
+                else:
+                    session.execute(
+                        update(Utente)
+                        .where(Utente.id_telegram == seller_id)
+                        .values(points=Utente.points + total_price)
+                        .execution_options(synchronize_session=False)
+                    )
+                
+            # 3. Add to buyer in the same transaction (Check if it's a resource first)
+            resource_id = self.get_resource_id(item_name, session=session)
+            if resource_id:
+                from services.crafting_service import CraftingService
+                crafting_serv = CraftingService()
+                crafting_serv.add_resource_drop(buyer_id, resource_id, quantity, source="market", session=session)
+            else:
+                self.item_service.add_item(buyer_id, item_name, quantity, session=session)
+            
+            session.commit()
+            invalidate_listing_count()
+            
+            sale = {
+                'seller_id': seller_id, 'item_name': item_name, 'total_price': total_price,
+                'created_at': created_at, 'sold_at': now,
+            }
+            return True, f"✅ Acquistato {quantity}x {item_name} per {total_price} 🍑!", sale
+        except Exception:
             session.rollback()
-            return False, f"Errore: {e}"
+            raise
         finally:
             session.close()
 
+    def _purchase_refused(self, session, buyer_id, listing_id, now):
+        """Why a listing could not be claimed (expired listings are closed here)."""
+        listing = session.query(MarketListing).filter_by(id=listing_id).first()
+        
+        if not listing or listing.status != 'active':
+            return False, "Annuncio non più disponibile."
+        
+        if listing.seller_id == buyer_id:
+            return False, "Non puoi acquistare i tuoi oggetti."
+        
+        # Expired: close it once and give the items back
+        expired = session.execute(
+            update(MarketListing)
+            .where(MarketListing.id == listing_id, MarketListing.status == 'active')
+            .values(status='expired')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if expired:
+            self._return_to_seller(session, listing.seller_id, listing.item_name, listing.quantity, source="market_expired")
+        session.commit()
+        invalidate_listing_count()
+        return False, "Annuncio scaduto."
+
+    def _active_filter(self, now=None):
+        return (MarketListing.status == 'active', MarketListing.expires_at > (now or datetime.now()))
+
+    def count_active_listings(self, session=None):
+        """Number of active listings (cached for COUNT_CACHE_TTL seconds)."""
+        global _count_cache
+        cached = _count_cache
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        local_session = False
+        if not session:
+            session = self.db.get_session()
+            local_session = True
+        try:
+            total = session.query(MarketListing).filter(*self._active_filter()).count()
+        finally:
+            if local_session:
+                session.close()
+        with _market_cache_lock:
+            _count_cache = (time.monotonic() + COUNT_CACHE_TTL, total)
+        return total
+
     def get_active_listings(self, page=1, limit=10):
         """
-        Get paginated active listings.
+        Get paginated active listings by page number.
+        Prefer get_listings_page: OFFSET still walks all the skipped rows.
         """
         session = self.db.get_session()
         from sqlalchemy.orm import joinedload
         try:
             offset = (page - 1) * limit
             listings = session.query(MarketListing).options(joinedload(MarketListing.seller)).filter(
-                MarketListing.status == 'active',
-                MarketListing.expires_at > datetime.now()
-            ).order_by(MarketListing.created_at.desc()).offset(offset).limit(limit).all()
-            
-            # Count for pagination
-            total = session.query(MarketListing).filter(
-                MarketListing.status == 'active',
-                MarketListing.expires_at > datetime.now()
-            ).count()
+                *self._active_filter()
+            ).order_by(MarketListing.created_at.desc(), MarketListing.id.desc()).offset(offset).limit(limit).all()
             
-            # Expunge to detach from session but keep data (optional, but safer is eager load which we did)
-             #session.expunge_all() 
-            return listings, total
+            return listings, self.count_active_listings(session=session)
         finally:
             session.close()
 
+    def get_listings_page(self, cursor=None, backwards=False, limit=10):
+        """
+        Keyset page of active listings, newest first, ordered by (created_at, id).
+        cursor is the encode_cursor() of the last row of the previous page (or of
+        the first row of the next page when backwards=True).
+        Returns (listings, total, next_cursor, prev_cursor); cursors are None at the ends.
+        """
+        session = self.db.get_session()
+        from sqlalchemy.orm import joinedload
+        try:
+            query = session.query(MarketListing).options(joinedload(MarketListing.seller)).filter(*self._active_filter())
+            if cursor:
+                created_at, listing_id = decode_cursor(cursor)
+                if backwards:
+                    query = query.filter(or_(
+                        MarketListing.created_at > created_at,
+                        and_(MarketListing.created_at == created_at, MarketListing.id > listing_id)
+                    )).order_by(MarketListing.created_at.asc(), MarketListing.id.asc())
+                else:
+                    query = query.filter(or_(
+                        MarketListing.created_at < created_at,
+                        and_(MarketListing.created_at == created_at, MarketListing.id < listing_id)
+                    ))
+            if not (cursor and backwards):
+                query = query.order_by(MarketListing.created_at.desc(), MarketListing.id.desc())
+
+            # One extra row tells whether there is another page in this direction
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            listings = rows[:limit]
+            if cursor and backwards:
+                listings.reverse()
+                has_next, has_prev = True, has_more
+            else:
+                has_next, has_prev = has_more, bool(cursor)
+
+            next_cursor = encode_cursor(listings[-1]) if listings and has_next else None
+            prev_cursor = encode_cursor(listings[0]) if listings and has_prev else None
+            return listings, self.count_active_listings(session=session), next_cursor, prev_cursor
+        finally:
+            session.close()
+
+    def expire_listings(self):
+        """
+        Background sweeper: move expired listings out of the active set and
+        give the items back to their sellers. Returns the number of listings expired.
+        """
+        session = self.db.get_session()
+        try:
+            now = datetime.now()
+            expired = session.execute(
+                update(MarketListing)
+                .where(MarketListing.status == 'active', MarketListing.expires_at <= now)
+                .values(status='expired')
+                .returning(MarketListing.seller_id, MarketListing.item_name, MarketListing.quantity)
+                .execution_options(synchronize_session=False)
+            ).all()
+            for seller_id, item_name, quantity in expired:
+                self._return_to_seller(session, seller_id, item_name, quantity, source="market_expired")
+            session.commit()
+            if expired:
+                invalidate_listing_count()
+            return len(expired)
+        except Exception as e:
+            session.rollback()
+            print(f"[MARKET] Error expiring listings: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def get_resource_id(self, name, session=None):
+        """Resource id for an item name (None for regular items), from a preloaded map."""
+        global _resource_ids, _resource_ids_loaded_at
+        resource_id = _resource_ids.get(name)
+        if resource_id is not None:
+            return resource_id
+
+        # Unknown name: reload the map, but not on every regular-item lookup
+        loaded_at = _resource_ids_loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < RESOURCE_MAP_RELOAD:
+            return None
+
+        local_session = False
+        if not session:
+            session = self.db.get_session()
+            local_session = True
+        try:
+            rows = session.execute(text("SELECT id, name FROM resources")).all()
+        finally:
+            if local_session:
+                session.close()
+        with _market_cache_lock:
+            _resource_ids = {row_name: row_id for row_id, row_name in rows}
+            _resource_ids_loaded_at = time.monotonic()
+        return _resource_ids.get(name)
+
+    def _return_to_seller(self, session, seller_id, item_name, quantity, source="market_cancel"):
+        resource_id = self.get_resource_id(item_name, session=session)
+        if resource_id:
+            from services.crafting_service import CraftingService
+            crafting_serv = CraftingService()
+            crafting_serv.add_resource_drop(seller_id, resource_id, quantity, source=source, session=session)
+        else:
+            self.item_service.add_item(seller_id, item_name, quantity, session=session)
+
     def cancel_listing(self, user_id, listing_id):
         """Cancel listing and return items."""
         session = self.db.get_session()
@@ -220,20 +431,11 @@ class MarketService:
             
             listing.status = 'cancelled'
             
-            # Return items - check if it's a resource first
-            from sqlalchemy import text
-            resource_id = session.execute(text("SELECT id FROM resources WHERE name = :name"), {"name": listing.item_name}).scalar()
-            
-            if resource_id:
-                # Return as resource
-                from services.crafting_service import CraftingService
-                crafting_serv = CraftingService()
-                crafting_serv.add_resource_drop(user_id, resource_id, listing.quantity, source="market_cancel", session=session)
-            else:
-                # Return as regular item
-                self.item_service.add_item(user_id, listing.item_name, listing.quantity, session=session)
+            # Return items (as resource or regular item)
+            self._return_to_seller(session, user_id, listing.item_name, listing.quantity)
             
             session.commit()
+            invalidate_listing_count()
             return True, "Annuncio cancellato e oggetti restituiti."
         except Exception as e:
             session.rollback()
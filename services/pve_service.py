@@ -9,7 +9,7 @@ from services.user_service import UserService
 from services.item_service import ItemService
 from services.event_dispatcher import EventDispatcher
 from services.damage_calculator import DamageCalculator
-from services.status_effects import StatusEffect
+from services.status_effects import StatusEffect, load_effects
 from services.targeting_service import TargetingService
 from services.parry_service import ParryService
 from datetime import datetime, timedelta
@@ -19,8 +19,9 @@ import os
 import json
 from settings import PointsName, GRUPPO_AROMA
 from services.equipment_service import EquipmentService
-from services.leveling_service import LevelingService
+from services.leveling_service import LevelingService, get_level_curve
 from services.season_content_service import get_season_content_service
+from services.leaderboard_service import get_leaderboards
 
 # Dynamic path resolution
 SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -309,7 +310,7 @@ class PvEService:
 
             # Check Cooldown (Shared with attack)
             user_speed = getattr(db_user, 'speed', 0) or 0
-            cooldown_seconds = 60 / (1 + user_speed * 0.05)
+            cooldown_seconds = DamageCalculator.attack_cooldown(user_speed)
             
             last_attack = getattr(db_user, 'last_attack_time', None)
             if _has_timestamp(last_attack):
@@ -583,9 +584,9 @@ class PvEService:
         #      return False, "I mob possono apparire solo nel gruppo ufficiale!", None
             
         # Get current season theme
-        from models.seasons import Season
-        current_season = session.query(Season).filter_by(is_active=True).first()
-        theme = current_season.theme.strip().lower() if current_season and current_season.theme else None
+        from services.season_gate import get_active_season_theme
+        current_theme = get_active_season_theme(session=session)
+        theme = current_theme.lower() if current_theme else None
         
         mob_data = None
         if mob_name:
@@ -751,10 +752,8 @@ class PvEService:
                 return False, f"C'è già un boss attivo: {existing.name}!", None
         
         # Get current season theme (if not provided)
-        theme = None
-        from models.seasons import Season
-        current_season = session.query(Season).filter_by(is_active=True).first()
-        theme = current_season.theme if current_season else None
+        from services.season_gate import get_active_season_theme
+        theme = get_active_season_theme(session=session)
         
         boss_data = None
         if boss_name:
@@ -924,7 +923,7 @@ class PvEService:
             
             # Calculate precise cooldown
             mob_speed = mob.speed if mob.speed else 30
-            cooldown_seconds = 60 / (1 + mob_speed * 0.05)
+            cooldown_seconds = DamageCalculator.attack_cooldown(mob_speed)
             
             next_attack_in = 0
             if mob.last_attack_time:
@@ -1059,7 +1058,7 @@ class PvEService:
         # Check Cooldown based on Speed
         # 1 point = 5% cooldown reduction
         user_speed = getattr(user, 'speed', 0) or 0
-        cooldown_seconds = 60 / (1 + user_speed * 0.05)
+        cooldown_seconds = DamageCalculator.attack_cooldown(user_speed)
         
         last_attack = getattr(user, 'last_attack_time', None)
         if _has_timestamp(last_attack):
@@ -1250,6 +1249,7 @@ class PvEService:
                      session.add(stat)
                  
                  stat.total_damage += actual_damage_dealt
+                 get_leaderboards().record_guild_damage(guild_member.guild_id, actual_damage_dealt)
 
         
         # NEW: Guild Dungeon Damage Tracking
@@ -1275,6 +1275,7 @@ class PvEService:
                      session.add(stat)
                  
                  stat.total_damage += actual_damage_dealt
+                 get_leaderboards().record_guild_damage(guild_member.guild_id, actual_damage_dealt)
         
         # Build message
         msg = ""
@@ -1575,7 +1576,7 @@ class PvEService:
             
         # Check Cooldown (2x normal)
         user_speed = getattr(user, 'speed', 0) or 0
-        cooldown_seconds = (60 / (1 + user_speed * 0.05)) * 2
+        cooldown_seconds = DamageCalculator.attack_cooldown(user_speed) * 2
         
         # Check meditation
         meditating_until = getattr(user, 'meditating_until', None)
@@ -1722,6 +1723,7 @@ class PvEService:
                         session.add(stat)
                     
                     stat.total_damage += actual_damage_dealt
+                    get_leaderboards().record_guild_damage(guild_member.guild_id, actual_damage_dealt)
 
             # Update participation
             self.update_participation(mob.id, user.id_telegram, actual_damage_dealt, combat_result['is_crit'], session=session)
@@ -1865,6 +1867,17 @@ class PvEService:
             attack_events = []
             # Random attack logic
 
+            # Several mobs in the chat: resolve all their targets in one batch
+            targets_by_mob = None
+            fallen_this_turn = set() # Users knocked out by an earlier mob of this batch
+            if len(mobs_to_process) > 1:
+                recent_users = self.user_service.get_recent_users(chat_id=chat_id, minutes=1440)
+                targets_by_mob = self.targeting_service.get_valid_targets_for_mobs(
+                    mobs_to_process,
+                    chat_id=chat_id,
+                    recent_users=recent_users,
+                    session=session
+                )
             
             for mob in mobs_to_process:
                 try:
@@ -1901,7 +1914,7 @@ class PvEService:
                     mob_speed = mob.speed if mob.speed else 30
                     if hasattr(mob_speed, 'return_value'): mob_speed = 30 # Mock handling
                     
-                    cooldown_seconds = 60 / (1 + mob_speed * 0.05)
+                    cooldown_seconds = DamageCalculator.attack_cooldown(mob_speed)
                     
                     last_attack = mob.last_attack_time
                     if last_attack and not hasattr(last_attack, 'return_value'): # Skip if Mock
@@ -1963,43 +1976,17 @@ class PvEService:
                         is_aoe = True
                     
                     # Get targets using TargetingService
-                    recent_users = self.user_service.get_recent_users(chat_id=chat_id, minutes=1440)
-                    targets_pool = self.targeting_service.get_valid_targets(
-                        mob=mob,
-                        chat_id=chat_id,
-                        recent_users=recent_users,
-                        session=session
-                    )
-                    
-                    
-                    # Filter targets: Exclude dead, fled, or resting users
-                    valid_targets = []
-                    for uid in targets_pool:
-                        user_obj = session.query(Utente).filter_by(id_telegram=uid).first()
-                        if not user_obj:
-                            continue
-                            
-                        # 1. Dead Check
-                        current_hp = _safe_int(getattr(user_obj, 'current_hp', None), _safe_int(getattr(user_obj, 'health', 1), 1))
-                        if current_hp <= 0:
-                            continue
-                            
-                        # 2. Resting Check (Inn)
-                        # We use 'is_resting' flag or location if available. 
-                        # Assuming 'is_resting' is a valid attribute or we check location
-                        # For now, let's use a safe getattr
-                        if _is_true_flag(getattr(user_obj, 'is_resting', False)):
-                            continue
-                            
-                        # 3. Fled Check
-                        participation = session.query(CombatParticipation).filter_by(mob_id=mob.id, user_id=uid).first()
-                        has_fled = _is_true_flag(getattr(participation, 'has_fled', False)) if participation is not None else False
-                        if has_fled:
-                            continue
-                            
-                        valid_targets.append(uid)
-                        
-                    targets_pool = valid_targets
+                    # (already excludes dead, resting and fled users)
+                    if targets_by_mob is not None:
+                        targets_pool = [uid for uid in targets_by_mob.get(mob.id, []) if uid not in fallen_this_turn]
+                    else:
+                        recent_users = self.user_service.get_recent_users(chat_id=chat_id, minutes=1440)
+                        targets_pool = self.targeting_service.get_valid_targets(
+                            mob=mob,
+                            chat_id=chat_id,
+                            recent_users=recent_users,
+                            session=session
+                        )
                     
                     if not targets_pool:
                         continue
@@ -2182,6 +2169,7 @@ class PvEService:
                             'parry': parry_result if parry_result.get('success') else None
                         })
                         if died:
+                            fallen_this_turn.add(target.id_telegram)
                             death_messages.append(f"💀 **{tag}** è caduto in battaglia!")
                             
                             # Check if dungeon failed (all players dead)
@@ -2363,10 +2351,9 @@ class PvEService:
             p_xp = int(TOTAL_POOL_XP * share * penalty_factor_xp * challenge_mult)
             
             # 3. Single-Fight Cap (Max 1.5 Levels worth of EXP)
-            from services.leveling_service import LevelingService
-            lvl_service = LevelingService()
-            req_current = lvl_service.get_xp_requirement(user_level)
-            req_next = lvl_service.get_xp_requirement(user_level + 1)
+            level_curve = get_level_curve()
+            req_current = level_curve.requirement(user_level)
+            req_next = level_curve.requirement(user_level + 1)
             level_pool = max(100, req_next - req_current)
             max_p_xp = int(level_pool * 1.5)
             
@@ -2384,19 +2371,13 @@ class PvEService:
             has_turbo = False
             
             if p_user_check:
-                # Parse active effects
-                if p_user_check.active_status_effects:
-                    try:
-                        effects = json.loads(p_user_check.active_status_effects)
-                        for effect in effects:
-                            eff_id = effect.get('effect') or effect.get('id')
-                            if eff_id == 'stunned':
-                                is_stunned = True
-                                stun_attacker_id = effect.get('source_id')
-                            elif eff_id == 'turbo':
-                                has_turbo = True
-                    except:
-                        pass
+                # Active effects (parsed once per stored value, expired turbo already pruned)
+                for effect in load_effects(p_user_check):
+                    if effect.key == 'stunned':
+                        is_stunned = True
+                        stun_attacker_id = effect.source_id
+                    elif effect.key == 'turbo':
+                        has_turbo = True
                 
                 self.user_service.check_daily_reset(p_user_check)
                 if (p_user_check.daily_wumpa_earned or 0) >= 300:
@@ -2506,7 +2487,7 @@ class PvEService:
             
             # Calculate precise cooldown
             mob_speed = mob.speed if mob.speed else 30
-            cooldown_seconds = 60 / (1 + mob_speed * 0.05)
+            cooldown_seconds = DamageCalculator.attack_cooldown(mob_speed)
             
             next_attack_in = 0
             if mob.last_attack_time:
@@ -0,0 +1,70 @@
+"""
+Regeneration Service - Set-based periodic stat regeneration (mana, HP, ...).
+Each tick is a single UPDATE (or a few primary-key range chunks on large
+tables) instead of loading every user into the ORM.
+"""
+
+import time
+from sqlalchemy import update, func, case
+from database import Database
+from models.user import Utente
+
+
+class RegenerationService:
+    # Above this many users the UPDATE is split into id ranges so each
+    # transaction (and the row locks it holds) stays small.
+    CHUNK_SIZE = 5000
+
+    def __init__(self):
+        self.db = Database()
+
+    def regenerate(self, value_column, max_column, amount, *criteria, chunk_size=None, label=None):
+        """
+        value_column = min(value_column + amount, max_column) for every user below max.
+        Extra SQL criteria restrict the affected users.
+        Returns {'rows': int, 'duration_ms': float}.
+        """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        label = label or value_column.key
+        start = time.perf_counter()
+        rows = 0
+
+        # CASE instead of LEAST(): portable across PostgreSQL and SQLite
+        new_value = case(
+            (value_column + amount > max_column, max_column),
+            else_=value_column + amount
+        )
+        base_criteria = (value_column < max_column,) + criteria
+
+        session = self.db.get_session()
+        try:
+            min_id, max_id = session.query(func.min(Utente.id), func.max(Utente.id)).one()
+            if min_id is None:
+                return {'rows': 0, 'duration_ms': 0.0}
+
+            if max_id - min_id < chunk_size:
+                ranges = [(min_id, max_id)]
+            else:
+                ranges = [(lo, lo + chunk_size - 1) for lo in range(min_id, max_id + 1, chunk_size)]
+
+            for lo, hi in ranges:
+                stmt = (
+                    update(Utente)
+                    .where(Utente.id.between(lo, hi), *base_criteria)
+                    .values({value_column.key: new_value})
+                    .execution_options(synchronize_session=False)
+                )
+                rows += session.execute(stmt).rowcount or 0
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"[REGEN ERROR] {label}: {e}")
+        finally:
+            session.close()
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        return {'rows': rows, 'duration_ms': duration_ms}
+
+    def regenerate_mana(self, amount=10, chunk_size=None):
+        """Hourly mana regeneration for all users (+amount capped at max_mana)"""
+        return self.regenerate(Utente.mana, Utente.max_mana, amount, chunk_size=chunk_size, label='mana')
@@ -4,7 +4,8 @@ from settings import PointsName
 from services.status_effects import StatusEffect
 from models.user import Utente
 from utils.bot_utils import get_mention_markdown, escape_markdown
-from services.leveling_service import LevelingService
+from services.leveling_service import LevelingService, xp_requirement
+from utils.formula_ops import SCALAR_OPS
 from services.season_content_service import get_season_content_service
 
 class RewardService:
@@ -98,25 +99,11 @@ class RewardService:
                 mob_hp = float(mob_hp)
             except Exception:
                 mob_hp = 100.0
-            difficulty_multiplier = difficulty ** 1.8
-            
-            # Gentle HP bonus, max 3x
-            hp_scaling = min(3.0, (mob_hp / 1000) ** 0.35) if mob_hp > 1000 else 1.0
-            
-            base_xp_pool = int((mob_level * 5) * hp_scaling * difficulty_multiplier)
-            
-            # Base Wumpa pool proportional to health and difficulty
-            fixed_wumpa_pool = int(mob_hp * 0.05 * difficulty)
-            if fixed_wumpa_pool < 10: fixed_wumpa_pool = 10
+            base_xp_pool, fixed_wumpa_pool = self.mob_base_pools(mob_level, mob_hp, difficulty)
         
         # Add a small random variation (+/- 10%)
         variation = random.uniform(0.9, 1.1)
-        base_xp_pool = int(base_xp_pool * variation)
-        if base_xp_pool < 10: base_xp_pool = 10
-        
-        if fixed_wumpa_pool:
-            fixed_wumpa_pool = int(fixed_wumpa_pool * variation)
-            if fixed_wumpa_pool < 1: fixed_wumpa_pool = 1
+        base_xp_pool, fixed_wumpa_pool = self.apply_pool_variation(base_xp_pool, fixed_wumpa_pool, variation)
 
         # Batch fetch levels to apply leecher protection
         user_ids = [p.user_id for p in participants]
@@ -125,45 +112,13 @@ class RewardService:
         session.close()
 
         rewards = []
-        lvl_service = LevelingService()
-
         for p in participants:
             dmg = (getattr(p, 'damage_dealt', 0) or 0)
             share = dmg / total_damage
             user_level = user_levels.get(p.user_id, 1) or 1
             
-            # 1. Challenge Multiplier (Leecher Protection)
-            challenge_mult = min(1.0, (user_level + 10) / (mob_level + 10))
-            
-            # 2. XP Penalty for high levels (existing logic moved here)
-            overlevel_penalty = 1.0
-            if user_level > mob_level + 10:
-                overlevel_penalty = 0.5
-
-            # Wumpa (Points) calculation
-            if fixed_wumpa_pool:
-                wumpa = int(fixed_wumpa_pool * share)
-            else:
-                wumpa = int(dmg * 0.05 * difficulty)
-            
-            if user_level > mob_level + 10:
-                wumpa = int(wumpa * 0.25)
-            if wumpa < 1: wumpa = 1
-
-            # XP calculation with all factors
-            base_xp = int(base_xp_pool * share)
-            xp = int(base_xp * challenge_mult * overlevel_penalty)
-            
-            # 3. Single-Fight Cap (Max 1.5 Levels worth of EXP)
-            req_current = lvl_service.get_xp_requirement(user_level)
-            req_next = lvl_service.get_xp_requirement(user_level + 1)
-            level_pool = max(100, req_next - req_current)
-            max_xp_gain = int(level_pool * 1.5)
-            
-            if xp > max_xp_gain:
-                xp = max_xp_gain
-                
-            if xp < 1: xp = 1
+            xp, wumpa = self.participant_reward(share, dmg, user_level, mob_level, difficulty,
+                                                base_xp_pool, fixed_wumpa_pool)
             
             rewards.append({
                 'user_id': p.user_id,
@@ -176,6 +131,65 @@ class RewardService:
             
         return rewards
 
+    # Pure reward formulas: plain numbers in the bot, NumPy arrays in simulation/
+    # (pass ops=NumpyOps, see utils.formula_ops).
+
+    @staticmethod
+    def mob_base_pools(mob_level, mob_hp, difficulty, ops=SCALAR_OPS):
+        """(EXP pool, Wumpa pool) of a regular mob, before the random variation"""
+        # Rebalanced EXP Formula (2026-03-04)
+        # Cap HP scaling to prevent exponential blowouts for endgame mobs
+        difficulty_multiplier = difficulty ** 1.8
+        
+        # Gentle HP bonus, max 3x
+        hp_scaling = ops.where(mob_hp > 1000, ops.minimum(3.0, (ops.maximum(mob_hp, 1000) / 1000) ** 0.35), 1.0)
+        
+        base_xp_pool = ops.trunc((mob_level * 5) * hp_scaling * difficulty_multiplier)
+        
+        # Base Wumpa pool proportional to health and difficulty
+        fixed_wumpa_pool = ops.maximum(ops.trunc(mob_hp * 0.05 * difficulty), 10)
+        return base_xp_pool, fixed_wumpa_pool
+
+    @staticmethod
+    def apply_pool_variation(base_xp_pool, fixed_wumpa_pool, variation, ops=SCALAR_OPS):
+        """Scale both pools by the same random variation (min 10 EXP, min 1 Wumpa when there is a pool)"""
+        base_xp_pool = ops.maximum(ops.trunc(base_xp_pool * variation), 10)
+        fixed_wumpa_pool = ops.where(fixed_wumpa_pool != 0,
+                                     ops.maximum(ops.trunc(fixed_wumpa_pool * variation), 1), 0)
+        return base_xp_pool, fixed_wumpa_pool
+
+    @staticmethod
+    def participant_reward(share, damage, user_level, mob_level, difficulty, base_xp_pool, fixed_wumpa_pool,
+                           ops=SCALAR_OPS):
+        """(EXP, Wumpa) for a participant that dealt `share` of the total damage"""
+        # 1. Challenge Multiplier (Leecher Protection)
+        challenge_mult = ops.minimum(1.0, (user_level + 10) / (mob_level + 10))
+        
+        # 2. XP Penalty for high levels
+        overleveled = user_level > mob_level + 10
+        overlevel_penalty = ops.where(overleveled, 0.5, 1.0)
+
+        # Wumpa (Points) calculation
+        wumpa = ops.where(fixed_wumpa_pool != 0,
+                          ops.trunc(fixed_wumpa_pool * share),
+                          ops.trunc(damage * 0.05 * difficulty))
+        wumpa = ops.where(overleveled, ops.trunc(wumpa * 0.25), wumpa)
+        wumpa = ops.maximum(wumpa, 1)
+
+        # XP calculation with all factors
+        base_xp = ops.trunc(base_xp_pool * share)
+        xp = ops.trunc(base_xp * challenge_mult * overlevel_penalty)
+        
+        # 3. Single-Fight Cap (Max 1.5 Levels worth of EXP)
+        req_current = xp_requirement(user_level, ops)
+        req_next = xp_requirement(user_level + 1, ops)
+        level_pool = ops.maximum(100, req_next - req_current)
+        max_xp_gain = ops.trunc(level_pool * 1.5)
+        
+        xp = ops.minimum(xp, max_xp_gain)
+        xp = ops.maximum(xp, 1)
+        return xp, wumpa
+
     def distribute_rewards(self, rewards_data, mob, session):
         """
         Apply rewards to users and generate a summary report.
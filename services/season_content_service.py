@@ -5,7 +5,7 @@ Provides scalable file activation for seasonal content packs.
 
 import json
 import os
-from services.season_gate import get_active_season_theme
+from services.season_gate import get_active_season_theme, invalidate_season_cache
 
 
 SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,13 +26,19 @@ class SeasonContentService:
             return self._manifest_cache
         with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
             self._manifest_cache = json.load(f)
+        if self._manifest_mtime is not None:
+            # Manifest edited at runtime: re-resolve the active season too
+            invalidate_season_cache()
         self._manifest_mtime = mtime
         return self._manifest_cache
 
     def get_active_pack_key(self, session=None):
+        return self._pack_key_for_theme(get_active_season_theme(session=session))
+
+    def _pack_key_for_theme(self, theme):
         manifest = self._load_manifest()
         packs = manifest.get("packs", {})
-        active_theme = (get_active_season_theme(session=session) or "").strip().lower()
+        active_theme = (theme or "").strip().lower()
         for pack_key, pack_cfg in packs.items():
             match_theme = (
                 pack_cfg.get("match", {}).get("theme", "")
@@ -45,7 +51,7 @@ class SeasonContentService:
 
     def get_runtime_signature(self, session=None):
         theme = get_active_season_theme(session=session) or ""
-        pack = self.get_active_pack_key(session=session) or "base"
+        pack = self._pack_key_for_theme(theme) or "base"
         return f"{theme.strip().lower()}::{pack}"
 
     def get_files(self, content_type, session=None):
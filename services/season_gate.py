@@ -2,40 +2,98 @@
 Season gate helpers for theme-based content availability.
 """
 
+import threading
+import time
+from sqlalchemy import event
 from database import Database
 from models.seasons import Season
 from datetime import datetime
 
+# The active season changes a few times a year, but its theme is read on
+# every attack/message through the content signature. Keep a short-lived
+# snapshot so steady-state lookups never hit the database.
+SEASON_CACHE_TTL = 60  # seconds
 
-def get_active_season_theme(session=None):
-    """Return active season theme (string) or None."""
+_season_cache = None  # {'id', 'name', 'theme', 'expires_at'}
+_season_cache_generation = 0
+_season_cache_lock = threading.Lock()
+
+
+def invalidate_season_cache():
+    """Drop the cached active season (call after starting/ending a season)."""
+    global _season_cache, _season_cache_generation
+    with _season_cache_lock:
+        _season_cache = None
+        _season_cache_generation += 1
+
+
+def invalidate_season_cache_on_commit(session):
+    """
+    For a season ended on a session the caller commits: invalidating before
+    the commit lets a concurrent snapshot re-cache the still-active season.
+    """
+    event.listen(session, 'after_commit', lambda committed: invalidate_season_cache(), once=True)
+
+
+def _query_active_season(session):
+    now = datetime.now()
+    # Primary: active season in date window
+    season = session.query(Season).filter(
+        Season.is_active == True,
+        Season.start_date <= now,
+        Season.end_date >= now
+    ).order_by(Season.id.desc()).first()
+    # Fallback: any is_active season even if dates are misconfigured
+    if not season:
+        season = session.query(Season).filter(
+            Season.is_active == True
+        ).order_by(Season.id.desc()).first()
+    return season
+
+
+def get_active_season_snapshot(session=None):
+    """
+    Return the cached {'id', 'name', 'theme'} of the active season.
+    'id' is None when no season is active. Refreshed at most every SEASON_CACHE_TTL seconds.
+    """
+    global _season_cache
+    cached = _season_cache
+    if cached is not None and cached['expires_at'] > time.monotonic():
+        return cached
+
+    generation = _season_cache_generation
     local_session = False
     if session is None:
         session = Database().get_session()
         local_session = True
 
     try:
-        now = datetime.now()
-        # Primary: active season in date window
-        season = session.query(Season).filter(
-            Season.is_active == True,
-            Season.start_date <= now,
-            Season.end_date >= now
-        ).order_by(Season.id.desc()).first()
-        # Fallback: any is_active season even if dates are misconfigured
-        if not season:
-            season = session.query(Season).filter(
-                Season.is_active == True
-            ).order_by(Season.id.desc()).first()
-        if not season or not season.theme:
-            return None
-        return season.theme.strip()
+        season = _query_active_season(session)
+        theme = season.theme.strip() if season and season.theme else None
+        snapshot = {
+            'id': season.id if season else None,
+            'name': season.name if season else None,
+            'theme': theme or None,
+            'expires_at': time.monotonic() + SEASON_CACHE_TTL,
+        }
     except Exception:
-        return None
+        # Don't cache failures: retry on the next call
+        return {'id': None, 'name': None, 'theme': None, 'expires_at': 0.0}
     finally:
         if local_session:
             session.close()
 
+    with _season_cache_lock:
+        # An invalidation raced with this query: serve the result but don't cache it
+        if generation == _season_cache_generation:
+            _season_cache = snapshot
+    return snapshot
+
+
+def get_active_season_theme(session=None):
+    """Return active season theme (string) or None."""
+    return get_active_season_snapshot(session=session)['theme']
+
 
 def is_theme_active(theme_name, session=None):
     """Case-insensitive check against active season theme."""
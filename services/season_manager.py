@@ -1,10 +1,33 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 from database import Database
 from models.seasons import Season, SeasonProgress, SeasonReward, SeasonClaimedReward
 from models.user import Utente
 from services.user_service import UserService
-from services.character_service import CharacterService
+from services.character_service import (
+    CharacterService, invalidate_character_ownership, invalidate_character_ownership_on_commit,
+)
+from services.season_gate import (
+    get_active_season_snapshot, invalidate_season_cache, invalidate_season_cache_on_commit,
+)
+from services.leveling_service import LevelCurve
+from services.leaderboard_service import get_leaderboards
+
+
+def season_rank_exp(rank):
+    """EXP needed to go from rank to rank + 1. Dynamic EXP Curve: 100 * (current_rank ** 2)"""
+    return 100 * (rank ** 2)
+
+
+_season_rank_curve = None
+
+
+def get_season_rank_curve(max_rank):
+    """Cumulative seasonal EXP per rank, precomputed up to max_rank"""
+    global _season_rank_curve
+    if _season_rank_curve is None or _season_rank_curve.max_level != max_rank:
+        _season_rank_curve = LevelCurve.from_step_costs(season_rank_exp, max_rank)
+    return _season_rank_curve
 
 class SeasonManager:
     """Manages seasonal progression and rewards"""
@@ -24,17 +47,16 @@ class SeasonManager:
             local_session = True
             
         try:
-            now = datetime.now()
-            season = session.query(Season).filter(
-                Season.is_active == True,
-                Season.start_date <= now,
-                Season.end_date >= now
-            ).order_by(Season.id.desc()).first()
-            # Fallback: keep season usable if date bounds are stale but flag is active
-            if not season:
-                season = session.query(Season).filter(
-                    Season.is_active == True
-                ).order_by(Season.id.desc()).first()
+            # Resolved through the shared season cache; only a PK lookup hits the DB
+            season_id = get_active_season_snapshot(session=session)['id']
+            if season_id is None:
+                return None
+            season = session.get(Season, season_id)
+            if not season or not season.is_active:
+                # Ended elsewhere since the snapshot was taken
+                invalidate_season_cache()
+                season_id = get_active_season_snapshot(session=session)['id']
+                season = session.get(Season, season_id) if season_id is not None else None
             return season
         finally:
             if local_session:
@@ -122,22 +144,18 @@ class SeasonManager:
             progress.current_exp += amount
             progress.last_update = datetime.now()
             
-            # Check for level up
+            # Check for level up: current_exp is the progress inside the current rank,
+            # so resolve the new rank from the cumulative total in one lookup
             leveled_up = False
-            
-            # Dynamic EXP Curve: 100 * (current_rank ** 2)
-            def get_exp_required(rank):
-                return 100 * (rank ** 2)
-                
-            next_rank_exp = get_exp_required(progress.current_level)
-            
-            while progress.current_level < self.MAX_RANK and progress.current_exp >= next_rank_exp:
-                progress.current_exp -= next_rank_exp
-                progress.current_level += 1
-                leveled_up = True
-                print(f"User {user_id} reached seasonal Grado {progress.current_level}")
-                # Update requirement for next loop
-                next_rank_exp = get_exp_required(progress.current_level)
+            if progress.current_level < self.MAX_RANK:
+                curve = get_season_rank_curve(self.MAX_RANK)
+                total_exp = curve.requirement(progress.current_level) + progress.current_exp
+                new_rank = min(curve.level_for(total_exp), self.MAX_RANK)
+                if new_rank > progress.current_level:
+                    progress.current_level = new_rank
+                    progress.current_exp = total_exp - curve.requirement(new_rank)
+                    leveled_up = True
+                    print(f"User {user_id} reached seasonal Grado {progress.current_level}")
             
             # If at max rank, cap EXP
             if progress.current_level >= self.MAX_RANK:
@@ -155,8 +173,13 @@ class SeasonManager:
             
             if local_session:
                 session.commit()
+                if season_end_msg:
+                    invalidate_season_cache()
             else:
                 session.flush()
+                if season_end_msg:
+                    invalidate_season_cache_on_commit(session)
+            get_leaderboards().record_season(season.id, user_id, progress.current_level, progress.current_exp)
                 
             return rewards, season_end_msg
         except Exception as e:
@@ -220,6 +243,7 @@ class SeasonManager:
                 
             if close_session:
                 session.commit()
+                invalidate_season_cache()
             else:
                 # If sharing session, we might want to flush or commit here to ensure it saves?
                 # Or let caller handle it. But caller (add_seasonal_exp) commits BEFORE calling this currently.
@@ -322,11 +346,15 @@ class SeasonManager:
                     new_ownership = UserCharacter(
                         user_id=user_id,
                         character_id=char_id,
-                        obtained_at=datetime.date.today()
+                        obtained_at=datetime.now().date()
                     )
                     session.add(new_ownership)
                     if close_session:
                         session.commit()
+                        invalidate_character_ownership(user_id)
+                    else:
+                        # Shared session: the unlock is visible only once the caller commits
+                        invalidate_character_ownership_on_commit(session, user_id)
                     print(f"Character {char_id} unlocked for user {user_id}")
         except Exception as e:
             if close_session:
@@ -420,7 +448,7 @@ class SeasonManager:
                 'end_date': season.end_date,
                 'progress': progress_data,
                 'next_rewards': next_rewards,
-                'exp_per_level': 100 * (progress_data['level'] ** 2) # Dynamic requirement for current rank
+                'exp_per_level': season_rank_exp(progress_data['level']) # Dynamic requirement for current rank
             }
         finally:
             session.close()
@@ -434,31 +462,36 @@ class SeasonManager:
             session.close()
 
     def get_season_ranking(self, limit=10):
-        """Get top ranking users for current active season"""
+        """Get top ranking users for current active season (from the season leaderboard)"""
         season = self.get_active_season()
         if not season:
             return None, "Nessuna stagione attiva."
-            
+
+        top = get_leaderboards().get_season_top(season.id, limit)
+        if not top:
+            return [], season.name
+
         session = self.db.get_session()
         try:
-            # Join with Utente to get names
-            top_users = session.query(SeasonProgress, Utente).join(Utente, SeasonProgress.user_id == Utente.id_telegram)\
-                .filter(SeasonProgress.season_id == season.id)\
-                .order_by(SeasonProgress.current_level.desc(), SeasonProgress.current_exp.desc())\
-                .limit(limit).all()
-                
+            # Names for the displayed rows only (lookup by id_Telegram)
+            users = session.query(Utente).filter(Utente.id_telegram.in_([user_id for user_id, _, _ in top])).all()
+            users = {user.id_telegram: user for user in users}
+
             results = []
-            for progress, user in top_users:
+            for user_id, level, exp in top:
+                user = users.get(user_id)
+                if not user:
+                    continue
                 results.append({
                     'username': user.username,
                     'nome': user.nome, # Fallback
                     'game_name': user.game_name, # Preferred
-                    'level': progress.current_level, # Season Rank
-                    'exp': progress.current_exp,
+                    'level': level, # Season Rank
+                    'exp': exp,
                     'user_level': user.livello # Global User Level
                 })
-                
+
             return results, season.name
-            
+
         finally:
             session.close()
@@ -0,0 +1,44 @@
+"""
+Process-wide service registry.
+Hands out one shared, lazily built instance per service class so that hot
+paths (chat messages, callbacks, scheduler jobs) stop rebuilding the whole
+service graph (CSV loads, season queries, sub-services) on every call.
+"""
+
+import threading
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def get_service(service_cls):
+    """
+    Return the shared instance of service_cls, creating it on first use.
+    Thread-safe: concurrent first callers build the instance only once.
+    """
+    instance = _instances.get(service_cls)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        instance = _instances.get(service_cls)
+        if instance is None:
+            instance = service_cls()
+            _instances[service_cls] = instance
+    return instance
+
+
+def register_service(service_cls, instance):
+    """Install an already built instance (e.g. a mock in tests)."""
+    with _lock:
+        _instances[service_cls] = instance
+    return instance
+
+
+def reset_services(service_cls=None):
+    """Drop one shared instance, or all of them when no class is given."""
+    with _lock:
+        if service_cls is None:
+            _instances.clear()
+        else:
+            _instances.pop(service_cls, None)
@@ -4,21 +4,39 @@ import csv
 import os
 from services.season_content_service import get_season_content_service
 
+class AbilityIndex:
+    """Immutable per-load lookup tables (by ability id, by character id)."""
+    __slots__ = ('signature', 'abilities', 'by_id', 'by_character')
+
+    def __init__(self, signature, abilities):
+        self.signature = signature
+        self.abilities = abilities
+        self.by_id = {a['id']: a for a in abilities}
+        by_character = {}
+        for ability in abilities:
+            by_character.setdefault(ability['character_id'], []).append(ability)
+        self.by_character = {k: tuple(v) for k, v in by_character.items()}
+
+
 class SkillService:
     """Service for managing character skills/abilities"""
     
     def __init__(self):
         self.db = Database()
-        self.abilities_cache = None
-        self._last_content_signature = None
+        self._index = None
+
+    def _get_index(self):
+        """Current index, rebuilt first if the active content pack changed."""
+        self.load_abilities_from_csv()
+        return self._index
     
     def load_abilities_from_csv(self):
         """Load abilities from CSV file"""
         content_service = get_season_content_service()
         content_signature = content_service.get_runtime_signature()
-        if self.abilities_cache is not None and self._last_content_signature == content_signature:
-            return self.abilities_cache
-        self._last_content_signature = content_signature
+        index = self._index
+        if index is not None and index.signature == content_signature:
+            return index.abilities
             
         abilities = []
         try:
@@ -49,13 +67,13 @@ class SkillService:
         except Exception as e:
             print(f"Error loading abilities: {e}")
         
-        self.abilities_cache = abilities
+        # Single reference swap: readers see either the old or the new index
+        self._index = AbilityIndex(content_signature, abilities)
         return abilities
     
     def get_character_abilities(self, character_id):
         """Get all abilities for a character from CSV"""
-        abilities = self.load_abilities_from_csv()
-        return [a for a in abilities if a['character_id'] == character_id]
+        return list(self._get_index().by_character.get(character_id, ()))
     
     def get_character_abilities_from_db(self, character_id):
         """Get abilities from database"""
@@ -66,11 +84,7 @@ class SkillService:
     
     def get_ability_by_id(self, ability_id):
         """Get specific ability by ID from CSV"""
-        abilities = self.load_abilities_from_csv()
-        for ability in abilities:
-            if ability['id'] == ability_id:
-                return ability
-        return None
+        return self._get_index().by_id.get(ability_id)
     
     def sync_abilities_to_db(self):
         """Sync CSV abilities to database"""
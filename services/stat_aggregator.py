@@ -1,7 +1,6 @@
-from database import Database
+from database import Database, get_upsert_insert
 from models.stats import UserStat
 from models.achievements import GameEvent
-from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import text
 import json
 from datetime import datetime, timedelta
@@ -12,24 +11,31 @@ class StatAggregator:
     This avoids UniqueViolation errors in high-concurrency scenarios.
     """
     
+    # Rows per multi-row UPSERT statement.
+    # SQLite caps bound parameters (999 on old builds): 4 columns per row.
+    FLUSH_CHUNK_SIZE = 500
+    SQLITE_FLUSH_CHUNK_SIZE = 240
+
     def __init__(self):
         self.db = Database()
-        self._batch_cache = {} # Stores (user_id, stat_key) -> {'op': 'inc'|'set', 'value': val}
         
     def process_events(self, events, session=None):
         """
         Process a batch of events and aggregate stats in memory, then flush to DB.
+        Returns {user_id: set(stat_keys)} of the stats touched by the batch.
+        The aggregates are local to the call: the instance is shared by jobs
+        that can process batches at the same time.
         """
         if not events:
-            return
+            return {}
             
         local_session = False
         if not session:
             session = self.db.get_session()
             local_session = True
             
-        # Reset local cache for this batch
-        self._batch_cache = {}
+        # (user_id, stat_key) -> {'op': 'inc'|'set', 'value': val} for this batch
+        batch_cache = {}
         
         try:
             # 1. Filter out users that don't exist in 'utente' table
@@ -47,71 +53,74 @@ class StatAggregator:
                 # Re-attach event to current session if needed
                 if event not in session:
                     event = session.merge(event)
-                self._process_single_event(session, event)
+                self._process_single_event(session, event, batch_cache)
                 event.processed = True
             
+            touched = {}
+            for user_id, stat_key in batch_cache:
+                touched.setdefault(user_id, set()).add(stat_key)
+
             # 2. Flush aggregated stats to DB using UPSERT
-            self._flush_stats(session)
+            self._flush_stats(session, batch_cache)
             
             if local_session:
                 session.commit()
             else:
                 session.flush()
+            return touched
         except Exception as e:
             print(f"[ERROR] Stat Aggregation failed: {e}")
             if local_session:
                 session.rollback()
             raise e
         finally:
-            self._batch_cache = {}
             if local_session:
                 session.close()
 
-    def _flush_stats(self, session):
+    def _flush_stats(self, session, batch_cache):
         """
         Execute batch UPSERTs for all aggregated stats.
+        One multi-row statement per op type ('inc' / 'set'), chunked.
         """
-        if not self._batch_cache:
+        if not batch_cache:
             return
 
-        # Prepare data for bulk execution
+        insert = get_upsert_insert(session)
+        if session.get_bind().dialect.name == 'sqlite':
+            chunk_size = self.SQLITE_FLUSH_CHUNK_SIZE
+        else:
+            chunk_size = self.FLUSH_CHUNK_SIZE
+
         # We need separate logic for 'inc' (increment) and 'set' (overwrite)
-        
-        for (user_id, stat_key), data in self._batch_cache.items():
-            op = data['op']
-            value = data['value']
-            now = datetime.now()
-            
-            stmt = insert(UserStat).values(
-                user_id=user_id,
-                stat_key=stat_key,
-                value=value,
-                last_updated=now
-            )
-            
-            if op == 'inc':
-                # ON CONFLICT DO UPDATE SET value = user_stat.value + :value
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=['user_id', 'stat_key'],
-                    set_={
-                        'value': UserStat.value + stmt.excluded.value,
-                        'last_updated': now
-                    }
-                )
-            elif op == 'set':
-                # ON CONFLICT DO UPDATE SET value = :value
+        now = datetime.now()
+        rows_by_op = {'inc': [], 'set': []}
+        for (user_id, stat_key), data in batch_cache.items():
+            rows_by_op[data['op']].append({
+                'user_id': user_id,
+                'stat_key': stat_key,
+                'value': data['value'],
+                'last_updated': now
+            })
+
+        for op, rows in rows_by_op.items():
+            for i in range(0, len(rows), chunk_size):
+                stmt = insert(UserStat).values(rows[i:i + chunk_size])
+                if op == 'inc':
+                    # ON CONFLICT DO UPDATE SET value = user_stat.value + excluded.value
+                    new_value = UserStat.value + stmt.excluded.value
+                else:
+                    # ON CONFLICT DO UPDATE SET value = excluded.value
+                    new_value = stmt.excluded.value
                 stmt = stmt.on_conflict_do_update(
                     index_elements=['user_id', 'stat_key'],
                     set_={
-                        'value': stmt.excluded.value, # Overwrite
+                        'value': new_value,
                         'last_updated': now
                     }
                 )
-            
-            # Execute the statement
-            session.execute(stmt)
+                session.execute(stmt)
 
-    def _process_single_event(self, session, event):
+    def _process_single_event(self, session, event, batch_cache):
         """
         Update stats based on a single event.
         """
@@ -121,150 +130,150 @@ class StatAggregator:
         context = json.loads(event.context) if event.context else {}
         
         # 1. Update Base Stat (Direct Mapping)
-        self._increment_stat(user_id, event_type, value if value > 0 else 1)
+        self._increment_stat(batch_cache, user_id, event_type, value if value > 0 else 1)
         
         # 2. Derived Stats Logic
         if event_type == 'mob_kill':
-            self._increment_stat(user_id, 'total_kills', 1)
+            self._increment_stat(batch_cache, user_id, 'total_kills', 1)
             
             # Specific Mob Kills
             mob_name = context.get('mob_name')
             if mob_name:
                 stat_key = f"kill_{mob_name.lower().replace(' ', '_')}"
-                self._increment_stat(user_id, stat_key, 1)
+                self._increment_stat(batch_cache, user_id, stat_key, 1)
                 
                 # Android Kills Group
                 if mob_name in ['C17', 'C18', 'C19', 'C20']:
-                    self._increment_stat(user_id, 'android_kills', 1)
+                    self._increment_stat(batch_cache, user_id, 'android_kills', 1)
 
             # High Level Kills
             mob_level = context.get('mob_level', 0)
             player_level = context.get('player_level', 1000)
             if mob_level >= player_level + 10:
-                self._increment_stat(user_id, 'high_level_kills', 1)
+                self._increment_stat(batch_cache, user_id, 'high_level_kills', 1)
                 
             # Boss Kills
             if context.get('is_boss'):
-                self._increment_stat(user_id, 'boss_kills', 1)
+                self._increment_stat(batch_cache, user_id, 'boss_kills', 1)
                 
         elif event_type == 'damage_dealt':
-            self._increment_stat(user_id, 'total_damage', value)
+            self._increment_stat(batch_cache, user_id, 'total_damage', value)
             
             # One Shot
             if context.get('is_one_shot'):
-                self._increment_stat(user_id, 'one_shots', 1)
+                self._increment_stat(batch_cache, user_id, 'one_shots', 1)
                 
             # Critical Hits
             if context.get('is_crit'):
-                self._increment_stat(user_id, 'critical_hits', 1)
+                self._increment_stat(batch_cache, user_id, 'critical_hits', 1)
                 
         elif event_type == 'heal_given':
-            self._increment_stat(user_id, 'total_heals', value)
+            self._increment_stat(batch_cache, user_id, 'total_heals', value)
             
         elif event_type == 'damage_taken':
-            self._increment_stat(user_id, 'total_damage_taken', value)
+            self._increment_stat(batch_cache, user_id, 'total_damage_taken', value)
             if context.get('mitigated', 0) > 0:
-                self._increment_stat(user_id, 'total_mitigated', context['mitigated'])
+                self._increment_stat(batch_cache, user_id, 'total_mitigated', context['mitigated'])
                 
         elif event_type == 'dungeon_run':
-            self._increment_stat(user_id, 'dungeons_completed', 1)
+            self._increment_stat(batch_cache, user_id, 'dungeons_completed', 1)
             if context.get('damage_rank') == 1:
-                self._increment_stat(user_id, 'dungeon_mvp_damage', 1)
+                self._increment_stat(batch_cache, user_id, 'dungeon_mvp_damage', 1)
                 
         elif event_type == 'chat_exp':
-            self._increment_stat(user_id, 'total_chat_exp', value)
+            self._increment_stat(batch_cache, user_id, 'total_chat_exp', value)
             
         elif event_type == 'point_gain':
-            self._increment_stat(user_id, 'total_wumpa_earned', value)
+            self._increment_stat(batch_cache, user_id, 'total_wumpa_earned', value)
 
         elif event_type == 'level_up':
-            self._set_stat(user_id, 'level', value)
+            self._set_stat(batch_cache, user_id, 'level', value)
 
         elif event_type == 'item_gain':
             item_name = context.get('item_name', '')
             if "Sfera del Drago" in item_name:
-                self._increment_stat(user_id, 'dragon_balls_collected', value)
+                self._increment_stat(batch_cache, user_id, 'dragon_balls_collected', value)
         
         elif event_type == 'shenron_summoned':
-            self._increment_stat(user_id, 'shenron_summons', 1)
+            self._increment_stat(batch_cache, user_id, 'shenron_summons', 1)
             
         elif event_type == 'porunga_summoned':
-            self._increment_stat(user_id, 'porunga_summons', 1)
+            self._increment_stat(batch_cache, user_id, 'porunga_summons', 1)
 
         elif event_type == 'character_unlock':
             char_name = context.get('char_name')
             if char_name:
                 stat_key = f"unlock_{char_name.lower().replace(' ', '_')}"
-                self._increment_stat(user_id, stat_key, 1)
-                self._increment_stat(user_id, 'total_characters_unlocked', 1)
+                self._increment_stat(batch_cache, user_id, stat_key, 1)
+                self._increment_stat(batch_cache, user_id, 'total_characters_unlocked', 1)
 
         elif event_type == 'character_equip':
             char_name = context.get('char_name')
             if char_name:
                 stat_key = f"use_{char_name.lower().replace(' ', '_')}"
-                self._increment_stat(user_id, stat_key, 1)
+                self._increment_stat(batch_cache, user_id, stat_key, 1)
 
         # --- MARKET EVENTS ---
         elif event_type == 'ITEM_LISTED':
-            self._increment_stat(user_id, 'items_listed', 1)
+            self._increment_stat(batch_cache, user_id, 'items_listed', 1)
             
         elif event_type == 'ITEM_SOLD':
-            self._increment_stat(user_id, 'items_sold', 1)
+            self._increment_stat(batch_cache, user_id, 'items_sold', 1)
             
         elif event_type == 'ITEM_BOUGHT':
-            self._increment_stat(user_id, 'items_bought', 1)
-            self._increment_stat(user_id, 'total_spent_market', value)
+            self._increment_stat(batch_cache, user_id, 'items_bought', 1)
+            self._increment_stat(batch_cache, user_id, 'total_spent_market', value)
             
         elif event_type == 'MARKET_VIEWED':
-            self._increment_stat(user_id, 'market_views', 1)
+            self._increment_stat(batch_cache, user_id, 'market_views', 1)
             
         elif event_type == 'QUICK_SALE':
-            self._increment_stat(user_id, 'quick_sales', 1)
+            self._increment_stat(batch_cache, user_id, 'quick_sales', 1)
 
         # --- CRAFTING EVENTS ---
         elif event_type == 'RESOURCE_DROP':
-            self._increment_stat(user_id, 'resources_collected', value if value > 0 else 1)
+            self._increment_stat(batch_cache, user_id, 'resources_collected', value if value > 0 else 1)
             
         elif event_type == 'CRAFTING_COMPLETE':
-            self._increment_stat(user_id, 'items_crafted', 1)
+            self._increment_stat(batch_cache, user_id, 'items_crafted', 1)
             
         elif event_type == 'PROFESSION_LEVELUP':
-            self._set_stat(user_id, 'profession_level', value)
+            self._set_stat(batch_cache, user_id, 'profession_level', value)
 
         # --- PROFESSION EVENTS (Garden & Alchemy) ---
         elif event_type == 'garden_plant':
-            self._increment_stat(user_id, 'garden_plants_planted', value)
+            self._increment_stat(batch_cache, user_id, 'garden_plants_planted', value)
             
         elif event_type == 'garden_harvest':
-            self._increment_stat(user_id, 'garden_plants_harvested', value)
+            self._increment_stat(batch_cache, user_id, 'garden_plants_harvested', value)
             
         elif event_type == 'alchemy_brew':
-            self._increment_stat(user_id, 'potions_brewed', value)
+            self._increment_stat(batch_cache, user_id, 'potions_brewed', value)
             
         elif event_type == 'herb_discovery':
             herb_name = context.get('herb_name')
             if herb_name:
                 stat_key = f"discovery_{herb_name.lower().replace(' ', '_')}"
-                self._increment_stat(user_id, stat_key, 1)
+                self._increment_stat(batch_cache, user_id, stat_key, 1)
 
-    def _increment_stat(self, user_id, stat_key, amount):
+    def _increment_stat(self, batch_cache, user_id, stat_key, amount):
         """
         Queue a stat increment in local batch cache.
         """
         key = (user_id, stat_key)
         
-        if key in self._batch_cache:
+        if key in batch_cache:
             # Update existing entry
-            entry = self._batch_cache[key]
+            entry = batch_cache[key]
             entry['value'] += amount
             # Note: if op was 'set', it stays 'set' but value increases relative to setting
         else:
             # Create new entry
-            self._batch_cache[key] = {'op': 'inc', 'value': amount}
+            batch_cache[key] = {'op': 'inc', 'value': amount}
 
-    def _set_stat(self, user_id, stat_key, value):
+    def _set_stat(self, batch_cache, user_id, stat_key, value):
         """
         Queue a stat overwrite in local batch cache.
         """
         key = (user_id, stat_key)
-        self._batch_cache[key] = {'op': 'set', 'value': value}
+        batch_cache[key] = {'op': 'set', 'value': value}
@@ -1,9 +1,152 @@
 """
 Status Effects System - Handles all status effects (burn, poison, stun, confusion, etc.)
+Effects are stored as a JSON list (Utente.active_status_effects, Mob.active_buffs);
+they are parsed once per distinct column value into ActiveEffect tuples shared by
+every reader, pruned of timed effects once their earliest expiry passes, and
+serialised again only when an effect is written.
 """
 
 import random
 import json
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+EFFECT_CACHE_SIZE = 4096
+
+# Keys with their own ActiveEffect field; anything else is kept in `extra`
+_EFFECT_FIELDS = ('duration', 'stacks', 'source_level', 'source_id', 'value')
+
+
+@dataclass(frozen=True, slots=True)
+class ActiveEffect:
+    """
+    One stored effect. Combat effects have effect/duration(turns)/stacks;
+    timed buffs have effect or id, an expiry (unix time) and their values.
+    Frozen: parsed effects are shared, updates go through dataclasses.replace.
+    """
+    effect: str = None        # combat effects and timed buffs
+    id: str = None            # entries keyed by 'id' (turbo, relax limits, stunned)
+    duration: int = None      # turns left
+    stacks: int = None
+    source_level: int = None
+    source_id: int = None
+    value: float = None
+    expires_at: float = None  # unix time; legacy ISO 'expires' is converted
+    extra: dict = field(default_factory=dict)  # name, source, value_res, ...
+
+    @property
+    def key(self):
+        return self.effect or self.id
+
+    def expired(self, now_ts):
+        return self.expires_at is not None and self.expires_at <= now_ts
+
+    def get(self, name, default=None):
+        """Field or extra value by stored key (value_res, name, ...)"""
+        if name in _EFFECT_FIELDS or name in ('effect', 'id', 'expires_at'):
+            value = getattr(self, name)
+        else:
+            value = self.extra.get(name)
+        return default if value is None else value
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {k: v for k, v in data.items() if k not in _EFFECT_FIELDS and k not in ('effect', 'id', 'expires_at')}
+        expires_at = data.get('expires_at')
+        if expires_at is None and extra.get('expires'):
+            try:
+                expires_at = datetime.fromisoformat(extra.pop('expires')).timestamp()
+            except (TypeError, ValueError):
+                pass
+        return cls(effect=data.get('effect'), id=data.get('id'), expires_at=expires_at, extra=extra,
+                   **{name: data.get(name) for name in _EFFECT_FIELDS})
+
+    def to_dict(self):
+        data = {}
+        if self.effect is not None:
+            data['effect'] = self.effect
+        if self.id is not None:
+            data['id'] = self.id
+        for name in _EFFECT_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.expires_at is not None:
+            data['expires_at'] = self.expires_at
+        data.update(self.extra)
+        return data
+
+
+_parsed_effects = {}  # serialised value -> [effects, next expiry, effects parsed]
+_parsed_effects_lock = threading.Lock()
+
+
+def _next_expiry(effects):
+    return min((e.expires_at for e in effects if e.expires_at is not None), default=None)
+
+
+def _cache(raw, effects):
+    entry = [effects, _next_expiry(effects), len(effects)]
+    with _parsed_effects_lock:
+        if len(_parsed_effects) >= EFFECT_CACHE_SIZE:
+            _parsed_effects.clear()
+        _parsed_effects[raw] = entry
+    return entry
+
+
+def _entry(raw, now_ts):
+    entry = _parsed_effects.get(raw)
+    if entry is None:
+        try:
+            data = json.loads(raw)
+        except Exception:
+            data = []
+        if not isinstance(data, list):
+            data = []
+        entry = _cache(raw, tuple(ActiveEffect.from_dict(d) for d in data if isinstance(d, dict)))
+    if entry[1] is not None and entry[1] <= now_ts:
+        # Pruned once per expiry crossing, not on every read
+        effects = tuple(e for e in entry[0] if not e.expired(now_ts))
+        entry[0], entry[1] = effects, _next_expiry(effects)
+    return entry
+
+
+def parse_effects(raw, now_ts=None):
+    """Active effects of a stored JSON value (cached by value, expired timed effects dropped)"""
+    if not raw or not isinstance(raw, (str, bytes, bytearray)):
+        return ()
+    return _entry(raw, now_ts if now_ts is not None else datetime.now().timestamp())[0]
+
+
+def serialize_effects(effects, now_ts=None):
+    now_ts = now_ts if now_ts is not None else datetime.now().timestamp()
+    effects = tuple(e for e in effects if not e.expired(now_ts))
+    raw = json.dumps([e.to_dict() for e in effects])
+    _cache(raw, effects)
+    return raw
+
+
+def load_effects(target, attr='active_status_effects', now_ts=None):
+    """Active effects of a user/mob (or any object carrying the column value)"""
+    return parse_effects(getattr(target, attr, None), now_ts)
+
+
+def save_effects(target, effects, attr='active_status_effects', now_ts=None):
+    """Write effects back to the entity (the only place they are serialised)"""
+    setattr(target, attr, serialize_effects(effects, now_ts))
+
+
+def purge_expired_effects(raw, now_ts=None):
+    """New serialised value without the expired timed effects, None if nothing expired"""
+    if not raw or not isinstance(raw, str):
+        return None
+    now_ts = now_ts if now_ts is not None else datetime.now().timestamp()
+    effects, _, parsed = _entry(raw, now_ts)
+    if len(effects) == parsed:
+        return None
+    return serialize_effects(effects, now_ts)
+
 
 class StatusEffect:
     """Status effect handler"""
@@ -99,6 +242,13 @@ class StatusEffect:
         }
     }
     
+    @staticmethod
+    def _effects(target):
+        raw = getattr(target, 'active_status_effects', None)
+        if isinstance(raw, list):
+            return tuple(ActiveEffect.from_dict(d) for d in raw if isinstance(d, dict))
+        return load_effects(target)
+
     @staticmethod
     def apply_status(target, effect_name, duration=None, source_level=1, source_id=None):
         """
@@ -118,36 +268,34 @@ class StatusEffect:
             return False
         
         effect_config = StatusEffect.EFFECTS[effect_name]
-        
-        # Load existing effects
-        effects = json.loads(getattr(target, 'active_status_effects', None) or '[]')
+        effects = list(StatusEffect._effects(target))
         
         # Check if stackable
-        existing = next((e for e in effects if e.get('effect') == effect_name or e.get('id') == effect_name), None)
+        index = next((i for i, e in enumerate(effects) if effect_name in (e.effect, e.id)), None)
         
-        if existing:
+        if index is not None:
+            existing = effects[index]
             if effect_config.get('stackable', False):
                 max_stacks = effect_config.get('max_stacks', 999)
-                if existing['stacks'] < max_stacks:
-                    existing['stacks'] += 1
-                    existing['duration'] = duration or effect_config['duration']
+                stacks = existing.stacks or 1
+                if stacks < max_stacks:
+                    effects[index] = replace(existing, stacks=stacks + 1,
+                                             duration=duration or effect_config['duration'])
             else:
-                # Refresh duration
-                existing['duration'] = duration or effect_config['duration']
-                # Update source if new application overwrites
-                if source_id:
-                     existing['source_id'] = source_id
+                # Refresh duration, update source if new application overwrites
+                effects[index] = replace(existing, duration=duration or effect_config['duration'],
+                                         source_id=source_id or existing.source_id)
         else:
             # Add new effect
-            effects.append({
-                'effect': effect_name,
-                'duration': duration or effect_config['duration'],
-                'stacks': 1,
-                'source_level': source_level,
-                'source_id': source_id
-            })
+            effects.append(ActiveEffect(
+                effect=effect_name,
+                duration=duration or effect_config['duration'],
+                stacks=1,
+                source_level=source_level,
+                source_id=source_id
+            ))
         
-        target.active_status_effects = json.dumps(effects)
+        save_effects(target, effects)
         return True
     
     @staticmethod
@@ -161,7 +309,8 @@ class StatusEffect:
         Returns:
             Dictionary with messages, damage, skip_turn, attack_allies flags
         """
-        effects = json.loads(getattr(target, 'active_status_effects', None) or '[]')
+        effects = StatusEffect._effects(target)
+        target_name = getattr(target, 'nome', getattr(target, 'name', 'Target'))
         messages = []
         total_damage = 0
         skip_turn = False
@@ -172,35 +321,30 @@ class StatusEffect:
         remaining_effects = []
         
         for effect_data in effects:
-            effect_name = effect_data.get('effect') or effect_data.get('id')
+            effect_name = effect_data.key
             effect_config = StatusEffect.EFFECTS.get(effect_name)
             
             if not effect_config:
+                # Timed buffs (potions, guild facilities) share the list but have no turns
+                remaining_effects.append(effect_data)
                 continue
             
             # Process damage over time
             if 'damage_per_turn' in effect_config:
-                dmg = effect_config['damage_per_turn'](effect_data['source_level'])
-                dmg *= effect_data['stacks']
+                dmg = effect_config['damage_per_turn'](effect_data.source_level or 1)
+                dmg *= effect_data.stacks or 1
                 total_damage += dmg
-                messages.append(effect_config['message'].format(
-                    target=getattr(target, 'nome', getattr(target, 'name', 'Target')),
-                    damage=dmg
-                ))
+                messages.append(effect_config['message'].format(target=target_name, damage=dmg))
             
             # Process turn skip
             if effect_config.get('skip_turn'):
                 skip_turn = True
-                messages.append(effect_config['message'].format(
-                    target=getattr(target, 'nome', getattr(target, 'name', 'Target'))
-                ))
+                messages.append(effect_config['message'].format(target=target_name))
             
             # Process mind control
             if effect_config.get('attack_allies'):
                 attack_allies = True
-                messages.append(effect_config['message'].format(
-                    target=getattr(target, 'nome', getattr(target, 'name', 'Target'))
-                ))
+                messages.append(effect_config['message'].format(target=target_name))
             
             # Process speed reduction
             if 'speed_reduction' in effect_config:
@@ -211,22 +355,22 @@ class StatusEffect:
                 damage_modifier *= (1 - effect_config['damage_reduction'] / 100)
             
             # Decrease duration
-            effect_data['duration'] -= 1
+            duration = (effect_data.duration or 0) - 1
             
             # Check if effect persists
-            if effect_data['duration'] > 0:
+            if duration > 0:
                 # Check break chance (for freeze, etc.)
                 break_chance = effect_config.get('break_chance', 0)
                 if break_chance and random.randint(1, 100) <= break_chance:
-                    messages.append(f"✨ {getattr(target, 'nome', getattr(target, 'name', 'Target'))} si libera da {effect_name}!")
+                    messages.append(f"✨ {target_name} si libera da {effect_name}!")
                 else:
-                    remaining_effects.append(effect_data)
+                    remaining_effects.append(replace(effect_data, duration=duration))
             else:
                 # Effect expired
-                messages.append(f"⏰ L'effetto {effect_name} su {getattr(target, 'nome', getattr(target, 'name', 'Target'))} è terminato")
+                messages.append(f"⏰ L'effetto {effect_name} su {target_name} è terminato")
         
         # Update target
-        target.active_status_effects = json.dumps(remaining_effects)
+        save_effects(target, remaining_effects)
         
         # Apply damage
         if total_damage > 0:
@@ -246,59 +390,49 @@ class StatusEffect:
     
     @staticmethod
     def get_active_effects(target):
-        """Get list of active effects on target"""
+        """Get list of active effects on target (as dicts)"""
         raw = getattr(target, 'active_status_effects', None)
-        if raw is None:
-            return []
         if isinstance(raw, list):
             return raw
-        if not isinstance(raw, (str, bytes, bytearray)):
-            return []
-        try:
-            effects = json.loads(raw or '[]')
-            return effects if isinstance(effects, list) else []
-        except Exception:
-            return []
+        return [e.to_dict() for e in load_effects(target)]
     
     @staticmethod
     def has_effect(target, effect_name):
         """Check if target has specific effect"""
-        effects = StatusEffect.get_active_effects(target)
-        return any(e.get('effect') == effect_name or e.get('id') == effect_name for e in effects)
+        return any(effect_name in (e.effect, e.id) for e in StatusEffect._effects(target))
     
     @staticmethod
     def remove_effect(target, effect_name):
         """Remove specific effect from target"""
-        effects = StatusEffect.get_active_effects(target)
-        effects = [e for e in effects if e.get('effect') != effect_name and e.get('id') != effect_name]
-        target.active_status_effects = json.dumps(effects)
+        effects = [e for e in StatusEffect._effects(target) if effect_name not in (e.effect, e.id)]
+        save_effects(target, effects)
         return True
     
     @staticmethod
     def clear_all_effects(target):
         """Remove all effects from target"""
-        target.active_status_effects = json.dumps([])
+        save_effects(target, ())
         return True
     
     @staticmethod
     def format_effects_display(target):
         """Format active effects for display"""
-        effects = StatusEffect.get_active_effects(target)
+        effects = StatusEffect._effects(target)
         
         if not effects:
             return "Nessun effetto attivo"
         
         display_parts = []
         for effect_data in effects:
-            effect_name = effect_data.get('effect') or effect_data.get('id')
+            effect_name = effect_data.key
             effect_config = StatusEffect.EFFECTS.get(effect_name)
             
             if not effect_config:
                 continue
             
             icon = effect_config.get('icon', '•')
-            stacks = effect_data.get('stacks', 1)
-            duration = effect_data.get('duration', 0)
+            stacks = effect_data.stacks or 1
+            duration = effect_data.duration or 0
             
             if stacks > 1:
                 display_parts.append(f"{icon} {effect_name} x{stacks} ({duration} turni)")
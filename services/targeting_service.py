@@ -4,6 +4,7 @@ from models.pve import Mob
 from models.combat import CombatParticipation
 from models.dungeon import DungeonParticipant
 from services.user_service import UserService
+from services.damage_calculator import DamageCalculator
 from datetime import datetime, timedelta
 
 
@@ -37,6 +38,22 @@ class TargetingService:
         Returns:
             list: User IDs that can be targeted
         """
+        targets_by_mob = self.get_valid_targets_for_mobs(
+            [mob], chat_id=chat_id, recent_users=recent_users, session=session
+        )
+        return targets_by_mob.get(mob.id, [])
+
+    def get_valid_targets_for_mobs(self, mobs, chat_id=None, recent_users=None, session=None):
+        """
+        Resolve valid targets for several mobs at once.
+        
+        Uses a constant number of queries regardless of how many mobs and
+        candidates are involved (participants, users, fled flags), applying
+        the same rules as _is_valid_target.
+        
+        Returns:
+            dict: {mob_id: [user_id, ...]}
+        """
         local_session = False
         if not session:
             session = self.db.get_session()
@@ -44,37 +61,66 @@ class TargetingService:
         
         try:
             # Get recent users from THIS chat (48h window)
-            if recent_users is None:
+            if recent_users is None and any(not m.dungeon_id for m in mobs):
                 recent_users = self.user_service.get_recent_users(chat_id=chat_id, minutes=2880) # 48 hours
+            chat_candidates = set(recent_users) if recent_users else set()
             
             # Determine candidates based on mob type
-            if mob.dungeon_id:
-                # STRICT: Dungeon mobs only target dungeon participants
+            # STRICT: Dungeon mobs only target dungeon participants
+            dungeon_ids = {m.dungeon_id for m in mobs if m.dungeon_id}
+            participants_by_dungeon = {d_id: set() for d_id in dungeon_ids}
+            if dungeon_ids:
                 try:
-                    participants = session.query(DungeonParticipant).filter_by(dungeon_id=mob.dungeon_id).all()
-                    all_candidates = set(p.user_id for p in participants)
-                    # print(f"[DEBUG] Targeting: Dungeon mob {mob.id} restricted to {len(all_candidates)} participants")
-                except Exception as e:
-                    pass # print(f"[DEBUG] Error fetching dungeon participants for targeting: {e}")
-                    all_candidates = set()
-            else:
-                # Candidates are ONLY those active in the current chat
-                all_candidates = set(recent_users) if recent_users else set()
-                # print(f"[DEBUG] Targeting: chat_id={chat_id}, candidates_in_chat={len(all_candidates)}")
-
-
-
+                    rows = session.query(DungeonParticipant.dungeon_id, DungeonParticipant.user_id).filter(
+                        DungeonParticipant.dungeon_id.in_(dungeon_ids)
+                    ).all()
+                    for d_id, uid in rows:
+                        participants_by_dungeon[d_id].add(uid)
+                except Exception:
+                    pass
             
-            # Filter users based on eligibility
-            valid_targets = []
+            candidates_by_mob = {}
+            for mob in mobs:
+                if mob.dungeon_id:
+                    candidates_by_mob[mob.id] = participants_by_dungeon.get(mob.dungeon_id, set())
+                else:
+                    # Candidates are ONLY those active in the current chat
+                    candidates_by_mob[mob.id] = chat_candidates
             
-            for uid in list(all_candidates):
-                is_valid = self._is_valid_target(uid, mob, session)
-                if is_valid:
-                    valid_targets.append(uid)
-            # print(f"[DEBUG] Targeting: Final valid targets: {valid_targets}")
-
-            return valid_targets
+            all_candidates = set().union(*candidates_by_mob.values()) if candidates_by_mob else set()
+            if not all_candidates:
+                return {mob.id: [] for mob in mobs}
+            
+            # Eligible users: known, active in the last 6 months, not resting, alive
+            users = session.query(
+                Utente.id_telegram, Utente.last_activity, Utente.resting_since,
+                Utente.current_hp, Utente.health
+            ).filter(Utente.id_telegram.in_(all_candidates)).all()
+            
+            six_months_ago = datetime.now() - timedelta(days=180)
+            eligible = set()
+            for uid, last_activity, resting_since, current_hp, health in users:
+                if last_activity and last_activity < six_months_ago:
+                    continue
+                if resting_since:
+                    continue
+                hp = current_hp if current_hp is not None else (health or 0)
+                if hp <= 0:
+                    continue
+                eligible.add(uid)
+            
+            # Users who fled from these mobs
+            fled = set(session.query(CombatParticipation.mob_id, CombatParticipation.user_id).filter(
+                CombatParticipation.mob_id.in_([m.id for m in mobs]),
+                CombatParticipation.user_id.in_(eligible),
+                CombatParticipation.has_fled == True
+            ).all()) if eligible else set()
+            
+            return {
+                mob.id: [uid for uid in list(candidates_by_mob[mob.id])
+                         if uid in eligible and (mob.id, uid) not in fled]
+                for mob in mobs
+            }
             
         finally:
             if local_session:
@@ -139,7 +185,7 @@ class TargetingService:
         
         # Check cooldown (1 point = 5% CD reduction)
         user_speed = getattr(user, 'speed', 0) or 0
-        cooldown_seconds = 60 / (1 + user_speed * 0.05)
+        cooldown_seconds = DamageCalculator.attack_cooldown(user_speed)
         
         last_attack = getattr(user, 'last_attack_time', None)
         if last_attack:
@@ -164,7 +210,7 @@ class TargetingService:
         """
         # Check cooldown (shared with attack, 1 point = 5% CD reduction)
         user_speed = getattr(user, 'speed', 0) or 0
-        cooldown_seconds = 60 / (1 + user_speed * 0.05)
+        cooldown_seconds = DamageCalculator.attack_cooldown(user_speed)
         
         last_attack = getattr(user, 'last_attack_time', None)
         if last_attack:
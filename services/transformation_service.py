@@ -2,10 +2,33 @@ from database import Database
 from models.system import CharacterTransformation, UserTransformation, Livello
 from models.user import Utente
 from datetime import datetime, timedelta
+from services.character_loader import is_night_only_name
+
+# Night-only forms (Great Ape) are allowed between 18:00 and 06:00
+NIGHT_START_HOUR = 18
+NIGHT_END_HOUR = 6
+
+
+def is_night(now=None):
+    hour = (now or datetime.now()).hour
+    return hour >= NIGHT_START_HOUR or hour < NIGHT_END_HOUR
+
+
+def next_sunrise(now=None):
+    """When a night-only transformation started at `now` must end."""
+    now = now or datetime.now()
+    if not is_night(now):
+        return now
+    sunrise = now.replace(hour=NIGHT_END_HOUR, minute=0, second=0, microsecond=0)
+    if now.hour >= NIGHT_START_HOUR:
+        sunrise += timedelta(days=1)
+    return sunrise
+
 
 class TransformationService:
     def __init__(self):
         self.db = Database()
+        self._last_day_sweep = None  # Date of the last daytime night-only sweep
         from services.user_service import UserService
         self.user_service = UserService()
         from services.character_service import CharacterService
@@ -274,12 +297,11 @@ class TransformationService:
                         db_user.current_transformation = transformation_name
                         db_user.livello_selezionato = transformation_id
                 
-                # Great Ape (Scimmione) - NO EXPIRY (Handled by 6 AM check)
+                # Great Ape (Scimmione) - expires at the next 6 AM
                 elif 'Great Ape' in transformation_name or 'Scimmione' in transformation_name:
                      db_user = session.query(Utente).filter_by(id_telegram=user.id_telegram).first()
                      if db_user:
-                        # Clear expiry to ensure it doesn't expire by time
-                        db_user.transformation_expires_at = None
+                        db_user.transformation_expires_at = next_sunrise()
                         db_user.current_transformation = transformation_name
                         db_user.livello_selezionato = transformation_id
         
@@ -498,17 +520,7 @@ class TransformationService:
                 return {"health": 0, "mana": 0, "damage": 0}
                 
             transformation = session.query(CharacterTransformation).filter_by(id=user_trans.transformation_id).first()
-            
-            if not transformation:
-                return {"health": 0, "mana": 0, "damage": 0}
-            
-            bonuses = {
-                "health": int(transformation.health_bonus or 0),
-                "mana": int(transformation.mana_bonus or 0),
-                "damage": int(transformation.damage_bonus or 0),
-                "resistance": int(transformation.resistance_bonus or 0)
-            }
-            return bonuses
+            return self._bonuses_from_transformation(transformation)
         except Exception as e:
             print(f"Error in get_transformation_bonuses: {e}")
             raise e
@@ -516,6 +528,60 @@ class TransformationService:
             if local_session:
                 session.close()
 
+    def get_transformation_bonuses_bulk(self, user_ids, session=None):
+        """get_transformation_bonuses for many users in two queries. Returns {user_id: bonuses}."""
+        local_session = False
+        if not session:
+            session = self.db.get_session()
+            local_session = True
+        try:
+            result = {user_id: self._bonuses_from_transformation(None) for user_id in user_ids}
+            if not user_ids:
+                return result
+
+            active = session.query(UserTransformation).filter(
+                UserTransformation.user_id.in_(user_ids),
+                UserTransformation.is_active == True
+            ).order_by(UserTransformation.id).all()
+
+            now = datetime.now()
+            current = {}
+            for user_trans in active:
+                if user_trans.user_id in current:
+                    continue
+                current[user_trans.user_id] = user_trans
+                # Check expiration
+                if user_trans.expires_at and now > user_trans.expires_at:
+                    user_trans.is_active = False
+
+            live = {uid: ut for uid, ut in current.items() if ut.is_active}
+            rule_ids = {ut.transformation_id for ut in live.values()}
+            rules = {}
+            if rule_ids:
+                rules = {t.id: t for t in session.query(CharacterTransformation).filter(CharacterTransformation.id.in_(rule_ids)).all()}
+
+            for user_id, user_trans in live.items():
+                result[user_id] = self._bonuses_from_transformation(rules.get(user_trans.transformation_id))
+
+            if local_session:
+                session.commit()
+            else:
+                session.flush()
+            return result
+        finally:
+            if local_session:
+                session.close()
+
+    def _bonuses_from_transformation(self, transformation):
+        if not transformation:
+            return {"health": 0, "mana": 0, "damage": 0}
+        return {
+            "health": int(transformation.health_bonus or 0),
+            "mana": int(transformation.mana_bonus or 0),
+            "damage": int(transformation.damage_bonus or 0),
+            "resistance": int(transformation.resistance_bonus or 0)
+        }
+
     def activate_temporary_transformation(self, user, transformation_id, duration_minutes=5):
         """Activate a transformation temporarily (e.g. Potara Fusion)"""
         session = self.db.get_session()
@@ -572,146 +638,50 @@ class TransformationService:
         session.close()
         return trans.id if trans else None
     
-    def check_expired_transformations(self, session=None):
+    def check_expired_transformations(self, session=None, now=None):
         """
         Check for expired transformations (time duration or environmental conditions)
         and revert users to their base form.
+        Each tick only reads users whose transformation_expires_at has passed
+        (indexed); night-only forms without an expiry are swept once per day
+        window, the first tick after 06:00.
         """
         reverted_count = 0
-        users = []
+        now = now or datetime.now()
         local_session = False
         if not session:
             session = self.db.get_session()
             local_session = True
             
         try:
-            # Dynamic Great Ape Detection (requested by user to cover all cases)
-            # We scan all loaded characters for "Scimmione" or "Great Ape" in their name.
             from services.character_loader import get_character_loader
             loader = get_character_loader()
-            all_chars = loader.get_all_characters()
-            
-            ape_ids = []
-            for cdata in all_chars:
-                cid = cdata.get('id')
-                cname = cdata.get('nome', '')
-                if cid and ("Scimmione" in cname or "Great Ape" in cname or cid == 500):
-                    ape_ids.append(cid)
-            
-            # Ensure we catch ANY of these IDs, even if current_transformation is NULL
+            night_only_ids = loader.get_night_only_character_ids()
+            night = is_night(now)
+
+            # 1. Duration expiry (Great Ape expiries are set to the next sunrise)
             users = session.query(Utente).filter(
-                (Utente.current_transformation != None) | 
-                (Utente.livello_selezionato.in_(ape_ids))
+                Utente.transformation_expires_at != None,
+                Utente.transformation_expires_at <= now
             ).all()
-            
-            current_hour = datetime.now().hour
-            is_night = (current_hour >= 18 or current_hour < 6)
-            
-            print(f"[TRANSFORMATION_CHECK] Checking {len(users)} users. Hour: {current_hour}, IsNight: {is_night}")
-            
-            for user in users:
-                should_revert = False
-                reason = ""
-                
-                # Check 1: Great Ape Day Check (Dynamic)
-                is_scimmione_id = (user.livello_selezionato in ape_ids)
-                
-                if is_scimmione_id:
-                    if not is_night:
-                        should_revert = True
-                        reason = f"ritorno del sole (Great Ape ID {user.livello_selezionato})"
-                
-                # Check 2: Duration Expiry
-                elif user.transformation_expires_at and user.transformation_expires_at < datetime.now():
-                    should_revert = True
-                    reason = "scadenza durata"
-                    
-                # Check 3: Environmental Conditions (String based backup)
-                # Must check both English "Great Ape" and Italian "Scimmione"
-                elif user.current_transformation and (
-                    'Great Ape' in user.current_transformation or 
-                    'Scimmione' in user.current_transformation
-                ):
-                    if not is_night:
-                        should_revert = True
-                        reason = "ritorno del sole"
-                        
-                if should_revert:
-                    print(f"[TRANSFORMATION_CHECK] Reverting User {user.id_telegram} ({user.nome}). Reason: {reason}")
-                    
-                    # LOGIC TO FIND BASE CHARACTER
-                    base_id = 1 # Default fallback
-                    
-                    # 1. Try to find the correct base from UserTransformation record first (SAFER)
-                    active_user_trans = session.query(UserTransformation).filter_by(
-                        user_id=user.id_telegram,
-                        is_active=True
-                    ).first()
-                    
-                    trans_def = None
-                    if active_user_trans:
-                        trans_def = session.query(CharacterTransformation).filter_by(id=active_user_trans.transformation_id).first()
-                        if trans_def:
-                            base_id = trans_def.base_character_id
-                    
-                    # 2. Fallback: Deduce from character data (CSV)
-                    if not trans_def:
-                        char_data = loader.get_character_by_id(user.livello_selezionato)
-                        if char_data and char_data.get('base_character_id'):
-                            base_id = int(char_data.get('base_character_id', base_id))
-                    
-                    # 3. If still no active record and it's generic Great Ape (ID 500)
-                    if not trans_def and user.livello_selezionato == 500:
-                        # Find which Saiyan the user actually owns to revert to
-                        potential_bases = session.query(CharacterTransformation).filter_by(transformed_character_id=500).all()
-                        base_ids = [t.base_character_id for t in potential_bases]
-                        
-                        from models.system import UserCharacter
-                        owned_base = session.query(UserCharacter).filter(
-                            UserCharacter.user_id == user.id_telegram,
-                            UserCharacter.character_id.in_(base_ids)
-                        ).first()
-                        
-                        if owned_base:
-                            base_id = owned_base.character_id
-                        else:
-                            # Fallback: Goku (1), Vegeta (30), Gohan (5) - try to guess or use safe default
-                            base_id = 60 # Nappa default? Or Goku 1? Let's use 1 if unsure
-                            # Actually, let's try to check their history or just set to 1 (Goku) safe.
-                            pass
-                            
-                    # Apply Revert
-                    user.livello_selezionato = base_id
-                    user.current_transformation = None
-                    user.transformation_expires_at = None
-                    
-                    # --- UNIQUENESS SYNC START ---
-                    from models.character_ownership import CharacterOwnership
-                    # Clear user's previous ownership
-                    session.query(CharacterOwnership).filter_by(user_id=user.id_telegram).delete()
-                    # Add new ownership for the base character
-                    char_data = loader.get_character_by_id(base_id)
-                    if char_data and char_data.get('max_concurrent_owners', -1) != -1:
-                        new_ownership = CharacterOwnership(
-                            character_id=base_id,
-                            user_id=user.id_telegram,
-                            equipped_at=datetime.now()
-                        )
-                        session.add(new_ownership)
-                    # --- UNIQUENESS SYNC END ---
-                    
-                    # Deactivate in UserTransformation table too
-                    if active_user_trans:
-                        active_user_trans.is_active = False
-                    else:
-                        # Deactivate ALL active transformations for this user to be safe
-                        session.query(UserTransformation).filter_by(user_id=user.id_telegram, is_active=True).update({'is_active': False})
-                        
-                    # Recalculate stats
-                    self.user_service.recalculate_stats(user.id_telegram, session=session)
-                    reverted_count += 1
-                    print(f"[TRANSFORMATION_CHECK] SUCCESS: User {user.id_telegram} reverted to {base_id}.")
-                        
+
+            # 2. Day/night boundary: bulk revert of night-only forms left without an expiry
+            sweep = not night and self._last_day_sweep != now.date()
+            if sweep:
+                expired_ids = [u.id_telegram for u in users]
+                users += session.query(Utente).filter(
+                    Utente.livello_selezionato.in_(night_only_ids) |
+                    Utente.current_transformation.like('%Great Ape%') |
+                    Utente.current_transformation.like('%Scimmione%'),
+                    ~Utente.id_telegram.in_(expired_ids)
+                ).all()
+
+            if users:
+                print(f"[TRANSFORMATION_CHECK] {len(users)} users to check. Hour: {now.hour}, IsNight: {night}")
+                reverted_count = self._revert_users(session, users, loader, night_only_ids, night, now)
+
+            if sweep:
+                self._last_day_sweep = now.date()
         except Exception as e:
             print(f"[TRANSFORMATION_CHECK] Error: {e}")
             import traceback
@@ -722,3 +692,101 @@ class TransformationService:
                 session.close()
                 
         return reverted_count
+
+    def _revert_users(self, session, users, loader, night_only_ids, night, now):
+        """Revert the given users to their base form, with lookups preloaded in bulk."""
+        from models.system import UserCharacter
+        from models.character_ownership import CharacterOwnership
+
+        to_revert = []
+        for user in users:
+            is_night_form = (user.livello_selezionato in night_only_ids or
+                             is_night_only_name(user.current_transformation))
+            if is_night_form and not night:
+                reason = f"ritorno del sole (Great Ape ID {user.livello_selezionato})"
+            elif user.transformation_expires_at and user.transformation_expires_at <= now:
+                reason = "scadenza durata"
+            else:
+                continue
+            print(f"[TRANSFORMATION_CHECK] Reverting User {user.id_telegram} ({user.nome}). Reason: {reason}")
+            to_revert.append(user)
+
+        if not to_revert:
+            return 0
+
+        user_ids = [user.id_telegram for user in to_revert]
+
+        # Active transformation records and their rules (first active record per user)
+        active_by_user = {}
+        for user_trans in session.query(UserTransformation).filter(
+            UserTransformation.user_id.in_(user_ids),
+            UserTransformation.is_active == True
+        ).order_by(UserTransformation.id):
+            active_by_user.setdefault(user_trans.user_id, user_trans)
+        rule_ids = {ut.transformation_id for ut in active_by_user.values()}
+        rules = {}
+        if rule_ids:
+            rules = {t.id: t for t in session.query(CharacterTransformation).filter(CharacterTransformation.id.in_(rule_ids))}
+
+        # Generic Great Ape (ID 500): revert to a Saiyan the user actually owns
+        owned_ape_base = {}
+        generic_ape_users = [u.id_telegram for u in to_revert if u.livello_selezionato == 500]
+        if generic_ape_users:
+            base_ids = [row[0] for row in session.query(CharacterTransformation.base_character_id).filter_by(transformed_character_id=500)]
+            if base_ids:
+                for owned in session.query(UserCharacter).filter(
+                    UserCharacter.user_id.in_(generic_ape_users),
+                    UserCharacter.character_id.in_(base_ids)
+                ).order_by(UserCharacter.id):
+                    owned_ape_base.setdefault(owned.user_id, owned.character_id)
+
+        for user in to_revert:
+            # LOGIC TO FIND BASE CHARACTER
+            base_id = 1 # Default fallback
+
+            # 1. Try to find the correct base from UserTransformation record first (SAFER)
+            active_user_trans = active_by_user.get(user.id_telegram)
+            trans_def = rules.get(active_user_trans.transformation_id) if active_user_trans else None
+            if trans_def:
+                base_id = trans_def.base_character_id
+
+            # 2. Fallback: Deduce from character data (CSV)
+            if not trans_def:
+                char_data = loader.get_character_by_id(user.livello_selezionato)
+                if char_data and char_data.get('base_character_id'):
+                    base_id = int(char_data.get('base_character_id', base_id))
+
+            # 3. If still no active record and it's generic Great Ape (ID 500)
+            if not trans_def and user.livello_selezionato == 500:
+                base_id = owned_ape_base.get(user.id_telegram, base_id)
+
+            # Apply Revert
+            user.livello_selezionato = base_id
+            user.current_transformation = None
+            user.transformation_expires_at = None
+
+            # --- UNIQUENESS SYNC START ---
+            # Clear user's previous ownership
+            session.query(CharacterOwnership).filter_by(user_id=user.id_telegram).delete()
+            # Add new ownership for the base character
+            char_data = loader.get_character_by_id(base_id)
+            if char_data and char_data.get('max_concurrent_owners', -1) != -1:
+                session.add(CharacterOwnership(
+                    character_id=base_id,
+                    user_id=user.id_telegram,
+                    equipped_at=now
+                ))
+            # --- UNIQUENESS SYNC END ---
+
+        # Deactivate in UserTransformation table too (one UPDATE for everyone)
+        session.query(UserTransformation).filter(
+            UserTransformation.user_id.in_(user_ids),
+            UserTransformation.is_active == True
+        ).update({'is_active': False}, synchronize_session=False)
+        session.flush()
+
+        # Recalculate stats
+        for user in to_revert:
+            self.user_service.recalculate_stats(user.id_telegram, session=session)
+            print(f"[TRANSFORMATION_CHECK] SUCCESS: User {user.id_telegram} reverted to {user.livello_selezionato}.")
+        return len(to_revert)
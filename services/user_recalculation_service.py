@@ -0,0 +1,165 @@
+"""
+User Recalculation Service - Batched level/stat recalculation for all users.
+Used at boot: instead of recalculate_level + recalculate_stats per user (a
+dozen queries each), users are processed in id-ordered chunks with equipment,
+set bonuses and transformations preloaded in a few queries, stats computed in
+memory and only the rows that actually changed written back in bulk.
+"""
+
+from types import SimpleNamespace
+from sqlalchemy import update, or_
+from database import Database
+from models.user import Utente
+from models.system import UserTransformation
+from services.user_service import UserService
+from services.leveling_service import LevelingService
+from services.equipment_service import EquipmentService
+from services.transformation_service import TransformationService
+from services.character_loader import get_character_loader
+
+ALLOCATION_COLUMNS = (
+    'allocated_health', 'allocated_mana', 'allocated_damage',
+    'allocated_resistance', 'allocated_crit', 'allocated_speed',
+)
+STAT_COLUMNS = ('max_health', 'max_mana', 'base_damage', 'resistance', 'crit_chance', 'speed')
+LOADED_COLUMNS = (
+    'id', 'id_telegram', 'exp', 'livello', 'livello_selezionato', 'stat_points',
+    'active_status_effects', 'health', 'mana', 'current_hp', 'current_mana',
+) + ALLOCATION_COLUMNS + STAT_COLUMNS
+
+# Character ids used by Great Ape transformations (see UserService.check_transformation_expiration)
+APE_CHARACTER_IDS = [500] + list(range(600, 611))
+
+
+class UserRecalculationService:
+    CHUNK_SIZE = 500
+
+    def __init__(self):
+        self.db = Database()
+        self.user_service = UserService()
+        self.leveling_service = LevelingService()
+        self.equipment_service = EquipmentService()
+        self.transformation_service = TransformationService()
+
+    def recalculate_all(self, chunk_size=None, recalculate_levels=True):
+        """
+        Recalculate every user, chunk by chunk (one commit per chunk).
+        Returns {'users': processed, 'updated': rows written}.
+        """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        processed = 0
+        updated = 0
+        last_id = None
+        session = self.db.get_session()
+        try:
+            while True:
+                query = session.query(Utente.id).order_by(Utente.id)
+                if last_id is not None:
+                    query = query.filter(Utente.id > last_id)
+                ids = [row[0] for row in query.limit(chunk_size).all()]
+                if not ids:
+                    break
+                last_id = ids[-1]
+
+                try:
+                    updated += self.recalculate_chunk(ids, session, recalculate_levels=recalculate_levels)
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    print(f"[RECALC] Error recalculating users {ids[0]}-{ids[-1]}: {e}")
+                processed += len(ids)
+        finally:
+            session.close()
+        return {'users': processed, 'updated': updated}
+
+    def recalculate_chunk(self, ids, session, recalculate_levels=True):
+        """Recalculate the users with the given primary keys. Returns the number of rows updated."""
+        # 1. Transformation expiry: only users that can actually be affected
+        candidates = session.query(Utente.id_telegram).filter(
+            Utente.id.in_(ids),
+            or_(
+                Utente.livello_selezionato.in_(APE_CHARACTER_IDS),
+                Utente.id_telegram.in_(
+                    session.query(UserTransformation.user_id).filter(UserTransformation.is_active == True)
+                )
+            )
+        ).all()
+        for (user_id,) in candidates:
+            self.user_service.check_transformation_expiration(user_id, session)
+        if candidates:
+            session.flush()
+
+        # 2. Load the columns we need and preload equipment / transformations
+        columns = [getattr(Utente, name) for name in LOADED_COLUMNS]
+        rows = session.query(*columns).filter(Utente.id.in_(ids)).all()
+        user_ids = [row.id_telegram for row in rows]
+        equip_by_user = self.equipment_service.calculate_equipment_stats_bulk(user_ids, session=session)
+        trans_by_user = self.transformation_service.get_transformation_bonuses_bulk(user_ids, session=session)
+
+        # 3. Compute in memory, keep only changed rows
+        loader = get_character_loader()
+        changes = []
+        for row in rows:
+            new = self._project(row, loader, equip_by_user.get(row.id_telegram, {}),
+                                trans_by_user.get(row.id_telegram), session, recalculate_levels)
+            diff = {name: value for name, value in new.items() if getattr(row, name) != value}
+            if diff:
+                diff['id'] = row.id
+                changes.append(diff)
+
+        # 4. Bulk UPDATE by primary key
+        if changes:
+            session.execute(update(Utente), changes)
+        return len(changes)
+
+    def _project(self, row, loader, equip_stats, transformation_bonuses, session, recalculate_levels):
+        """Same result as recalculate_level + recalculate_stats, without touching the DB."""
+        user = SimpleNamespace(**{name: getattr(row, name) for name in LOADED_COLUMNS})
+
+        if recalculate_levels:
+            # Fallback valori None a 0
+            if user.exp is None:
+                user.exp = 0
+            if user.livello is None:
+                user.livello = 1
+            for attr in ALLOCATION_COLUMNS:
+                if getattr(user, attr) is None:
+                    setattr(user, attr, 0)
+
+            user.livello = self.leveling_service.get_level_for_exp(int(user.exp))
+            spent_points = sum(getattr(user, attr) for attr in ALLOCATION_COLUMNS)
+            if spent_points > user.livello * 2:
+                print(f"[RECALC] Utente {user.id_telegram} ha troppi punti assegnati ({spent_points} > {user.livello * 2}). Resetting stats.")
+                for attr in ALLOCATION_COLUMNS:
+                    setattr(user, attr, 0)
+                spent_points = 0
+            user.stat_points = (user.livello * 2) - spent_points
+
+            # Controllo livello massimo personaggio selezionato
+            if user.livello_selezionato is not None:
+                char_info = loader.get_character_by_id(user.livello_selezionato)
+                if char_info:
+                    required_level = char_info.get('livello', 1)
+                    if user.livello < required_level:
+                        print(f"[BOOT] User {user.id_telegram} level ({user.livello}) below character requirement ({required_level}). Resetting to Chocobo (1).")
+                        user.livello_selezionato = 1 # Chocobo ID
+
+        stats = self.user_service.get_projected_stats(
+            user, session=session,
+            equip_stats=equip_stats,
+            transformation_bonuses=transformation_bonuses
+        )
+        for name in STAT_COLUMNS:
+            setattr(user, name, stats[name])
+
+        # Ensure current values don't exceed max
+        if user.health is None or user.health > user.max_health:
+            user.health = user.max_health
+        if user.mana is None or user.mana > user.max_mana:
+            user.mana = user.max_mana
+        if user.current_hp is None or user.current_hp > user.max_health:
+            user.current_hp = user.max_health
+        if user.current_mana is None or user.current_mana > user.max_mana:
+            user.current_mana = user.max_mana
+
+        return {name: getattr(user, name) for name in LOADED_COLUMNS if name not in ('id', 'id_telegram', 'active_status_effects')}
@@ -349,7 +349,19 @@ class UserService:
             session.query(GiocoUtente).filter_by(id_telegram=user_id).delete()
             session.query(Utente).filter_by(id_telegram=user_id).delete()
             
+            led_guild_ids = [g.id for g in guilds_led]
             session.commit()
+            from services.guild_service import invalidate_guild_cache
+            from services.leaderboard_service import get_leaderboards
+            from services.character_service import invalidate_character_ownership
+            get_leaderboards().remove_user(user_id)
+            invalidate_character_ownership(user_id)
+            for guild_id in led_guild_ids:
+                get_leaderboards().remove_guild(guild_id)
+            if guilds_led:
+                invalidate_guild_cache()  # Whole guilds were removed with their members
+            else:
+                invalidate_guild_cache(user_id=user_id)
             print(f"[CLEANUP] Successfully deleted all data for user {user_id}")
             return True
         except Exception as e:
@@ -693,11 +705,8 @@ class UserService:
         msg += trans_text
         
         # Active Buffs
-        import json
-        try:
-             effects = json.loads(utente.active_status_effects or '[]')
-        except:
-             effects = []
+        from services.status_effects import load_effects
+        effects = load_effects(utente)
              
         now = datetime.now()
         buffs = []
@@ -709,11 +718,9 @@ class UserService:
              
         # Beer Potion Bonus
         for e in effects:
-            if e.get('effect') == 'beer_potion_bonus':
-                expires = datetime.fromtimestamp(e.get('expires_at', 0))
-                if expires > now:
-                    mins = int((expires - now).total_seconds() / 60)
-                    buffs.append(f"🍺 **{e.get('name', 'Birra')}**: Pozioni +{e.get('value', 0)}% ({mins}m)")
+            if e.effect == 'beer_potion_bonus':
+                mins = int((e.get('expires_at', 0) - now.timestamp()) / 60)
+                buffs.append(f"🍺 **{e.get('name', 'Birra')}**: Pozioni +{e.get('value', 0)}% ({mins}m)")
                     
         if buffs:
              msg += "\n✨ **Buff Attivi**:\n" + "\n".join(buffs) + "\n"
@@ -916,9 +923,12 @@ class UserService:
         # eventuali altre validazioni tipo valori min/max
         return fixed
 
-    def get_projected_stats(self, utente, override_character_id=None, session=None):
+    def get_projected_stats(self, utente, override_character_id=None, session=None,
+                            equip_stats=None, transformation_bonuses=None):
         """
         Calculate total stats for a user, optionally overriding the character.
+        equip_stats / transformation_bonuses can be passed when already preloaded
+        (batched recalculation) to skip the per-user queries.
         Returns a dict of final stats.
         """
         # 1. System Base Stats (Matching model defaults for level 1)
@@ -980,7 +990,8 @@ class UserService:
         # calculate_equipment_stats uses a new session if none provided, 
         # but here we might pass a user object detached or attached.
         # Ideally we fetch fresh equip stats for the user ID.
-        equip_stats = self.equipment_service.calculate_equipment_stats(utente.id_telegram, session=session)
+        if equip_stats is None:
+            equip_stats = self.equipment_service.calculate_equipment_stats(utente.id_telegram, session=session)
         
         total_hp += equip_stats.get('max_health', 0)
         total_mana += equip_stats.get('max_mana', 0)
@@ -991,9 +1002,11 @@ class UserService:
         
         # 5. Transformation Bonuses
         try:
-            from services.transformation_service import TransformationService
-            trans_service = TransformationService()
-            trans_bonuses = trans_service.get_transformation_bonuses(utente, session=session)
+            trans_bonuses = transformation_bonuses
+            if trans_bonuses is None:
+                from services.transformation_service import TransformationService
+                trans_service = TransformationService()
+                trans_bonuses = trans_service.get_transformation_bonuses(utente, session=session)
             
             total_hp += trans_bonuses.get('health', 0)
             total_mana += trans_bonuses.get('mana', 0)
@@ -1003,35 +1016,33 @@ class UserService:
             
         # 6. Active Status Effects (Temple/Library/Relax/Bordello Buffs)
         try:
-            import json
-            effects = json.loads(utente.active_status_effects or '[]')
-            from datetime import datetime
-            now_ts = datetime.now().timestamp()
-            
-            for effect in effects:
-                if effect.get('expires_at', 0) > now_ts:
-                    # Temple
-                    if effect.get('effect') == 'temple_buff_crit':
-                        total_crit += effect.get('value', 0)
-                    # Library
-                    elif effect.get('effect') == 'library_buff_mana':
-                        total_mana += effect.get('value', 0)
-                    # Relax Corner (Resistance / Speed Malus)
-                    elif effect.get('effect', '').startswith('relax_'):
-                        total_res += effect.get('value_res', 0)
-                        total_speed += effect.get('value_speed', 0)
-                    # Bordello (Dmg / Crit / Mana / HP Malus)
-                    elif effect.get('effect', '').startswith('bordello_'):
-                        total_dmg += effect.get('value_dmg', 0)
-                        total_crit += effect.get('value_crit', 0)
-                        total_mana += effect.get('value_mana', 0)
-                        
-                        # Handle Percentage Max HP Malus
-                        hp_malus_percent = effect.get('value_max_hp_percent', 0)
-                        if hp_malus_percent != 0:
-                            # Apply to base + alloc + equip (current total_hp)
-                            # Malus is negative, so adding a negative value
-                            total_hp += (total_hp * (hp_malus_percent / 100))
+            from services.status_effects import load_effects
+            
+            # Expired buffs are already pruned by the effect store
+            for effect in load_effects(utente):
+                etype = effect.effect or ''
+                # Temple
+                if etype == 'temple_buff_crit':
+                    total_crit += effect.get('value', 0)
+                # Library
+                elif etype == 'library_buff_mana':
+                    total_mana += effect.get('value', 0)
+                # Relax Corner (Resistance / Speed Malus)
+                elif etype.startswith('relax_'):
+                    total_res += effect.get('value_res', 0)
+                    total_speed += effect.get('value_speed', 0)
+                # Bordello (Dmg / Crit / Mana / HP Malus)
+                elif etype.startswith('bordello_'):
+                    total_dmg += effect.get('value_dmg', 0)
+                    total_crit += effect.get('value_crit', 0)
+                    total_mana += effect.get('value_mana', 0)
+                    
+                    # Handle Percentage Max HP Malus
+                    hp_malus_percent = effect.get('value_max_hp_percent', 0)
+                    if hp_malus_percent != 0:
+                        # Apply to base + alloc + equip (current total_hp)
+                        # Malus is negative, so adding a negative value
+                        total_hp += (total_hp * (hp_malus_percent / 100))
                             
         except Exception as e:
             print(f"Error applying status effect buffs: {e}")
@@ -1048,6 +1059,53 @@ class UserService:
             'speed': int(total_speed)
         }
 
+    def purge_expired_status_effects(self, session=None):
+        """
+        Drop expired timed effects (buffs, turbo, daily limits) from every user in one
+        batched UPDATE. Compare-and-set on the old value: a row rewritten in the
+        meantime is left alone and pruned on its next read. Returns rows updated.
+        """
+        from sqlalchemy import bindparam, update
+        from services.status_effects import purge_expired_effects
+
+        local_session = False
+        if not session:
+            session = self.db.get_session()
+            local_session = True
+
+        try:
+            rows = session.query(Utente.id, Utente.active_status_effects).filter(
+                Utente.active_status_effects.like('%expires%')
+            ).all()
+            now_ts = datetime.now().timestamp()
+            params = []
+            for row_id, raw in rows:
+                purged = purge_expired_effects(raw, now_ts)
+                if purged is not None:
+                    params.append({'b_id': row_id, 'b_old': raw, 'b_new': purged})
+            if not params:
+                return 0
+
+            table = Utente.__table__
+            result = session.connection().execute(
+                update(table)
+                .where(table.c.id == bindparam('b_id'))
+                .where(table.c.active_status_effects == bindparam('b_old'))
+                .values(active_status_effects=bindparam('b_new')),
+                params
+            )
+            if local_session:
+                session.commit()
+            return result.rowcount if result.rowcount >= 0 else len(params)
+        except Exception as e:
+            print(f"Error purging expired status effects: {e}")
+            if local_session:
+                session.rollback()
+            return 0
+        finally:
+            if local_session:
+                session.close()
+
     def recalculate_stats(self, user_id, session=None):
         """Recalculate total stats (Base + Allocations + Equipment)"""
         local_session = False
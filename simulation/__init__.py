@@ -0,0 +1,10 @@
+"""
+Balance simulator: millions of fights evaluated as NumPy batches with the
+bot's own formulas (DamageCalculator, RewardService, LevelingService).
+Requires NumPy (pip install numpy); the bot itself does not.
+
+    python -m simulation --fights 20000 --out sweep.csv
+"""
+
+from simulation.combat import FightData, sample_fights, simulate_fights
+from simulation.sweep import SWEEP_COLUMNS, fight_rewards, sweep_levels, export_csv
@@ -0,0 +1,42 @@
+"""
+Level sweep from the command line:
+    python -m simulation --levels 1-100 --fights 20000 --out sweep.csv
+"""
+
+import argparse
+
+from simulation.sweep import timed_sweep, export_csv
+
+
+def parse_levels(value):
+    start, _, end = value.partition('-')
+    return range(int(start), int(end or start) + 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate fights and leveling pace per level")
+    parser.add_argument('--levels', type=parse_levels, default=range(1, 101), help="e.g. 1-100 (default)")
+    parser.add_argument('--fights', type=int, default=20000, help="fights per level")
+    parser.add_argument('--spread', type=int, default=10, help="mob level spread around the player level")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default=None, help="CSV path for the per-level results")
+    args = parser.parse_args(argv)
+
+    rows, elapsed, total = timed_sweep(levels=args.levels, fights_per_level=args.fights,
+                                       seed=args.seed, mob_level_spread=args.spread)
+
+    print(f"{'Level':<6} | {'Kill %':<7} | {'TTK (s)':<8} | {'EXP/fight':<10} | {'EXP/h':<10} | {'Fights/LV':<10} | {'Total (h)':<10}")
+    print("-" * 80)
+    for row in rows:
+        print(f"{row['level']:<6} | {row['kill_rate'] * 100:<7.1f} | {row['avg_ttk_seconds']:<8.0f} | "
+              f"{row['avg_exp']:<10.0f} | {row['exp_per_hour']:<10.0f} | {row['fights_to_next']:<10.1f} | "
+              f"{row['cumulative_hours']:<10.1f}")
+    print(f"\n{total:,} fights simulated in {elapsed:.1f}s ({total / elapsed:,.0f} fights/sec)")
+
+    if args.out:
+        export_csv(rows, args.out)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Vectorized fights: players against regular mobs, one array element per fight.
+Damage goes through DamageCalculator.damage_formula and the attack cadence
+through DamageCalculator.attack_cooldown, so the numbers follow the bot.
+Fighters and mobs are sampled the way the bot builds them (see
+UserService.get_projected_stats and PvEService.spawn_specific_mob).
+"""
+
+import csv
+import os
+
+from services.damage_calculator import DamageCalculator
+from services.character_loader import get_character_loader
+from utils.formula_ops import np, get_numpy_ops
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOBS_CSV = os.path.join(BASE_DIR, "data", "mobs.csv")
+
+# UserService.get_projected_stats: level * 2 stat points, 1 point = 2 DMG / 1 Crit / 1 Speed
+BASE_DAMAGE = 10
+POINTS_PER_LEVEL = 2
+DAMAGE_PER_POINT = 2
+# Share of the stat points a simulated player puts in damage / crit / speed
+# (the rest goes to HP, mana and resistance, which do not change the kill time)
+DEFAULT_BUILD = (0.4, 0.15, 0.15)
+
+# PvEService._allocate_mob_stats: level points spread over hp/dmg/speed/res
+MOB_STAT_SHARE = 0.25
+MOB_HP_PER_LEVEL = 10
+MOB_HP_PER_POINT = 10
+MOB_MAX_RESISTANCE = 50
+
+MAX_HITS = 200
+
+
+class FightData:
+    """Characters and mobs as arrays, loaded once per simulation run"""
+
+    def __init__(self, characters=None, mobs=None):
+        self.ops = get_numpy_ops()  # ImportError with install hint when NumPy is missing
+        characters = characters if characters is not None else [
+            c for c in get_character_loader().get_all_characters() if not c.get('is_transformation')
+        ]
+        characters = sorted(characters, key=lambda c: c.get('livello', 1))
+        mobs = mobs if mobs is not None else load_mobs()
+
+        self.char_level = np.array([c.get('livello', 1) for c in characters], dtype=np.int64)
+        self.char_damage = np.array([c.get('bonus_damage', 0) for c in characters], dtype=np.float64)
+        self.char_crit = np.array([c.get('crit_chance', 0) + c.get('bonus_crit', 0) for c in characters], dtype=np.int64)
+        self.char_crit_multiplier = np.array([c.get('crit_multiplier', 1.5) for c in characters], dtype=np.float64)
+        self.char_speed = np.array([c.get('bonus_speed', 0) for c in characters], dtype=np.int64)
+        char_types = [c.get('elemental_type') or 'Normal' for c in characters]
+
+        self.mob_hp = np.array([m['hp'] for m in mobs], dtype=np.int64)
+        self.mob_difficulty = np.array([m['difficulty'] for m in mobs], dtype=np.int64)
+        mob_types = [m['attack_type'] for m in mobs]
+
+        # Elemental chart as a matrix: effectiveness[char_type, mob_type]
+        self.type_names = sorted(set(char_types) | set(mob_types))
+        type_index = {name: i for i, name in enumerate(self.type_names)}
+        self.char_type = np.array([type_index[t] for t in char_types], dtype=np.int64)
+        self.mob_type = np.array([type_index[t] for t in mob_types], dtype=np.int64)
+        self.effectiveness = np.array([
+            [DamageCalculator.get_elemental_effectiveness(a, d) for d in self.type_names]
+            for a in self.type_names
+        ], dtype=np.float64)
+
+        self.mobs_by_difficulty = {
+            int(d): np.nonzero(self.mob_difficulty == d)[0] for d in np.unique(self.mob_difficulty)
+        }
+
+    def mob_pool(self, difficulty):
+        """Mob indices spawned for a target difficulty (same fallbacks as PvEService.spawn_specific_mob)"""
+        for offset in (0, 1, -1, 2, -2):
+            pool = self.mobs_by_difficulty.get(difficulty + offset)
+            if pool is not None:
+                return pool
+        closest = min(self.mobs_by_difficulty, key=lambda d: abs(d - difficulty))
+        return self.mobs_by_difficulty[closest]
+
+    def unlocked_characters(self, levels):
+        """How many characters (sorted by level requirement) each player level can use"""
+        return np.searchsorted(self.char_level, levels, side='right')
+
+
+def load_mobs(path=MOBS_CSV):
+    mobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            difficulty = row.get('difficulty', '1')
+            mobs.append({
+                'nome': row['nome'],
+                'hp': int(row['hp']),
+                'attack_type': row.get('attack_type') or 'Normal',
+                'difficulty': int(difficulty) if str(difficulty).isdigit() else 1,
+            })
+    return mobs
+
+
+def sample_fights(data, levels, rng, mob_level_spread=10, build=DEFAULT_BUILD):
+    """
+    One fight per element of `levels`: a player of that level with a random
+    unlocked character against a mob spawned around the same level.
+    Returns a dict of arrays.
+    """
+    levels = np.asarray(levels, dtype=np.int64)
+    n = len(levels)
+
+    # Player: character pick + stat allocation
+    unlocked = np.maximum(data.unlocked_characters(levels), 1)
+    char = (rng.random(n) * unlocked).astype(np.int64)
+    points = levels * POINTS_PER_LEVEL
+    dmg_share, crit_share, speed_share = build
+    damage = (BASE_DAMAGE + data.char_damage[char] + np.floor(points * dmg_share) * DAMAGE_PER_POINT
+              + (levels - 1))
+    crit_chance = data.char_crit[char] + np.floor(points * crit_share).astype(np.int64)
+    speed = data.char_speed[char] + np.floor(points * speed_share).astype(np.int64)
+
+    # Mob: level around the player (reference_level spawn), mob of the matching difficulty
+    mob_level = np.maximum(1, levels + rng.integers(-mob_level_spread, mob_level_spread + 1, size=n))
+    target_difficulty = (mob_level - 1) // 10 + 1
+    mob = np.empty(n, dtype=np.int64)
+    for difficulty in np.unique(target_difficulty):
+        mask = target_difficulty == difficulty
+        pool = data.mob_pool(int(difficulty))
+        mob[mask] = pool[rng.integers(0, len(pool), size=int(mask.sum()))]
+    mob_hp = (data.mob_hp[mob] + mob_level * MOB_HP_PER_LEVEL
+              + rng.binomial(mob_level, MOB_STAT_SHARE) * MOB_HP_PER_POINT)
+    resistance = np.minimum(MOB_MAX_RESISTANCE, rng.binomial(mob_level, MOB_STAT_SHARE))
+
+    return {
+        'level': levels,
+        'damage': damage,
+        'crit_chance': crit_chance,
+        'crit_multiplier': data.char_crit_multiplier[char],
+        'speed': speed,
+        'effectiveness': data.effectiveness[data.char_type[char], data.mob_type[mob]],
+        'mob_level': mob_level,
+        'mob_hp': mob_hp,
+        'difficulty': data.mob_difficulty[mob],
+        'resistance': resistance,
+    }
+
+
+def simulate_fights(fights, rng, max_hits=MAX_HITS):
+    """
+    Play every fight hit by hit (all fights in lockstep, finished ones drop out).
+    Adds 'hits', 'crits', 'damage_dealt', 'killed' and 'ttk_seconds' to `fights`.
+    """
+    ops = get_numpy_ops()
+    n = len(fights['level'])
+    hp_left = fights['mob_hp'].astype(np.int64)
+    hits = np.zeros(n, dtype=np.int64)
+    crits = np.zeros(n, dtype=np.int64)
+
+    alive = np.arange(n)
+    for _ in range(max_hits):
+        if not len(alive):
+            break
+        # Same rolls as DamageCalculator.calculate_damage
+        is_crit = rng.integers(1, 101, size=len(alive)) <= fights['crit_chance'][alive]
+        base_dmg = fights['damage'][alive] * np.where(is_crit, fights['crit_multiplier'][alive], 1.0)
+        variance = rng.uniform(0.9, 1.1, size=len(alive))
+        dealt = DamageCalculator.damage_formula(
+            base_dmg, fights['effectiveness'][alive], fights['resistance'][alive], None, variance, ops
+        )
+        hp_left[alive] -= dealt
+        hits[alive] += 1
+        crits[alive] += is_crit
+        alive = alive[hp_left[alive] > 0]
+
+    fights['hits'] = hits
+    fights['crits'] = crits
+    fights['killed'] = hp_left <= 0
+    fights['damage_dealt'] = fights['mob_hp'] - np.maximum(hp_left, 0)
+    fights['ttk_seconds'] = hits * DamageCalculator.attack_cooldown(fights['speed'])
+    return fights
@@ -0,0 +1,98 @@
+"""
+Economy sweep: rewards per simulated fight and the resulting leveling pace.
+Rewards come from RewardService's pure formulas and the EXP curve from
+leveling_service.xp_requirement, evaluated on whole batches of fights.
+"""
+
+import csv
+import time
+
+from services.reward_service import RewardService
+from services.leveling_service import xp_requirement
+from simulation.combat import FightData, sample_fights, simulate_fights
+from utils.formula_ops import np, get_numpy_ops
+
+SWEEP_COLUMNS = [
+    'level', 'fights', 'kill_rate', 'avg_hits', 'crit_rate', 'avg_effectiveness', 'avg_ttk_seconds',
+    'avg_exp', 'avg_wumpa', 'exp_per_hour', 'wumpa_per_hour',
+    'exp_to_next', 'fights_to_next', 'hours_to_next', 'cumulative_hours',
+]
+
+
+def fight_rewards(fights, rng):
+    """Solo-kill rewards (share = 100%) for every killed fight; adds 'exp' and 'wumpa'."""
+    ops = get_numpy_ops()
+    base_xp_pool, fixed_wumpa_pool = RewardService.mob_base_pools(
+        fights['mob_level'], fights['mob_hp'].astype(np.float64), fights['difficulty'], ops
+    )
+    variation = rng.uniform(0.9, 1.1, size=len(base_xp_pool))
+    base_xp_pool, fixed_wumpa_pool = RewardService.apply_pool_variation(base_xp_pool, fixed_wumpa_pool, variation, ops)
+    exp, wumpa = RewardService.participant_reward(
+        1.0, fights['damage_dealt'], fights['level'], fights['mob_level'], fights['difficulty'],
+        base_xp_pool, fixed_wumpa_pool, ops
+    )
+    killed = fights['killed']
+    fights['exp'] = np.where(killed, exp, 0)
+    fights['wumpa'] = np.where(killed, wumpa, 0)
+    return fights
+
+
+def sweep_levels(levels=range(1, 101), fights_per_level=20000, seed=None, mob_level_spread=10, data=None):
+    """
+    Simulate fights_per_level fights at every level and summarize the pace.
+    Returns one dict per level (keys: SWEEP_COLUMNS).
+    """
+    data = data or FightData()
+    rng = np.random.default_rng(seed)
+    rows = []
+    cumulative_hours = 0.0
+    for level in levels:
+        fights = sample_fights(data, np.full(fights_per_level, level), rng, mob_level_spread=mob_level_spread)
+        simulate_fights(fights, rng)
+        fight_rewards(fights, rng)
+
+        killed = fights['killed']
+        kills = int(killed.sum())
+        avg_ttk = float(fights['ttk_seconds'].mean())
+        avg_exp = float(fights['exp'].mean())
+        avg_wumpa = float(fights['wumpa'].mean())
+        exp_to_next = int(xp_requirement(level + 1) - xp_requirement(level))
+        fights_to_next = exp_to_next / avg_exp if avg_exp else float('inf')
+        hours_to_next = fights_to_next * avg_ttk / 3600
+        cumulative_hours += hours_to_next
+
+        rows.append({
+            'level': level,
+            'fights': fights_per_level,
+            'kill_rate': kills / fights_per_level,
+            'avg_hits': float(fights['hits'].mean()),
+            'crit_rate': float(fights['crits'].sum() / max(1, fights['hits'].sum())),
+            'avg_effectiveness': float(fights['effectiveness'].mean()),
+            'avg_ttk_seconds': avg_ttk,
+            'avg_exp': avg_exp,
+            'avg_wumpa': avg_wumpa,
+            'exp_per_hour': avg_exp / avg_ttk * 3600 if avg_ttk else 0.0,
+            'wumpa_per_hour': avg_wumpa / avg_ttk * 3600 if avg_ttk else 0.0,
+            'exp_to_next': exp_to_next,
+            'fights_to_next': fights_to_next,
+            'hours_to_next': hours_to_next,
+            'cumulative_hours': cumulative_hours,
+        })
+    return rows
+
+
+def export_csv(rows, path, columns=SWEEP_COLUMNS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: (round(v, 4) if isinstance(v, float) else v) for k, v in row.items()})
+    return path
+
+
+def timed_sweep(**kwargs):
+    """sweep_levels plus elapsed seconds and total fights simulated"""
+    start = time.perf_counter()
+    rows = sweep_levels(**kwargs)
+    elapsed = time.perf_counter() - start
+    return rows, elapsed, sum(row['fights'] for row in rows)
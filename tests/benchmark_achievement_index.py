@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for AchievementTracker.check_achievements
+A batch touching one stat per user: re-evaluate every achievement vs only the
+achievements indexed under the touched stat keys.
+Runs on an in-memory SQLite DB.
+"""
+
+import os
+import sys
+import json
+import time
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.stats import UserStat
+from models.achievements import Achievement
+from services.achievement_tracker import AchievementTracker
+
+NUM_USERS = 200
+NUM_STATS = 100
+ACHIEVEMENTS_PER_STAT = 3
+
+
+def build_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Utente(id_telegram=uid, nome=f"U{uid}") for uid in range(1, NUM_USERS + 1)])
+    tiers = json.dumps({'bronze': {'threshold': 10 ** 9}})
+    session.add_all([
+        Achievement(achievement_key=f"ach_{s}_{i}", name=f"A{s}{i}", description='', stat_key=f"stat_{s}", tiers=tiers)
+        for s in range(NUM_STATS) for i in range(ACHIEVEMENTS_PER_STAT)
+    ])
+    session.add_all([
+        UserStat(user_id=uid, stat_key=f"stat_{s}", value=uid)
+        for uid in range(1, NUM_USERS + 1) for s in range(0, NUM_STATS, 5)
+    ])
+    session.commit()
+    return session
+
+
+def build_tracker():
+    tracker = AchievementTracker()
+    tracker._ensure_active_achievement_definitions = MagicMock()
+    tracker.content_service = MagicMock()
+    tracker.content_service.get_inactive_seasonal_achievement_categories.return_value = []
+    return tracker
+
+
+def check_all(tracker, session):
+    """Vecchio sistema: tutti gli achievement ricaricati e controllati per ogni utente"""
+    for uid in range(1, NUM_USERS + 1):
+        tracker.invalidate_achievement_index()
+        tracker.check_achievements(uid, session=session)
+
+
+def check_touched(tracker, session):
+    """Nuovo sistema: solo gli achievement delle stat toccate dal batch"""
+    for uid in range(1, NUM_USERS + 1):
+        tracker.check_achievements(uid, session=session, stat_keys={'stat_0'})
+
+
+def run(check):
+    session = build_session()
+    tracker = build_tracker()
+    try:
+        start = time.perf_counter()
+        check(tracker, session)
+        session.commit()
+        return time.perf_counter() - start
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: incremental achievement checks\n")
+    print(f"   {NUM_USERS} users, {NUM_STATS * ACHIEVEMENTS_PER_STAT} achievements, 1 touched stat per user\n")
+
+    print("📊 Test 1: OLD Implementation (every achievement, every user)")
+    old_time = run(check_all)
+    print(f"   Total: {old_time * 1000:.1f}ms\n")
+
+    print("📊 Test 2: NEW Implementation (stat_key index)")
+    new_time = run(check_touched)
+    print(f"   Total: {new_time * 1000:.1f}ms\n")
+
+    print(f"⚡ Speedup: {old_time / new_time:.1f}x")
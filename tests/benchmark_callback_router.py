@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for inline callback dispatch
+Replays a recorded mix of callback_data strings (a combat-heavy session) through
+the old dispatch - 39 standalone telebot filters, then the callback_query
+if/elif chain of ~120 comparisons - and through the CallbackRouter table
+built from the bot's @callback_router.route registrations.
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.callback_router import CallbackRouter
+from tests.test_callback_router import registered_routes, make_call
+
+# Old evaluation order: "x" == x, "x|" startswith x|, "x*" startswith x
+OLD_HANDLERS = [
+    "guild_upgrade_laboratory guild_upgrade_lab", "guild_upgrade_garden", "guild_upgrade_armory",
+    "guild_upgrade_inn", "guild_upgrade_bordello", "guild_upgrade_stables", "guild_upgrade_temple",
+    "guild_upgrade_library", "guild_tour|", "guild_piazza guild_main_menu", "guild_inn_view",
+    "stables_maintenance_alert", "garden_harvest_all", "garden_manage_slots", "guild_buy_beer",
+    "guild_upgrade_brothel", "guild_armory_view", "char_select|", "dungeon_leave_global", "skin_menu|",
+    "skin_buy|", "skin_equip|", "skin_unequip", "potion_use|", "potion_buy|", "profile_rest_start",
+    "profile_rest_stop", "stat_*", "guild_brewery_menu", "guild_buy_drink*", "guild_bordello_menu",
+    "guild_visit_bordello*", "garden_water_menu*", "garden_relax_menu", "garden_smoke*", "guild_inn_wake",
+    "guild_temple_pray", "guild_library_study", "close_user_msg",
+]
+OLD_CHAIN = [
+    "profile_refresh", "profile_potions", "craft_select_equipment", "craft_view_set|", "craft_item|",
+    "craft_view_resources", "craft_claim_all", "guild_refinery_view", "alchemy_refine_view",
+    "garden_refine_view", "refine_select_qty|", "refine_do|", "refinery_claim_all*", "refinery_upgrade_view",
+    "refinery_upgrade_sel|", "refinery_upgrade_do|", "alchemy_recipes", "alchemy_brew|", "alchemy_claim",
+    "guild_lab_info", "guild_upgrade_garden_info", "guild_upgrade_lab", "guild_upgrade_garden",
+    "garden_view", "garden_plant_menu|", "garden_plant_do|", "garden_harvest|", "garden_water|",
+    "garden_clear|", "ranking|", "guide_*", "market_* buy_item* cancel_listing* market_menu",
+    "view_equipment", "equip_inventory", "equip_item|", "equip_locked", "back_to_profile", "title_menu",
+    "set_title|", "guild_create_final|", "guild_found_start", "guild_deposit_start", "inn_rest_start",
+    "inn_rest_stop", "guild_rest", "guild_wakeup", "guild_list_view", "guild_members|", "guild_manage_menu",
+    "guild_leave_ask", "guild_leave_confirm", "guild_warehouse", "guild_deposit_ask", "guild_deposit|",
+    "dungeon_host|", "dungeon_join|", "dungeon_start|", "dungeon_show_mobs|", "ignore", "flee",
+    "flee_confirm", "flee_cancel", "guild_join|", "guild_withdraw|", "wish_summon|", "use_item|",
+    "defuse_tnt", "use_item_mob|", "guild_rename_ask", "guild_delete_ask", "guild_delete_confirm",
+    "guild_back_main", "guild_upgrade|", "guild_personalize_menu", "guild_pers_choice|", "season_page|",
+    "refresh_enemies", "set_title|", "char_nav|", "saga_nav|", "char_filter|", "char_page|", "char_buy|",
+    "char_already_equipped", "char_page_info", "char_select|", "transform_menu|", "activate_transform|",
+    "buy_transform|", "no_mana", "back_to_profile", "stats_menu", "stat_alloc|", "reset_stats*",
+    "transform_menu", "transform_locked", "transform|", "use_potion|", "buy_potion|", "scan_mob|",
+    "attack_enemy|", "special_attack_enemy|", "flee_enemy|", "aoe_attack_enemy| special_aoe_attack_enemy|",
+    "attack_mob", "special_attack_mob", "defend_mob*", "use|", "steal|", "sg|", "invoke|", "wish|", "pwish|",
+    "guide_main", "alchemy_menu", "alchemy_recipes", "alchemy_brew|", "alchemy_claim", "guide|", "ach_page|",
+    "ach_cat|", "season_page|", "buy_season_pass",
+]
+
+# Recorded session mix: (callback_data, weight)
+RECORDED_MIX = [
+    ("attack_enemy|1532", 300), ("special_attack_enemy|1532", 80), ("aoe_attack_enemy|1532", 60),
+    ("defend_mob|1532", 40), ("flee_enemy|1532", 10), ("use_potion|pozione_media", 25),
+    ("scan_mob|1532", 15), ("attack_mob", 20), ("char_nav|3|2|0", 40), ("char_page|2", 15),
+    ("char_select|57", 10), ("profile_refresh", 30), ("stat_alloc|forza", 20), ("stats_menu", 10),
+    ("transform_menu", 8), ("transform|4", 5), ("guide|fight_system", 8), ("guide_cat|combat", 5),
+    ("market_list|1", 12), ("buy_item|88", 6), ("guild_piazza", 15), ("guild_inn_view", 6),
+    ("guild_buy_drink|birra", 4), ("garden_harvest|2", 6), ("garden_water|2", 4), ("craft_item|12", 6),
+    ("refine_do|3|10", 4), ("dungeon_join|4", 8), ("ach_page|2", 5), ("season_page|1", 6),
+    ("buy_season_pass", 1), ("wish|shenron", 3), ("close_user_msg", 12), ("ignore", 5),
+]
+REPLAY_LENGTH = 20000
+ROUNDS = 10
+
+
+def build_old_dispatch():
+    """The telebot filter loop followed by a compiled if/elif chain, as the bot used to dispatch"""
+    def test(pattern):
+        if pattern.endswith('*'):
+            return f"data.startswith({pattern[:-1]!r})"
+        if pattern.endswith('|'):
+            return f"data.startswith({pattern!r})"
+        return f"data == {pattern!r}"
+
+    filters = []
+    for entry in OLD_HANDLERS:
+        filters.append(eval(f"lambda data: {' or '.join(test(p) for p in entry.split())}"))
+
+    lines = ["def chain(data):"]
+    for i, entry in enumerate(OLD_CHAIN):
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} {' or '.join(test(p) for p in entry.split())}:")
+        lines.append(f"        return {i}")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    chain = namespace['chain']
+
+    def dispatch(call):
+        for i, matches in enumerate(filters):
+            if matches(call.data):
+                return ('handler', i)
+        return ('chain', chain(call.data))
+    return dispatch
+
+
+def replay(dispatch, calls):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for call in calls:
+            dispatch(call)
+    return (time.perf_counter() - start) / (ROUNDS * len(calls))
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: inline callback dispatch\n")
+    rng = random.Random(11)
+    population = [data for data, _ in RECORDED_MIX]
+    weights = [weight for _, weight in RECORDED_MIX]
+    calls = [make_call(data) for data in rng.choices(population, weights=weights, k=REPLAY_LENGTH)]
+    print(f"   {REPLAY_LENGTH} recorded callbacks x {ROUNDS} rounds, {len(RECORDED_MIX)} distinct buttons\n")
+
+    print("📊 Test 1: OLD Implementation (telebot filters + if/elif chain)")
+    old_time = replay(build_old_dispatch(), calls)
+    print(f"   Per callback: {old_time * 1e6:.2f}µs\n")
+
+    router = registered_routes(CallbackRouter())
+    print(f"📊 Test 2: NEW Implementation (CallbackRouter, {len(router)} patterns)")
+    resolve_time = replay(lambda call: router.resolve(call.data), calls)
+    print(f"   Lookup only: {resolve_time * 1e6:.2f}µs")
+    dispatch_time = replay(router.dispatch, calls)
+    print(f"   Dispatch + counters: {dispatch_time * 1e6:.2f}µs\n")
+
+    print("📈 Busiest routes (from the router counters)")
+    print("   " + router.format_metrics(limit=5).replace("\n", "\n   ") + "\n")
+
+    print(f"⚡ Speedup: {old_time / dispatch_time:.1f}x (lookup alone {old_time / resolve_time:.1f}x)")
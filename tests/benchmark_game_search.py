@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for GameService.search_games
+A synthetic catalogue on an in-memory SQLite DB: the old DISTINCT platform +
+chained ILIKE scans vs the in-memory inverted/trigram index (index lookup
+only, and full search_games including the primary-key row fetch).
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, or_
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.game import GameInfo
+from models.user import Utente  # noqa: F401 (FK targets for create_all)
+from models.guild import Guild  # noqa: F401
+from services.game_search import GameSearchIndex, STOP_WORDS
+from services.game_service import GameService
+
+NUM_GAMES = 20000
+FILLER_WORDS = 4000
+WORDS = ["super", "mario", "zelda", "crash", "bandicoot", "racing", "legend", "dragon", "ball", "final",
+         "fantasy", "kingdom", "hearts", "metal", "gear", "solid", "street", "fighter", "tekken", "sonic",
+         "hedgehog", "pokemon", "rosso", "blu", "spyro", "resident", "evil", "silent", "hill", "tomb"]
+PLATFORMS = ["PS1", "PS2", "N64", "NES", "SNES", "Game Boy", "GBA", "PC", "Switch", "Wii"]
+GENRES = ["Platform", "Avventura", "Corse", "GDR", "Picchiaduro", "Sparatutto", "Puzzle"]
+QUERIES = ["mario", "crash bandicoot", "zelad", "ps1 racing", "final fantasy 1998", "pok", "kingdom hearts ps2"]
+ROUNDS = 50
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def get_session(self):
+        return self.Session()
+
+
+def make_title(rng, filler):
+    """A franchise word in about a third of the titles, the rest from a long tail of words"""
+    words = rng.sample(filler, rng.randint(1, 3))
+    if rng.random() < 0.3:
+        words.insert(0, rng.choice(WORDS))
+    return " ".join(words).title()
+
+
+def seed(db):
+    rng = random.Random(5)
+    filler = sorted({"".join(rng.choice("bcdfglmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+                     for _ in range(FILLER_WORDS)})
+    session = db.get_session()
+    session.add_all([
+        GameInfo(id=i, title=make_title(rng, filler),
+                 platform=rng.choice(PLATFORMS), genre=rng.choice(GENRES), year=rng.randint(1985, 2015),
+                 premium=rng.randint(0, 1), message_link=f"https://t.me/c/1/{i}")
+        for i in range(1, NUM_GAMES + 1)
+    ])
+    session.commit()
+    session.close()
+
+
+def old_search(db, query):
+    """Vecchio sistema: DISTINCT platform + ILIKE su ogni ricerca"""
+    session = db.get_session()
+    try:
+        platforms = [p[0].lower() for p in session.query(GameInfo.platform).distinct().all() if p[0]]
+        words = query.lower().split()
+        platform_filters = [w for w in words if w in platforms]
+        terms = [w for w in words if w not in platform_filters and w not in STOP_WORDS]
+        sql_query = session.query(GameInfo)
+        if platform_filters:
+            sql_query = sql_query.filter(or_(*[GameInfo.platform.ilike(f'%{pf}%') for pf in platform_filters]))
+        for term in terms:
+            sql_query = sql_query.filter(GameInfo.title.ilike(f'%{term}%'))
+        return sql_query.all()
+    finally:
+        session.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            fn(query)
+    return (time.perf_counter() - start) / (ROUNDS * len(QUERIES))
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: game catalogue search\n")
+    db = MemoryDatabase()
+    seed(db)
+    print(f"   {NUM_GAMES} games, {len(QUERIES)} queries x {ROUNDS} rounds\n")
+
+    service = GameService()
+    service.db = db
+    start = time.perf_counter()
+    service.load_search_index()
+    print(f"📦 Index build: {(time.perf_counter() - start) * 1000:.0f}ms\n")
+
+    print("📊 Test 1: OLD Implementation (DISTINCT + ILIKE)")
+    old_time = timed(lambda q: old_search(db, q))
+    print(f"   Per query: {old_time * 1000:.2f}ms\n")
+
+    print("📊 Test 2: NEW Implementation (index lookup only)")
+    index = GameSearchIndex()
+    index.build(db.get_session().query(GameInfo).all())
+    index_time = timed(lambda q: index.search(q))
+    print(f"   Per query: {index_time * 1000:.3f}ms\n")
+
+    print("📊 Test 3: NEW search_games (index + the 5 rows shown, by primary key)")
+    new_time = timed(lambda q: service.search_games(q, limit=5))
+    print(f"   Per query: {new_time * 1000:.2f}ms\n")
+
+    print(f"⚡ Speedup: {old_time / new_time:.1f}x (index alone {old_time / index_time:.0f}x)")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Stress benchmark for MarketService.buy_item and GuildService.deposit_wumpa
+Many threads race for the same listings / bank on a file-backed SQLite DB:
+reports purchases/sec and checks that no listing is sold twice and that
+points are conserved (no double-spend, no negative balance).
+"""
+
+import os
+import sys
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild, GuildMember
+from models.items import Collezionabili
+from models.market import MarketListing
+from models.resources import Resource, UserResource  # noqa: F401 (tables for create_all)
+from models.achievements import GameEvent  # noqa: F401
+from services.market_service import MarketService, invalidate_listing_count
+from services.guild_service import GuildService, invalidate_guild_cache
+
+NUM_THREADS = 8
+NUM_BUYERS = 40
+NUM_LISTINGS = 200
+ATTEMPTS_PER_THREAD = 150
+BUYER_POINTS = 120  # enough for a few purchases only: the balance check matters
+DEPOSITS_PER_THREAD = 50
+
+
+class FileDatabase:
+    """Stand-in for Database(): sessions on a temporary SQLite file"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f'sqlite:///{self.path}', connect_args={'timeout': 30, 'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def get_session(self):
+        return self.Session()
+
+    def close(self):
+        self.engine.dispose()
+        os.remove(self.path)
+
+
+def seed_market(db):
+    session = db.get_session()
+    session.add(Utente(id_telegram=1, nome="Seller", points=0))
+    for i in range(NUM_BUYERS):
+        session.add(Utente(id_telegram=100 + i, nome=f"Buyer{i}", points=BUYER_POINTS))
+    now = datetime.now()
+    for i in range(NUM_LISTINGS):
+        session.add(MarketListing(id=i + 1, seller_id=1, item_name="Pozione", quantity=1,
+                                  price_per_unit=random.choice([10, 20, 30, 40]),
+                                  created_at=now - timedelta(hours=1),
+                                  expires_at=now + timedelta(days=1), status='active'))
+    session.commit()
+    session.close()
+
+
+def make_market_service(db):
+    service = MarketService()
+    service.db = db
+    service.item_service.db = db
+    service.event_dispatcher.db = db
+    service.item_service.event_dispatcher.db = db
+    return service
+
+
+def run_market(db):
+    service = make_market_service(db)
+    results = {'bought': 0, 'refused': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(ATTEMPTS_PER_THREAD):
+            buyer_id = 100 + random.randrange(NUM_BUYERS)
+            success, msg = service.buy_item(buyer_id, random.randint(1, NUM_LISTINGS))
+            key = 'bought' if success else ('errors' if msg.startswith("Errore") else 'refused')
+            with lock:
+                results[key] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(NUM_THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, results
+
+
+def check_market(db, results):
+    session = db.get_session()
+    try:
+        sold = session.query(MarketListing).filter_by(status='sold').all()
+        revenue = sum(l.price_per_unit * l.quantity for l in sold)
+        total_points = session.query(func.sum(Utente.points)).scalar()
+        negative = session.query(Utente).filter(Utente.points < 0).count()
+        seller_points = session.query(Utente.points).filter_by(id_telegram=1).scalar()
+        items = session.query(Collezionabili).filter_by(oggetto="Pozione").count()
+
+        assert len(sold) == results['bought'], f"{results['bought']} purchases but {len(sold)} listings sold"
+        assert total_points == NUM_BUYERS * BUYER_POINTS, f"points not conserved: {total_points}"
+        assert negative == 0, f"{negative} users with negative points"
+        assert seller_points == revenue, f"seller got {seller_points}, listings sold for {revenue}"
+        assert items == len(sold), f"{items} items delivered for {len(sold)} sold listings"
+        return len(sold), revenue
+    finally:
+        session.close()
+
+
+def run_guild_bank(db):
+    session = db.get_session()
+    session.add(Utente(id_telegram=1, nome="Leader", points=0))
+    session.add(Guild(id=1, name="Gilda", leader_id=1, wumpa_bank=0))
+    session.add(GuildMember(guild_id=1, user_id=1, role="Leader"))
+    for i in range(NUM_THREADS):
+        session.add(Utente(id_telegram=100 + i, nome=f"Member{i}", points=DEPOSITS_PER_THREAD // 2))
+        session.add(GuildMember(guild_id=1, user_id=100 + i, role="Member"))
+    session.commit()
+    session.close()
+
+    service = GuildService()
+    service.db = db
+    deposited = [0] * NUM_THREADS
+
+    def worker(index):
+        # Each member tries to deposit twice what they own, one Wumpa at a time
+        for _ in range(DEPOSITS_PER_THREAD):
+            success, _ = service.deposit_wumpa(100 + index, 1)
+            if success:
+                deposited[index] += 1
+        # Leader withdraws concurrently with the deposits
+        service.withdraw_wumpa(1, 1)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(NUM_THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    session = db.get_session()
+    try:
+        bank = session.query(Guild.wumpa_bank).filter_by(id=1).scalar()
+        leader = session.query(Utente.points).filter_by(id_telegram=1).scalar()
+        members = session.query(func.sum(Utente.points)).filter(Utente.id_telegram >= 100).scalar()
+        assert sum(deposited) == NUM_THREADS * (DEPOSITS_PER_THREAD // 2), f"deposited {sum(deposited)}"
+        assert members == 0, f"members left with {members}"
+        assert bank + leader == sum(deposited), f"bank {bank} + leader {leader} != {sum(deposited)}"
+        assert bank >= 0
+    finally:
+        session.close()
+    return elapsed, sum(deposited)
+
+
+if __name__ == "__main__":
+    print("🚀 Stress Benchmark: market purchases and guild bank\n")
+    random.seed(42)
+
+    invalidate_listing_count()
+    db = FileDatabase()
+    try:
+        seed_market(db)
+        attempts = NUM_THREADS * ATTEMPTS_PER_THREAD
+        print(f"📊 Test 1: {NUM_THREADS} threads, {attempts} purchase attempts on {NUM_LISTINGS} listings")
+        elapsed, results = run_market(db)
+        sold, revenue = check_market(db, results)
+        print(f"   Bought: {results['bought']}  Refused: {results['refused']}  Errors: {results['errors']}")
+        print(f"   Total: {elapsed * 1000:.1f}ms  ({results['bought'] / elapsed:.0f} purchases/sec, {attempts / elapsed:.0f} attempts/sec)")
+        print(f"   ✅ {sold} listings sold exactly once, {revenue} 🍑 moved, points conserved\n")
+    finally:
+        db.close()
+
+    invalidate_guild_cache()
+    db = FileDatabase()
+    try:
+        print(f"📊 Test 2: {NUM_THREADS} members depositing past their balance while the leader withdraws")
+        elapsed, deposited = run_guild_bank(db)
+        print(f"   Total: {elapsed * 1000:.1f}ms, {deposited} Wumpa deposited")
+        print("   ✅ No overdraft, bank + withdrawals == deposits")
+    finally:
+        db.close()
+        invalidate_guild_cache()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for the service registry
+Compares building PvEService per chat message (old handle_any_message)
+against reusing the shared instance from the registry.
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pve_service import PvEService
+from services.service_registry import get_service, reset_services
+
+
+def benchmark_old_implementation(num_messages=50):
+    """Simula il vecchio sistema: un PvEService nuovo per ogni messaggio"""
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        PvEService()
+    elapsed = time.perf_counter() - start
+    return num_messages / elapsed
+
+
+def benchmark_new_implementation(num_messages=50000):
+    """Simula il nuovo sistema: istanza condivisa dal registry"""
+    reset_services(PvEService)
+    get_service(PvEService)  # Warm-up (first message pays the build)
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        get_service(PvEService)
+    elapsed = time.perf_counter() - start
+    return num_messages / elapsed
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: Service Registry\n")
+
+    print("📊 Test 1: OLD Implementation (PvEService() per message)")
+    old_rate = benchmark_old_implementation()
+    print(f"   Throughput: {old_rate:,.1f} messages/s\n")
+
+    print("📊 Test 2: NEW Implementation (shared registry instance)")
+    new_rate = benchmark_new_implementation()
+    print(f"   Throughput: {new_rate:,.1f} messages/s\n")
+
+    print(f"⚡ Speedup: {new_rate / old_rate:,.0f}x")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for StatAggregator._flush_stats
+10k events across 500 users: one UPSERT per (user, stat) vs grouped multi-row UPSERTs.
+Runs on a file-backed SQLite DB (the fallback engine in database.py).
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import Base
+from models.stats import UserStat
+from services.stat_aggregator import StatAggregator
+
+NUM_EVENTS = 10000
+NUM_USERS = 500
+EVENT_TYPES = ['damage_dealt', 'mob_kill', 'damage_taken', 'chat_exp', 'point_gain']
+
+
+def build_batch_cache():
+    """Aggregate 10k fake events in memory (same path as process_events)"""
+    aggregator = StatAggregator()
+    batch_cache = {}
+    for _ in range(NUM_EVENTS):
+        event = SimpleNamespace(
+            user_id=random.randint(1, NUM_USERS),
+            event_type=random.choice(EVENT_TYPES),
+            value=random.randint(1, 500),
+            context=json.dumps({'mob_name': random.choice(['Goblin', 'C17', 'Freezer']), 'is_crit': random.random() < 0.2})
+        )
+        aggregator._process_single_event(None, event, batch_cache)
+    return aggregator, batch_cache
+
+
+def flush_one_by_one(session, batch_cache):
+    """Vecchio sistema: una UPSERT per coppia (user_id, stat_key)"""
+    for (user_id, stat_key), data in batch_cache.items():
+        stmt = sqlite_insert(UserStat).values(user_id=user_id, stat_key=stat_key, value=data['value'])
+        if data['op'] == 'inc':
+            new_value = UserStat.value + stmt.excluded.value
+        else:
+            new_value = stmt.excluded.value
+        session.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'stat_key'], set_={'value': new_value}))
+
+
+def run(flush):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine, tables=[UserStat.__table__])
+    session = sessionmaker(bind=engine)()
+    try:
+        start = time.perf_counter()
+        flush(session)
+        session.commit()
+        return time.perf_counter() - start
+    finally:
+        session.close()
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: StatAggregator flush\n")
+    aggregator, batch_cache = build_batch_cache()
+    print(f"   {NUM_EVENTS} events, {NUM_USERS} users -> {len(batch_cache)} stat rows\n")
+
+    print("📊 Test 1: OLD Implementation (one statement per stat)")
+    old_time = run(lambda s: flush_one_by_one(s, batch_cache))
+    print(f"   Total: {old_time * 1000:.1f}ms\n")
+
+    print("📊 Test 2: NEW Implementation (multi-row UPSERT per op type)")
+    new_time = run(lambda s: aggregator._flush_stats(s, batch_cache))
+    print(f"   Total: {new_time * 1000:.1f}ms\n")
+
+    print(f"⚡ Speedup: {old_time / new_time:.1f}x")
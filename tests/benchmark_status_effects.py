@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Performance benchmark for status effect reads
+A combat round reads a player's stored effects several times (stun/turbo check,
+projected stats, attacker wrapper, profile). The old code ran json.loads and
+re-checked every expiry on each read; the new store parses each distinct column
+value once and prunes expired timed effects only when an expiry passes.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import status_effects
+from services.status_effects import load_effects
+
+PLAYERS = 200
+READS_PER_PLAYER = 50
+ROUNDS = 5
+
+
+def make_players(now_ts):
+    players = []
+    for i in range(PLAYERS):
+        effects = [
+            {'effect': 'temple_buff_crit', 'value': 15, 'expires_at': now_ts + 1800, 'source': 'temple'},
+            {'effect': 'relax_bong', 'expires_at': now_ts + 900, 'value_res': 15, 'value_speed': -15,
+             'source': 'relax_corner', 'name': 'Bong'},
+            {'id': 'relax_limit_bong', 'expires_at': now_ts + 3600, 'type': 'limit'},
+            {'effect': 'poison', 'duration': 3, 'stacks': i % 3 + 1, 'source_level': 10},
+            {'effect': 'beer_potion_bonus', 'value': 20 + i % 5, 'expires_at': now_ts - 60, 'name': 'Birra'},
+        ]
+        players.append(SimpleNamespace(active_status_effects=json.dumps(effects)))
+    return players
+
+
+def old_read(player, now_ts):
+    """json.loads and an expiry check on every read"""
+    try:
+        effects = json.loads(player.active_status_effects or '[]')
+    except Exception:
+        effects = []
+    crit = 0
+    for effect in effects:
+        if effect.get('expires_at', 0) > now_ts and effect.get('effect') == 'temple_buff_crit':
+            crit += effect.get('value', 0)
+    return crit
+
+
+def new_read(player, now_ts):
+    crit = 0
+    for effect in load_effects(player, now_ts=now_ts):
+        if effect.effect == 'temple_buff_crit':
+            crit += effect.value
+    return crit
+
+
+def replay(read, players, now_ts):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for player in players:
+            for _ in range(READS_PER_PLAYER):
+                read(player, now_ts)
+    return (time.perf_counter() - start) / (ROUNDS * PLAYERS * READS_PER_PLAYER)
+
+
+if __name__ == "__main__":
+    print("🚀 Performance Benchmark: status effect reads\n")
+    now_ts = datetime.now().timestamp()
+    players = make_players(now_ts)
+    print(f"   {PLAYERS} players x {READS_PER_PLAYER} reads x {ROUNDS} rounds, 5 stored effects each\n")
+
+    print("📊 Test 1: OLD Implementation (json.loads per read)")
+    old_time = replay(old_read, players, now_ts)
+    print(f"   Per read: {old_time * 1e6:.2f}µs\n")
+
+    status_effects._parsed_effects.clear()
+    print("📊 Test 2: NEW Implementation (cached ActiveEffect tuples)")
+    new_time = replay(new_read, players, now_ts)
+    print(f"   Per read: {new_time * 1e6:.2f}µs\n")
+
+    assert all(old_read(p, now_ts) == new_read(p, now_ts) for p in players)
+    print(f"⚡ Speedup: {old_time / new_time:.1f}x")
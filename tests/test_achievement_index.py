@@ -0,0 +1,88 @@
+import unittest
+import json
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.stats import UserStat
+from models.achievements import Achievement, UserAchievement
+from services.achievement_tracker import AchievementTracker
+
+
+def _tiers(threshold):
+    return json.dumps({'bronze': {'threshold': threshold, 'rewards': {}}})
+
+
+class TestAchievementStatIndex(unittest.TestCase):
+    """Incremental achievement evaluation keyed by touched stat keys"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add(Utente(id_telegram=1, nome="Hero"))
+        self.session.add_all([
+            Achievement(achievement_key='butcher', name='Macellaio', description='', stat_key='total_kills', tiers=_tiers(1)),
+            Achievement(achievement_key='hitter', name='Picchiatore', description='', stat_key='total_damage', tiers=_tiers(10)),
+            Achievement(achievement_key='botanist', name='Botanico', description='', stat_key='botanist_unique_count', tiers=_tiers(2)),
+        ])
+        self.session.add_all([
+            UserStat(user_id=1, stat_key='total_kills', value=5),
+            UserStat(user_id=1, stat_key='total_damage', value=50),
+            UserStat(user_id=1, stat_key='discovery_erba', value=1),
+            UserStat(user_id=1, stat_key='discovery_fiore', value=1),
+        ])
+        self.session.commit()
+
+        self.tracker = AchievementTracker()
+        self.tracker._ensure_active_achievement_definitions = MagicMock()
+        self.tracker.content_service = MagicMock()
+        self.tracker.content_service.get_inactive_seasonal_achievement_categories.return_value = []
+        patcher = patch.object(AchievementTracker, '_apply_reward')
+        self.apply_reward = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _unlocked(self):
+        return {
+            ua.achievement_key for ua in self.session.query(UserAchievement).filter_by(user_id=1)
+            if ua.current_tier
+        }
+
+    def test_index_groups_by_stat_key(self):
+        index = self.tracker._get_achievement_index(self.session)
+        self.assertEqual(set(index), {'total_kills', 'total_damage', 'botanist_unique_count'})
+        self.assertIs(self.tracker._get_achievement_index(self.session), index)
+
+        self.tracker.invalidate_achievement_index()
+        self.assertIsNot(self.tracker._get_achievement_index(self.session), index)
+
+    def test_only_touched_stats_are_checked(self):
+        self.tracker.check_achievements(1, session=self.session, stat_keys={'total_damage'})
+        self.assertEqual(self._unlocked(), {'hitter'})
+
+    def test_discovery_stats_trigger_derived_achievement(self):
+        self.tracker.check_achievements(1, session=self.session, stat_keys={'discovery_fiore'})
+        self.assertEqual(self._unlocked(), {'botanist'})
+
+    def test_empty_stat_keys_is_noop(self):
+        self.tracker.check_achievements(1, session=self.session, stat_keys=set())
+        self.assertEqual(self._unlocked(), set())
+        self.apply_reward.assert_not_called()
+
+    def test_full_check_without_stat_keys(self):
+        self.tracker.check_achievements(1, session=self.session)
+        self.assertEqual(self._unlocked(), {'butcher', 'hitter', 'botanist'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import random
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.damage_calculator import DamageCalculator
+from services.reward_service import RewardService
+from services.leveling_service import xp_requirement
+from utils.formula_ops import NUMPY_AVAILABLE, np, get_numpy_ops
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "NumPy non installato")
+class TestFormulaParity(unittest.TestCase):
+    """The bot (plain numbers) and the simulator (NumPy arrays) must compute the same values"""
+
+    def setUp(self):
+        self.ops = get_numpy_ops()
+        rng = random.Random(7)
+        self.cases = [
+            {
+                'base_dmg': rng.choice([10, 37, 250]) * rng.choice([1.0, 1.5, 2.0]),
+                'effectiveness': rng.choice([0.0, 0.5, 1.0, 2.0]),
+                'resistance': rng.randint(-5, 50),
+                'variance': rng.uniform(0.9, 1.1),
+                'user_level': rng.randint(1, 100),
+                'mob_level': rng.randint(1, 100),
+                'mob_hp': float(rng.choice([30, 900, 1000, 5000, 150000])),
+                'difficulty': rng.randint(1, 9),
+                'share': rng.choice([1.0, 0.5, 0.01]),
+                'damage': rng.randint(0, 5000),
+                'wumpa_pool': rng.choice([0, 10, 500]),
+            }
+            for _ in range(300)
+        ]
+
+    def column(self, name):
+        return np.array([case[name] for case in self.cases])
+
+    def test_damage_formula(self):
+        arrays = DamageCalculator.damage_formula(
+            self.column('base_dmg'), self.column('effectiveness'), self.column('resistance'),
+            None, self.column('variance'), self.ops
+        )
+        scalars = [DamageCalculator.damage_formula(c['base_dmg'], c['effectiveness'], c['resistance'],
+                                                   None, c['variance']) for c in self.cases]
+        self.assertEqual(arrays.tolist(), scalars)
+
+        defended = DamageCalculator.damage_formula(200.0, 1.0, 0, np.array([0, 50, 300]), 1.0, self.ops)
+        self.assertEqual(defended.tolist(), [DamageCalculator.damage_formula(200.0, 1.0, 0, d, 1.0) for d in (0, 50, 300)])
+
+    def test_xp_requirement(self):
+        levels = np.arange(0, 151)
+        self.assertEqual(xp_requirement(levels, self.ops).tolist(), [xp_requirement(int(l)) for l in levels])
+
+    def test_reward_formulas(self):
+        xp_pool, wumpa_pool = RewardService.mob_base_pools(
+            self.column('mob_level'), self.column('mob_hp'), self.column('difficulty'), self.ops)
+        xp_pool, wumpa_pool = RewardService.apply_pool_variation(xp_pool, wumpa_pool, self.column('variance'), self.ops)
+        xp, wumpa = RewardService.participant_reward(
+            self.column('share'), self.column('damage'), self.column('user_level'), self.column('mob_level'),
+            self.column('difficulty'), xp_pool, self.column('wumpa_pool'), self.ops)
+
+        for i, c in enumerate(self.cases):
+            s_xp_pool, s_wumpa_pool = RewardService.mob_base_pools(c['mob_level'], c['mob_hp'], c['difficulty'])
+            s_xp_pool, s_wumpa_pool = RewardService.apply_pool_variation(s_xp_pool, s_wumpa_pool, c['variance'])
+            self.assertEqual((int(xp_pool[i]), int(wumpa_pool[i])), (s_xp_pool, s_wumpa_pool))
+
+            s_xp, s_wumpa = RewardService.participant_reward(
+                c['share'], c['damage'], c['user_level'], c['mob_level'], c['difficulty'],
+                s_xp_pool, c['wumpa_pool'])
+            self.assertEqual((int(xp[i]), int(wumpa[i])), (s_xp, s_wumpa))
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "NumPy non installato")
+class TestLevelSweep(unittest.TestCase):
+    def test_sweep_and_export(self):
+        from simulation import sweep_levels, export_csv, SWEEP_COLUMNS
+
+        rows = sweep_levels(levels=range(1, 4), fights_per_level=500, seed=3)
+        self.assertEqual([row['level'] for row in rows], [1, 2, 3])
+        for row in rows:
+            self.assertEqual(row['fights'], 500)
+            self.assertGreater(row['kill_rate'], 0)
+            self.assertGreater(row['avg_exp'], 0)
+        self.assertGreaterEqual(rows[2]['cumulative_hours'], rows[0]['cumulative_hours'])
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            export_csv(rows, path)
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[0].split(','), SWEEP_COLUMNS)
+            self.assertEqual(len(lines), 4)
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
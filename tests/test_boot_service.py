@@ -1,7 +1,6 @@
 import unittest
 from unittest.mock import MagicMock, patch
 from services.boot_service import BootService
-from models.user import Utente
 
 class TestBootService(unittest.TestCase):
     def setUp(self):
@@ -24,29 +23,23 @@ class TestBootService(unittest.TestCase):
         self.boot_service.startup_and_clean.assert_called_once()
 
     def test_startup_and_clean(self):
-        session = MagicMock()
-        self.boot_service.db.get_session.return_value = session
+        self.boot_service.recalculation_service = MagicMock()
+        self.boot_service.recalculation_service.recalculate_all.return_value = {'users': 2, 'updated': 1}
         
-        # We need mock query chain
-        mock_query = session.query.return_value
+        result = self.boot_service.startup_and_clean(background=False)
         
-        user1 = Utente(id_telegram=1, exp=None, livello=None)
-        user2 = Utente(id_telegram=2, exp=100, livello=2)
-        mock_query.all.return_value = [user1, user2]
-        
-        self.boot_service.startup_and_clean()
-        
-        # Verify Fallback logic
-        self.assertEqual(user1.exp, 0)
-        self.assertEqual(user1.livello, 1)
-        self.assertEqual(user1.allocated_health, 0)
+        self.assertIsNone(result)
+        self.boot_service.recalculation_service.recalculate_all.assert_called_once_with()
+
+    def test_startup_and_clean_background(self):
+        self.boot_service.recalculation_service = MagicMock()
+        self.boot_service.recalculation_service.recalculate_all.return_value = {'users': 0, 'updated': 0}
         
-        # Verify recalculations called for both users
-        self.assertEqual(self.boot_service.leveling_service.recalculate_level.call_count, 2)
-        self.assertEqual(self.boot_service.user_service.recalculate_stats.call_count, 2)
+        thread = self.boot_service.startup_and_clean(background=True)
+        thread.join(2)
         
-        session.commit.assert_called_once()
-        session.close.assert_called_once()
+        self.assertFalse(thread.is_alive())
+        self.boot_service.recalculation_service.recalculate_all.assert_called_once_with()
 
 if __name__ == '__main__':
     unittest.main()
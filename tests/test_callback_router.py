@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import ast
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.callback_router import CallbackRouter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ROUTED_SOURCES = ['main.py', os.path.join('handlers', 'guild_handler.py')]
+
+
+def make_call(data):
+    return SimpleNamespace(data=data, id="cb1")
+
+
+def registered_routes(router):
+    """Register the @callback_router.route handlers of the bot sources (parsed, not imported) on a router"""
+    for path in ROUTED_SOURCES:
+        with open(os.path.join(ROOT, path), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if not isinstance(node, ast.FunctionDef):
+                continue
+            handler = None
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and ast.unparse(decorator.func) == 'callback_router.route':
+                    if handler is None:
+                        handler = lambda call: None
+                        handler.__name__ = node.name
+                    options = {kw.arg: kw.value.value for kw in decorator.keywords}
+                    router.add(handler, *[arg.value for arg in decorator.args], **options)
+    return router
+
+
+class TestCallbackRouter(unittest.TestCase):
+    """Exact, '|'-argument and legacy prefix routes; counters"""
+
+    def setUp(self):
+        self.router = CallbackRouter()
+        self.hits = []
+
+        @self.router.route("transform_menu")
+        def transform_menu(call):
+            self.hits.append(("menu", call.data))
+
+        @self.router.route("transform_menu|", "transform|")
+        def transform_page(call):
+            self.hits.append(("page", call.data))
+
+        @self.router.route("guide_", prefix=True)
+        def guide(call):
+            self.hits.append(("guide", call.data))
+
+        @self.router.route("guide|")
+        def guide_topic(call):
+            self.hits.append(("topic", call.data))
+
+    def test_dispatch(self):
+        for data in ["transform_menu", "transform_menu|3", "transform|7", "guide_cat|combat", "guide|dungeons"]:
+            self.assertTrue(self.router.dispatch(make_call(data)))
+        self.assertEqual(self.hits, [("menu", "transform_menu"), ("page", "transform_menu|3"), ("page", "transform|7"),
+                                     ("guide", "guide_cat|combat"), ("topic", "guide|dungeons")])
+
+    def test_no_partial_matches(self):
+        # An exact route does not take arguments, an argument route needs the separator
+        for data in ["transform_menu_x", "transform", "guid", "", None]:
+            self.assertFalse(self.router.dispatch(make_call(data)), data)
+        self.assertEqual(self.hits, [])
+
+    def test_conflicts_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.router.add(lambda call: None, "transform_menu")
+        with self.assertRaises(ValueError):
+            self.router.add(lambda call: None, "transform|")
+        with self.assertRaises(ValueError):
+            self.router.add(lambda call: None, "guide_", prefix=True)
+        with self.assertRaises(ValueError):
+            self.router.add(lambda call: None, "a|b|")
+
+    def test_metrics(self):
+        @self.router.route("boom")
+        def boom(call):
+            raise RuntimeError("x")
+
+        for _ in range(3):
+            self.router.dispatch(make_call("transform|1"))
+        with self.assertRaises(RuntimeError):
+            self.router.dispatch(make_call("boom"))
+
+        metrics = self.router.get_metrics()
+        self.assertEqual(metrics['transform_page']['calls'], 3)
+        self.assertEqual(metrics['boom'], dict(metrics['boom'], calls=1, errors=1))
+        self.assertNotIn('transform_menu', metrics)  # Never hit
+        self.assertIn("transform_page: 3 calls", self.router.format_metrics())
+
+        self.router.reset_metrics()
+        self.assertEqual(self.router.get_metrics(), {})
+
+    def test_pass_bot(self):
+        router = CallbackRouter(bot="bot")
+        seen = []
+        router.add(lambda bot, call: seen.append((bot, call.data)), "guild_found_start", pass_bot=True)
+        router.dispatch(make_call("guild_found_start"))
+        self.assertEqual(seen, [("bot", "guild_found_start")])
+
+
+class TestBotRoutes(unittest.TestCase):
+    """The bot's route table registers without conflicts and keeps the old precedence"""
+
+    def test_routes(self):
+        router = registered_routes(CallbackRouter())
+        self.assertGreater(len(router), 100)
+
+        expected = {
+            "attack_enemy|12": "handle_attack_enemy_cb",
+            "transform_menu": "handle_transform_menu_callback",
+            "transform_menu|3": "handle_transform_menu_cb",
+            # Previously caught first by the standalone handlers / earlier branches
+            "guide_main": "handle_guide_cb",
+            "stat_alloc|forza": "handle_stat_callbacks",
+            "char_select|5": "handle_character_selection_callback",
+            "guild_upgrade_lab": "handle_guild_upgrade_laboratory",
+            "season_page|1": "handle_season_page_cb",
+            # Legacy prefixes without '|'
+            "buy_item|3": "handle_market_cb",
+            "market_menu": "handle_market_cb",
+            "reset_stats_yes": "handle_reset_stats_cb",
+            "garden_water|2": "handle_garden_water",
+            "garden_water_menu|2": "handle_garden_water",
+            # Registered from handlers/
+            "guild_found_start": "handle_found_start_callback",
+        }
+        for data, handler_name in expected.items():
+            route = router.resolve(data)
+            self.assertIsNotNone(route, data)
+            self.assertEqual(route.name, handler_name, data)
+        self.assertIsNone(router.resolve("unknown_button"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.system import UserCharacter
+from models.seasons import SeasonReward
+from services.character_service import CharacterService, invalidate_character_ownership
+from services.season_manager import SeasonManager
+
+
+def reference_unlocked(user, character, purchased):
+    """The old per-character rules of is_character_unlocked, as reference"""
+    if character['livello'] > user.livello:
+        return False
+    if character['lv_premium'] == 1:
+        return user.premium == 1
+    if character.get('lv_premium') == 0:
+        return True
+    return character['id'] in purchased
+
+
+def reference_owned(user, character, purchased):
+    if character['lv_premium'] == 0:
+        return user.livello >= character['livello']
+    if character['lv_premium'] == 1:
+        return user.premium == 1
+    return character['id'] in purchased
+
+
+class TestOwnershipSnapshot(unittest.TestCase):
+    """Catalog-wide unlock/ownership checks from one cached query"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+        self.service = CharacterService()
+        self.service.db = self
+        self.service.user_service.db = self
+        self.service.event_dispatcher.db = self
+
+        catalog = self.service.get_all_characters()
+        purchasable = [c for c in catalog if c['lv_premium'] == 2]
+        self.purchased = {purchasable[0]['id'], purchasable[-1]['id']}
+        self.buyable = next(c for c in purchasable
+                            if c['id'] not in self.purchased and c.get('price', 0) > 0
+                            and not c.get('required_character_id') and c['livello'] <= 30)
+
+        session = self.Session()
+        session.add(Utente(id_telegram=1, nome="Collezionista", livello=30, premium=0, points=100000))
+        session.add_all([UserCharacter(user_id=1, character_id=char_id) for char_id in self.purchased])
+        session.commit()
+        session.close()
+        invalidate_character_ownership()
+
+        self.queries = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+
+    def tearDown(self):
+        invalidate_character_ownership()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def _user(self):
+        session = self.Session()
+        try:
+            user = session.query(Utente).filter_by(id_telegram=1).first()
+            session.expunge(user)
+            return user
+        finally:
+            session.close()
+
+    def test_whole_catalog_in_one_query(self):
+        user = self._user()
+        self.queries = 0
+        for character in self.service.get_all_characters():
+            self.assertEqual(self.service.is_character_unlocked(user, character['id']),
+                             reference_unlocked(user, character, self.purchased), character['id'])
+            self.assertEqual(self.service.is_character_owned(user, character['id']),
+                             reference_owned(user, character, self.purchased), character['id'])
+        self.assertEqual(self.queries, 1)
+
+    def test_purchase_invalidates_snapshot(self):
+        user = self._user()
+        self.assertFalse(self.service.get_ownership_snapshot(user).is_owned(self.buyable))
+
+        success, _ = self.service.purchase_character(user, self.buyable['id'])
+        self.assertTrue(success)
+        self.assertTrue(self.service.get_ownership_snapshot(user).is_owned(self.buyable))
+        self.assertIn(self.buyable['id'], [c['id'] for c in self.service.get_available_characters(user)])
+
+    def test_season_unlock_on_shared_session_invalidates_after_commit(self):
+        user = self._user()
+        manager = SeasonManager()
+        manager.db = self
+        reward = SeasonReward(reward_type='character', reward_value=str(self.buyable['id']), reward_name="Premio")
+
+        session = self.Session()
+        manager.award_reward(1, reward, session=session)
+        # A snapshot taken before the caller commits caches the old set...
+        self.assertFalse(self.service.get_ownership_snapshot(user).is_owned(self.buyable))
+        session.commit()
+        session.close()
+        # ...and the commit drops it
+        self.assertTrue(self.service.get_ownership_snapshot(user).is_owned(self.buyable))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.achievements import GameEvent
+from services.chat_exp_buffer import ChatExpBuffer
+from services.leveling_service import xp_requirement
+
+
+class TestChatExpBuffer(unittest.TestCase):
+    """Chat EXP summed in memory, flushed in one transaction, level-ups projected"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Chatty", exp=xp_requirement(2) - 5, livello=1, chat_exp=100),
+            Utente(id_telegram=2, nome="Quiet", exp=0, livello=1, chat_exp=None),
+        ])
+        session.commit()
+        session.close()
+
+        self.buffer = ChatExpBuffer()
+        self.buffer.db = self  # get_session() below
+        self.buffer.leveling_service.db = self
+        self.buffer.leveling_service.event_dispatcher.db = self
+        self.buffer.event_dispatcher.db = self
+
+        self.writes = 0
+        event.listen(self.engine, "before_cursor_execute", self._count_writes)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _count_writes(self, conn, cursor, statement, *args):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            self.writes += 1
+
+    def _user(self, user_id):
+        session = self.Session()
+        try:
+            user = session.query(Utente).filter_by(id_telegram=user_id).first()
+            session.expunge(user)
+            return user
+        finally:
+            session.close()
+
+    def test_level_up_projected_before_flush(self):
+        chatty = self._user(1)
+        self.assertIsNone(self.buffer.add(chatty, 3, chat_exp=3))
+        self.assertEqual(self.buffer.add(chatty, 4, chat_exp=4), 2)
+        # Announced once, even though the DB row is still at level 1
+        self.assertIsNone(self.buffer.add(chatty, 1))
+        self.assertEqual(self.buffer.pending_exp(1), 8)
+        self.assertEqual(self.writes, 0)
+        self.assertEqual(self._user(1).livello, 1)
+
+    def test_flush_writes_sums_levels_and_events(self):
+        chatty = self._user(1)
+        quiet = self._user(2)
+        for _ in range(3):
+            self.buffer.add(chatty, 4, chat_exp=4)
+        self.buffer.add(quiet, 1)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.pending_exp(1), 0)
+
+        chatty = self._user(1)
+        self.assertEqual(chatty.exp, xp_requirement(2) - 5 + 12)
+        self.assertEqual(chatty.chat_exp, 112)
+        self.assertEqual(chatty.livello, 2)
+        self.assertEqual(self._user(2).exp, 1)
+
+        session = self.Session()
+        try:
+            events = session.query(GameEvent).filter_by(event_type='chat_exp').all()
+            self.assertEqual([(e.user_id, e.value) for e in events], [(1, 12)])
+            self.assertIn('"total_chat_exp": 112', events[0].context)
+            self.assertEqual(session.query(GameEvent).filter_by(event_type='level_up', user_id=1).count(), 1)
+        finally:
+            session.close()
+
+        # Nothing pending: no transaction at all
+        self.writes = 0
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.writes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
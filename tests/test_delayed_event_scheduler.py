@@ -0,0 +1,162 @@
+import unittest
+import threading
+import time
+import sys
+import os
+import ast
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.callback_router import CallbackRouter
+from services.delayed_event_scheduler import DelayedEventScheduler
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DUNGEON_SCRIPT_FUNCTIONS = ('handle_dungeon_start_cb', 'handle_aoe_attack_enemy_cb', '_play_dungeon_event',
+                            'process_dungeon_events', 'queue_stage_events')
+
+
+def load_bot_functions(names, namespace):
+    """Compile the named top-level functions of main.py (parsed, not imported) into namespace"""
+    with open(os.path.join(ROOT, 'main.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in names]
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), 'main.py', 'exec'), namespace)
+    return namespace
+
+
+class TestDelayedEventScheduler(unittest.TestCase):
+    """Async playback of dungeon event scripts"""
+
+    def setUp(self):
+        self.scheduler = DelayedEventScheduler()
+        self.played = []
+        self.done = threading.Event()
+
+    def _handler(self, tag):
+        def handle(event):
+            self.played.append((tag, event.get('content', event['type'])))
+            if event.get('content') == 'end':
+                self.done.set()
+        return handle
+
+    def test_play_script_does_not_block_and_keeps_order(self):
+        events = [
+            {'type': 'message', 'content': 'intro'},
+            {'type': 'delay', 'seconds': 0.1},
+            {'type': 'message', 'content': 'end'},
+        ]
+        start = time.monotonic()
+        self.scheduler.play_script(1, events, self._handler('a'))
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertEqual(self.played, [('a', 'intro'), ('a', 'delay'), ('a', 'end')])
+
+    def test_second_script_for_same_chat_waits_for_first(self):
+        self.scheduler.play_script(1, [{'type': 'delay', 'seconds': 0.1}, {'type': 'message', 'content': 'first'}], self._handler('a'))
+        self.scheduler.play_script(1, [{'type': 'message', 'content': 'end'}], self._handler('b'))
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual([p[1] for p in self.played], ['delay', 'first', 'end'])
+
+    def test_cancel_drops_pending_steps_for_chat_only(self):
+        self.scheduler.play_script(1, [{'type': 'delay', 'seconds': 0.1}, {'type': 'message', 'content': 'spawn'}], self._handler('a'))
+        self.scheduler.play_script(2, [{'type': 'delay', 'seconds': 0.1}, {'type': 'message', 'content': 'end'}], self._handler('b'))
+        time.sleep(0.02)
+        self.scheduler.cancel(1)
+        self.assertEqual(self.scheduler.pending(1), 0)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertNotIn(('a', 'spawn'), self.played)
+        self.assertIn(('b', 'end'), self.played)
+
+    def test_handler_errors_do_not_stop_playback(self):
+        def handle(event):
+            if event.get('content') == 'boom':
+                raise RuntimeError("send failed")
+            self.done.set()
+
+        self.scheduler.play_script(1, [{'type': 'message', 'content': 'boom'}, {'type': 'message', 'content': 'end'}], handle)
+        self.assertTrue(self.done.wait(2))
+
+
+class TestDungeonScripts(unittest.TestCase):
+    """Dungeon start / stage clear: new mobs attack only after the script has shown them"""
+
+    def setUp(self):
+        self.scheduler = DelayedEventScheduler()
+        self.steps = []
+        self.done = threading.Event()
+        self.call = SimpleNamespace(data="", id="cb1", from_user=SimpleNamespace(id=1),
+                                    message=SimpleNamespace(chat=SimpleNamespace(id=-100), message_id=5))
+
+    def _attack(self, bot, chat_id, mob_ids):
+        self.steps.append(('attack', mob_ids))
+        self.done.set()
+
+    def _namespace(self, **services):
+        bot = MagicMock()
+        bot.send_message.side_effect = lambda chat_id, text, **kwargs: self.steps.append(('message', text))
+        namespace = {
+            'bot': bot,
+            'callback_router': CallbackRouter(),
+            'BotCommands': lambda message, bot, user_id=None: SimpleNamespace(
+                process_dungeon_events=lambda evs, chat_id: namespace['process_dungeon_events'](evs, chat_id)),
+            'get_delayed_event_scheduler': lambda: self.scheduler,
+            'get_combat_markup': lambda *args: None,
+            'send_combat_message': lambda chat_id, msg, image, markup, mob_id, *args, **kwargs: self.steps.append(('spawn', mob_id)),
+            'display_mob_spawn': lambda bot, chat_id, mob_id: self.steps.append(('card', mob_id)),
+            'trigger_dungeon_mob_attack': self._attack,
+            'safe_answer_callback': lambda *args, **kwargs: None,
+            'get_mention_markdown': lambda user_id, name: name,
+        }
+        namespace.update(services)
+        return load_bot_functions(DUNGEON_SCRIPT_FUNCTIONS, namespace)
+
+    @staticmethod
+    def _mob_details(mob_id):
+        return {'name': f"mob{mob_id}", 'is_boss': False, 'image_path': None, 'health': 0}
+
+    def test_start_attack_is_the_last_step(self):
+        events = [
+            {'type': 'message', 'content': 'intro'},
+            {'type': 'delay', 'seconds': 0.05},
+            {'type': 'spawn', 'content': 'Saibaman', 'mob_ids': [7, 8]},
+        ]
+        namespace = self._namespace(
+            dungeon_service=SimpleNamespace(start_dungeon=lambda chat_id: (True, "", events)),
+            pve_service=SimpleNamespace(get_mob_details=self._mob_details),
+        )
+        namespace['handle_dungeon_start_cb'](self.call)
+        self.assertEqual(self.steps, [])  # Nothing sent synchronously: the script plays on the timer thread
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.steps, [('message', 'intro'), ('spawn', 7), ('spawn', 8), ('attack', [7, 8])])
+
+    def test_aoe_stage_clear_plays_summary_then_script_then_attack(self):
+        extra_data = {
+            'dungeon_events': [
+                {'type': 'message', 'content': 'Stage Completato!'},
+                {'type': 'delay', 'seconds': 0.05},
+                {'type': 'spawn', 'content': 'Cell', 'mob_ids': [9]},
+            ],
+            'new_mob_ids': [9],
+            'mob_ids': [3],
+        }
+        user = SimpleNamespace(id_telegram=1, username="goku", nome="Goku", base_damage=10)
+        namespace = self._namespace(
+            user_service=SimpleNamespace(get_resting_status=lambda user_id: None, get_user=lambda user_id: user),
+            pve_service=SimpleNamespace(get_mob_details=self._mob_details,
+                                        attack_aoe=lambda *args, **kwargs: (True, "summary", extra_data, [])),
+        )
+        self.call.data = "aoe_attack_enemy|mob|3"
+        namespace['handle_aoe_attack_enemy_cb'](self.call)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.steps, [('message', "goku\nsummary"), ('message', 'Stage Completato!'),
+                                      ('spawn', 9), ('attack', [9])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import datetime
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.achievements import GameEvent, GameEventDailyRollup
+from services.event_dispatcher import EventDispatcher
+
+
+class TestEventQueue(unittest.TestCase):
+    """Claim ordering and retention compaction of the GameEvent queue"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.dispatcher = EventDispatcher()
+        self.dispatcher.db = self  # get_session() below
+
+        session = self.Session()
+        session.add(Utente(id_telegram=1, nome="Hero"))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _add_events(self, count, processed, timestamp):
+        session = self.Session()
+        session.add_all([
+            GameEvent(user_id=1, event_type='mob_kill', value=2, processed=processed, timestamp=timestamp)
+            for _ in range(count)
+        ])
+        session.commit()
+        session.close()
+
+    def test_partial_index_declared(self):
+        indexes = {ix['name'] for ix in inspect(self.engine).get_indexes('game_event')}
+        self.assertIn('ix_game_event_unprocessed', indexes)
+
+    def test_claim_is_ordered_and_skips_processed(self):
+        now = datetime.datetime.now()
+        self._add_events(3, True, now)
+        self._add_events(5, False, now)
+
+        session = self.Session()
+        claimed = self.dispatcher.claim_unprocessed_events(3, session=session)
+        ids = [e.id for e in claimed]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(ids, [4, 5, 6])
+        session.close()
+
+    def test_compaction_rolls_up_and_deletes(self):
+        old = datetime.datetime.now() - datetime.timedelta(days=40)
+        recent = datetime.datetime.now()
+        self._add_events(4, True, old)
+        self._add_events(2, False, old)   # Never compact unprocessed rows
+        self._add_events(3, True, recent)  # Inside retention window
+
+        compacted = self.dispatcher.compact_processed_events(retention_days=30, batch_size=3)
+        self.assertEqual(compacted, 4)
+
+        session = self.Session()
+        self.assertEqual(session.query(GameEvent).count(), 5)
+        rollup = session.query(GameEventDailyRollup).one()
+        self.assertEqual(rollup.day, old.date())
+        self.assertEqual(rollup.event_count, 4)
+        self.assertEqual(rollup.value_sum, 8)
+        session.close()
+
+        # Counts keep including compacted history
+        self.assertEqual(self.dispatcher.get_event_count(1, 'mob_kill'), 9)
+
+        # Re-running is a no-op
+        self.assertEqual(self.dispatcher.compact_processed_events(retention_days=30), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.game import GameInfo
+from models.user import Utente  # noqa: F401 (FK targets for create_all)
+from models.guild import Guild  # noqa: F401
+from services import game_search
+from services.game_search import GameSearchIndex, normalize
+from services.game_service import GameService
+
+GAMES = [
+    GameInfo(id=1, title="Super Mario Bros.", platform="NES", genre="Platform", year=1985, premium=0, message_link="l/1"),
+    GameInfo(id=2, title="The Legend of Zelda: Ocarina of Time", platform="N64", genre="Avventura", year=1998, premium=1, message_link="l/2"),
+    GameInfo(id=3, title="Crash Bandicoot", platform="PS1", genre="Platform", year=1996, premium=0, message_link="l/3"),
+    GameInfo(id=4, title="Crash Team Racing", platform="PS1", genre="Corse", year=1999, premium=1, message_link="l/4"),
+    GameInfo(id=5, title="Super Mario 64", platform="N64", genre="Platform", year=1996, premium=0, message_link="l/5"),
+    GameInfo(id=6, title="Pokémon Rosso", platform="Game Boy", genre="GDR", year=1996, premium=0, message_link="l/6"),
+]
+
+
+class TestGameSearchIndex(unittest.TestCase):
+    """Inverted + trigram index: substring, prefix, typo tolerance and ranking"""
+
+    def setUp(self):
+        self.index = GameSearchIndex()
+        self.index.build(GAMES)
+
+    def test_substring_and_all_terms(self):
+        self.assertEqual(set(self.index.search("mario")), {1, 5})
+        self.assertEqual(set(self.index.search("andico")), {3})  # inside a word, like ILIKE '%term%'
+        self.assertEqual(self.index.search("mario n64"), [5])
+        self.assertEqual(self.index.search("crash 1999"), [4])
+        self.assertEqual(self.index.search("mario xyzzy"), [])
+
+    def test_stop_words_accents_and_short_prefixes(self):
+        self.assertEqual(self.index.search("il pokemon"), [6])
+        self.assertEqual(normalize("Pokémon"), "pokemon")
+        self.assertEqual(set(self.index.search("cr")), {3, 4})
+
+    def test_typos(self):
+        self.assertEqual(self.index.search("zelad"), [2])
+        self.assertEqual(self.index.search("ocarena"), [2])
+        self.assertEqual(self.index.search("bandicot"), [3])
+        self.assertEqual(self.index.search("mario zelda"), [])  # still every term must match
+
+    def test_ranking(self):
+        # 'platform' is a genre of three games but the title of none: a title hit wins
+        self.index.add(GameInfo(id=7, title="Platform Masters", platform="PC", genre="Puzzle", year=2010, premium=0))
+        self.assertEqual(self.index.search("platform")[0], 7)
+        # Exact word before prefix before substring
+        self.assertEqual(self.index.search("crash")[:2], [3, 4])
+
+    def test_premium_and_updates(self):
+        self.assertEqual(self.index.search("premium"), [4, 2])
+        self.index.remove(4)
+        self.assertEqual(self.index.search("racing"), [])
+        self.index.add(GameInfo(id=2, title="Zelda Remastered", platform="Switch", genre="", year=None, premium=0))
+        self.assertEqual(self.index.search("ocarina"), [])
+        self.assertEqual(self.index.search("switch"), [2])
+        self.assertEqual(self.index.search("premium"), [])
+
+
+class TestGameServiceSearch(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add_all([GameInfo(**{c.name: getattr(g, c.name) for c in GameInfo.__table__.columns}) for g in GAMES])
+        session.commit()
+        session.close()
+        game_search._game_search_index = None
+        self.service = GameService()
+        self.service.db = self
+
+    def tearDown(self):
+        game_search._game_search_index = None
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def test_search_returns_rows_in_rank_order(self):
+        results = self.service.search_games("super mario")
+        self.assertEqual([g.title for g in results], ["Super Mario 64", "Super Mario Bros."])
+
+    def test_games_added_outside_the_bot_are_searchable(self):
+        self.service.search_games("crash")  # Index loaded
+        session = self.Session()
+        session.add(GameInfo(id=99, title="Spyro the Dragon", platform="PS1", genre="Platform", year=1998,
+                             premium=0, message_link="l/99"))
+        session.query(GameInfo).filter_by(id=4).delete()
+        session.commit()
+        session.close()
+        self.assertEqual([g.id for g in self.service.search_games("spyro")], [99])
+        self.assertEqual([g.id for g in self.service.search_games("crash")], [3])
+
+    def test_periodic_resync_picks_up_edits(self):
+        self.service.search_games("crash")
+        session = self.Session()
+        session.query(GameInfo).filter_by(id=3).update({'title': "Crash Bandicoot N. Sane Trilogy"})
+        session.commit()
+        session.close()
+        self.assertEqual(self.service.search_games("trilogy"), [])  # Same max id, no rebuild yet
+        self.assertEqual(self.service.load_search_index(), len(GAMES))
+        self.assertEqual([g.id for g in self.service.search_games("trilogy")], [3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.cultivation import GardenSlot
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from services.cultivation_service import CultivationService, compute_moisture
+
+
+class TestGardenGrowth(unittest.TestCase):
+    """Set-based growth/rot transitions with lazily computed moisture"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = CultivationService()
+        self.service.db = self  # get_session() below
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _add(self, **kwargs):
+        session = self.Session()
+        slot = GardenSlot(slot_id=1, seed_type="Semi di Wumpa", **kwargs)
+        session.add(slot)
+        session.commit()
+        slot_pk = slot.id
+        session.close()
+        return slot_pk
+
+    def _slot(self, slot_pk):
+        session = self.Session()
+        try:
+            return session.get(GardenSlot, slot_pk)
+        finally:
+            session.close()
+
+    def test_compute_moisture(self):
+        now = datetime.now()
+        self.assertEqual(compute_moisture(SimpleNamespace(last_watered_at=now, moisture=100), now), 100)
+        self.assertEqual(compute_moisture(SimpleNamespace(last_watered_at=now - timedelta(hours=3), moisture=100), now), 70)
+        self.assertEqual(compute_moisture(SimpleNamespace(last_watered_at=now - timedelta(hours=12), moisture=100), now), 0)
+        self.assertEqual(compute_moisture(SimpleNamespace(last_watered_at=None, moisture=40), now), 40)
+
+    def test_transitions_return_only_changed_slots(self):
+        now = datetime.now()
+        ready = self._add(user_id=1, status='growing', completion_time=now - timedelta(minutes=1),
+                          moisture=100, last_watered_at=now - timedelta(hours=4))
+        growing = self._add(user_id=2, status='growing', completion_time=now + timedelta(hours=1),
+                            moisture=100, last_watered_at=now)
+        rotting = self._add(user_id=3, status='ready', rot_time=now - timedelta(minutes=1),
+                            moisture=100, last_watered_at=now)
+        rotten = self._add(user_id=4, status='rotting', rot_time=now - timedelta(minutes=1),
+                           moisture=100, last_watered_at=now)
+
+        events = self.service.process_all_growth()
+        self.assertEqual(
+            sorted((e['user_id'], e['event']) for e in events),
+            [(1, 'ready'), (3, 'rotting'), (4, 'rotten')]
+        )
+
+        self.assertEqual(self._slot(ready).status, 'ready')
+        self.assertGreater(self._slot(ready).rot_time, now)
+        self.assertEqual(self._slot(growing).status, 'growing')
+        self.assertEqual(self._slot(rotting).status, 'rotting')
+        self.assertGreater(self._slot(rotting).rot_time, now)
+        self.assertEqual(self._slot(rotten).status, 'rotten')
+
+        # Nothing left to change on the next tick
+        self.assertEqual(self.service.process_all_growth(), [])
+
+    def test_dry_plant_stalls(self):
+        now = datetime.now()
+        dry = self._add(user_id=1, status='growing', completion_time=now - timedelta(minutes=1),
+                        moisture=100, last_watered_at=now - timedelta(hours=11))
+
+        self.assertEqual(self.service.process_all_growth(), [])
+        slot = self._slot(dry)
+        self.assertEqual(slot.status, 'growing')
+        self.assertGreater(slot.completion_time, now)
+        self.assertEqual(slot.moisture, 100)  # Never rewritten, derived at read time
+
+    def test_check_growth_is_scoped_to_user(self):
+        now = datetime.now()
+        mine = self._add(user_id=1, status='growing', completion_time=now - timedelta(minutes=1),
+                         moisture=100, last_watered_at=now)
+        other = self._add(user_id=2, status='growing', completion_time=now - timedelta(minutes=1),
+                          moisture=100, last_watered_at=now)
+
+        self.assertEqual(self.service.check_growth(1), 1)
+        self.assertEqual(self._slot(mine).status, 'ready')
+        self.assertEqual(self._slot(other).status, 'growing')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild, GuildMember
+from services.guild_service import GuildService, invalidate_guild_cache
+
+
+class TestGuildSnapshotCache(unittest.TestCase):
+    """get_user_guild / get_user_guilds served from the snapshot cache"""
+
+    def setUp(self):
+        invalidate_guild_cache()
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = GuildService()
+        self.service.db = self  # get_session() below
+
+        self.queries = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Leader", points=0, livello=10),
+            Utente(id_telegram=2, nome="Member", points=0, livello=10),
+            Utente(id_telegram=3, nome="Loner", points=0, livello=10),
+            Guild(id=1, name="Gilda", leader_id=1, wumpa_bank=50000, inn_level=1, armory_level=2),
+            GuildMember(guild_id=1, user_id=1, role="Leader"),
+            GuildMember(guild_id=1, user_id=2, role="Member"),
+        ])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        invalidate_guild_cache()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def test_repeated_lookups_hit_cache(self):
+        guild = self.service.get_user_guild(2)
+        self.assertEqual(guild['name'], "Gilda")
+        self.assertEqual(guild['role'], "Member")
+
+        self.queries = 0
+        for _ in range(5):
+            self.assertEqual(self.service.get_user_guild(2)['armory_level'], 2)
+        self.assertIsNone(self.service.get_user_guild(3))
+        self.assertIsNone(self.service.get_user_guild(3))
+        self.assertEqual(self.queries, 1)  # Only the first "no guild" lookup
+
+    def test_returned_dict_is_a_copy(self):
+        self.service.get_user_guild(1)['name'] = "Modificata"
+        self.assertEqual(self.service.get_user_guild(1)['name'], "Gilda")
+
+    def test_upgrade_invalidates_snapshot(self):
+        self.assertEqual(self.service.get_user_guild(2)['inn_level'], 1)
+        success, _ = self.service.upgrade_inn(1)
+        self.assertTrue(success)
+        guild = self.service.get_user_guild(2)
+        self.assertEqual(guild['inn_level'], 2)
+        self.assertEqual(guild['wumpa_bank'], 45000)
+
+    def test_join_and_leave_invalidate_membership(self):
+        self.assertIsNone(self.service.get_user_guild(3))
+        self.service.join_guild(3, 1)
+        self.assertEqual(self.service.get_user_guild(3)['id'], 1)
+        self.service.leave_guild(3)
+        self.assertIsNone(self.service.get_user_guild(3))
+
+    def test_bulk_lookup(self):
+        self.queries = 0
+        guilds = self.service.get_user_guilds([1, 2, 3, 2])
+        self.assertEqual(self.queries, 2)  # Memberships + guilds
+        self.assertEqual(guilds[1]['role'], "Leader")
+        self.assertEqual(guilds[2]['role'], "Member")
+        self.assertIsNone(guilds[3])
+
+        self.queries = 0
+        self.assertEqual(self.service.get_user_guilds([1, 2, 3]), guilds)
+        self.assertEqual(self.queries, 0)
+
+    def test_guild_snapshot_by_id(self):
+        self.assertEqual(self.service.get_guild_snapshot(1)['armory_level'], 2)
+        self.assertIsNone(self.service.get_guild_snapshot(99))
+
+
+if __name__ == '__main__':
+    unittest.main()
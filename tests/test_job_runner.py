@@ -0,0 +1,138 @@
+import unittest
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import schedule
+from services.job_runner import JobRunner
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestJobRunner(unittest.TestCase):
+    """Bounded pool, overlap prevention and per-job metrics"""
+
+    def setUp(self):
+        self.scheduler = schedule.Scheduler()
+        self.runner = JobRunner(scheduler=self.scheduler, max_workers=2, default_timeout=0.05)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.runner.shutdown(wait=True)
+
+    def _make_due(self):
+        for job in self.scheduler.jobs:
+            job.next_run = job.next_run.replace(year=2000)
+
+    def test_slow_job_does_not_block_others(self):
+        fast_runs = []
+
+        def slow_job():
+            self.release.wait(2)
+
+        def fast_job():
+            fast_runs.append(1)
+
+        self.scheduler.every(10).seconds.do(slow_job)
+        self.scheduler.every(10).seconds.do(fast_job)
+        self._make_due()
+        self.runner.run_pending()
+
+        self.assertTrue(_wait_for(lambda: fast_runs))
+        self.assertTrue(_wait_for(lambda: self.runner.get_metrics().get('fast_job', {}).get('runs') == 1))
+
+    def test_overlapping_run_is_skipped_and_counted(self):
+        calls = []
+
+        def slow_job():
+            calls.append(1)
+            self.release.wait(2)
+
+        self.scheduler.every(10).seconds.do(slow_job)
+        self._make_due()
+        self.runner.run_pending()
+        self.assertTrue(_wait_for(lambda: calls))
+
+        self._make_due()
+        self.runner.run_pending()
+        time.sleep(0.1)
+        self.runner.run_pending()  # Timeout check
+
+        metrics = self.runner.get_metrics()['slow_job']
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(metrics['missed_runs'], 1)
+        self.assertEqual(metrics['timeouts'], 1)
+        self.assertGreater(metrics['last_lag'], 0)
+
+        self.release.set()
+        self.assertTrue(_wait_for(lambda: self.runner.get_metrics()['slow_job']['runs'] == 1))
+
+    def test_failure_and_cancel(self):
+        def broken_job():
+            raise RuntimeError("boom")
+
+        def one_shot_job():
+            return schedule.CancelJob
+
+        self.scheduler.every(10).seconds.do(broken_job)
+        self.scheduler.every(10).seconds.do(one_shot_job)
+        self._make_due()
+        self.runner.run_pending()
+
+        self.assertTrue(_wait_for(lambda: self.runner.get_metrics().get('broken_job', {}).get('failures') == 1))
+        self.assertTrue(_wait_for(lambda: len(self.scheduler.jobs) == 1))
+
+    def test_jobs_of_a_group_never_run_together(self):
+        self.runner.groups = {'trigger_job': 'dungeon', 'check_job': 'dungeon'}
+        running = []
+        overlaps = []
+
+        def grouped(tag):
+            def job():
+                if running:
+                    overlaps.append(tag)
+                running.append(tag)
+                self.release.wait(2)
+                running.remove(tag)
+            job.__name__ = f"{tag}_job"
+            return job
+
+        self.scheduler.every(10).seconds.do(grouped('trigger'))
+        self.scheduler.every(10).seconds.do(grouped('check'))
+        self._make_due()
+        self.runner.run_pending()
+        self.assertTrue(_wait_for(lambda: running))
+        first = running[0]
+        second = 'check' if first == 'trigger' else 'trigger'
+
+        self.runner.run_pending()  # Still busy: the other job stays due
+        self.assertEqual(running, [first])
+        self.assertEqual(self.runner.get_metrics()[f"{second}_job"]['deferred_runs'], 1)
+
+        self.release.set()
+        self.assertTrue(_wait_for(lambda: self.runner.get_metrics().get(f"{first}_job", {}).get('runs') == 1))
+        self.runner.run_pending()
+        self.assertTrue(_wait_for(lambda: self.runner.get_metrics()[f"{second}_job"]['runs'] == 1))
+        self.assertEqual(overlaps, [])
+
+    def test_record_adds_job_values(self):
+        self.runner.record('regen_job', rows=12, duration_ms=3.5)
+        self.runner.record('regen_job', rows=4, duration_ms=1.0)
+        metrics = self.runner.get_metrics()['regen_job']
+        self.assertEqual((metrics['rows'], metrics['duration_ms']), (4, 1.0))
+        self.assertEqual(metrics['runs'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
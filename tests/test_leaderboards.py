@@ -0,0 +1,149 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild
+from models.seasons import Season, SeasonProgress
+from models.guild_dungeon_stats import GuildDungeonStats
+from services import leaderboard_service, season_gate
+from services.leaderboard_service import Leaderboard, LeaderboardService
+from services.leveling_service import LevelingService
+from services.season_manager import SeasonManager
+from services.guild_service import GuildService
+
+
+class TestLeaderboard(unittest.TestCase):
+    """Sorted board: top-N, rank-of and updates in place"""
+
+    def test_top_rank_and_updates(self):
+        board = Leaderboard()
+        board.load([(1, 50), (2, 300), (3, 120)])
+        self.assertEqual(board.top(2), [(2, 300), (3, 120)])
+        self.assertEqual(board.rank_of(1), 3)
+        self.assertIsNone(board.rank_of(99))
+
+        board.update(1, 500)
+        self.assertEqual(board.rank_of(1), 1)
+        self.assertEqual(len(board), 3)
+
+        # Ties break by member id
+        board.update(4, 120)
+        self.assertEqual([member for member, _ in board.top(10)], [1, 2, 3, 4])
+
+        board.remove(2)
+        self.assertEqual(board.rank_of(3), 2)
+        self.assertEqual(board.increment(5, 10), 10)
+        self.assertEqual(board.increment(5, 200), 210)
+        self.assertEqual(board.score_of(5), 210)
+        self.assertEqual(board.top(2), [(1, 500), (5, 210)])
+
+    def test_tuple_scores(self):
+        board = Leaderboard()
+        board.load([(1, (3, 10)), (2, (3, 90)), (3, (5, 0))])
+        self.assertEqual(board.top(3), [(3, (5, 0)), (2, (3, 90)), (1, (3, 10))])
+
+
+class TestLeaderboardService(unittest.TestCase):
+    """Boards rebuilt from the DB, fed by the write paths, read without scanning utente"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Uno", game_name="Primo", exp=1000, livello=5),
+            Utente(id_telegram=2, nome="Due", exp=5000, livello=9),
+            Utente(id_telegram=3, nome="Tre", exp=0, livello=1),
+        ])
+        session.add(Season(id=1, name="Stagione Test", start_date=datetime.now(),
+                           end_date=datetime.now() + timedelta(days=30), is_active=True))
+        session.add_all([
+            SeasonProgress(user_id=1, season_id=1, current_level=4, current_exp=10),
+            SeasonProgress(user_id=2, season_id=1, current_level=2, current_exp=50),
+        ])
+        session.add_all([Guild(id=1, name="Alfa", leader_id=1), Guild(id=2, name="Beta", leader_id=2)])
+        session.add_all([
+            GuildDungeonStats(guild_id=1, dungeon_id=1, total_damage=100),
+            GuildDungeonStats(guild_id=1, dungeon_id=2, total_damage=150),
+            GuildDungeonStats(guild_id=2, dungeon_id=1, total_damage=200),
+        ])
+        session.commit()
+        session.close()
+
+        self.boards = LeaderboardService()
+        self.boards.db = self
+        leaderboard_service._leaderboard_service = self.boards
+        season_gate.invalidate_season_cache()
+
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+
+    def tearDown(self):
+        leaderboard_service._leaderboard_service = None
+        season_gate.invalidate_season_cache()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(" ".join(statement.split()))
+
+    def test_global_ranking_follows_exp_writes(self):
+        self.boards.rebuild()
+        self.assertEqual([u.id_telegram for u in self.boards.get_global_ranking(10)], [2, 1])
+
+        leveling = LevelingService()
+        leveling.db = self
+        leveling.event_dispatcher.db = self
+        leveling.add_exp_by_id(3, 9000)
+
+        self.statements = []
+        users = self.boards.get_global_ranking(2)
+        self.assertEqual([u.id_telegram for u in users], [3, 2])
+        self.assertEqual(self.boards.rank_of_user(1), 3)
+        # Only the displayed rows are read, by key
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(" IN (", self.statements[0])
+
+    def test_season_ranking(self):
+        manager = SeasonManager()
+        manager.db = self
+
+        ranking, name = manager.get_season_ranking(limit=10)
+        self.assertEqual(name, "Stagione Test")
+        self.assertEqual([(d['game_name'] or d['nome'], d['level']) for d in ranking], [("Primo", 4), ("Due", 2)])
+
+        manager.add_seasonal_exp(2, 5000)
+        ranking, _ = manager.get_season_ranking(limit=1)
+        self.assertEqual(ranking[0]['nome'], "Due")
+        self.assertGreater(ranking[0]['level'], 4)
+        # Ranks come from the board, not from an ORDER BY over season_progress
+        self.assertFalse([s for s in self.statements if "FROM season_progress" in s and "ORDER BY" in s])
+
+    def test_guild_ranking(self):
+        guild_service = GuildService()
+        guild_service.db = self
+        self.boards.rebuild()
+
+        self.assertEqual(guild_service.get_dungeon_ranking(limit=5),
+                         [{'name': "Alfa", 'total_damage': 250}, {'name': "Beta", 'total_damage': 200}])
+
+        self.boards.record_guild_damage(2, 100)
+        self.assertEqual(guild_service.get_dungeon_ranking(limit=1), [{'name': "Beta", 'total_damage': 300}])
+
+        # Per-dungeon ranking still comes from the stats table
+        self.assertEqual(guild_service.get_dungeon_ranking(dungeon_id=2, limit=5),
+                         [{'name': "Alfa", 'total_damage': 150}])
+
+
+if __name__ == '__main__':
+    unittest.main()
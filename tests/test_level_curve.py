@@ -0,0 +1,110 @@
+import unittest
+import sys
+import os
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.achievements import GameEvent
+from services.leveling_service import (
+    LevelingService, LevelCurve, get_level_curve, xp_requirement, LEVEL_CURVE_CAP
+)
+from services.season_manager import get_season_rank_curve, season_rank_exp
+
+
+def walk_level(exp_total):
+    """The old per-level walk, as reference"""
+    level = 1
+    while exp_total >= xp_requirement(level + 1):
+        level += 1
+    return level
+
+
+class TestLevelCurve(unittest.TestCase):
+    """Precomputed EXP table + bisect must match the formula everywhere"""
+
+    def test_requirements_match_formula(self):
+        curve = get_level_curve()
+        for level in range(-2, LEVEL_CURVE_CAP + 20):
+            self.assertEqual(curve.requirement(level), xp_requirement(level))
+
+    def test_level_for_exp_matches_walk(self):
+        curve = get_level_curve()
+        rng = random.Random(11)
+        samples = [-10, 0, 1, 55, 56, 57]
+        samples += [xp_requirement(level) + delta for level in range(2, 200) for delta in (-1, 0, 1)]
+        samples += [rng.randint(0, 10 ** 9) for _ in range(500)]
+        # Past the table the formula takes over
+        samples += [xp_requirement(LEVEL_CURVE_CAP + 3), xp_requirement(LEVEL_CURVE_CAP + 3) - 1]
+        for exp_total in samples:
+            self.assertEqual(curve.level_for(exp_total), walk_level(exp_total), exp_total)
+
+    def test_step_cost_curve(self):
+        curve = LevelCurve.from_step_costs(season_rank_exp, 5)
+        self.assertEqual([curve.requirement(r) for r in range(1, 6)], [0, 100, 500, 1400, 3000])
+        self.assertEqual(curve.requirement(7), 3000 + 2500 + 3600)
+        self.assertEqual(curve.level_for(99), 1)
+        self.assertEqual(curve.level_for(100), 2)
+        # Past max_level the step costs keep accumulating
+        self.assertEqual(curve.level_for(5499), 5)
+        self.assertEqual(curve.level_for(5500), 6)
+
+    def test_season_rank_curve_cached_per_max_rank(self):
+        self.assertIs(get_season_rank_curve(30), get_season_rank_curve(30))
+        self.assertEqual(get_season_rank_curve(10).max_level, 10)
+
+
+class TestAddExpLevelJump(unittest.TestCase):
+    """add_exp_by_id resolves several level-ups in one step"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add(Utente(id_telegram=1, nome="Grinder", exp=0, livello=1, stat_points=2))
+        session.commit()
+        session.close()
+        self.service = LevelingService()
+        self.service.db = self
+        self.service.event_dispatcher.db = self
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def test_multi_level_gain(self):
+        session = self.Session()
+        try:
+            exp = xp_requirement(6) + 10
+            result = self.service.add_exp_by_id(1, exp, session=session)
+            session.commit()
+
+            self.assertTrue(result['leveled_up'])
+            self.assertEqual(result['new_level'], 6)
+            self.assertEqual(result['next_level_exp'], xp_requirement(7))
+            user = session.query(Utente).filter_by(id_telegram=1).first()
+            self.assertEqual(user.livello, 6)
+            self.assertEqual(user.stat_points, 12)
+
+            events = session.query(GameEvent).filter_by(event_type='level_up').all()
+            self.assertEqual(len(events), 1)
+            self.assertEqual(events[0].value, 6)
+
+            # No level change: nothing logged
+            result = self.service.add_exp_by_id(1, 1, session=session)
+            self.assertFalse(result['leveled_up'])
+            self.assertEqual(session.query(GameEvent).filter_by(event_type='level_up').count(), 1)
+        finally:
+            session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
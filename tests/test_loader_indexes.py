@@ -0,0 +1,69 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.character_loader import CharacterLoader
+from services.skill_service import SkillService
+
+
+class TestCharacterLoaderIndex(unittest.TestCase):
+    """Prebuilt indexes must match the old linear scans"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loader = CharacterLoader()
+        cls.chars = cls.loader.get_all_characters()
+
+    def test_by_level_and_saga(self):
+        for level in self.loader.get_character_levels():
+            self.assertEqual(self.loader.get_characters_by_level(level),
+                             [c for c in self.chars if c['livello'] == level])
+        for saga in self.loader.get_all_sagas():
+            self.assertEqual(self.loader.get_characters_by_saga(saga),
+                             sorted([c for c in self.chars if c['character_group'] == saga], key=lambda x: x['livello']))
+
+    def test_transformations_and_partitions(self):
+        for char in self.chars:
+            self.assertEqual(self.loader.get_transformations_for_base(char['id']),
+                             [c for c in self.chars if c.get('base_character_id') == char['id']])
+        self.assertEqual(self.loader.get_boss_entities(), [c for c in self.chars if c.get('entity_type') == 'Boss'])
+        self.assertEqual(self.loader.get_spawnable_entities(), [c for c in self.chars if c.get('spawn_eligible')])
+
+    def test_returned_lists_do_not_alias_index(self):
+        level = self.chars[0]['livello']
+        self.loader.get_characters_by_level(level).clear()
+        self.assertTrue(self.loader.get_characters_by_level(level))
+
+    def test_signature_change_swaps_index(self):
+        loader = CharacterLoader()
+        content = MagicMock()
+        content.get_files.return_value = []
+        content.get_runtime_signature.return_value = "a::base"
+        with patch('services.character_loader.get_season_content_service', return_value=content):
+            loader.get_all_characters()
+            first = loader._index
+            loader.get_character_by_id(1)
+            self.assertIs(loader._index, first)
+
+            content.get_runtime_signature.return_value = "b::pack"
+            loader.get_character_by_id(1)
+            self.assertIsNot(loader._index, first)
+
+
+class TestSkillServiceIndex(unittest.TestCase):
+
+    def test_abilities_by_character(self):
+        service = SkillService()
+        abilities = service.load_abilities_from_csv()
+        for character_id in {a['character_id'] for a in abilities}:
+            self.assertEqual(service.get_character_abilities(character_id),
+                             [a for a in abilities if a['character_id'] == character_id])
+        self.assertEqual(service.get_character_abilities(-1), [])
+        self.assertIs(service.get_ability_by_id(abilities[0]['id']), abilities[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
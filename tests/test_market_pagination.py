@@ -0,0 +1,133 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.items import Collezionabili
+from models.market import MarketListing
+from models.resources import Resource, UserResource
+from services.market_service import (
+    MarketService, encode_cursor, decode_cursor,
+    invalidate_listing_count, invalidate_resource_map
+)
+
+
+class TestMarketPagination(unittest.TestCase):
+    """Keyset market browser, cached count, resource map and expiry sweeper"""
+
+    def setUp(self):
+        invalidate_listing_count()
+        invalidate_resource_map()
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = MarketService()
+        self.service.db = self  # get_session() below
+        self.service.item_service.db = self
+
+        session = self.Session()
+        session.add(Utente(id_telegram=1, nome="Seller", points=0))
+        session.add(Resource(id=7, name="Ferro", rarity=1))
+        base = datetime(2024, 1, 1, 12, 0)
+        # 12 active listings, two of them sharing the same created_at
+        for i in range(12):
+            created = base + timedelta(minutes=i if i != 11 else 10)
+            session.add(MarketListing(seller_id=1, item_name="Pozione", quantity=1, price_per_unit=10,
+                                      created_at=created, expires_at=datetime.now() + timedelta(days=1),
+                                      status='active'))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        invalidate_listing_count()
+        invalidate_resource_map()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _expected_order(self):
+        session = self.Session()
+        try:
+            rows = session.query(MarketListing).order_by(
+                MarketListing.created_at.desc(), MarketListing.id.desc()).all()
+            return [r.id for r in rows]
+        finally:
+            session.close()
+
+    def test_cursor_roundtrip(self):
+        listing = MarketListing(id=42, created_at=datetime(2024, 5, 6, 7, 8, 9, 123456))
+        self.assertEqual(decode_cursor(encode_cursor(listing)), (listing.created_at, 42))
+
+    def test_walk_forward_and_back(self):
+        expected = self._expected_order()
+        seen = []
+        pages = []
+        cursor = None
+        while True:
+            listings, total, next_cursor, prev_cursor = self.service.get_listings_page(cursor, limit=5)
+            self.assertEqual(total, 12)
+            pages.append((listings, prev_cursor))
+            seen.extend(l.id for l in listings)
+            if not next_cursor:
+                break
+            cursor = next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0][1])
+
+        # Back from the last page to the second one
+        listings, _, next_cursor, prev_cursor = self.service.get_listings_page(pages[2][1], backwards=True, limit=5)
+        self.assertEqual([l.id for l in listings], expected[5:10])
+        self.assertIsNotNone(next_cursor)
+        self.assertIsNotNone(prev_cursor)
+
+        # And back to the first
+        listings, _, _, prev_cursor = self.service.get_listings_page(prev_cursor, backwards=True, limit=5)
+        self.assertEqual([l.id for l in listings], expected[:5])
+        self.assertIsNone(prev_cursor)
+
+    def test_count_is_cached_until_invalidated(self):
+        self.assertEqual(self.service.count_active_listings(), 12)
+        session = self.Session()
+        session.query(MarketListing).filter(MarketListing.id == 1).update({'status': 'sold'})
+        session.commit()
+        session.close()
+        self.assertEqual(self.service.count_active_listings(), 12)
+        invalidate_listing_count()
+        self.assertEqual(self.service.count_active_listings(), 11)
+
+    def test_resource_map(self):
+        self.assertEqual(self.service.get_resource_id("Ferro"), 7)
+        self.assertIsNone(self.service.get_resource_id("Pozione"))
+
+    def test_expiry_sweeper_returns_items(self):
+        session = self.Session()
+        session.add(MarketListing(seller_id=1, item_name="Ferro", quantity=3, price_per_unit=5,
+                                  expires_at=datetime.now() - timedelta(minutes=1), status='active'))
+        session.add(MarketListing(seller_id=1, item_name="Pozione", quantity=2, price_per_unit=5,
+                                  expires_at=datetime.now() - timedelta(minutes=1), status='active'))
+        session.commit()
+        session.close()
+
+        self.assertEqual(self.service.expire_listings(), 2)
+        self.assertEqual(self.service.expire_listings(), 0)
+
+        session = self.Session()
+        try:
+            self.assertEqual(session.query(MarketListing).filter_by(status='expired').count(), 2)
+            self.assertEqual(session.query(UserResource).filter_by(user_id=1, resource_id=7).first().quantity, 3)
+            self.assertEqual(session.query(Collezionabili).filter_by(id_telegram='1', oggetto="Pozione").count(), 2)
+        finally:
+            session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
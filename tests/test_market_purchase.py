@@ -0,0 +1,186 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild, GuildMember
+from models.items import Collezionabili
+from models.market import MarketListing
+from models.resources import Resource, UserResource  # noqa: F401 (tables for create_all)
+from models.achievements import GameEvent  # noqa: F401
+from services.market_service import MarketService, invalidate_listing_count, invalidate_resource_map
+from services.guild_service import GuildService, invalidate_guild_cache
+
+
+class TestMarketPurchase(unittest.TestCase):
+    """buy_item claims the listing with a conditional UPDATE and moves points as SQL deltas"""
+
+    def setUp(self):
+        invalidate_listing_count()
+        invalidate_resource_map()
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = MarketService()
+        self.service.db = self  # get_session() below
+        self.service.item_service.db = self
+        self.service.event_dispatcher.db = self
+        self.service.item_service.event_dispatcher.db = self
+
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Seller", points=0),
+            Utente(id_telegram=2, nome="Buyer", points=100),
+            Utente(id_telegram=3, nome="Poor", points=5),
+            MarketListing(id=1, seller_id=1, item_name="Pozione", quantity=2, price_per_unit=20,
+                          created_at=datetime.now() - timedelta(hours=1),
+                          expires_at=datetime.now() + timedelta(days=1), status='active'),
+            MarketListing(id=2, seller_id=1, item_name="Elisir", quantity=1, price_per_unit=10,
+                          created_at=datetime.now() - timedelta(days=8),
+                          expires_at=datetime.now() - timedelta(days=1), status='active'),
+        ])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        invalidate_listing_count()
+        invalidate_resource_map()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _points(self, user_id):
+        session = self.Session()
+        try:
+            return session.query(Utente.points).filter_by(id_telegram=user_id).scalar()
+        finally:
+            session.close()
+
+    def _listing(self, listing_id):
+        session = self.Session()
+        try:
+            listing = session.query(MarketListing).filter_by(id=listing_id).first()
+            session.expunge(listing)
+            return listing
+        finally:
+            session.close()
+
+    def test_buy_moves_points_and_items_once(self):
+        success, msg = self.service.buy_item(2, 1)
+        self.assertTrue(success, msg)
+        self.assertEqual(self._points(2), 60)
+        self.assertEqual(self._points(1), 40)
+        listing = self._listing(1)
+        self.assertEqual(listing.status, 'sold')
+        self.assertEqual(listing.buyer_id, 2)
+
+        session = self.Session()
+        self.assertEqual(session.query(Collezionabili).filter_by(id_telegram="2", oggetto="Pozione").count(), 2)
+        session.close()
+
+        # Second attempt finds the listing already claimed: nothing moves
+        success, msg = self.service.buy_item(2, 1)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Annuncio non più disponibile.")
+        self.assertEqual(self._points(2), 60)
+        self.assertEqual(self._points(1), 40)
+
+    def test_insufficient_points_leaves_listing_active(self):
+        success, msg = self.service.buy_item(3, 1)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Non hai abbastanza 🍑 (5/40).")
+        self.assertEqual(self._listing(1).status, 'active')
+        self.assertEqual(self._points(3), 5)
+        self.assertEqual(self._points(1), 0)
+
+    def test_own_listing_refused(self):
+        success, msg = self.service.buy_item(1, 1)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Non puoi acquistare i tuoi oggetti.")
+        self.assertEqual(self._listing(1).status, 'active')
+
+    def test_expired_listing_returned_to_seller(self):
+        success, msg = self.service.buy_item(2, 2)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Annuncio scaduto.")
+        self.assertEqual(self._listing(2).status, 'expired')
+        self.assertEqual(self._points(2), 100)
+
+        session = self.Session()
+        self.assertEqual(session.query(Collezionabili).filter_by(id_telegram="1", oggetto="Elisir").count(), 1)
+        session.close()
+
+
+class TestGuildBankDeltas(unittest.TestCase):
+    """deposit_wumpa / withdraw_wumpa never overdraw the user or the bank"""
+
+    def setUp(self):
+        invalidate_guild_cache()
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = GuildService()
+        self.service.db = self
+
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Leader", points=100, livello=10),
+            Utente(id_telegram=2, nome="Member", points=30, livello=10),
+            Guild(id=1, name="Gilda", leader_id=1, wumpa_bank=50),
+            GuildMember(guild_id=1, user_id=1, role="Leader"),
+            GuildMember(guild_id=1, user_id=2, role="Member"),
+        ])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        invalidate_guild_cache()
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _balances(self):
+        session = self.Session()
+        try:
+            points = dict(session.query(Utente.id_telegram, Utente.points).all())
+            bank = session.query(Guild.wumpa_bank).filter_by(id=1).scalar()
+            return points, bank
+        finally:
+            session.close()
+
+    def test_deposit(self):
+        success, _ = self.service.deposit_wumpa(2, 20)
+        self.assertTrue(success)
+        self.assertEqual(self._balances(), ({1: 100, 2: 10}, 70))
+
+        success, msg = self.service.deposit_wumpa(2, 20)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Non hai abbastanza Wumpa!")
+        self.assertEqual(self._balances(), ({1: 100, 2: 10}, 70))
+
+    def test_withdraw(self):
+        success, _ = self.service.withdraw_wumpa(1, 50)
+        self.assertTrue(success)
+        self.assertEqual(self._balances(), ({1: 150, 2: 30}, 0))
+
+        # Bank empty: the user credit is rolled back with the failed debit
+        success, msg = self.service.withdraw_wumpa(1, 1)
+        self.assertFalse(success)
+        self.assertEqual(msg, "La banca della gilda non ha abbastanza fondi!")
+        self.assertEqual(self._balances(), ({1: 150, 2: 30}, 0))
+
+        success, msg = self.service.withdraw_wumpa(2, 1)
+        self.assertFalse(success)
+        self.assertEqual(msg, "Solo il capogilda può prelevare fondi!")
+
+
+if __name__ == '__main__':
+    unittest.main()
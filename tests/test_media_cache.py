@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+from utils import media_cache
+from utils.media_cache import MediaCache
+from utils.bot_utils import SafeTeleBot
+
+
+def _photo_message(file_id):
+    size = MagicMock()
+    size.file_id = file_id
+    msg = MagicMock()
+    msg.photo = [MagicMock(file_id='thumb'), size]
+    return msg
+
+
+class TestMediaCache(unittest.TestCase):
+    """Telegram file_id reuse for local media uploads"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.tmp.name, 'mob.png')
+        with open(self.image, 'wb') as f:
+            f.write(b'png')
+        self.cache_path = os.path.join(self.tmp.name, 'file_ids.json')
+        patcher = patch.object(media_cache, '_media_cache', MediaCache(self.cache_path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bot = SafeTeleBot('123:TEST')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _send(self):
+        with open(self.image, 'rb') as photo:
+            return self.bot.send_photo(1, photo, caption='hi')
+
+    def test_second_send_reuses_file_id(self):
+        with patch.object(telebot.TeleBot, 'send_photo', return_value=_photo_message('FID1')) as send:
+            self._send()
+            self._send()
+        self.assertNotIsInstance(send.call_args_list[0].args[1], str)
+        self.assertEqual(send.call_args_list[1].args[1], 'FID1')
+        self.assertEqual(send.call_args_list[1].kwargs['caption'], 'hi')
+
+        # Persisted across instances
+        self.assertEqual(MediaCache(self.cache_path).get(self.image, 'photo'), 'FID1')
+
+    def test_modified_file_is_uploaded_again(self):
+        with patch.object(telebot.TeleBot, 'send_photo', return_value=_photo_message('FID1')) as send:
+            self._send()
+            os.utime(self.image, (1, 1))
+            self._send()
+        self.assertNotIsInstance(send.call_args_list[1].args[1], str)
+
+    def test_stale_file_id_falls_back_to_upload(self):
+        stale = ApiTelegramException('sendPhoto', None, {'error_code': 400, 'description': 'Bad Request: wrong file identifier'})
+
+        def fake_send(chat_id, photo, *args, **kwargs):
+            if isinstance(photo, str):
+                raise stale
+            return _photo_message('FID2')
+
+        media_cache.get_media_cache().remember(self.image, 'photo', _photo_message('OLD'))
+        with patch.object(telebot.TeleBot, 'send_photo', side_effect=fake_send) as send:
+            self._send()
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(media_cache.get_media_cache().get(self.image, 'photo'), 'FID2')
+
+    def test_in_memory_media_is_not_cached(self):
+        import io
+        with patch.object(telebot.TeleBot, 'send_photo', return_value=_photo_message('FID1')) as send:
+            self.bot.send_photo(1, io.BytesIO(b'gray'))
+            self.bot.send_photo(1, io.BytesIO(b'gray'))
+        self.assertFalse(any(isinstance(c.args[1], str) for c in send.call_args_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from services.regeneration_service import RegenerationService
+
+
+class TestRegenerationService(unittest.TestCase):
+    """Set-based mana regeneration"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = RegenerationService()
+        self.service.db = self  # get_session() below
+
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="A", mana=0, max_mana=50),
+            Utente(id_telegram=2, nome="B", mana=45, max_mana=50),
+            Utente(id_telegram=3, nome="C", mana=50, max_mana=50),
+            Utente(id_telegram=4, nome="D", mana=10, max_mana=100),
+        ])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _mana(self):
+        session = self.Session()
+        try:
+            return {u.id_telegram: u.mana for u in session.query(Utente).all()}
+        finally:
+            session.close()
+
+    def test_single_update_caps_at_max(self):
+        result = self.service.regenerate_mana(amount=10)
+        self.assertEqual(result['rows'], 3)  # Full-mana user untouched
+        self.assertEqual(self._mana(), {1: 10, 2: 50, 3: 50, 4: 20})
+
+    def test_chunked_update_matches_single(self):
+        result = self.service.regenerate_mana(amount=10, chunk_size=1)
+        self.assertEqual(result['rows'], 3)
+        self.assertEqual(self._mana(), {1: 10, 2: 50, 3: 50, 4: 20})
+
+    def test_empty_table(self):
+        session = self.Session()
+        session.query(Utente).delete()
+        session.commit()
+        session.close()
+        self.assertEqual(self.service.regenerate_mana()['rows'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
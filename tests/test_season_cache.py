@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import services.season_gate as season_gate
+from database import Base
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.seasons import Season, SeasonProgress
+from models.user import Utente
+from services.season_content_service import SeasonContentService
+from services.season_manager import SeasonManager
+
+
+def _mock_session(theme="Dragon Ball", season_id=1):
+    session = MagicMock()
+    season = MagicMock(id=season_id, theme=theme)
+    season.name = "Test Season"
+    session.query.return_value.filter.return_value.order_by.return_value.first.return_value = season
+    return session
+
+
+class TestSeasonCache(unittest.TestCase):
+    def setUp(self):
+        season_gate.invalidate_season_cache()
+
+    def tearDown(self):
+        season_gate.invalidate_season_cache()
+
+    @patch('services.season_gate.Database')
+    def test_theme_is_cached_between_calls(self, MockDatabase):
+        session = _mock_session()
+        MockDatabase.return_value.get_session.return_value = session
+
+        for _ in range(5):
+            self.assertEqual(season_gate.get_active_season_theme(), "Dragon Ball")
+
+        self.assertEqual(session.query.call_count, 1)
+
+    @patch('services.season_gate.Database')
+    def test_invalidate_forces_reload(self, MockDatabase):
+        session = _mock_session()
+        MockDatabase.return_value.get_session.return_value = session
+        season_gate.get_active_season_theme()
+
+        new_season = MagicMock(id=2, theme="Marvel")
+        session.query.return_value.filter.return_value.order_by.return_value.first.return_value = new_season
+        self.assertEqual(season_gate.get_active_season_theme(), "Dragon Ball")
+
+        season_gate.invalidate_season_cache()
+        self.assertTrue(season_gate.is_marvel_season_active())
+        self.assertEqual(season_gate.get_active_season_snapshot()['id'], 2)
+
+    @patch('services.season_gate.Database')
+    def test_errors_are_not_cached(self, MockDatabase):
+        session = MagicMock()
+        session.query.side_effect = Exception("db down")
+        MockDatabase.return_value.get_session.return_value = session
+        self.assertIsNone(season_gate.get_active_season_theme())
+
+        session.query.side_effect = None
+        session.query.return_value.filter.return_value.order_by.return_value.first.return_value = MagicMock(id=3, theme="Mario")
+        self.assertEqual(season_gate.get_active_season_theme(), "Mario")
+
+    @patch('services.season_gate.Database')
+    def test_runtime_signature_needs_single_lookup(self, MockDatabase):
+        session = _mock_session(theme="Marvel")
+        MockDatabase.return_value.get_session.return_value = session
+        service = SeasonContentService()
+
+        first = service.get_runtime_signature()
+        for _ in range(10):
+            self.assertEqual(service.get_runtime_signature(), first)
+        self.assertTrue(first.startswith("marvel::"))
+        self.assertEqual(MockDatabase.return_value.get_session.call_count, 1)
+
+
+class TestSeasonEndOnSharedSession(unittest.TestCase):
+    def setUp(self):
+        season_gate.invalidate_season_cache()
+        # A file database, so another session only sees what was committed
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'seasons.db')}")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+        now = datetime.now()
+        session = self.Session()
+        session.add(Utente(id_telegram=1, nome='a'))
+        session.add(Season(id=1, name="S1", is_active=True, exp_multiplier=1.0,
+                           start_date=now - timedelta(days=1), end_date=now + timedelta(days=30)))
+        session.add(SeasonProgress(user_id=1, season_id=1, current_exp=0,
+                                   current_level=SeasonManager.MAX_RANK - 1, last_update=now))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        season_gate.invalidate_season_cache()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def get_session(self):
+        return self.Session()
+
+    def test_season_end_invalidates_after_commit(self):
+        manager = SeasonManager()
+        manager.db = self
+
+        def end_season(season_id, winner_user_id, session=None):
+            session.get(Season, season_id).is_active = False
+            return "fine"
+
+        with patch('services.season_gate.Database') as MockDatabase, \
+                patch.object(manager, 'end_season', side_effect=end_season):
+            MockDatabase.return_value.get_session.side_effect = self.get_session
+            session = self.Session()
+            _, season_end_msg = manager.add_seasonal_exp(1, 10 ** 9, session=session)
+            self.assertEqual(season_end_msg, "fine")
+            # A snapshot taken before the caller commits caches the still-active season...
+            self.assertEqual(season_gate.get_active_season_snapshot()['id'], 1)
+            session.commit()
+            session.close()
+            # ...and the commit drops it
+            self.assertIsNone(season_gate.get_active_season_snapshot()['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import threading
+import unittest
+
+from services.service_registry import get_service, register_service, reset_services
+
+
+class _CountingService:
+    instances = 0
+
+    def __init__(self):
+        _CountingService.instances += 1
+
+
+class TestServiceRegistry(unittest.TestCase):
+    def setUp(self):
+        reset_services(_CountingService)
+        _CountingService.instances = 0
+
+    def tearDown(self):
+        reset_services(_CountingService)
+
+    def test_returns_same_instance(self):
+        first = get_service(_CountingService)
+        second = get_service(_CountingService)
+        self.assertIs(first, second)
+        self.assertEqual(_CountingService.instances, 1)
+
+    def test_concurrent_first_use_builds_once(self):
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            results.append(get_service(_CountingService))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(_CountingService.instances, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_register_and_reset(self):
+        fake = object()
+        register_service(_CountingService, fake)
+        self.assertIs(get_service(_CountingService), fake)
+
+        reset_services(_CountingService)
+        self.assertIsNot(get_service(_CountingService), fake)
+        self.assertEqual(_CountingService.instances, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
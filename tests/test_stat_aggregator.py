@@ -0,0 +1,105 @@
+import unittest
+import json
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.stats import UserStat
+from models.achievements import GameEvent
+from services.stat_aggregator import StatAggregator
+
+
+class TestStatAggregatorFlush(unittest.TestCase):
+    """Multi-row UPSERT flush on the SQLite fallback"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add_all([Utente(id_telegram=uid, nome=f"U{uid}") for uid in (1, 2)])
+        self.session.commit()
+        self.aggregator = StatAggregator()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _stat(self, user_id, key):
+        row = self.session.query(UserStat).filter_by(user_id=user_id, stat_key=key).first()
+        return row.value if row else None
+
+    def _events(self):
+        return [
+            GameEvent(user_id=1, event_type='damage_dealt', value=100, context=json.dumps({'is_crit': True})),
+            GameEvent(user_id=1, event_type='damage_dealt', value=50, context=None),
+            GameEvent(user_id=2, event_type='mob_kill', value=1, context=json.dumps({'mob_name': 'C17', 'is_boss': True})),
+            GameEvent(user_id=2, event_type='level_up', value=7, context=None),
+            GameEvent(user_id=999, event_type='mob_kill', value=1, context=None),  # Unknown user
+        ]
+
+    def test_increments_accumulate_across_batches(self):
+        self.aggregator.process_events(self._events(), session=self.session)
+        self.session.commit()
+        self.aggregator.process_events(self._events(), session=self.session)
+        self.session.commit()
+
+        self.assertEqual(self._stat(1, 'total_damage'), 300)
+        self.assertEqual(self._stat(1, 'critical_hits'), 2)
+        self.assertEqual(self._stat(2, 'android_kills'), 2)
+        self.assertEqual(self._stat(2, 'boss_kills'), 2)
+        self.assertIsNone(self._stat(999, 'total_kills'))
+
+    def test_set_overwrites(self):
+        self.aggregator.process_events(self._events(), session=self.session)
+        self.session.commit()
+        self.aggregator.process_events(
+            [GameEvent(user_id=2, event_type='level_up', value=9, context=None)], session=self.session
+        )
+        self.session.commit()
+        self.assertEqual(self._stat(2, 'level'), 9)
+
+    def test_overlapping_batches_keep_their_own_aggregates(self):
+        # The flush job and the achievements job share one aggregator: a second
+        # batch processed mid-way through the first must not reset or flush its stats
+        aggregator = self.aggregator
+        inner_session = sessionmaker(bind=self.engine)()
+        original = aggregator._process_single_event
+        nested = []
+
+        def process_single_event(session, event, batch_cache):
+            original(session, event, batch_cache)
+            if not nested:
+                nested.append(True)
+                aggregator.process_events(
+                    [GameEvent(user_id=2, event_type='damage_dealt', value=7, context=None)], session=inner_session
+                )
+                inner_session.commit()
+
+        aggregator._process_single_event = process_single_event
+        touched = aggregator.process_events(self._events(), session=self.session)
+        self.session.commit()
+        inner_session.close()
+
+        self.assertEqual(self._stat(1, 'total_damage'), 150)
+        self.assertEqual(self._stat(2, 'total_damage'), 7)
+        self.assertEqual(self._stat(2, 'level'), 7)
+        self.assertEqual(touched[1], {'damage_dealt', 'total_damage', 'critical_hits'})
+
+    def test_chunking(self):
+        self.aggregator.SQLITE_FLUSH_CHUNK_SIZE = 3
+        batch_cache = {
+            (1, f"kill_mob_{i}"): {'op': 'inc', 'value': i} for i in range(10)
+        }
+        self.aggregator._flush_stats(self.session, batch_cache)
+        self.session.commit()
+        self.assertEqual(self.session.query(UserStat).filter_by(user_id=1).count(), 10)
+        self.assertEqual(self._stat(1, 'kill_mob_9'), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
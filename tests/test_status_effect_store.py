@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import json
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from services.status_effects import (
+    ActiveEffect, StatusEffect, load_effects, parse_effects, purge_expired_effects, save_effects,
+)
+from services.user_service import UserService
+
+NOW = 1_700_000_000.0
+
+
+class TestEffectStore(unittest.TestCase):
+    """Parsed once per stored value, pruned on expiry, serialised on write"""
+
+    def test_round_trip_keeps_unknown_keys(self):
+        raw = json.dumps([
+            {'effect': 'relax_bong', 'expires_at': NOW + 60, 'value_res': 15, 'name': 'Bong'},
+            {'effect': 'poison', 'duration': 3, 'stacks': 2, 'source_level': 4},
+        ])
+        relax, poison = parse_effects(raw, NOW)
+        self.assertEqual(relax.get('value_res'), 15)
+        self.assertEqual(relax.get('name'), 'Bong')
+        self.assertEqual((poison.key, poison.stacks, poison.source_level), ('poison', 2, 4))
+
+        target = SimpleNamespace(active_status_effects=None)
+        save_effects(target, (relax, poison), now_ts=NOW)
+        self.assertEqual(json.loads(target.active_status_effects), json.loads(raw))
+
+    def test_parse_is_shared_between_readers(self):
+        raw = json.dumps([{'effect': 'temple_buff_crit', 'value': 15, 'expires_at': NOW + 60}])
+        user = SimpleNamespace(active_status_effects=raw)
+        wrapper = SimpleNamespace(active_status_effects=user.active_status_effects)
+        self.assertIs(load_effects(user, now_ts=NOW), load_effects(wrapper, now_ts=NOW))
+
+    def test_expired_effects_are_pruned(self):
+        raw = json.dumps([
+            {'id': 'turbo', 'expires': '2000-01-01T00:00:00'},  # Legacy ISO expiry
+            {'effect': 'library_buff_mana', 'value': 40, 'expires_at': NOW + 60},
+            {'effect': 'burn', 'duration': 2},
+        ])
+        self.assertEqual([e.key for e in parse_effects(raw, NOW)], ['library_buff_mana', 'burn'])
+        self.assertEqual([e.key for e in parse_effects(raw, NOW + 120)], ['burn'])
+
+        purged = purge_expired_effects(raw, NOW + 120)
+        self.assertEqual(json.loads(purged), [{'effect': 'burn', 'duration': 2}])
+        self.assertIsNone(purge_expired_effects(purged, NOW + 120))
+        self.assertEqual(parse_effects('not json'), ())
+
+    def test_turns_keep_timed_buffs(self):
+        far = NOW * 2
+        user = SimpleNamespace(nome='Crash', current_hp=100, active_status_effects=json.dumps(
+            [{'effect': 'beer_potion_bonus', 'value': 20, 'expires_at': far}]
+        ))
+        self.assertTrue(StatusEffect.apply_status(user, 'poison', source_level=1))
+        self.assertTrue(StatusEffect.apply_status(user, 'poison', source_level=1))
+        self.assertEqual(StatusEffect.get_active_effects(user)[1], {'effect': 'poison', 'duration': 5, 'stacks': 2, 'source_level': 1})
+
+        result = StatusEffect.process_turn_effects(user)
+        self.assertEqual(result['damage'], 8)
+        self.assertEqual(user.current_hp, 92)
+        self.assertEqual([(e.key, e.duration) for e in load_effects(user)], [('beer_potion_bonus', None), ('poison', 4)])
+
+        StatusEffect.remove_effect(user, 'poison')
+        self.assertFalse(StatusEffect.has_effect(user, 'poison'))
+        self.assertTrue(StatusEffect.has_effect(user, 'beer_potion_bonus'))
+
+
+class TestPurgeExpiredStatusEffects(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = UserService()
+        self.service.db = self
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def test_bulk_purge(self):
+        expired = {'effect': 'temple_buff_crit', 'value': 15, 'expires_at': 1.0}
+        active = {'effect': 'library_buff_mana', 'value': 20, 'expires_at': NOW * 2}
+        session = self.Session()
+        session.add_all([
+            Utente(id_telegram=1, nome='a', active_status_effects=json.dumps([expired, active])),
+            Utente(id_telegram=2, nome='b', active_status_effects=json.dumps([active])),
+            Utente(id_telegram=3, nome='c', active_status_effects=json.dumps([{'id': 'relax_limit_bong', 'expires': '2000-01-01T00:00:00'}])),
+            Utente(id_telegram=4, nome='d', active_status_effects=None),
+        ])
+        session.commit()
+        session.close()
+
+        self.assertEqual(self.service.purge_expired_status_effects(), 2)
+        self.assertEqual(self.service.purge_expired_status_effects(), 0)
+
+        session = self.Session()
+        stored = {u.id_telegram: u.active_status_effects for u in session.query(Utente)}
+        session.close()
+        self.assertEqual(json.loads(stored[1]), [active])
+        self.assertEqual(json.loads(stored[2]), [active])
+        self.assertEqual(json.loads(stored[3]), [])
+        self.assertIsNone(stored[4])
+
+
+if __name__ == '__main__':
+    unittest.main()
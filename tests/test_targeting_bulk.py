@@ -0,0 +1,91 @@
+import unittest
+import datetime
+import sys
+import os
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.pve import Mob
+from models.combat import CombatParticipation
+from models.dungeon import DungeonParticipant
+from services.targeting_service import TargetingService
+from services.user_service import UserService
+
+
+class TestTargetingBulk(unittest.TestCase):
+    """Bulk targeting must match the per-user _is_valid_target rules."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+        now = datetime.datetime.now()
+        users = [
+            Utente(id_telegram=1, nome="Alive", health=100, max_health=100, current_hp=80, mana=10, max_mana=50),
+            Utente(id_telegram=2, nome="Dead", health=100, max_health=100, current_hp=0, mana=10, max_mana=50),
+            Utente(id_telegram=3, nome="Resting", health=100, max_health=100, current_hp=50, mana=10, max_mana=50,
+                   resting_since=now - datetime.timedelta(minutes=5)),
+            Utente(id_telegram=4, nome="Fled", health=100, max_health=100, current_hp=50, mana=10, max_mana=50),
+            Utente(id_telegram=5, nome="Ancient", health=100, max_health=100, current_hp=50, mana=10, max_mana=50,
+                   last_activity=now - datetime.timedelta(days=200)),
+            Utente(id_telegram=6, nome="NoCurrentHp", health=40, max_health=100, current_hp=None, mana=10, max_mana=50),
+            Utente(id_telegram=7, nome="DungeonHero", health=100, max_health=100, current_hp=100, mana=10, max_mana=50),
+        ]
+        self.session.add_all(users)
+
+        self.world_mob = Mob(id=10, name="Goblin", health=100, max_health=100, chat_id=-100)
+        self.other_mob = Mob(id=11, name="Orc", health=100, max_health=100, chat_id=-100)
+        self.dungeon_mob = Mob(id=12, name="Guardian", health=100, max_health=100, chat_id=-100, dungeon_id=99)
+        self.session.add_all([self.world_mob, self.other_mob, self.dungeon_mob])
+
+        self.session.add(CombatParticipation(mob_id=10, user_id=4, has_fled=True))
+        self.session.add(CombatParticipation(mob_id=11, user_id=1, has_fled=False))
+        self.session.add(DungeonParticipant(dungeon_id=99, user_id=7))
+        self.session.add(DungeonParticipant(dungeon_id=99, user_id=2))
+        self.session.commit()
+
+        self.service = TargetingService()
+        # Per-user reference path needs a real resting check bound to our session
+        self.service.user_service = UserService()
+        self.service.user_service.get_recent_users = MagicMock(return_value=[1, 2, 3, 4, 5, 6, 404])
+        self.recent = [1, 2, 3, 4, 5, 6, 404]
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _reference_targets(self, mob):
+        if mob.dungeon_id:
+            candidates = {p.user_id for p in self.session.query(DungeonParticipant).filter_by(dungeon_id=mob.dungeon_id)}
+        else:
+            candidates = set(self.recent)
+        return {uid for uid in candidates if self.service._is_valid_target(uid, mob, self.session)}
+
+    def test_bulk_matches_per_user_logic(self):
+        mobs = [self.world_mob, self.other_mob, self.dungeon_mob]
+        result = self.service.get_valid_targets_for_mobs(mobs, chat_id=-100, recent_users=self.recent, session=self.session)
+
+        for mob in mobs:
+            self.assertEqual(set(result[mob.id]), self._reference_targets(mob), f"Mismatch for mob {mob.id}")
+
+        self.assertEqual(set(result[10]), {1, 6})
+        self.assertEqual(set(result[11]), {1, 4, 6})
+        self.assertEqual(set(result[12]), {7})
+
+    def test_single_mob_wrapper(self):
+        targets = self.service.get_valid_targets(self.world_mob, chat_id=-100, session=self.session)
+        self.assertEqual(set(targets), self._reference_targets(self.world_mob))
+
+    def test_no_candidates(self):
+        result = self.service.get_valid_targets_for_mobs([self.world_mob], recent_users=[], session=self.session)
+        self.assertEqual(result, {10: []})
+
+
+if __name__ == '__main__':
+    unittest.main()
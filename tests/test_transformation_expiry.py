@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.guild import Guild  # noqa: F401 (FK targets for create_all)
+from models.system import CharacterTransformation, UserTransformation
+from models.character_ownership import CharacterOwnership  # noqa: F401
+from services.transformation_service import TransformationService, next_sunrise, is_night
+
+
+class TestTransformationExpiry(unittest.TestCase):
+    """Expiry-indexed reverter with a once-per-day night-only sweep"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = TransformationService()
+        self.service.db = self  # get_session() below
+        self.service.user_service = MagicMock()  # Stats recalculation is out of scope here
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def get_session(self):
+        return self.Session()
+
+    def _add_user(self, user_id, char_id, expires_at=None, transformation=None):
+        session = self.Session()
+        session.add(Utente(id_telegram=user_id, nome=f"U{user_id}", livello_selezionato=char_id,
+                           transformation_expires_at=expires_at, current_transformation=transformation))
+        session.commit()
+        session.close()
+
+    def _char(self, user_id):
+        session = self.Session()
+        try:
+            user = session.query(Utente).filter_by(id_telegram=user_id).first()
+            return user.livello_selezionato, user.transformation_expires_at
+        finally:
+            session.close()
+
+    def test_next_sunrise(self):
+        self.assertEqual(next_sunrise(datetime(2024, 1, 1, 22, 30)), datetime(2024, 1, 2, 6, 0))
+        self.assertEqual(next_sunrise(datetime(2024, 1, 2, 3, 0)), datetime(2024, 1, 2, 6, 0))
+        day = datetime(2024, 1, 2, 12, 0)
+        self.assertEqual(next_sunrise(day), day)
+        self.assertTrue(is_night(datetime(2024, 1, 1, 18, 0)))
+        self.assertFalse(is_night(datetime(2024, 1, 1, 6, 0)))
+
+    def test_only_expired_rows_are_reverted(self):
+        now = datetime(2024, 1, 1, 22, 0)
+        session = self.Session()
+        rule = CharacterTransformation(base_character_id=60, transformed_character_id=70,
+                                       transformation_name="SSJ", wumpa_cost=0, duration_days=1)
+        session.add(rule)
+        session.flush()
+        session.add(UserTransformation(user_id=1, transformation_id=rule.id,
+                                       expires_at=now, is_active=True))
+        session.commit()
+        session.close()
+
+        self._add_user(1, 70, expires_at=now - timedelta(minutes=1), transformation="SSJ")
+        self._add_user(2, 70, expires_at=now + timedelta(hours=1), transformation="SSJ")
+        self._add_user(3, 600)  # Great Ape at night: untouched
+
+        self.assertEqual(self.service.check_expired_transformations(now=now), 1)
+        self.assertEqual(self._char(1), (60, None))
+        self.assertEqual(self._char(2)[0], 70)
+        self.assertEqual(self._char(3)[0], 600)
+
+        session = self.Session()
+        self.assertFalse(session.query(UserTransformation).filter_by(user_id=1).first().is_active)
+        session.close()
+
+    def test_great_ape_expires_at_sunrise(self):
+        night = datetime(2024, 1, 1, 22, 0)
+        self._add_user(1, 600, expires_at=next_sunrise(night), transformation="Scimmione (Goku)")
+
+        self.assertEqual(self.service.check_expired_transformations(now=night), 0)
+        morning = datetime(2024, 1, 2, 6, 1)
+        self.service._last_day_sweep = morning.date()  # Only the expiry path
+        self.assertEqual(self.service.check_expired_transformations(now=morning), 1)
+        self.assertEqual(self._char(1), (60, None))
+
+    def test_day_sweep_runs_once_per_day(self):
+        self._add_user(1, 600)  # Orphaned Great Ape without expiry
+        morning = datetime(2024, 1, 2, 6, 1)
+        self.assertEqual(self.service.check_expired_transformations(now=morning), 1)
+        self.assertEqual(self._char(1)[0], 60)
+
+        # Later the same day the sweep is not repeated
+        self._add_user(2, 601)
+        self.assertEqual(self.service.check_expired_transformations(now=morning + timedelta(hours=1)), 0)
+        self.assertEqual(self._char(2)[0], 601)
+
+        # Next day window
+        self.assertEqual(self.service.check_expired_transformations(now=morning + timedelta(days=1)), 1)
+        self.assertEqual(self._char(2)[0], 61)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import datetime
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models.user import Utente
+from models.equipment import Equipment, UserEquipment
+from models.item import ItemSet
+from models.system import CharacterTransformation, UserTransformation
+from services.user_recalculation_service import UserRecalculationService, LOADED_COLUMNS
+from services.character_loader import get_character_loader
+
+
+class _FakeDb:
+    def __init__(self, Session):
+        self.Session = Session
+
+    def get_session(self):
+        return self.Session()
+
+
+class TestUserRecalculation(unittest.TestCase):
+    """Batched boot recalculation must match the per-user path"""
+
+    def _build_db(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        session.add_all([
+            Utente(id_telegram=1, nome="Nuovo", exp=None, livello=None),
+            Utente(id_telegram=2, nome="Medio", exp=5000, livello=3, allocated_health=4, allocated_damage=2, health=9999),
+            Utente(id_telegram=3, nome="Barato", exp=10, livello=50, allocated_speed=30),
+            Utente(id_telegram=4, nome="Equip", exp=20000, livello=10, livello_selezionato=1),
+            Utente(id_telegram=5, nome="Trasf", exp=20000, livello=10, livello_selezionato=1),
+            Utente(id_telegram=6, nome="Scaduto", exp=20000, livello=10, livello_selezionato=1),
+            Utente(id_telegram=7, nome="Alto", exp=1, livello=1, livello_selezionato=self.high_level_char),
+        ])
+        session.add(ItemSet(id=1, name="Set Saiyan", bonuses={"2": {"max_health": 50}}))
+        session.add_all([
+            Equipment(id=1, name="Anello", slot="ring", stats_json={"health": 20, "attack": 3}, set_name="Set Saiyan"),
+            Equipment(id=2, name="Armatura", slot="body", stats_json={"all_stats": 2}, set_name="Set Saiyan"),
+        ])
+        session.add_all([
+            UserEquipment(user_id=4, equipment_id=1, equipped=True),
+            UserEquipment(user_id=4, equipment_id=2, equipped=True),
+            UserEquipment(user_id=5, equipment_id=1, equipped=False),
+        ])
+        session.add(CharacterTransformation(id=1, base_character_id=1, transformed_character_id=2, transformation_name="Super",
+                                            wumpa_cost=0, health_bonus=30, mana_bonus=10, damage_bonus=5))
+        future = datetime.datetime.now() + datetime.timedelta(days=1)
+        past = datetime.datetime.now() - datetime.timedelta(days=1)
+        session.add_all([
+            UserTransformation(user_id=5, transformation_id=1, expires_at=future, is_active=True),
+            UserTransformation(user_id=6, transformation_id=1, expires_at=past, is_active=True),
+        ])
+        session.commit()
+        session.close()
+        return engine, Session
+
+    def _snapshot(self, Session):
+        session = Session()
+        try:
+            columns = [getattr(Utente, name) for name in LOADED_COLUMNS]
+            return {row.id_telegram: tuple(row) for row in session.query(*columns).all()}
+        finally:
+            session.close()
+
+    def setUp(self):
+        chars = get_character_loader().get_all_characters()
+        self.high_level_char = max(chars, key=lambda c: c['livello'])['id']
+
+    def test_matches_per_user_recalculation(self):
+        # Old path: recalculate_level + recalculate_stats per user
+        _, OldSession = self._build_db()
+        service = UserRecalculationService()
+        session = OldSession()
+        loader = get_character_loader()
+        for u in session.query(Utente).all():
+            if u.exp is None:
+                u.exp = 0
+            if u.livello is None:
+                u.livello = 1
+            for attr in ['allocated_health', 'allocated_mana', 'allocated_damage',
+                         'allocated_resistance', 'allocated_crit', 'allocated_speed']:
+                if getattr(u, attr) is None:
+                    setattr(u, attr, 0)
+            service.leveling_service.recalculate_level(u.id_telegram, session=session)
+            service.user_service.recalculate_stats(u.id_telegram, session=session)
+            char_info = loader.get_character_by_id(u.livello_selezionato) if u.livello_selezionato is not None else None
+            if char_info and u.livello < char_info.get('livello', 1):
+                u.livello_selezionato = 1
+                service.user_service.recalculate_stats(u.id_telegram, session=session)
+        session.commit()
+        session.close()
+        expected = self._snapshot(OldSession)
+
+        # New path: batched engine, tiny chunks to exercise paging
+        _, NewSession = self._build_db()
+        service = UserRecalculationService()
+        service.db = _FakeDb(NewSession)
+        result = service.recalculate_all(chunk_size=3)
+
+        self.assertEqual(result['users'], 7)
+        self.assertEqual(self._snapshot(NewSession), expected)
+
+        # Second run: nothing left to write
+        self.assertEqual(service.recalculate_all(chunk_size=3)['updated'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
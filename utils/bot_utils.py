@@ -1,5 +1,6 @@
 import telebot
 from telebot.apihelper import ApiTelegramException
+from utils.media_cache import get_media_cache, cacheable_path
 
 class SafeTeleBot(telebot.TeleBot):
     def __init__(self, token, parse_mode=None, threaded=True, skip_pending=False, num_threads=2, next_step_backend=None, reply_backend=None, exception_handler=None, last_update_id=0, suppress_middleware_excep=False, state_storage=None, use_class_middlewares=False, disable_web_page_preview=None, disable_notification=None, protect_content=None, allow_sending_without_reply=None, strict_kwargs=False):
@@ -25,6 +26,40 @@ class SafeTeleBot(telebot.TeleBot):
                 return super().reply_to(message, text, parse_mode=None, **kwargs)
             raise e
 
+    def _send_media(self, kind, send, chat_id, media, *args, **kwargs):
+        """Send a local file by its cached Telegram file_id, uploading it only once."""
+        path = cacheable_path(media)
+        if path is None:
+            return send(chat_id, media, *args, **kwargs)
+
+        cache = get_media_cache()
+        file_id = cache.get(path, kind)
+        if file_id:
+            try:
+                return send(chat_id, file_id, *args, **kwargs)
+            except ApiTelegramException as e:
+                if "can't parse entities" in str(e) or e.error_code != 400:
+                    raise e
+                # Stale file_id (e.g. bot token changed): upload the file again
+                print(f"[SafeTeleBot] Cached file_id rejected for {path}: {e}. Re-uploading.")
+                cache.forget(path, kind)
+
+        message = send(chat_id, media, *args, **kwargs)
+        cache.remember(path, kind, message)
+        return message
+
+    def send_photo(self, chat_id, photo, *args, **kwargs):
+        return self._send_media('photo', super().send_photo, chat_id, photo, *args, **kwargs)
+
+    def send_animation(self, chat_id, animation, *args, **kwargs):
+        return self._send_media('animation', super().send_animation, chat_id, animation, *args, **kwargs)
+
+    def send_video(self, chat_id, video, *args, **kwargs):
+        return self._send_media('video', super().send_video, chat_id, video, *args, **kwargs)
+
+    def send_sticker(self, chat_id, sticker, *args, **kwargs):
+        return self._send_media('sticker', super().send_sticker, chat_id, sticker, *args, **kwargs)
+
     def delete_message(self, chat_id, message_id, timeout=None):
         """Override to handle rate limits and 'message not found' gracefully"""
         import time
@@ -0,0 +1,64 @@
+"""
+Formula backends.
+The balance formulas (DamageCalculator, RewardService, LevelingService) take
+an `ops` argument so the very same code runs on plain numbers inside the bot
+and on whole NumPy arrays in the simulator (see simulation/).
+NumPy is optional: only the simulator needs it (pip install numpy).
+"""
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class ScalarOps:
+    """Plain Python numbers (what the bot uses)"""
+
+    @staticmethod
+    def maximum(a, b):
+        return max(a, b)
+
+    @staticmethod
+    def minimum(a, b):
+        return min(a, b)
+
+    @staticmethod
+    def trunc(x):
+        """Truncate towards zero to an int, like int()"""
+        return int(x)
+
+    @staticmethod
+    def where(cond, a, b):
+        return a if cond else b
+
+
+class NumpyOps:
+    """Element-wise NumPy arrays (one element per simulated fight)"""
+
+    @staticmethod
+    def maximum(a, b):
+        return np.maximum(a, b)
+
+    @staticmethod
+    def minimum(a, b):
+        return np.minimum(a, b)
+
+    @staticmethod
+    def trunc(x):
+        return np.trunc(x).astype(np.int64)
+
+    @staticmethod
+    def where(cond, a, b):
+        return np.where(cond, a, b)
+
+
+SCALAR_OPS = ScalarOps()
+
+
+def get_numpy_ops():
+    if not NUMPY_AVAILABLE:
+        raise ImportError("NumPy non disponibile. Installa con: pip install numpy")
+    return NumpyOps()
@@ -0,0 +1,117 @@
+"""
+Telegram file_id cache.
+Telegram returns a file_id for every uploaded media: re-sending that id
+instead of the bytes is instant and costs no upload. Entries are keyed by
+the absolute image path and invalidated when the file's mtime changes.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "data", "telegram_file_ids.json")
+
+# Message attribute holding the uploaded media, per send method kind
+MEDIA_ATTRIBUTES = {
+    'photo': ('photo', 'document'),
+    'animation': ('animation', 'document'),
+    'video': ('video', 'document'),
+    'sticker': ('sticker',),
+}
+
+
+class MediaCache:
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or DEFAULT_CACHE_PATH
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[MEDIA CACHE] Could not read {self.cache_path}: {e}")
+            return {}
+
+    def _save(self):
+        # Atomic replace: a crash mid-write never leaves a truncated cache
+        directory = os.path.dirname(self.cache_path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"[MEDIA CACHE] Could not write {self.cache_path}: {e}")
+
+    @staticmethod
+    def _key(path, kind):
+        return f"{kind}:{os.path.abspath(path)}"
+
+    def get(self, path, kind='photo'):
+        """Cached file_id for path, or None if unknown or the file changed since upload."""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        entry = self._entries.get(self._key(path, kind))
+        if entry and entry.get('mtime') == mtime:
+            return entry.get('file_id')
+        return None
+
+    def remember(self, path, kind, message):
+        """Store the file_id Telegram assigned to the media in message."""
+        file_id = extract_file_id(message, kind)
+        if not file_id:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            self._entries[self._key(path, kind)] = {'mtime': mtime, 'file_id': file_id}
+            self._save()
+        return file_id
+
+    def forget(self, path, kind='photo'):
+        with self._lock:
+            if self._entries.pop(self._key(path, kind), None) is not None:
+                self._save()
+
+
+def extract_file_id(message, kind):
+    for attr in MEDIA_ATTRIBUTES.get(kind, (kind,)):
+        media = getattr(message, attr, None)
+        if not media:
+            continue
+        if isinstance(media, list):
+            media = media[-1]  # Largest photo size
+        file_id = getattr(media, 'file_id', None)
+        if isinstance(file_id, str):
+            return file_id
+    return None
+
+
+def cacheable_path(media):
+    """Filesystem path behind an open file object (None for BytesIO, file_ids, URLs)."""
+    path = getattr(media, 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    return None
+
+
+_media_cache = None
+
+
+def get_media_cache():
+    global _media_cache
+    if _media_cache is None:
+        _media_cache = MediaCache()
+    return _media_cache